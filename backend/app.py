@@ -2,21 +2,40 @@
 アプリケーションのエントリーポイント
 """
 import os
+import time
+import threading
+from typing import Optional
+
+# モジュールのインポート時間を計測するための開始時刻
+_imports_started = time.perf_counter()
+
 from flask import Flask
 from flask_cors import CORS
-from dotenv import load_dotenv
 
-# 設定のインポート
+# 設定のインポート（環境変数の読み込みはconfigモジュールで一度だけ行う）
 from config import get_config
 
 # サービスのインポート
-from services.auth_service import initialize_firebase
+from services.auth_service import (
+    init_firebase, ensure_firebase, init_token_cache, init_token_verifier, init_session_tokens
+)
+from services import auth_service
 from services.db_service import init_db, db
+from services.replica_router import init_replicas, PIN_HEADER
+from services.partitioning import init_partitioning
+from services.policy import init_policies, policy_stats
+from services.profile_cache import init_profile_cache, profile_cache
+from services.autocomplete import init_autocomplete, autocomplete
+from services.write_coalescer import init_write_coalescer, write_coalescer
+from services.metrics import register_collector
+from services.json_provider import init_json
+from services.compression import init_compression, compressor
 
 # コントローラー（Blueprint）のインポート
 from controllers.main_controller import main_bp
 from controllers.auth_controller import auth_bp
 from controllers.profile_controller import profile_bp
+from controllers.admin_controller import admin_bp
 
 # エラーハンドリングのインポート
 from errors import register_error_handlers
@@ -24,21 +43,101 @@ from errors import register_error_handlers
 # ロギングのインポート
 from logger import setup_logger, get_logger
 
+# 起動計測のインポート
+from startup import record_timing, timed, get_timings, check_startup_budget
+
+record_timing('import:app_modules', (time.perf_counter() - _imports_started) * 1000)
+
 # ロガーの取得
 logger = get_logger(__name__)
 
+def warm_up(app: Flask) -> None:
+    """
+    遅延初期化されたコンポーネントを事前に初期化する
+    
+    LAZY_INITが有効な場合に、各ワーカープロセスがリクエストの受け付けを開始した後に
+    バックグラウンドで呼び出されます（start_warm_upを参照）。
+    
+    Args:
+        app: Flaskアプリケーションインスタンス
+    """
+    with timed('warm_up'):
+        with app.app_context():
+            if not ensure_firebase():
+                logger.warning("Firebase Admin SDKの初期化に失敗しました")
+            
+            if auth_service.token_verifier is not None:
+                with timed('init:signing_keys'):
+                    auth_service.token_verifier.key_set.load()
+            
+            try:
+                with timed('init:db_connection'):
+                    with db.engine.connect():
+                        pass
+            except Exception as e:
+                logger.warning(f"ウォームアップ中のデータベース接続に失敗しました: {str(e)}")
+    
+    logger.info("ウォームアップが完了しました", extra={'context': {'startup_timings': get_timings()}})
+
+
+def schedule_warm_up(app: Flask) -> threading.Timer:
+    """
+    ウォームアップをバックグラウンドスレッドで実行するようにスケジュールする
+    
+    Args:
+        app: Flaskアプリケーションインスタンス
+    
+    Returns:
+        ウォームアップを実行するタイマースレッド
+    """
+    timer = threading.Timer(app.config.get('WARM_UP_DELAY', 0.0), warm_up, args=(app,))
+    timer.daemon = True
+    timer.start()
+    return timer
+
+
+# ウォームアップを開始したプロセスの記録を保護するロック
+_warm_up_lock = threading.Lock()
+
+
+def start_warm_up(app: Flask) -> Optional[threading.Timer]:
+    """
+    このプロセスでまだウォームアップを開始していない場合に開始する
+    
+    アプリケーションの作成時ではなくワーカープロセス内（最初のリクエスト、ASGIのlifespan）で呼び出します。
+    gunicorn --preloadではアプリケーションがマスタープロセスで作成され、マスターで開始したスレッドは
+    フォークしたワーカーに引き継がれないため、プロセスIDごとに1回開始します。
+    
+    Args:
+        app: Flaskアプリケーションインスタンス
+    
+    Returns:
+        ウォームアップを実行するタイマースレッド、開始済みまたは無効な場合はNone
+    """
+    if not (app.config.get('LAZY_INIT') and app.config.get('WARM_UP_ON_START')):
+        return None
+    
+    pid = os.getpid()
+    if app.extensions.get('warm_up_pid') == pid:
+        return None
+    with _warm_up_lock:
+        if app.extensions.get('warm_up_pid') == pid:
+            return None
+        app.extensions['warm_up_pid'] = pid
+    return schedule_warm_up(app)
+
+
 def create_app(config_name=None):
     """
     アプリケーションファクトリー関数
     
     Args:
         config_name: 設定名（development, testing, production）
-        
+    
     Returns:
         設定済みのFlaskアプリケーションインスタンス
     """
-    # 環境変数の読み込み
-    load_dotenv()
+    started = time.perf_counter()
     
     # Flaskアプリケーションの作成
     app = Flask(__name__)
@@ -47,38 +146,107 @@ def create_app(config_name=None):
     config_obj = get_config()
     app.config.from_object(config_obj)
     
+    # JSONプロバイダーの設定
+    init_json(app)
+    
     # ロガーの設定
     setup_logger(app)
     
+    # レスポンス圧縮の設定（after_requestは登録と逆順に実行されるため、他のフックより先に登録して最後に圧縮する）
+    init_compression(app)
+    register_collector('compression', compressor.stats)
+    
     # CORSの設定
-    CORS(app, resources={r"/api/*": {"origins": app.config['CORS_ORIGIN']}})
+    CORS(app, resources={r"/api/*": {"origins": app.config['CORS_ORIGIN'], "expose_headers": [PIN_HEADER]}})
     
     # グローバルエラーハンドラーの登録
     register_error_handlers(app)
     
     # データベースの初期化
-    init_db(app)
+    with timed('init:db'):
+        init_db(app)
+        init_partitioning(app)
+        init_replicas(app)
+    
+    # プロフィールキャッシュの初期化
+    init_profile_cache(app)
+    register_collector('profile_cache', profile_cache.stats)
+    
+    # プロフィール更新の集約の初期化
+    init_write_coalescer(app)
+    register_collector('write_coalescer', write_coalescer.stats)
+    
+    # 表示名オートコンプリートの初期化
+    init_autocomplete(app)
+    register_collector('autocomplete', autocomplete.stats)
+    
+    # 検証済みトークンキャッシュの初期化
+    init_token_cache(app)
+    
+    # Firebase IDトークンのオフライン検証エンジンの初期化
+    with timed('init:token_verifier'):
+        init_token_verifier(app)
+    
+    # セッショントークンの初期化
+    init_session_tokens(app)
+    
+    # ロールポリシーの正規化クレームキャッシュの初期化
+    init_policies(app)
+    register_collector('policies', policy_stats)
     
     # Blueprintの登録
     app.register_blueprint(main_bp)
     app.register_blueprint(auth_bp)
     app.register_blueprint(profile_bp)
+    app.register_blueprint(admin_bp)
+    
+    # 起動時間の計測値をメトリクスとして公開
+    register_collector('startup', get_timings)
     
     # アプリケーションコンテキスト内でのセットアップ
     with app.app_context():
-        # Firebase Admin SDKの初期化
-        firebase_initialized = initialize_firebase()
+        # Firebase Admin SDKの初期化（LAZY_INITが有効な場合は初回使用時まで遅延）
+        firebase_initialized = init_firebase(app)
         if not firebase_initialized:
             logger.warning("Firebase Admin SDKの初期化に失敗しました")
         
         # アプリケーションの起動ログ
         logger.info(f"アプリケーションが起動しました（環境: {os.getenv('FLASK_ENV', 'development')}）")
     
+    total_ms = (time.perf_counter() - started) * 1000
+    record_timing('create_app', total_ms)
+    logger.info(
+        f"アプリケーションの初期化時間: {total_ms:.1f}ms",
+        extra={'context': {'startup_timings': get_timings()}}
+    )
+    check_startup_budget(
+        total_ms,
+        app.config.get('STARTUP_TIME_BUDGET_MS', 0),
+        strict=app.config.get('STARTUP_TIME_BUDGET_STRICT', False)
+    )
+    
+    # 遅延初期化モードでは各ワーカーの最初のリクエストでウォームアップを開始し、以降のリクエストと並行して行う
+    if app.config.get('LAZY_INIT') and app.config.get('WARM_UP_ON_START'):
+        # before_requestの戻り値はレスポンスとして扱われるため、タイマーを返さないようにする
+        @app.before_request
+        def _start_warm_up_hook() -> None:
+            start_warm_up(app)
+    
+    return app
+
+def __getattr__(name):
+    """
+    モジュール属性appを初回参照時に作成する（gunicorn app:app、asgi.pyなど）
+    
+    create_appのみをインポートする場合（テストのフィクスチャなど）はアプリケーションを作成しません。
+    """
+    if name != 'app':
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    app = globals()['app'] = create_app()
     return app
 
-# アプリケーションのインスタンスを作成
-app = create_app()
 
 if __name__ == '__main__':
     # Flaskアプリを実行
+    app = create_app()
     app.run(host='0.0.0.0', port=int(os.getenv('PORT', 5000)))
@@ -0,0 +1,134 @@
+"""
+ASGIアプリケーションのエントリーポイント
+
+認証とプロフィールのAPIをasyncioのネイティブなルート（Starlette）で提供し、
+それ以外のルートはWSGIアダプター経由でFlaskアプリケーションに渡します。
+データベースとFirebaseの待ち時間にワーカースレッドを占有しないため、
+I/O待ちの多いリクエストを1つのプロセスで多数同時に処理できます。
+
+実行例:
+    uvicorn asgi:app --host 0.0.0.0 --port 5000 --workers 2
+"""
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator
+
+from flask import Flask
+from starlette.applications import Starlette
+from starlette.datastructures import MutableHeaders
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.requests import HTTPConnection
+from starlette.routing import Mount
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from werkzeug.http import dump_cookie
+
+try:
+    # a2wsgiがインストールされている場合はスレッドプールの大きさを制御できるアダプターを使用する
+    from a2wsgi import WSGIMiddleware
+except ImportError:
+    from starlette.middleware.wsgi import WSGIMiddleware
+
+from services.async_db import init_async_db, dispose_async_db
+from services.replica_router import replica_router, PIN_COOKIE, PIN_HEADER
+from controllers.async_auth_controller import routes as auth_routes
+from controllers.async_profile_controller import routes as profile_routes
+from errors import register_asgi_error_handlers
+from logger import get_logger
+
+# ロガーの取得
+logger = get_logger(__name__)
+
+
+class ReplicaPinMiddleware:
+    """
+    クライアントから送られた最終書き込み時刻をリクエストに設定し、書き込みを行ったレスポンスで
+    ユーザーの最終書き込み時刻を保存してCookieとヘッダーを返すミドルウェア（read-your-writes）
+    
+    WSGIアダプター経由のFlaskのルートは、init_replicasで登録したフックで同じ処理を行います。
+    """
+    
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        
+        connection = HTTPConnection(scope)
+        state = replica_router.begin_request(
+            connection.headers.get(PIN_HEADER) or connection.cookies.get(PIN_COOKIE)
+        )
+        
+        async def send_with_pin(message: Message) -> None:
+            if message['type'] == 'http.response.start':
+                value = replica_router.pin_value(state)
+                if value is not None:
+                    # レスポンスの送信前に保存する（共有ストアへのアクセスはワーカースレッドで実行する）
+                    await asyncio.to_thread(replica_router.save_pin, state)
+                    headers = MutableHeaders(scope=message)
+                    headers.append('set-cookie', dump_cookie(
+                        PIN_COOKIE, value, secure=scope.get('scheme') == 'https', **replica_router.cookie_options()
+                    ))
+                    headers[PIN_HEADER] = value
+            await send(message)
+        
+        await self.app(scope, receive, send_with_pin)
+
+
+def create_asgi_app(flask_app: Flask) -> Starlette:
+    """
+    ASGIアプリケーションファクトリー関数
+    
+    Args:
+        flask_app: 設定済みのFlaskアプリケーションインスタンス（設定とその他のルートに使用）
+    
+    Returns:
+        Starletteアプリケーションインスタンス
+    """
+    config = flask_app.config
+    
+    @asynccontextmanager
+    async def lifespan(app: Any) -> AsyncIterator[None]:
+        from app import start_warm_up
+        
+        # 非同期エンジンはイベントループ上で作成する
+        init_async_db(config)
+        # ワーカープロセスごとにウォームアップを開始する（非同期ルートのみのワーカーでもFlaskのフックを待たない）
+        start_warm_up(flask_app)
+        logger.info("ASGIアプリケーションが起動しました")
+        yield
+        await dispose_async_db()
+    
+    origins = config['CORS_ORIGIN']
+    app = Starlette(
+        routes=[
+            *auth_routes,
+            *profile_routes,
+            Mount('/', app=WSGIMiddleware(flask_app))
+        ],
+        middleware=[
+            Middleware(
+                CORSMiddleware,
+                allow_origins=[origins] if isinstance(origins, str) else list(origins),
+                allow_methods=['*'],
+                allow_headers=['*'],
+                expose_headers=['ETag', PIN_HEADER]
+            ),
+            Middleware(ReplicaPinMiddleware)
+        ],
+        lifespan=lifespan
+    )
+    app.state.config = config
+    register_asgi_error_handlers(app)
+    return app
+
+
+def _create_default_app() -> Starlette:
+    from app import app as flask_app
+    return create_asgi_app(flask_app)
+
+
+# アプリケーションのインスタンスを作成
+app = _create_default_app()
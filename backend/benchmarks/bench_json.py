@@ -0,0 +1,131 @@
+"""
+JSONエンコードとシリアライズのマイクロベンチマーク
+
+APIレスポンスの作成について、Flaskの標準のプロバイダーと同じ設定の標準ライブラリのjsonと
+services.json_providerのエンコーダー（orjsonがあればorjson）を比較し、
+フィールドごとにループする従来のシリアライズと生成されたシリアライザーを比較して、
+1回あたりのCPU時間を表示します。
+
+使用例:
+    python benchmarks/bench_json.py
+    python benchmarks/bench_json.py --profiles 100 --iterations 20000
+"""
+import os
+import sys
+import json
+import time
+import argparse
+from datetime import datetime
+from typing import Any, Callable, Dict, Mapping
+
+# backendディレクトリのモジュールをインポートできるようにする
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault('FLASK_ENV', 'testing')
+
+from flask.json.provider import _default as flask_default
+
+from services.json_provider import dumps_bytes, is_fast
+from services.serializers import row_serializer
+
+
+def legacy_serialize(row: Mapping[str, Any], fields: tuple) -> Dict[str, Any]:
+    """フィールドごとに型を判定する従来のシリアライズ"""
+    data = {}
+    for field in fields:
+        value = row.get(field)
+        data[field] = value.isoformat() if isinstance(value, datetime) else value
+    return data
+
+
+def legacy_to_dict(profile: Any, fields: tuple) -> Dict[str, Any]:
+    """属性を辞書に集めてからシリアライズする従来のto_dict"""
+    return legacy_serialize({field: getattr(profile, field) for field in fields}, fields)
+
+
+def legacy_dumps(value: Any) -> bytes:
+    """FlaskのDefaultJSONProviderと同じ設定のエンコード"""
+    return json.dumps(value, default=flask_default, ensure_ascii=True, sort_keys=True).encode('utf-8')
+
+
+def measure(name: str, func: Callable[[], object], iterations: int) -> float:
+    """
+    処理を繰り返し実行し、1回あたりのCPU時間を計測する
+    
+    Args:
+        name: 計測対象の名前
+        func: 計測する処理
+        iterations: 実行回数
+    
+    Returns:
+        1回あたりのCPU時間（マイクロ秒）
+    """
+    for _ in range(20):
+        func()
+    
+    started = time.process_time()
+    for _ in range(iterations):
+        func()
+    cpu_us = (time.process_time() - started) / iterations * 1e6
+    
+    print(f"{name:<40} cpu {cpu_us:8.2f}us")
+    return cpu_us
+
+
+def main() -> int:
+    """メイン関数"""
+    parser = argparse.ArgumentParser(description='JSONエンコードとシリアライズのマイクロベンチマーク')
+    parser.add_argument('--profiles', type=int, default=20, help='一覧レスポンスに含めるプロフィールの数')
+    parser.add_argument('--iterations', type=int, default=10000, help='実行回数')
+    args = parser.parse_args()
+    
+    from models.user_profile import UserProfile
+    
+    now = datetime.now()
+    rows = [
+        {
+            'id': index,
+            'firebase_uid': f"bench-user-{index}",
+            'display_name': f"ユーザー {index}",
+            'bio': 'プロフィールの自己紹介文です。' * 4,
+            'created_at': now,
+            'updated_at': now,
+        }
+        for index in range(args.profiles)
+    ]
+    fields = UserProfile.FIELDS
+    profiles = [UserProfile.serialize(row) for row in rows]
+    single = {'profile': profiles[0], 'message': 'プロフィールが正常に取得されました'}
+    listing = {'profiles': profiles, 'total': len(profiles)}
+    error = {'error': 'not_found', 'message': 'プロフィールが見つかりません', 'status_code': 404}
+    
+    print(f"encoder={'orjson' if is_fast() else 'json'}  profiles={args.profiles}  iterations={args.iterations}")
+    results = []
+    for name, payload in (('single', single), ('list', listing), ('error', error)):
+        legacy = measure(f"json.dumps ({name})", lambda: legacy_dumps(payload), args.iterations)
+        fast = measure(f"dumps_bytes ({name})", lambda: dumps_bytes(payload), args.iterations)
+        results.append(f"{name} {legacy - fast:.2f}us")
+    
+    legacy = measure('per-field serialize (list)', lambda: [legacy_serialize(row, fields) for row in rows],
+                     args.iterations)
+    serialize = row_serializer(UserProfile.__table__, fields)
+    compiled = measure('compiled serialize (list)', lambda: [serialize(row) for row in rows], args.iterations)
+    results.append(f"serialize {legacy - compiled:.2f}us")
+    
+    instances = []
+    for row in rows:
+        profile = UserProfile(row['firebase_uid'], row['display_name'], row['bio'])
+        profile.id, profile.created_at, profile.updated_at = row['id'], now, now
+        instances.append(profile)
+    legacy = measure('per-field to_dict (list)', lambda: [legacy_to_dict(profile, fields) for profile in instances],
+                     args.iterations)
+    compiled = measure('compiled to_dict (list)', lambda: [profile.to_dict() for profile in instances],
+                       args.iterations)
+    results.append(f"to_dict {legacy - compiled:.2f}us")
+    
+    print(f"短縮された時間: {', '.join(results)}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
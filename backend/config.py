@@ -14,6 +14,16 @@ class Config:
     TESTING = False
     SECRET_KEY = os.getenv('SECRET_KEY', 'dev-key-please-change-in-production')
     
+    # 起動設定（LAZY_INITが有効な場合、Firebase等の重いSDKは初回使用時またはウォームアップ時に初期化する）
+    LAZY_INIT = os.getenv('LAZY_INIT', 'false').lower() == 'true'
+    WARM_UP_ON_START = os.getenv('WARM_UP_ON_START', 'true').lower() == 'true'
+    WARM_UP_DELAY = float(os.getenv('WARM_UP_DELAY', '0'))
+    STARTUP_TIME_BUDGET_MS = float(os.getenv('STARTUP_TIME_BUDGET_MS', '0'))
+    STARTUP_TIME_BUDGET_STRICT = os.getenv('STARTUP_TIME_BUDGET_STRICT', 'false').lower() == 'true'
+    
+    # メトリクス設定
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'false').lower() == 'true'
+    
     # データベース設定
     SQLALCHEMY_DATABASE_URI = os.getenv(
         'DATABASE_URL',
@@ -25,6 +35,71 @@ class Config:
     )
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
+    # 接続プール設定（ワーカーあたり。DB_POOL_SIZE・DB_MAX_OVERFLOWが負の値の場合はWORKER_THREADSから算出し、
+    # DB_MAX_CONNECTIONSを指定した場合は全ワーカー（WEB_CONCURRENCY）の合計がその値を超えないようにする）
+    WEB_CONCURRENCY = int(os.getenv('WEB_CONCURRENCY', '1'))
+    WORKER_THREADS = int(os.getenv('WORKER_THREADS', '4'))
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '-1'))
+    DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '-1'))
+    DB_MAX_CONNECTIONS = int(os.getenv('DB_MAX_CONNECTIONS', '0'))
+    DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '10'))
+    DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '1800'))
+    DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'true').lower() == 'true'
+    DB_STATEMENT_TIMEOUT_MS = int(os.getenv('DB_STATEMENT_TIMEOUT_MS', '0'))
+    DB_APPLICATION_NAME = os.getenv('DB_APPLICATION_NAME', 'react-spa-flask-api')
+    
+    # サーバーサイドプリペアドステートメント（psycopg）。同じ文がDB_PREPARE_THRESHOLD回実行されるとPREPAREする
+    # （負の値で無効）。PgBouncerのトランザクションモードを経由する場合はDB_PGBOUNCERを有効にして無効化する
+    DB_PREPARE_THRESHOLD = int(os.getenv('DB_PREPARE_THRESHOLD', '5'))
+    DB_PGBOUNCER = os.getenv('DB_PGBOUNCER', 'false').lower() == 'true'
+    
+    # リードレプリカ設定（DB_REPLICA_URLSはカンマ区切り。書き込み後DB_REPLICA_PIN_SECONDS秒間は
+    # そのユーザーの読み取りをプライマリで行い（PROFILE_CACHE_REDIS_URLのRedisでワーカー間で共有）、
+    # 接続エラーのレプリカはDB_REPLICA_RETRY_INTERVAL秒間切り離す）
+    DB_REPLICA_URLS = [
+        url.strip() for url in os.getenv('DB_REPLICA_URLS', '').split(',') if url.strip()
+    ]
+    DB_REPLICA_PIN_SECONDS = float(os.getenv('DB_REPLICA_PIN_SECONDS', '5'))
+    DB_REPLICA_RETRY_INTERVAL = float(os.getenv('DB_REPLICA_RETRY_INTERVAL', '30'))
+    
+    # user_profilesのハッシュパーティション数（PostgreSQLのみ。0の場合はパーティショニングしない。
+    # setup_db.pyでのテーブル作成時に適用され、既存のテーブルは`setup_db.py partition`で移行する）
+    DB_HASH_PARTITIONS = int(os.getenv('DB_HASH_PARTITIONS', '0'))
+    
+    # マイグレーション設定（ロックの取得はMIGRATION_LOCK_TIMEOUT_MSミリ秒で諦めてMIGRATION_LOCK_RETRIES回まで再試行し、
+    # バックフィルはMIGRATION_BACKFILL_BATCH_SIZE行ごとにコミットしてMIGRATION_BACKFILL_SLEEP_MSミリ秒待機する）
+    MIGRATION_LOCK_TIMEOUT_MS = int(os.getenv('MIGRATION_LOCK_TIMEOUT_MS', '2000'))
+    MIGRATION_LOCK_RETRIES = int(os.getenv('MIGRATION_LOCK_RETRIES', '5'))
+    MIGRATION_BACKFILL_BATCH_SIZE = int(os.getenv('MIGRATION_BACKFILL_BATCH_SIZE', '1000'))
+    MIGRATION_BACKFILL_SLEEP_MS = int(os.getenv('MIGRATION_BACKFILL_SLEEP_MS', '50'))
+    
+    # JSONプロバイダー（fast: orjsonがあればorjsonでエンコードする、default: Flaskの標準のプロバイダー）
+    JSON_PROVIDER = os.getenv('JSON_PROVIDER', 'fast')
+    
+    # プロフィールキャッシュ設定（PROFILE_CACHE_REDIS_URLを設定するとワーカー間で共有する）
+    PROFILE_CACHE_ENABLED = os.getenv('PROFILE_CACHE_ENABLED', 'true').lower() == 'true'
+    PROFILE_CACHE_MAX_SIZE = int(os.getenv('PROFILE_CACHE_MAX_SIZE', '10000'))
+    PROFILE_CACHE_TTL = int(os.getenv('PROFILE_CACHE_TTL', '300'))
+    PROFILE_CACHE_LOCAL_TTL = int(os.getenv('PROFILE_CACHE_LOCAL_TTL', '5'))
+    # 削除後にプロフィールのキャッシュへの登録を拒否する期間（秒）
+    PROFILE_CACHE_TOMBSTONE_TTL = int(os.getenv('PROFILE_CACHE_TOMBSTONE_TTL', '10'))
+    PROFILE_CACHE_REDIS_URL = os.getenv('PROFILE_CACHE_REDIS_URL')
+    
+    # プロフィール更新の集約（同じユーザーのWRITE_COALESCING_WINDOW_MSミリ秒以内の更新を1回の書き込みにまとめる）
+    WRITE_COALESCING_ENABLED = os.getenv('WRITE_COALESCING_ENABLED', 'false').lower() == 'true'
+    WRITE_COALESCING_WINDOW_MS = int(os.getenv('WRITE_COALESCING_WINDOW_MS', '50'))
+    
+    # レスポンス圧縮設定（COMPRESSION_ALGORITHMSはサーバーの優先順で、brはbrotli、zstdはzstandardが必要。
+    # COMPRESSION_LEVELSに指定したContent-Typeのみ圧縮し、COMPRESSION_MIN_SIZEバイト未満の本文は圧縮しない。
+    # ストリーミングレスポンスは圧縮前のCOMPRESSION_STREAM_FLUSH_BYTESバイトごとにクライアントへ送信する）
+    COMPRESSION_ENABLED = os.getenv('COMPRESSION_ENABLED', 'true').lower() == 'true'
+    COMPRESSION_ALGORITHMS = [
+        name.strip() for name in os.getenv('COMPRESSION_ALGORITHMS', 'zstd,br,gzip').split(',') if name.strip()
+    ]
+    COMPRESSION_LEVELS = os.getenv('COMPRESSION_LEVELS', 'application/json=6,application/x-ndjson=3,text/*=6')
+    COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', '1024'))
+    COMPRESSION_STREAM_FLUSH_BYTES = int(os.getenv('COMPRESSION_STREAM_FLUSH_BYTES', '16384'))
+    
     # CORS設定
     CORS_ORIGIN = os.getenv('CORS_ORIGIN', 'http://localhost:3000')
     
@@ -38,18 +113,64 @@ class Config:
     FIREBASE_TOKEN_URI = os.getenv('FIREBASE_TOKEN_URI', 'https://oauth2.googleapis.com/token')
     FIREBASE_AUTH_PROVIDER_X509_CERT_URL = os.getenv('FIREBASE_AUTH_PROVIDER_X509_CERT_URL', 'https://www.googleapis.com/oauth2/v1/certs')
     FIREBASE_CLIENT_X509_CERT_URL = os.getenv('FIREBASE_CLIENT_X509_CERT_URL')
+    
+    # 検証済みトークンキャッシュ設定
+    TOKEN_CACHE_ENABLED = os.getenv('TOKEN_CACHE_ENABLED', 'true').lower() == 'true'
+    TOKEN_CACHE_MAX_SIZE = int(os.getenv('TOKEN_CACHE_MAX_SIZE', '10000'))
+    
+    # オフライン検証設定（署名鍵セットを自前で保持し、リクエスト処理中にネットワークを使用しない）
+    FIREBASE_LOCAL_VERIFICATION = os.getenv('FIREBASE_LOCAL_VERIFICATION', 'false').lower() == 'true'
+    FIREBASE_SIGNING_KEYS_URL = os.getenv(
+        'FIREBASE_SIGNING_KEYS_URL',
+        'https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com'
+    )
+    # 署名鍵セットの永続化ファイル（未設定の場合は永続化しない）。アプリケーションのユーザーのみが書き込める
+    # ディレクトリを指定する（他のユーザーが書き込めるファイルは信頼できないため読み込まない）
+    FIREBASE_SIGNING_KEYS_FILE = os.getenv('FIREBASE_SIGNING_KEYS_FILE') or None
+    FIREBASE_SIGNING_KEYS_REFRESH_MARGIN = int(os.getenv('FIREBASE_SIGNING_KEYS_REFRESH_MARGIN', '300'))
+    FIREBASE_TOKEN_LEEWAY = int(os.getenv('FIREBASE_TOKEN_LEEWAY', '0'))
+    
+    # セッショントークン設定（SESSION_TOKEN_SECRETSはカンマ区切り、古い順で最後の鍵で署名する）
+    SESSION_TOKEN_ENABLED = os.getenv('SESSION_TOKEN_ENABLED', 'false').lower() == 'true'
+    SESSION_TOKEN_SECRETS = [
+        key.strip() for key in os.getenv('SESSION_TOKEN_SECRETS', '').split(',') if key.strip()
+    ]
+    SESSION_TOKEN_TTL = int(os.getenv('SESSION_TOKEN_TTL', '900'))
+    
+    # ロールポリシー設定（正規化したクレームのキャッシュサイズ）
+    POLICY_CLAIMS_CACHE_SIZE = int(os.getenv('POLICY_CLAIMS_CACHE_SIZE', '10000'))
+    
+    # トークン一括検証設定
+    TOKEN_BATCH_MAX_SIZE = int(os.getenv('TOKEN_BATCH_MAX_SIZE', '100'))
+    TOKEN_BATCH_MAX_WORKERS = int(os.getenv('TOKEN_BATCH_MAX_WORKERS', '8'))
+    
+    # プロフィール一括取得設定（1リクエストのUID上限と1クエリあたりのUID数）
+    PROFILE_LOOKUP_MAX_UIDS = int(os.getenv('PROFILE_LOOKUP_MAX_UIDS', '500'))
+    PROFILE_LOOKUP_CHUNK_SIZE = int(os.getenv('PROFILE_LOOKUP_CHUNK_SIZE', '200'))
+    
+    # 表示名オートコンプリート設定（短い前方一致の結果をキャッシュする）
+    AUTOCOMPLETE_CACHE_SIZE = int(os.getenv('AUTOCOMPLETE_CACHE_SIZE', '10000'))
+    AUTOCOMPLETE_CACHE_TTL = int(os.getenv('AUTOCOMPLETE_CACHE_TTL', '30'))
+    AUTOCOMPLETE_CACHE_PREFIX_LENGTH = int(os.getenv('AUTOCOMPLETE_CACHE_PREFIX_LENGTH', '3'))
+    AUTOCOMPLETE_INDEX_TTL = int(os.getenv('AUTOCOMPLETE_INDEX_TTL', '60'))
+    
+    # 管理者用エクスポート設定（1ページあたりの行数）
+    ADMIN_EXPORT_BATCH_SIZE = int(os.getenv('ADMIN_EXPORT_BATCH_SIZE', '1000'))
 
 
 class DevelopmentConfig(Config):
     """開発環境設定"""
     DEBUG = True
-    
+
 
 class TestingConfig(Config):
     """テスト環境設定"""
     TESTING = True
     DEBUG = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    LAZY_INIT = True
+    WARM_UP_ON_START = False
+    METRICS_ENABLED = True
 
 
 class ProductionConfig(Config):
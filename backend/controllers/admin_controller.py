@@ -0,0 +1,81 @@
+"""
+管理者用コントローラー
+"""
+from datetime import datetime, timezone
+from typing import Iterator, Optional
+from flask import Blueprint, Response, current_app, request, stream_with_context
+from services.auth_service import auth_required, require_role
+from models.user_profile import UserProfile
+from services.replica_router import replica_router
+from services.json_provider import dumps
+from errors import register_error_handlers, BadRequestError
+from logger import get_logger
+
+# ロガーの取得
+logger = get_logger(__name__)
+
+# Blueprintを作成
+admin_bp = Blueprint('admin_bp', __name__, url_prefix='/api/admin')
+
+# エラーハンドラーを登録
+register_error_handlers(admin_bp)
+
+
+def _parse_updated_since(value: Optional[str]) -> Optional[datetime]:
+    """
+    updated_sinceクエリパラメータ（ISO 8601形式）を解析する
+    
+    Args:
+        value: クエリパラメータの値
+    
+    Returns:
+        日時（UTC、タイムゾーン情報なし）、指定されていない場合はNone
+    
+    Raises:
+        BadRequestError: 形式が不正な場合
+    """
+    if not value:
+        return None
+    
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        raise BadRequestError("updated_sinceはISO 8601形式で指定してください")
+    
+    # updated_atはUTCのタイムゾーン情報なしで保存されているため合わせる
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+@admin_bp.route('/profiles/export', methods=['GET'])
+@auth_required
+@require_role('admin')
+def export_profiles():
+    """
+    ユーザープロフィールをNDJSON形式（1行1プロフィール）でストリーミング出力します。
+    このエンドポイントはadminロールを持つユーザーのみが利用できます。
+    
+    Query Parameters:
+        updated_since: この日時（ISO 8601形式）以降に更新されたプロフィールのみを出力（オプション）
+        after_id: このidより後のプロフィールから出力（オプション、中断したエクスポートの再開用）
+    
+    Returns:
+        application/x-ndjson形式のストリーミングレスポンス
+    """
+    updated_since = _parse_updated_since(request.args.get('updated_since'))
+    after_id = request.args.get('after_id', 0, type=int)
+    batch_size = current_app.config.get('ADMIN_EXPORT_BATCH_SIZE', 1000)
+    
+    logger.info(f"プロフィールのエクスポートを開始します（updated_since: {updated_since}、after_id: {after_id}）")
+    
+    def generate() -> Iterator[str]:
+        count = 0
+        # エクスポートはリードレプリカがあればレプリカから読み込む
+        with replica_router.read():
+            for profile in UserProfile.iter_export(updated_since, after_id, batch_size):
+                count += 1
+                yield dumps(profile) + '\n'
+        logger.info(f"プロフィールのエクスポートが完了しました: {count}件")
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
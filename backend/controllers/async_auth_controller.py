@@ -0,0 +1,121 @@
+"""
+認証コントローラー（ASGIモード）
+
+auth_controllerと同じエンドポイントをStarletteの非同期ルートとして提供します。
+"""
+from typing import Any, List
+
+from starlette.requests import Request
+from starlette.routing import Route
+
+from services.auth_service import (
+    async_auth_required, verify_token_async, verify_tokens_async, issue_session_token
+)
+from controllers.auth_controller import user_summary
+from controllers.async_common import JSONResponse, read_json
+from errors import UnauthorizedError, BadRequestError, APIError
+from schemas import TokenBatchSchema
+from logger import get_logger
+
+# ロガーの取得
+logger = get_logger(__name__)
+
+
+@async_auth_required
+async def verify_auth(request: Request) -> JSONResponse:
+    """
+    認証トークンを検証し、ユーザー情報（とセッショントークン）を返します。
+    
+    Returns:
+        デコードされたトークンからのユーザー情報を含むJSONレスポンス
+    """
+    user_info = request.state.user
+    
+    logger.info(f"ユーザー認証が検証されました: {user_info.get('uid')}")
+    
+    response = {
+        'authenticated': True,
+        'user': user_summary(user_info)
+    }
+    
+    session_info = issue_session_token(user_info)
+    if session_info:
+        response['session_token'] = session_info['token']
+        response['session_expires_at'] = session_info['expires_at']
+    
+    return JSONResponse(response)
+
+
+async def check_token(request: Request) -> JSONResponse:
+    """
+    トークンを検証し、有効かどうかを返します。
+    
+    Returns:
+        トークンの検証結果を含むJSONレスポンス
+    """
+    data = await read_json(request)
+    
+    if not data or 'token' not in data:
+        logger.warning("トークンが提供されていません")
+        raise UnauthorizedError("トークンが必要です")
+    
+    decoded_token = await verify_token_async(data['token'])
+    
+    logger.info(f"トークンが検証されました: {decoded_token.get('uid')}")
+    
+    return JSONResponse({
+        'valid': True,
+        'user': user_summary(decoded_token)
+    })
+
+
+async def check_tokens_batch(request: Request) -> JSONResponse:
+    """
+    複数のトークンを並行して検証し、トークンごとの検証結果を返します。
+    
+    Returns:
+        リクエストと同じ順序の検証結果を含むJSONレスポンス
+    """
+    data = await read_json(request, silent=True)
+    
+    if not data:
+        logger.warning("トークンが提供されていません")
+        raise BadRequestError("トークンのリストが必要です")
+    
+    tokens = TokenBatchSchema.validate_request(data)['tokens']
+    
+    config = request.app.state.config
+    max_size = config.get('TOKEN_BATCH_MAX_SIZE', 100)
+    if len(tokens) > max_size:
+        logger.warning(f"一括検証の上限を超えました: {len(tokens)}件")
+        raise BadRequestError(f"一度に検証できるトークンは最大{max_size}件です")
+    
+    verified = await verify_tokens_async(
+        tokens,
+        max_concurrency=config.get('TOKEN_BATCH_MAX_WORKERS', 8)
+    )
+    
+    results: List[Any] = []
+    for token in tokens:
+        outcome = verified[token]
+        if isinstance(outcome, APIError):
+            results.append({'valid': False, **outcome.to_dict()})
+        else:
+            results.append({'valid': True, 'user': user_summary(outcome)})
+    
+    valid_count = sum(1 for result in results if result['valid'])
+    logger.info(f"トークンを一括検証しました: {len(tokens)}件（有効: {valid_count}件）")
+    
+    return JSONResponse({
+        'results': results,
+        'count': len(results),
+        'valid_count': valid_count
+    })
+
+
+# auth_bpと同じURLのルート
+routes = [
+    Route('/api/auth/verify', verify_auth, methods=['POST']),
+    Route('/api/auth/token', check_token, methods=['POST']),
+    Route('/api/auth/token/batch', check_tokens_batch, methods=['POST'])
+]
@@ -0,0 +1,41 @@
+"""
+ASGIモードのコントローラーで共有するヘルパー
+"""
+from typing import Any, Optional
+
+from starlette.responses import JSONResponse as StarletteJSONResponse
+
+from errors import BadRequestError
+from services.json_provider import dumps_bytes, loads
+
+
+class JSONResponse(StarletteJSONResponse):
+    """services.json_providerのエンコーダー（orjsonがあればorjson）でエンコードするJSONレスポンス"""
+    
+    def render(self, content: Any) -> bytes:
+        return dumps_bytes(content)
+
+
+async def read_json(request: Any, silent: bool = False) -> Optional[Any]:
+    """
+    リクエストボディをJSONとして読み込む（Flaskのrequest.get_jsonに相当）
+    
+    Args:
+        request: Starletteのリクエスト
+        silent: 読み込めない場合に例外を送出せずNoneを返すかどうか
+    
+    Returns:
+        読み込んだデータ、ボディが空の場合はNone
+    
+    Raises:
+        BadRequestError: JSONとして読み込めない場合（silentがFalseの場合）
+    """
+    body = await request.body()
+    if not body:
+        return None
+    try:
+        return loads(body)
+    except ValueError:
+        if silent:
+            return None
+        raise BadRequestError("JSONの形式が不正です")
@@ -0,0 +1,280 @@
+"""
+プロフィールコントローラー（ASGIモード）
+
+profile_controllerと同じエンドポイントをStarletteの非同期ルートとして提供します。
+データベースへのアクセスは非同期のSQLAlchemyセッション（services.async_db）で行い、
+読み取りはFlaskのルートと同じくリードレプリカに振り分けます。レスポンスの作成やキャッシュへの反映などの
+処理はcontrollers.profile_commonをprofile_controllerと共有します。
+"""
+from typing import Any, Dict, List, Optional
+
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.routing import Route
+from werkzeug.http import parse_etags, quote_etag
+
+from models.user_profile import UserProfile
+from services.async_db import session_scope, run_read
+from services.auth_service import async_auth_required
+from services.profile_cache import profile_cache
+from services.search_service import search_profiles_async
+from services.autocomplete import autocomplete
+from services.replica_router import replica_router
+from services.write_coalescer import write_coalescer
+from controllers.async_common import JSONResponse, read_json
+from controllers.profile_common import (
+    CACHE_CONTROL, profile_body, matching_etag, cacheable, validate_update,
+    profile_updated, profile_deleted, lookup_uids
+)
+from errors import NotFoundError, DatabaseError
+from schemas import ProfileFieldsSchema, SearchQuerySchema, AutocompleteQuerySchema
+from logger import get_logger
+
+# ロガーの取得
+logger = get_logger(__name__)
+
+
+def _profile_response(
+    body: Dict[str, Any],
+    profile_data: Dict[str, Any],
+    fields: Optional[List[str]] = None
+) -> JSONResponse:
+    """プロフィールのETagを付与したJSONレスポンスを作成する"""
+    return JSONResponse(body, headers={
+        'ETag': quote_etag(UserProfile.etag(profile_data, fields)),
+        'Cache-Control': CACHE_CONTROL
+    })
+
+
+async def _not_modified(
+    request: Request,
+    firebase_uid: str,
+    fields: Optional[List[str]] = None,
+    cached_profile: Optional[Dict[str, Any]] = None
+) -> Optional[Response]:
+    """If-None-Matchがプロフィールの現在のETagと一致する場合は304レスポンスを返す（キャッシュは呼び出し側で参照する）"""
+    if_none_match = request.headers.get('If-None-Match')
+    if not if_none_match:
+        return None
+    
+    version = cached_profile or await run_read(
+        lambda session: UserProfile.get_version_async(session, firebase_uid)
+    )
+    etag = matching_etag(parse_etags(if_none_match), version, fields)
+    if etag is None:
+        return None
+    
+    return Response(status_code=304, headers={'ETag': quote_etag(etag), 'Cache-Control': CACHE_CONTROL})
+
+
+@async_auth_required
+async def get_profile(request: Request) -> Response:
+    """
+    ユーザープロフィールを取得し、存在しない場合は作成します。
+    
+    Returns:
+        ユーザープロフィール情報を含むJSONレスポンス
+    """
+    firebase_uid = request.state.user_id
+    fields = ProfileFieldsSchema.parse(dict(request.query_params))
+    
+    logger.info(f"ユーザープロフィール取得リクエスト: {firebase_uid}")
+    
+    cached_profile = await profile_cache.get_async(firebase_uid)
+    
+    not_modified = await _not_modified(request, firebase_uid, fields, cached_profile)
+    if not_modified is not None:
+        return not_modified
+    
+    if cached_profile is not None:
+        return _profile_response(profile_body(cached_profile, fields), cached_profile, fields)
+    
+    # 既存のプロフィールをSELECTのみで取得し（リードレプリカがある場合はレプリカから）、
+    # 見つからない場合のみプライマリで作成する
+    load_fields = UserProfile.load_fields(fields)
+    result = None
+    profile = await run_read(
+        lambda session: UserProfile.get_by_firebase_uid_async(session, firebase_uid, load_fields)
+    )
+    if profile is not None:
+        result = (profile.to_dict(load_fields), False)
+    from_replica = result is not None and replica_router.enabled and not replica_router.is_pinned()
+    
+    if result is None:
+        async with session_scope() as session:
+            result = await UserProfile.get_or_create_async(session, firebase_uid, fields)
+    
+    if result is None:
+        logger.error(f"プロフィール作成エラー: {firebase_uid}")
+        raise DatabaseError("プロフィールの作成中にエラーが発生しました")
+    
+    profile_data, created = result
+    if cacheable(fields, from_replica):
+        await profile_cache.set_async(firebase_uid, profile_data)
+    
+    if not created:
+        logger.info(f"既存のプロフィールを返します: {firebase_uid}")
+        return _profile_response(profile_body(profile_data, fields), profile_data, fields)
+    
+    replica_router.pin()
+    logger.info(f"新しいプロフィールを作成しました: {firebase_uid}")
+    return _profile_response(
+        profile_body(profile_data, fields, 'プロフィールが作成されました'), profile_data, fields
+    )
+
+
+@async_auth_required
+async def update_profile(request: Request) -> Response:
+    """
+    ユーザープロフィールを作成または更新します。
+    
+    Returns:
+        更新されたユーザープロフィール情報を含むJSONレスポンス
+    """
+    firebase_uid = request.state.user_id
+    fields = ProfileFieldsSchema.parse(dict(request.query_params))
+    
+    validated_data = validate_update(firebase_uid, await read_json(request))
+    
+    logger.info(f"プロフィール更新リクエスト: {firebase_uid}")
+    
+    async def write(data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        async with session_scope() as session:
+            return await UserProfile.upsert_async(session, firebase_uid, data)
+    
+    # 集約が有効な場合は同じユーザーの短時間の更新をまとめて書き込む（Flaskのルートと同じ）
+    profile_data = await write_coalescer.submit_async(firebase_uid, validated_data, write)
+    
+    if profile_data is None:
+        logger.error(f"プロフィール更新エラー: {firebase_uid}")
+        await profile_cache.invalidate_async(firebase_uid)
+        raise DatabaseError("プロフィールの更新中にエラーが発生しました")
+    
+    await profile_cache.set_async(firebase_uid, profile_data)
+    profile_updated(firebase_uid, validated_data, profile_data)
+    
+    return _profile_response(
+        profile_body(profile_data, fields, 'プロフィールが更新されました'), profile_data, fields
+    )
+
+
+@async_auth_required
+async def delete_profile(request: Request) -> Response:
+    """
+    ユーザープロフィールを削除します。
+    
+    Returns:
+        削除結果を含むJSONレスポンス
+    """
+    firebase_uid = request.state.user_id
+    
+    logger.info(f"プロフィール削除リクエスト: {firebase_uid}")
+    
+    await profile_cache.invalidate_async(firebase_uid)
+    try:
+        async with session_scope() as session:
+            deleted = await UserProfile.delete_async(session, firebase_uid)
+    except Exception as e:
+        logger.error(f"プロフィール削除中の例外: {str(e)}")
+        raise DatabaseError("プロフィールの削除中にエラーが発生しました")
+    finally:
+        # 削除前の無効化からコミットまでの間に並行するGETがキャッシュした行を取り除き、
+        # コミット前に行を読み取ったGETがこの後に登録しないよう墓標に置き換える
+        await profile_cache.mark_deleted_async(firebase_uid)
+    
+    if not deleted:
+        logger.warning(f"削除するプロフィールが見つかりません: {firebase_uid}")
+        raise NotFoundError("削除するプロフィールが見つかりません")
+    
+    profile_deleted(firebase_uid)
+    
+    return JSONResponse({
+        'success': True,
+        'message': 'プロフィールが削除されました'
+    })
+
+
+@async_auth_required
+async def lookup_profiles(request: Request) -> Response:
+    """
+    複数のユーザーの公開プロフィールをまとめて取得します。
+    
+    Returns:
+        UIDから公開プロフィールへのマッピングと、見つからなかったUIDのリストを含むJSONレスポンス
+    """
+    config = request.app.state.config
+    uids, validated_data = lookup_uids(await read_json(request, silent=True), config)
+    
+    profiles = await run_read(lambda session: UserProfile.lookup_public_async(
+        session,
+        uids,
+        fields=validated_data.get('selected_fields'),
+        chunk_size=config.get('PROFILE_LOOKUP_CHUNK_SIZE', 200)
+    ))
+    missing = [uid for uid in uids if uid not in profiles]
+    
+    logger.info(f"プロフィールを一括取得しました: {len(uids)}件（見つからない: {len(missing)}件）")
+    
+    return JSONResponse({
+        'success': True,
+        'profiles': profiles,
+        'missing': missing
+    })
+
+
+@async_auth_required
+async def search(request: Request) -> Response:
+    """
+    display_name、bio、locationを全文検索し、関連度の高い順にプロフィールを返します。
+    
+    Returns:
+        検索結果と次のページのカーソルを含むJSONレスポンス
+    """
+    validated_data = SearchQuerySchema.validate_request(dict(request.query_params))
+    
+    results, next_cursor = await run_read(lambda session: search_profiles_async(
+        session,
+        validated_data['q'],
+        limit=validated_data['max_results'],
+        cursor=validated_data.get('cursor'),
+        fields=validated_data.get('selected_fields')
+    ))
+    
+    logger.info(f"プロフィールを検索しました: {len(results)}件")
+    
+    return JSONResponse({
+        'success': True,
+        'results': results,
+        'next_cursor': next_cursor
+    })
+
+
+@async_auth_required
+async def autocomplete_display_names(request: Request) -> Response:
+    """
+    入力中の文字列に一致する表示名の候補を返します。
+    
+    Returns:
+        firebase_uidとdisplay_nameのみを含む候補のリストのJSONレスポンス
+    """
+    validated_data = AutocompleteQuerySchema.validate_request(dict(request.query_params))
+    
+    results = await run_read(
+        lambda session: autocomplete.suggest_async(session, validated_data['q'], validated_data['limit'])
+    )
+    
+    return JSONResponse({
+        'success': True,
+        'results': results
+    })
+
+
+# profile_bpと同じURLのルート
+routes = [
+    Route('/api/profile', get_profile, methods=['GET']),
+    Route('/api/profile', update_profile, methods=['PUT']),
+    Route('/api/profile', delete_profile, methods=['DELETE']),
+    Route('/api/profiles/lookup', lookup_profiles, methods=['POST']),
+    Route('/api/profiles/search', search, methods=['GET']),
+    Route('/api/profiles/autocomplete', autocomplete_display_names, methods=['GET'])
+]
@@ -1,9 +1,11 @@
 """
 認証コントローラー
 """
-from flask import Blueprint, request, jsonify, g
-from services.auth_service import auth_required, verify_token
-from errors import register_error_handlers, UnauthorizedError
+from typing import Dict, Any
+from flask import Blueprint, request, jsonify, g, current_app
+from services.auth_service import auth_required, verify_token, verify_tokens, issue_session_token
+from errors import register_error_handlers, UnauthorizedError, BadRequestError, APIError
+from schemas import TokenBatchSchema
 from logger import get_logger
 
 # ロガーの取得
@@ -15,31 +17,54 @@ auth_bp = Blueprint('auth_bp', __name__, url_prefix='/api/auth')
 # エラーハンドラーを登録
 register_error_handlers(auth_bp)
 
+
+def user_summary(decoded_token: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    デコードされたトークンからレスポンス用のユーザー情報を作成します。
+    
+    Args:
+        decoded_token: デコードされたトークン
+    
+    Returns:
+        ユーザー情報の辞書
+    """
+    return {
+        'uid': decoded_token.get('uid'),
+        'email': decoded_token.get('email'),
+        'email_verified': decoded_token.get('email_verified', False),
+        'auth_time': decoded_token.get('auth_time')
+    }
+
+
 @auth_bp.route('/verify', methods=['POST'])
 @auth_required
 def verify_auth():
     """
     認証トークンを検証し、ユーザー情報を返します。
     このエンドポイントはauth_requiredデコレータで保護されています。
+    SESSION_TOKEN_ENABLEDが有効な場合は、Firebase IDトークンでの認証時にセッショントークンを発行します。
     
     Returns:
-        デコードされたトークンからのユーザー情報を含むJSONレスポンス
+        デコードされたトークンからのユーザー情報（とセッショントークン）を含むJSONレスポンス
     """
     # auth_requiredデコレータがデコードされたトークンをrequest.userとg.userに追加します
     user_info = g.user
     
     logger.info(f"ユーザー認証が検証されました: {user_info.get('uid')}")
     
-    # ユーザー情報を返す
-    return jsonify({
+    response = {
         'authenticated': True,
-        'user': {
-            'uid': user_info.get('uid'),
-            'email': user_info.get('email'),
-            'email_verified': user_info.get('email_verified', False),
-            'auth_time': user_info.get('auth_time')
-        }
-    })
+        'user': user_summary(user_info)
+    }
+    
+    # セッショントークンが有効な場合は、以降のリクエストで使用できるセッショントークンを発行する
+    session_info = issue_session_token(user_info)
+    if session_info:
+        response['session_token'] = session_info['token']
+        response['session_expires_at'] = session_info['expires_at']
+    
+    # ユーザー情報を返す
+    return jsonify(response)
 
 @auth_bp.route('/token', methods=['POST'])
 def check_token():
@@ -68,10 +93,53 @@ def check_token():
     
     return jsonify({
         'valid': True,
-        'user': {
-            'uid': decoded_token.get('uid'),
-            'email': decoded_token.get('email'),
-            'email_verified': decoded_token.get('email_verified', False),
-            'auth_time': decoded_token.get('auth_time')
-        }
+        'user': user_summary(decoded_token)
+    })
+
+
+@auth_bp.route('/token/batch', methods=['POST'])
+def check_tokens_batch():
+    """
+    複数のトークンを並列に検証し、トークンごとの検証結果を返します。
+    同じバッチ内の重複したトークンは一度だけ検証されます。
+    
+    Request JSON:
+        tokens: 検証するFirebase IDトークンのリスト（最大TOKEN_BATCH_MAX_SIZE件）
+    
+    Returns:
+        リクエストと同じ順序の検証結果を含むJSONレスポンス
+    """
+    data = request.get_json(silent=True)
+    
+    if not data:
+        logger.warning("トークンが提供されていません")
+        raise BadRequestError("トークンのリストが必要です")
+    
+    tokens = TokenBatchSchema.validate_request(data)['tokens']
+    
+    max_size = current_app.config.get('TOKEN_BATCH_MAX_SIZE', 100)
+    if len(tokens) > max_size:
+        logger.warning(f"一括検証の上限を超えました: {len(tokens)}件")
+        raise BadRequestError(f"一度に検証できるトークンは最大{max_size}件です")
+    
+    verified = verify_tokens(
+        tokens,
+        max_workers=current_app.config.get('TOKEN_BATCH_MAX_WORKERS', 8)
+    )
+    
+    results = []
+    for token in tokens:
+        outcome = verified[token]
+        if isinstance(outcome, APIError):
+            results.append({'valid': False, **outcome.to_dict()})
+        else:
+            results.append({'valid': True, 'user': user_summary(outcome)})
+    
+    valid_count = sum(1 for result in results if result['valid'])
+    logger.info(f"トークンを一括検証しました: {len(tokens)}件（有効: {valid_count}件）")
+    
+    return jsonify({
+        'results': results,
+        'count': len(results),
+        'valid_count': valid_count
     })
@@ -2,7 +2,8 @@
 メインコントローラー
 """
 from flask import Blueprint, jsonify, current_app
-from errors import register_error_handlers
+from errors import register_error_handlers, NotFoundError
+from services.metrics import collect_metrics
 from logger import get_logger
 
 # ロガーの取得
@@ -37,3 +38,18 @@ def index():
             'profile_update': '/api/profile (JSONボディとAuthorizationヘッダーを持つPUT)'
         }
     })
+
+
+@main_bp.route('/metrics')
+def metrics():
+    """
+    キャッシュや起動時間などの内部メトリクスを返します。
+    METRICS_ENABLEDが無効な場合は404を返します。
+    
+    Returns:
+        メトリクス名から値へのマッピングを含むJSONレスポンス
+    """
+    if not current_app.config.get('METRICS_ENABLED'):
+        raise NotFoundError()
+    
+    return jsonify(collect_metrics())
@@ -0,0 +1,149 @@
+"""
+プロフィールコントローラーで共有するヘルパー
+
+profile_controller（Flask）とasync_profile_controller（ASGIモード）は、
+リクエストの入出力以外の処理（レスポンスの本文、ETagの判定、キャッシュ・レプリカ固定・
+オートコンプリートへの反映、入力の検証）をこのモジュールで共有し、両者の動作を揃えます。
+"""
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+from models.user_profile import UserProfile
+from services.autocomplete import autocomplete
+from services.replica_router import replica_router
+from errors import BadRequestError
+from schemas import ProfileSchema, ProfileLookupSchema
+from logger import get_logger
+
+# ロガーの取得
+logger = get_logger(__name__)
+
+# プロフィールのレスポンスのキャッシュ制御
+CACHE_CONTROL = 'private, no-cache'
+
+
+def profile_body(
+    profile_data: Dict[str, Any],
+    fields: Optional[List[str]] = None,
+    message: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    プロフィールのレスポンスの本文を作成する
+    
+    Args:
+        profile_data: シリアライズ済みのプロフィールデータ
+        fields: レスポンスに含めるフィールド（省略時はすべて）
+        message: メッセージ（オプション）
+    
+    Returns:
+        レスポンスボディの辞書
+    """
+    body = {'success': True, 'profile': UserProfile.select_fields(profile_data, fields)}
+    if message is not None:
+        body['message'] = message
+    return body
+
+
+def matching_etag(
+    if_none_match: Any,
+    version: Optional[Mapping[str, Any]],
+    fields: Optional[List[str]] = None
+) -> Optional[str]:
+    """
+    If-None-Matchがプロフィールの現在のETagと一致する場合はETagを返す
+    
+    Args:
+        if_none_match: 解析済みのIf-None-Match（werkzeugのETags）
+        version: idとupdated_atを含むプロフィールデータ（存在しない場合はNone）
+        fields: レスポンスに含めるフィールド（省略時はすべて）
+    
+    Returns:
+        一致したETag、一致しない場合はNone
+    """
+    if version is None:
+        return None
+    etag = UserProfile.etag(version, fields)
+    # If-None-Matchは弱い比較で判定する（圧縮したレスポンスのETagは弱いETagになるため）
+    return etag if if_none_match.contains_weak(etag) else None
+
+
+def cacheable(fields: Optional[List[str]], from_replica: bool) -> bool:
+    """
+    取得したプロフィールをキャッシュしてよいかどうか
+    
+    一部のフィールドのみのプロフィールと、レプリケーションの遅延で古い可能性があるレプリカの行はキャッシュしません。
+    """
+    return fields is None and not from_replica
+
+
+def validate_update(firebase_uid: str, data: Any) -> Dict[str, Any]:
+    """
+    プロフィールの更新データを検証する
+    
+    Args:
+        firebase_uid: Firebase認証のユーザーID
+        data: リクエストボディ
+    
+    Returns:
+        検証済みのデータ
+    
+    Raises:
+        BadRequestError: データがない場合
+    """
+    if not data:
+        logger.warning(f"更新データなしのリクエスト: {firebase_uid}")
+        raise BadRequestError("更新するデータがありません")
+    return ProfileSchema.validate_request(data)
+
+
+def profile_updated(firebase_uid: str, validated_data: Dict[str, Any], profile_data: Dict[str, Any]) -> None:
+    """
+    プロフィールの更新をレプリカの固定とオートコンプリートに反映する（キャッシュの置き換えは呼び出し側で行う）
+    
+    Args:
+        firebase_uid: Firebase認証のユーザーID
+        validated_data: 検証済みの更新データ
+        profile_data: 更新後のプロフィールデータ
+    """
+    logger.info(f"プロフィールが更新されました: {firebase_uid}")
+    replica_router.pin()
+    if 'display_name' in validated_data:
+        autocomplete.update_name(firebase_uid, profile_data.get('display_name'))
+
+
+def profile_deleted(firebase_uid: str) -> None:
+    """
+    プロフィールの削除をレプリカの固定とオートコンプリートに反映する
+    
+    Args:
+        firebase_uid: Firebase認証のユーザーID
+    """
+    autocomplete.update_name(firebase_uid, None)
+    replica_router.pin()
+    logger.info(f"プロフィールが削除されました: {firebase_uid}")
+
+
+def lookup_uids(data: Any, config: Mapping[str, Any]) -> Tuple[List[str], Dict[str, Any]]:
+    """
+    プロフィール一括取得のリクエストを検証し、重複を除いたUIDのリストを返す
+    
+    Args:
+        data: リクエストボディ
+        config: アプリケーション設定
+    
+    Returns:
+        UIDのリストと検証済みのデータのタプル
+    
+    Raises:
+        BadRequestError: UIDのリストがない場合、または上限を超えた場合
+    """
+    if not data:
+        raise BadRequestError("UIDのリストが必要です")
+    
+    validated_data = ProfileLookupSchema.validate_request(data)
+    uids = list(dict.fromkeys(validated_data['uids']))
+    
+    max_uids = config.get('PROFILE_LOOKUP_MAX_UIDS', 500)
+    if len(uids) > max_uids:
+        logger.warning(f"プロフィール一括取得の上限を超えました: {len(uids)}件")
+        raise BadRequestError(f"一度に取得できるプロフィールは最大{max_uids}件です")
+    return uids, validated_data
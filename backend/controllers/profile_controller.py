@@ -1,13 +1,22 @@
 """
 プロフィールコントローラー
 """
-from typing import Dict, Any, Optional, Tuple
-from flask import Blueprint, request, jsonify, g
+from typing import Dict, Any, List, Optional, Tuple
+from flask import Blueprint, Response, current_app, request, jsonify, g
 from services.auth_service import auth_required, get_user_id_from_token
 from models.user_profile import UserProfile
-from services.db_service import db, add_to_db, commit_changes
-from errors import register_error_handlers, BadRequestError, NotFoundError, DatabaseError
-from schemas import ProfileSchema
+from services.db_service import db
+from services.profile_cache import profile_cache
+from services.search_service import search_profiles
+from services.autocomplete import autocomplete
+from services.replica_router import replica_router
+from services.write_coalescer import write_coalescer
+from controllers.profile_common import (
+    CACHE_CONTROL, profile_body, matching_etag, cacheable, validate_update,
+    profile_updated, profile_deleted, lookup_uids
+)
+from errors import register_error_handlers, NotFoundError, DatabaseError
+from schemas import ProfileFieldsSchema, SearchQuerySchema, AutocompleteQuerySchema
 from logger import get_logger
 
 # ロガーの取得
@@ -19,6 +28,60 @@ profile_bp = Blueprint('profile_bp', __name__, url_prefix='/api')
 # エラーハンドラーを登録
 register_error_handlers(profile_bp)
 
+def _profile_response(
+    body: Dict[str, Any],
+    profile_data: Dict[str, Any],
+    fields: Optional[List[str]] = None
+) -> Response:
+    """
+    プロフィールのETagを付与したJSONレスポンスを作成する
+    
+    Args:
+        body: レスポンスボディの辞書
+        profile_data: シリアライズ済みのプロフィールデータ（idとupdated_atを含む）
+        fields: レスポンスに含めたフィールド（省略時はすべて）
+    
+    Returns:
+        ETagとCache-Controlヘッダーを設定したレスポンス
+    """
+    response = jsonify(body)
+    response.set_etag(UserProfile.etag(profile_data, fields))
+    response.headers['Cache-Control'] = CACHE_CONTROL
+    return response
+
+
+def _not_modified(
+    firebase_uid: str,
+    fields: Optional[List[str]] = None,
+    cached_profile: Optional[Dict[str, Any]] = None
+) -> Optional[Response]:
+    """
+    If-None-Matchがプロフィールの現在のETagと一致する場合は304レスポンスを返す
+    
+    キャッシュされたプロフィール、またはidとupdated_atのみを取得する軽量なクエリでETagを計算します。
+    
+    Args:
+        firebase_uid: Firebase認証のユーザーID
+        fields: レスポンスに含めるフィールド（省略時はすべて）
+        cached_profile: 呼び出し側で取得したキャッシュのプロフィール（ない場合はNone）
+    
+    Returns:
+        304レスポンス、一致しない場合はNone
+    """
+    if not request.if_none_match:
+        return None
+    
+    version = cached_profile or replica_router.run(lambda: UserProfile.get_version(firebase_uid))
+    etag = matching_etag(request.if_none_match, version, fields)
+    if etag is None:
+        return None
+    
+    response = Response(status=304)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = CACHE_CONTROL
+    return response
+
+
 @profile_bp.route('/profile', methods=['GET'])
 @auth_required
 def get_profile():
@@ -26,38 +89,62 @@ def get_profile():
     ユーザープロフィールを取得します。
     このエンドポイントはauth_requiredデコレータで保護されています。
     
+    Query Parameters:
+        fields: レスポンスに含めるフィールド（カンマ区切り、オプション）。
+                指定されなかった列はデータベースから取得しません。
+    
     Returns:
         ユーザープロフィール情報を含むJSONレスポンス
     """
     # 認証されたユーザーIDを取得
     firebase_uid = get_user_id_from_token()
+    fields = ProfileFieldsSchema.parse(request.args)
     
     logger.info(f"ユーザープロフィール取得リクエスト: {firebase_uid}")
     
-    # ユーザープロフィールを検索
-    profile = UserProfile.get_by_firebase_uid(firebase_uid)
+    # キャッシュの参照は1回のみ行い、ETagの判定とレスポンスの両方に使用する
+    cached_profile = profile_cache.get(firebase_uid)
+    
+    # クライアントのETagが現在のものと一致する場合は本文を返さない
+    not_modified = _not_modified(firebase_uid, fields, cached_profile)
+    if not_modified is not None:
+        return not_modified
+    
+    # キャッシュされたプロフィールがあればデータベースを参照せずに返す
+    if cached_profile is not None:
+        return _profile_response(profile_body(cached_profile, fields), cached_profile, fields)
+    
+    # 既存のプロフィールをSELECTのみで取得する（リードレプリカがある場合はレプリカから）
+    # （フィールドが指定された場合は、その列とETagに必要な列のみを読み込む）
+    load_fields = UserProfile.load_fields(fields)
+    result = None
+    profile = replica_router.run(lambda: UserProfile.get_by_firebase_uid(firebase_uid, load_fields))
+    if profile is not None:
+        result = (profile.to_dict(load_fields), False)
+    from_replica = result is not None and replica_router.enabled and not replica_router.is_pinned()
+    
+    # 見つからない場合のみプライマリで作成する（同時の初回アクセスでも競合しない）
+    if result is None:
+        result = UserProfile.get_or_create(firebase_uid, fields)
+    
+    if result is None:
+        logger.error(f"プロフィール作成エラー: {firebase_uid}")
+        raise DatabaseError("プロフィールの作成中にエラーが発生しました")
     
-    if profile:
+    profile_data, created = result
+    if cacheable(fields, from_replica):
+        profile_cache.set(firebase_uid, profile_data)
+    
+    if not created:
         # プロフィールが存在する場合は返す
         logger.info(f"既存のプロフィールを返します: {firebase_uid}")
-        return jsonify({
-            'success': True,
-            'profile': profile.to_dict()
-        })
-    else:
-        # プロフィールが存在しない場合は新規作成
-        logger.info(f"新しいプロフィールを作成します: {firebase_uid}")
-        new_profile = UserProfile(firebase_uid=firebase_uid)
-        
-        if not add_to_db(new_profile):
-            logger.error(f"プロフィール作成エラー: {firebase_uid}")
-            raise DatabaseError("プロフィールの作成中にエラーが発生しました")
-        
-        return jsonify({
-            'success': True,
-            'profile': new_profile.to_dict(),
-            'message': 'プロフィールが作成されました'
-        })
+        return _profile_response(profile_body(profile_data, fields), profile_data, fields)
+    
+    replica_router.pin()
+    logger.info(f"新しいプロフィールを作成しました: {firebase_uid}")
+    return _profile_response(
+        profile_body(profile_data, fields, 'プロフィールが作成されました'), profile_data, fields
+    )
 
 
 @profile_bp.route('/profile', methods=['PUT'])
@@ -73,48 +160,39 @@ def update_profile():
         location: 場所（オプション）
         website: ウェブサイト（オプション）
     
+    Query Parameters:
+        fields: レスポンスに含めるフィールド（カンマ区切り、オプション）
+    
     Returns:
         更新されたユーザープロフィール情報を含むJSONレスポンス
     """
     # 認証されたユーザーIDを取得
     firebase_uid = get_user_id_from_token()
+    fields = ProfileFieldsSchema.parse(request.args)
     
-    # リクエストボディからJSONデータを取得
-    data = request.get_json()
-    
-    if not data:
-        logger.warning(f"更新データなしのリクエスト: {firebase_uid}")
-        raise BadRequestError("更新するデータがありません")
-    
-    # データを検証
-    validated_data = ProfileSchema.validate_request(data)
+    # リクエストボディからJSONデータを取得して検証
+    validated_data = validate_update(firebase_uid, request.get_json())
     
     logger.info(f"プロフィール更新リクエスト: {firebase_uid}")
     
-    # ユーザープロフィールを検索
-    profile = UserProfile.get_by_firebase_uid(firebase_uid)
-    
-    if not profile:
-        # プロフィールが存在しない場合は新規作成
-        logger.info(f"更新のために新しいプロフィールを作成します: {firebase_uid}")
-        profile = UserProfile(firebase_uid=firebase_uid)
-        db.session.add(profile)
+    # プロフィールを1つの文で作成または更新し、返された行からレスポンスを作成
+    # （集約が有効な場合は同じユーザーの短時間の更新をまとめて書き込み、全員に最終的なプロフィールを返す）
+    profile_data = write_coalescer.submit(
+        firebase_uid, validated_data, lambda data: UserProfile.upsert(firebase_uid, data)
+    )
     
-    # プロフィールを更新
-    profile.update(validated_data)
-    
-    # 変更を保存
-    if not commit_changes():
+    if profile_data is None:
         logger.error(f"プロフィール更新エラー: {firebase_uid}")
+        profile_cache.invalidate(firebase_uid)
         raise DatabaseError("プロフィールの更新中にエラーが発生しました")
     
-    logger.info(f"プロフィールが更新されました: {firebase_uid}")
+    # 更新後のプロフィールでキャッシュを置き換え、しばらくの間の読み取りをプライマリに固定する
+    profile_cache.set(firebase_uid, profile_data)
+    profile_updated(firebase_uid, validated_data, profile_data)
     
-    return jsonify({
-        'success': True,
-        'profile': profile.to_dict(),
-        'message': 'プロフィールが更新されました'
-    })
+    return _profile_response(
+        profile_body(profile_data, fields, 'プロフィールが更新されました'), profile_data, fields
+    )
 
 
 @profile_bp.route('/profile', methods=['DELETE'])
@@ -132,27 +210,117 @@ def delete_profile():
     
     logger.info(f"プロフィール削除リクエスト: {firebase_uid}")
     
-    # ユーザープロフィールを検索
-    profile = UserProfile.get_by_firebase_uid(firebase_uid)
-    
-    if not profile:
-        logger.warning(f"削除するプロフィールが見つかりません: {firebase_uid}")
-        raise NotFoundError("削除するプロフィールが見つかりません")
-    
-    # プロフィールを削除
+    # プロフィールを削除（firebase_uidを条件に1つの文で削除する）
+    profile_cache.invalidate(firebase_uid)
     try:
-        db.session.delete(profile)
-        if not commit_changes():
-            logger.error(f"プロフィール削除エラー: {firebase_uid}")
-            raise DatabaseError("プロフィールの削除中にエラーが発生しました")
-        
-        logger.info(f"プロフィールが削除されました: {firebase_uid}")
-        
-        return jsonify({
-            'success': True,
-            'message': 'プロフィールが削除されました'
-        })
+        deleted = UserProfile.delete(firebase_uid)
     except Exception as e:
         logger.error(f"プロフィール削除中の例外: {str(e)}")
         db.session.rollback()
         raise DatabaseError("プロフィールの削除中にエラーが発生しました")
+    finally:
+        # 削除前の無効化からコミットまでの間に並行するGETがキャッシュした行を取り除き、
+        # コミット前に行を読み取ったGETがこの後に登録しないよう墓標に置き換える
+        profile_cache.mark_deleted(firebase_uid)
+    
+    if not deleted:
+        logger.warning(f"削除するプロフィールが見つかりません: {firebase_uid}")
+        raise NotFoundError("削除するプロフィールが見つかりません")
+    
+    profile_deleted(firebase_uid)
+    
+    return jsonify({
+        'success': True,
+        'message': 'プロフィールが削除されました'
+    })
+
+
+@profile_bp.route('/profiles/lookup', methods=['POST'])
+@auth_required
+def lookup_profiles():
+    """
+    複数のユーザーの公開プロフィールをまとめて取得します。
+    このエンドポイントはauth_requiredデコレータで保護されています。
+    
+    Request JSON:
+        uids: Firebase認証のユーザーIDのリスト（重複は除外、最大PROFILE_LOOKUP_MAX_UIDS件）
+        fields: 取得するフィールドのリスト（オプション、省略時はすべての公開フィールド）
+    
+    Returns:
+        UIDから公開プロフィールへのマッピングと、見つからなかったUIDのリストを含むJSONレスポンス
+    """
+    uids, validated_data = lookup_uids(request.get_json(silent=True), current_app.config)
+    
+    chunk_size = current_app.config.get('PROFILE_LOOKUP_CHUNK_SIZE', 200)
+    profiles = replica_router.run(lambda: UserProfile.lookup_public(
+        uids,
+        fields=validated_data.get('selected_fields'),
+        chunk_size=chunk_size
+    ))
+    missing = [uid for uid in uids if uid not in profiles]
+    
+    logger.info(f"プロフィールを一括取得しました: {len(uids)}件（見つからない: {len(missing)}件）")
+    
+    return jsonify({
+        'success': True,
+        'profiles': profiles,
+        'missing': missing
+    })
+
+
+@profile_bp.route('/profiles/search', methods=['GET'])
+@auth_required
+def search():
+    """
+    display_name、bio、locationを全文検索し、関連度の高い順にプロフィールを返します。
+    このエンドポイントはauth_requiredデコレータで保護されています。
+    
+    Query Parameters:
+        q: 検索語
+        max_results: 1ページあたりの件数（1〜50、デフォルト: 10）
+        cursor: 前のページのnext_cursor（オプション）
+        fields: 結果に含める公開フィールド（カンマ区切り、オプション。firebase_uidは常に含む）
+    
+    Returns:
+        検索結果と次のページのカーソルを含むJSONレスポンス
+    """
+    validated_data = SearchQuerySchema.validate_request(request.args.to_dict())
+    
+    results, next_cursor = replica_router.run(lambda: search_profiles(
+        validated_data['q'],
+        limit=validated_data['max_results'],
+        cursor=validated_data.get('cursor'),
+        fields=validated_data.get('selected_fields')
+    ))
+    
+    logger.info(f"プロフィールを検索しました: {len(results)}件")
+    
+    return jsonify({
+        'success': True,
+        'results': results,
+        'next_cursor': next_cursor
+    })
+
+
+@profile_bp.route('/profiles/autocomplete', methods=['GET'])
+@auth_required
+def autocomplete_display_names():
+    """
+    入力中の文字列に一致する表示名の候補を返します（メンションの入力補完用）。
+    このエンドポイントはauth_requiredデコレータで保護されています。
+    
+    Query Parameters:
+        q: 入力中の文字列
+        limit: 最大件数（1〜20、デフォルト: 8）
+    
+    Returns:
+        firebase_uidとdisplay_nameのみを含む候補のリストのJSONレスポンス
+    """
+    validated_data = AutocompleteQuerySchema.validate_request(request.args.to_dict())
+    
+    return jsonify({
+        'success': True,
+        'results': replica_router.run(
+            lambda: autocomplete.suggest(validated_data['q'], validated_data['limit'])
+        )
+    })
@@ -130,3 +130,40 @@ def register_error_handlers(app_or_blueprint: Union[Blueprint, Any]) -> None:
         })
         response.status_code = 500
         return response
+
+
+def register_asgi_error_handlers(app: Any) -> None:
+    """
+    ASGIアプリケーション（Starlette）にFlaskと同じ形式のエラーハンドラーを登録する
+    
+    Args:
+        app: Starletteアプリケーションインスタンス
+    """
+    from starlette.exceptions import HTTPException as StarletteHTTPException
+    from controllers.async_common import JSONResponse
+    from http import HTTPStatus
+    
+    async def handle_api_error(request: Any, error: APIError) -> JSONResponse:
+        """APIエラーハンドラー"""
+        return JSONResponse(error.to_dict(), status_code=error.status_code)
+    
+    async def handle_http_exception(request: Any, error: StarletteHTTPException) -> JSONResponse:
+        """HTTPException（Starlette例外）ハンドラー"""
+        name = HTTPStatus(error.status_code).phrase
+        return JSONResponse({
+            'error': name.lower().replace(' ', '_'),
+            'message': error.detail,
+            'status_code': error.status_code
+        }, status_code=error.status_code, headers=getattr(error, 'headers', None))
+    
+    async def handle_generic_exception(request: Any, error: Exception) -> JSONResponse:
+        """一般的な例外ハンドラー"""
+        return JSONResponse({
+            'error': 'internal_error',
+            'message': '内部サーバーエラーが発生しました',
+            'status_code': 500
+        }, status_code=500)
+    
+    app.add_exception_handler(APIError, handle_api_error)
+    app.add_exception_handler(StarletteHTTPException, handle_http_exception)
+    app.add_exception_handler(Exception, handle_generic_exception)
@@ -3,11 +3,12 @@
 """
 import os
 import logging
-import json
 from datetime import datetime
 from typing import Dict, Any, Optional
 from flask import Flask, request, g
 
+from services.json_provider import dumps
+
 
 class CustomJSONFormatter(logging.Formatter):
     """JSON形式のログフォーマッター"""
@@ -47,7 +48,8 @@ class CustomJSONFormatter(logging.Formatter):
         if hasattr(record, 'context'):
             log_data.update(record.context)
         
-        return json.dumps(log_data)
+        # 日本語などの非ASCII文字は\uXXXXにエスケープせずUTF-8のまま出力する（区切りの空白も含まない）
+        return dumps(log_data)
 
 
 def setup_logger(app: Flask) -> None:
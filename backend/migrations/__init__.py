@@ -0,0 +1,16 @@
+"""
+バージョン付きマイグレーションパッケージ
+
+`python setup_db.py migrate`で未適用のマイグレーションを適用します。
+新しいマイグレーションはversionsに`<4桁の番号>_<説明>.py`として追加し、
+version・description・upgrade(ctx)を定義します。
+"""
+from migrations.runner import (
+    Migration, MigrationContext, MigrationError,
+    discover_migrations, migration_status, run_migrations
+)
+
+__all__ = [
+    'Migration', 'MigrationContext', 'MigrationError',
+    'discover_migrations', 'migration_status', 'run_migrations'
+]
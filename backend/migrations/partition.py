@@ -0,0 +1,282 @@
+"""
+既存のテーブルのハッシュパーティションテーブルへのオンライン移行（PostgreSQLのみ）
+
+書き込みを止めずに次の手順で移行します。
+
+1. 同じ列を持つパーティションテーブル（<テーブル>_partitioned）とパーティション、インデックスを作成する
+2. 元のテーブルにトリガーを作成し、以降の挿入・更新・削除を新しいテーブルに反映する
+3. 既存の行をid順の小さなバッチで新しいテーブルにコピーする
+4. 短いトランザクションでテーブル名を入れ替え、元のテーブルを<テーブル>_unpartitionedとして残す
+
+コピー中の行はFOR KEY SHAREでロックするため、同時に削除された行がコピーで復活することはありません。
+中断した場合は再実行すると途中から再開します。PostgreSQL 13以降が必要です。
+"""
+import re
+import time
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy.engine import Engine
+
+from migrations.runner import MigrationContext, MigrationError, migration_connection, migration_context
+from services.partitioning import is_partitioned, partition_ddl, partition_name
+from logger import get_logger
+
+# ロガーの取得
+logger = get_logger(__name__)
+
+# PostgreSQLの識別子の最大長
+MAX_IDENTIFIER_LENGTH = 63
+
+
+def _columns(ctx: MigrationContext, table: str) -> List[str]:
+    """値をコピーする列（生成列を除く）"""
+    rows = ctx.execute(
+        "SELECT column_name FROM information_schema.columns "
+        "WHERE table_name = :table AND table_schema = current_schema() AND is_generated = 'NEVER' "
+        "ORDER BY ordinal_position",
+        {'table': table}
+    )
+    return [row[0] for row in rows]
+
+
+def _indexes(ctx: MigrationContext, table: str) -> List[Dict[str, Any]]:
+    """主キー以外のインデックスの名前と定義"""
+    rows = ctx.execute(
+        "SELECT c.relname AS name, pg_get_indexdef(i.indexrelid) AS definition "
+        "FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+        "WHERE i.indrelid = CAST(:table AS regclass) AND NOT i.indisprimary",
+        {'table': table}
+    ).mappings()
+    return [dict(row) for row in rows]
+
+
+def _primary_key(ctx: MigrationContext, table: str) -> Optional[str]:
+    """主キーのインデックス名"""
+    return ctx.execute(
+        "SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+        "WHERE i.indrelid = CAST(:table AS regclass) AND i.indisprimary",
+        {'table': table}
+    ).scalar()
+
+
+def _triggers(ctx: MigrationContext, table: str, exclude: str) -> List[str]:
+    """ユーザー定義のトリガーの定義（同期用のトリガーを除く）"""
+    rows = ctx.execute(
+        "SELECT pg_get_triggerdef(oid) FROM pg_trigger "
+        "WHERE tgrelid = CAST(:table AS regclass) AND NOT tgisinternal AND tgname <> :exclude",
+        {'table': table, 'exclude': exclude}
+    )
+    return [row[0] for row in rows]
+
+
+def _identifier(name: str, suffix: str) -> str:
+    """接尾辞を付けた識別子（最大長を超える場合は元の名前を切り詰める）"""
+    return f"{name[:MAX_IDENTIFIER_LENGTH - len(suffix)]}{suffix}"
+
+
+def _copy_index(definition: str, name: str, new_name: str, table: str, new_table: str) -> str:
+    """インデックスの定義を新しいテーブル用に書き換える"""
+    definition = definition.replace(f"INDEX {name} ON ", f"INDEX IF NOT EXISTS {new_name} ON ", 1)
+    return re.sub(rf" ON (ONLY )?(\S+\.)?{re.escape(table)} ", f" ON {new_table} ", definition, count=1)
+
+
+def _create_sync_trigger(ctx: MigrationContext, table: str, new_table: str, key: str, columns: List[str]) -> None:
+    """元のテーブルへの書き込みを新しいテーブルに反映するトリガーを作成する"""
+    function = f"{table}_partition_sync"
+    column_list = ', '.join(columns)
+    values = ', '.join(f"NEW.{column}" for column in columns)
+    updates = ', '.join(f"{column} = EXCLUDED.{column}" for column in columns if column != key)
+    
+    ctx.execute(
+        f"CREATE OR REPLACE FUNCTION {function}() RETURNS trigger AS $$ "
+        f"BEGIN "
+        f"IF TG_OP = 'DELETE' OR (TG_OP = 'UPDATE' AND OLD.{key} IS DISTINCT FROM NEW.{key}) THEN "
+        f"DELETE FROM {new_table} WHERE id = OLD.id AND {key} = OLD.{key}; "
+        f"END IF; "
+        f"IF TG_OP <> 'DELETE' THEN "
+        f"INSERT INTO {new_table} ({column_list}) VALUES ({values}) "
+        f"ON CONFLICT ({key}) DO UPDATE SET {updates}; "
+        f"END IF; "
+        f"RETURN NULL; "
+        f"END $$ LANGUAGE plpgsql"
+    )
+    ctx.execute(f"DROP TRIGGER IF EXISTS {function} ON {table}")
+    ctx.execute(
+        f"CREATE TRIGGER {function} AFTER INSERT OR UPDATE OR DELETE ON {table} "
+        f"FOR EACH ROW EXECUTE FUNCTION {function}()"
+    )
+
+
+def _copy_rows(
+    ctx: MigrationContext,
+    table: str,
+    new_table: str,
+    columns: List[str],
+    batch_size: int,
+    sleep: float
+) -> int:
+    """既存の行をid順のバッチで新しいテーブルにコピーする（トリガーで反映済みの行は上書きしない）"""
+    column_list = ', '.join(columns)
+    last_id = 0
+    total = 0
+    
+    while True:
+        row = ctx.execute(
+            f"WITH batch AS ("
+            f"SELECT {column_list} FROM {table} WHERE id > :last_id ORDER BY id LIMIT :batch_size FOR KEY SHARE"
+            f"), copied AS ("
+            f"INSERT INTO {new_table} ({column_list}) SELECT {column_list} FROM batch ON CONFLICT DO NOTHING"
+            f") SELECT count(*), max(id) FROM batch",
+            {'last_id': last_id, 'batch_size': batch_size}
+        ).first()
+        count, max_id = row
+        if not count:
+            break
+        
+        total += count
+        last_id = max_id
+        logger.info(f"{new_table}へのコピー: {total}行")
+        if count < batch_size:
+            break
+        if sleep > 0:
+            time.sleep(sleep)
+    
+    return total
+
+
+def partition_table(
+    ctx: MigrationContext,
+    table: str,
+    key: str,
+    partitions: int,
+    drop_old: bool = False
+) -> bool:
+    """
+    既存のテーブルをハッシュパーティションテーブルにオンラインで移行する
+    
+    Args:
+        ctx: マイグレーションのコンテキスト
+        table: 移行するテーブル名（整数のid列を持つこと）
+        key: パーティションキーの列名（一意であること）
+        partitions: パーティション数
+        drop_old: 移行後に元のテーブルを削除するかどうか
+    
+    Returns:
+        移行したかどうか（既にパーティションテーブルの場合はFalse）
+    
+    Raises:
+        MigrationError: PostgreSQL以外の場合、またはパーティション数が不正な場合
+    """
+    if not ctx.is_postgresql:
+        raise MigrationError("パーティションテーブルへの移行はPostgreSQLでのみ実行できます")
+    if partitions < 1:
+        raise MigrationError("パーティション数は1以上を指定してください")
+    if is_partitioned(ctx.connection, table):
+        logger.info(f"{table}は既にパーティションテーブルです")
+        return False
+    
+    new_table = f"{table}_partitioned"
+    old_table = f"{table}_unpartitioned"
+    sync_trigger = f"{table}_partition_sync"
+    started = time.perf_counter()
+    
+    # 1. パーティションテーブル、パーティション、インデックス（空のうちに作成する）
+    ctx.execute(
+        f"CREATE TABLE IF NOT EXISTS {new_table} "
+        f"(LIKE {table} INCLUDING DEFAULTS INCLUDING GENERATED INCLUDING STORAGE INCLUDING COMMENTS) "
+        f"PARTITION BY HASH ({key})"
+    )
+    for statement in partition_ddl(new_table, partitions):
+        ctx.execute(statement)
+    if _primary_key(ctx, new_table) is None:
+        ctx.execute(f"ALTER TABLE {new_table} ADD PRIMARY KEY (id, {key})")
+    
+    indexes = _indexes(ctx, table)
+    for index in indexes:
+        ctx.execute(_copy_index(
+            index['definition'], index['name'], _identifier(index['name'], '_new'), table, new_table
+        ))
+    
+    # 2. 以降の書き込みの同期
+    columns = _columns(ctx, table)
+    _create_sync_trigger(ctx, table, new_table, key, columns)
+    
+    # 3. 既存の行のコピー
+    copied = _copy_rows(
+        ctx, table, new_table, columns,
+        batch_size=ctx.backfill_batch_size,
+        sleep=ctx.backfill_sleep_ms / 1000
+    )
+    ctx.execute(f"ANALYZE {new_table}")
+    
+    # 4. テーブル名の入れ替え（同期用のトリガーと同じトランザクションで行い、書き込みの取りこぼしを防ぐ）
+    triggers = _triggers(ctx, table, exclude=sync_trigger)
+    sequence = ctx.execute("SELECT pg_get_serial_sequence(:table, 'id')", {'table': table}).scalar()
+    old_pkey = _primary_key(ctx, table)
+    new_pkey = _primary_key(ctx, new_table)
+    
+    statements = [
+        f"LOCK TABLE {table} IN ACCESS EXCLUSIVE MODE",
+        f"DROP TRIGGER {sync_trigger} ON {table}",
+        f"ALTER TABLE {table} RENAME TO {old_table}"
+    ]
+    if old_pkey:
+        statements.append(f"ALTER INDEX {old_pkey} RENAME TO {_identifier(old_pkey, '_unpartitioned')}")
+    for index in indexes:
+        statements.append(f"ALTER INDEX {index['name']} RENAME TO {_identifier(index['name'], '_unpartitioned')}")
+    
+    statements.append(f"ALTER TABLE {new_table} RENAME TO {table}")
+    for remainder in range(partitions):
+        statements.append(
+            f"ALTER TABLE {partition_name(new_table, remainder)} RENAME TO {partition_name(table, remainder)}"
+        )
+    statements.append(f"ALTER INDEX {new_pkey} RENAME TO {old_pkey or f'{table}_pkey'}")
+    for index in indexes:
+        statements.append(f"ALTER INDEX {_identifier(index['name'], '_new')} RENAME TO {index['name']}")
+    # トリガーの定義はテーブル名で参照するため、入れ替え後に実行すると新しいテーブルに作成される
+    statements.extend(triggers)
+    if sequence:
+        statements.append(f"ALTER SEQUENCE {sequence} OWNED BY {table}.id")
+    ctx.execute_atomic(statements)
+    ctx.execute(f"DROP FUNCTION IF EXISTS {sync_trigger}()")
+    
+    if drop_old:
+        ctx.execute(f"DROP TABLE {old_table}")
+    
+    logger.info(
+        f"{table}を{partitions}個のハッシュパーティションに移行しました"
+        f"（{copied}行、{time.perf_counter() - started:.1f}秒）"
+    )
+    return True
+
+
+def partition_profiles(
+    engine: Engine,
+    config: Optional[Dict[str, Any]] = None,
+    partitions: Optional[int] = None,
+    drop_old: bool = False
+) -> bool:
+    """
+    user_profilesをハッシュパーティションテーブルにオンラインで移行する
+    
+    Args:
+        engine: データベースエンジン
+        config: アプリケーション設定（MIGRATION_*とDB_HASH_PARTITIONSを使用する）
+        partitions: パーティション数（省略時はDB_HASH_PARTITIONS）
+        drop_old: 移行後に元のテーブルを削除するかどうか
+    
+    Returns:
+        移行したかどうか（既にパーティションテーブルの場合はFalse）
+    """
+    from models.user_profile import UserProfile
+    
+    config = config or {}
+    partitions = partitions if partitions is not None else config.get('DB_HASH_PARTITIONS', 0)
+    with migration_connection(engine) as connection:
+        return partition_table(
+            migration_context(connection, config),
+            UserProfile.__tablename__,
+            'firebase_uid',
+            partitions,
+            drop_old=drop_old
+        )
@@ -0,0 +1,607 @@
+"""
+マイグレーションの実行エンジン
+
+migrations/versions以下のバージョン付きマイグレーションを番号順に適用し、
+適用済みのバージョンをschema_migrationsテーブルに記録します。
+
+マイグレーションの各操作は自動コミットで1文ずつ実行され、PostgreSQLではlock_timeoutを設定して
+ロックの取得を一定時間で諦めて再試行します（user_profilesへの書き込みを長時間待たせないため）。
+そのため各マイグレーションは途中で中断されても再実行できるように（IF NOT EXISTSなどで）冪等に記述します。
+"""
+import time
+import pkgutil
+import importlib
+from contextlib import contextmanager
+from datetime import datetime
+from types import ModuleType
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import OperationalError
+
+from logger import get_logger
+
+# ロガーの取得
+logger = get_logger(__name__)
+
+# 適用済みのバージョンを記録するテーブル
+VERSION_TABLE = 'schema_migrations'
+
+# 同時に複数のマイグレーションが実行されないようにするアドバイザリーロックのキー
+ADVISORY_LOCK_KEY = 72_410_001
+
+# ロック待ちのタイムアウトを示すSQLSTATE（lock_not_available）
+LOCK_NOT_AVAILABLE = '55P03'
+
+
+class MigrationError(Exception):
+    """マイグレーションのエラー"""
+
+
+class Migration:
+    """
+    バージョン付きマイグレーション
+    
+    migrations/versionsのモジュールは、version・description・upgrade(ctx)を定義します。
+    """
+    
+    def __init__(self, version: str, description: str, upgrade: Callable[['MigrationContext'], None]) -> None:
+        self.version = version
+        self.description = description
+        self.upgrade = upgrade
+    
+    @classmethod
+    def from_module(cls, module: ModuleType) -> 'Migration':
+        """マイグレーションのモジュールからMigrationを作成する"""
+        return cls(module.version, getattr(module, 'description', ''), module.upgrade)
+
+
+def discover_migrations(package: str = 'migrations.versions') -> List[Migration]:
+    """
+    パッケージ内のマイグレーションをバージョン順に返す
+    
+    Args:
+        package: マイグレーションのモジュールを含むパッケージ
+    
+    Returns:
+        マイグレーションのリスト
+    
+    Raises:
+        MigrationError: バージョンが重複している場合
+    """
+    module = importlib.import_module(package)
+    migrations = [
+        Migration.from_module(importlib.import_module(f"{package}.{info.name}"))
+        for info in pkgutil.iter_modules(module.__path__)
+        if not info.name.startswith('_')
+    ]
+    migrations.sort(key=lambda migration: migration.version)
+    
+    versions = [migration.version for migration in migrations]
+    duplicates = sorted({version for version in versions if versions.count(version) > 1})
+    if duplicates:
+        raise MigrationError(f"マイグレーションのバージョンが重複しています: {', '.join(duplicates)}")
+    return migrations
+
+
+def partition_index_name(name: str, table: str, partition: str) -> str:
+    """
+    パーティションテーブルのインデックスに接続するパーティションのインデックス名を返す
+    
+    例: ix_user_profiles_updated_at（user_profiles）のuser_profiles_p0 → ix_user_profiles_updated_at_p0
+    """
+    prefix = f"{table}_"
+    suffix = partition[len(prefix):] if partition.startswith(prefix) else partition
+    return f"{name}_{suffix}"
+
+
+def _is_lock_timeout(error: OperationalError) -> bool:
+    return getattr(error.orig, 'sqlstate', None) == LOCK_NOT_AVAILABLE
+
+
+class MigrationContext:
+    """マイグレーションから使用するオンライン操作"""
+    
+    def __init__(
+        self,
+        connection: Connection,
+        lock_timeout_ms: int = 2000,
+        lock_retries: int = 5,
+        backfill_batch_size: int = 1000,
+        backfill_sleep_ms: int = 50
+    ) -> None:
+        """
+        コンテキストの初期化
+        
+        Args:
+            connection: 自動コミットの接続
+            lock_timeout_ms: ロックの取得を待つ最大時間（ミリ秒、PostgreSQLのみ）
+            lock_retries: ロックの取得に失敗した場合の再試行回数
+            backfill_batch_size: バックフィルの1バッチあたりの行数
+            backfill_sleep_ms: バックフィルのバッチ間の待ち時間（ミリ秒）
+        """
+        self.connection = connection
+        self.dialect = connection.dialect.name
+        self.lock_timeout_ms = lock_timeout_ms
+        self.lock_retries = lock_retries
+        self.backfill_batch_size = backfill_batch_size
+        self.backfill_sleep_ms = backfill_sleep_ms
+        
+        if self.dialect == 'postgresql' and lock_timeout_ms > 0:
+            self.connection.exec_driver_sql(f"SET lock_timeout = {int(lock_timeout_ms)}")
+    
+    @property
+    def is_postgresql(self) -> bool:
+        return self.dialect == 'postgresql'
+    
+    def execute(self, sql: str, params: Optional[Dict[str, Any]] = None) -> Any:
+        """
+        SQLを実行する（ロックの取得がタイムアウトした場合は待ち時間を延ばしながら再試行する）
+        
+        Args:
+            sql: 実行するSQL
+            params: バインドパラメーター
+        
+        Returns:
+            実行結果
+        
+        Raises:
+            MigrationError: 再試行してもロックを取得できなかった場合
+        """
+        return self._retry(lambda: self._execute_once(sql, params), sql)
+    
+    def _execute_once(self, sql: str, params: Optional[Dict[str, Any]] = None) -> Any:
+        """SQLを1回だけ実行する（ロックの取得がタイムアウトしても再試行しない）"""
+        return self.connection.execute(text(sql), params or {})
+    
+    def execute_atomic(self, statements: Sequence[str]) -> None:
+        """
+        複数のSQLを1つのトランザクションで実行する（テーブルの入れ替えなど）
+        
+        PostgreSQLではSET LOCAL lock_timeoutを設定し、いずれかのロックの取得がタイムアウトした場合は
+        トランザクション全体をロールバックして再試行します。
+        
+        Args:
+            statements: 実行するSQLのリスト
+        
+        Raises:
+            MigrationError: 再試行してもロックを取得できなかった場合
+        """
+        def run() -> None:
+            with self.connection.engine.begin() as connection:
+                if self.is_postgresql and self.lock_timeout_ms > 0:
+                    connection.exec_driver_sql(f"SET LOCAL lock_timeout = {int(self.lock_timeout_ms)}")
+                for statement in statements:
+                    connection.execute(text(statement))
+        
+        self._retry(run, statements[0] if statements else '')
+    
+    def _retry(self, operation: Callable[[], Any], sql: str) -> Any:
+        """ロックの取得がタイムアウトした場合は待ち時間を延ばしながら再試行する"""
+        for attempt in range(self.lock_retries + 1):
+            try:
+                return operation()
+            except OperationalError as e:
+                if not _is_lock_timeout(e):
+                    raise
+                if attempt == self.lock_retries:
+                    raise MigrationError(f"ロックを取得できませんでした（{attempt + 1}回）: {sql}") from e
+                delay = min(0.1 * 2 ** attempt, 5.0)
+                logger.warning(f"ロックの取得がタイムアウトしました。{delay:.1f}秒後に再試行します: {sql}")
+                time.sleep(delay)
+    
+    def table_exists(self, table: str) -> bool:
+        """テーブルが存在するかどうか"""
+        return inspect(self.connection).has_table(table)
+    
+    def column_exists(self, table: str, column: str) -> bool:
+        """列が存在するかどうか"""
+        return any(info['name'] == column for info in inspect(self.connection).get_columns(table))
+    
+    def column_is_generated(self, table: str, column: str) -> bool:
+        """
+        列が生成列（GENERATED ALWAYS AS ... STORED）かどうか
+        
+        生成列はUPDATEで値を設定できないため、バックフィルの前に確認します。
+        
+        Args:
+            table: テーブル名
+            column: 列名
+        
+        Returns:
+            生成列の場合はTrue（PostgreSQL以外では常にFalse）
+        """
+        if not self.is_postgresql:
+            return False
+        row = self.execute(
+            "SELECT is_generated FROM information_schema.columns "
+            "WHERE table_schema = current_schema() AND table_name = :table AND column_name = :column",
+            {'table': table, 'column': column}
+        ).first()
+        return row is not None and row[0] == 'ALWAYS'
+    
+    def index_exists(self, table: str, name: str) -> bool:
+        """インデックスが存在するかどうか"""
+        return any(info['name'] == name for info in inspect(self.connection).get_indexes(table))
+    
+    def partitions(self, table: str) -> Optional[List[str]]:
+        """
+        パーティションテーブル（relkind = 'p'）のパーティションを返す
+        
+        Args:
+            table: テーブル名
+        
+        Returns:
+            パーティションのテーブル名のリスト、パーティションテーブルでない場合はNone（PostgreSQL以外では常にNone）
+        """
+        if not self.is_postgresql:
+            return None
+        row = self.execute(
+            "SELECT relkind FROM pg_class WHERE relname = :table AND pg_table_is_visible(oid)",
+            {'table': table}
+        ).first()
+        if row is None or row[0] != 'p':
+            return None
+        return [
+            partition for (partition,) in self.execute(
+                "SELECT child.relname FROM pg_inherits i "
+                "JOIN pg_class parent ON parent.oid = i.inhparent "
+                "JOIN pg_class child ON child.oid = i.inhrelid "
+                "WHERE parent.relname = :table AND pg_table_is_visible(parent.oid) "
+                "ORDER BY child.relname",
+                {'table': table}
+            )
+        ]
+    
+    def _index_state(self, name: str) -> Optional[Any]:
+        """インデックスの種類（relkind）と有効かどうか、存在しない場合はNone（PostgreSQLのみ）"""
+        return self.execute(
+            "SELECT c.relkind, i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+            "WHERE c.relname = :name AND pg_table_is_visible(c.oid)",
+            {'name': name}
+        ).first()
+    
+    def _create_index_concurrently(self, name: str, sql: str) -> None:
+        """
+        CREATE INDEX CONCURRENTLYでインデックスを作成し、有効になったことを確認する（PostgreSQLのみ）
+        
+        CONCURRENTLYの待機中にlock_timeoutで中断されると無効（INVALID）なインデックスが残り、
+        IF NOT EXISTSでは作成し直されないため、無効なインデックスの削除と作成をまとめて再試行します。
+        
+        Args:
+            name: インデックス名
+            sql: インデックスを作成するSQL（CREATE INDEX CONCURRENTLY IF NOT EXISTS ...）
+        
+        Raises:
+            MigrationError: 再試行してもロックを取得できなかった場合、またはインデックスが有効にならなかった場合
+        """
+        def run() -> None:
+            state = self._index_state(name)
+            if state is not None and not state[1]:
+                logger.warning(f"無効なインデックスを削除して作成し直します: {name}")
+                self._execute_once(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+            self._execute_once(sql)
+        
+        self._retry(run, sql)
+        state = self._index_state(name)
+        if state is None or not state[1]:
+            raise MigrationError(f"インデックスが有効になりませんでした: {name}")
+    
+    def create_index(
+        self,
+        name: str,
+        table: str,
+        expression: str,
+        unique: bool = False,
+        using: Optional[str] = None,
+        where: Optional[str] = None
+    ) -> None:
+        """
+        インデックスを作成する
+        
+        PostgreSQLではCREATE INDEX CONCURRENTLYを使用し、テーブルへの書き込みをブロックしません。
+        中断などで無効（INVALID）なインデックスが残っている場合は削除してから作成し直し、
+        作成後にインデックスが有効でない場合はMigrationErrorを送出します。
+        
+        パーティションテーブルにはCONCURRENTLYでインデックスを作成できないため、親テーブルのみに
+        CREATE INDEX ... ON ONLYでインデックスを作成し、パーティションごとにCONCURRENTLYで作成した
+        インデックスをALTER INDEX ... ATTACH PARTITIONで接続します（すべて接続されると親のインデックスが有効になる）。
+        中断された場合も、再実行すると残りのパーティションから続けます。
+        
+        Args:
+            name: インデックス名
+            table: テーブル名
+            expression: インデックスの列または式（例: "lower(display_name) gin_trgm_ops"）
+            unique: 一意インデックスにするかどうか
+            using: インデックスの種類（GIN、GiSTなど、PostgreSQLのみ）
+            where: 部分インデックスの条件
+        
+        Raises:
+            MigrationError: 再試行してもロックを取得できなかった場合、またはインデックスが有効にならなかった場合
+        """
+        unique_sql = 'UNIQUE ' if unique else ''
+        where_sql = f" WHERE {where}" if where else ''
+        
+        if not self.is_postgresql:
+            self.execute(f"CREATE {unique_sql}INDEX IF NOT EXISTS {name} ON {table} ({expression}){where_sql}")
+            return
+        
+        using_sql = f" USING {using}" if using else ''
+        partitions = self.partitions(table)
+        if partitions is None:
+            self._create_index_concurrently(
+                name,
+                f"CREATE {unique_sql}INDEX CONCURRENTLY IF NOT EXISTS {name} "
+                f"ON {table}{using_sql} ({expression}){where_sql}"
+            )
+            return
+        
+        # 親のインデックスはパーティションがすべて接続されるまで無効のため、削除せずに続きから接続する
+        self.execute(
+            f"CREATE {unique_sql}INDEX IF NOT EXISTS {name} "
+            f"ON ONLY {table}{using_sql} ({expression}){where_sql}"
+        )
+        for partition in partitions:
+            partition_index = partition_index_name(name, table, partition)
+            self._create_index_concurrently(
+                partition_index,
+                f"CREATE {unique_sql}INDEX CONCURRENTLY IF NOT EXISTS {partition_index} "
+                f"ON {partition}{using_sql} ({expression}){where_sql}"
+            )
+            # 既に接続されている場合は何もしない
+            self.execute(f"ALTER INDEX {name} ATTACH PARTITION {partition_index}")
+    
+    def drop_index(self, name: str) -> None:
+        """
+        インデックスを削除する（PostgreSQLではDROP INDEX CONCURRENTLY）
+        
+        パーティションテーブルのインデックス（relkind = 'I'）はCONCURRENTLYで削除できないため、
+        通常のDROP INDEXで親とパーティションのインデックスをまとめて削除します。
+        
+        Args:
+            name: インデックス名
+        """
+        if not self.is_postgresql:
+            self.execute(f"DROP INDEX IF EXISTS {name}")
+            return
+        
+        state = self._index_state(name)
+        concurrently = '' if state is not None and state[0] == 'I' else 'CONCURRENTLY '
+        self.execute(f"DROP INDEX {concurrently}IF EXISTS {name}")
+    
+    def add_column(self, table: str, column: str, definition: str) -> bool:
+        """
+        列を追加する
+        
+        テーブルを書き換えないよう、NULL許容または定数のデフォルト値を持つ列のみを追加してください
+        （PostgreSQL 11以降では定数のデフォルト値はメタデータのみの変更になります）。
+        値の設定はbackfillで行います。
+        
+        Args:
+            table: テーブル名
+            column: 列名
+            definition: 列の型とオプション（例: "VARCHAR(20) DEFAULT 'active'"）
+        
+        Returns:
+            列を追加したかどうか（既に存在する場合はFalse）
+        
+        Raises:
+            MigrationError: NOT NULLでデフォルト値のない列を追加しようとした場合
+        """
+        upper = definition.upper()
+        if 'NOT NULL' in upper and 'DEFAULT' not in upper:
+            raise MigrationError(f"デフォルト値のないNOT NULL列はオンラインで追加できません: {table}.{column}")
+        
+        if self.column_exists(table, column):
+            return False
+        self.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+        return True
+    
+    def backfill(
+        self,
+        table: str,
+        assignments: str,
+        where: str = 'TRUE',
+        params: Optional[Dict[str, Any]] = None,
+        batch_size: Optional[int] = None,
+        sleep_ms: Optional[int] = None,
+        key: str = 'id'
+    ) -> int:
+        """
+        行をキーの順に小さなバッチで更新する
+        
+        バッチごとにコミットし、バッチ間で待機することで、ロックの保持時間と
+        レプリケーション・I/Oの負荷を抑えます。中断した場合もwhereの条件で未処理の行から再開できます。
+        
+        Args:
+            table: テーブル名
+            assignments: SET句（例: "status = 'active'"）
+            where: 更新対象の条件（更新後の行が一致しなくなる条件にすると再開が速くなる）
+            params: バインドパラメーター
+            batch_size: 1バッチあたりの行数
+            sleep_ms: バッチ間の待ち時間（ミリ秒）
+            key: バッチの区切りに使用する一意な整数の列
+        
+        Returns:
+            更新した行数
+        """
+        batch_size = batch_size or self.backfill_batch_size
+        sleep = (self.backfill_sleep_ms if sleep_ms is None else sleep_ms) / 1000
+        last_key = None
+        total = 0
+        
+        while True:
+            bounds = f"{key} > :last_key AND " if last_key is not None else ''
+            rows = self.execute(
+                f"UPDATE {table} SET {assignments} WHERE {key} IN ("
+                f"SELECT {key} FROM {table} WHERE {bounds}({where}) ORDER BY {key} LIMIT :batch_size"
+                f") RETURNING {key}",
+                {**(params or {}), 'last_key': last_key, 'batch_size': batch_size}
+            ).all()
+            if not rows:
+                break
+            
+            total += len(rows)
+            last_key = max(row[0] for row in rows)
+            logger.info(f"{table}のバックフィル: {total}行")
+            if len(rows) < batch_size:
+                break
+            if sleep > 0:
+                time.sleep(sleep)
+        
+        return total
+
+
+def _ensure_version_table(connection: Connection) -> None:
+    connection.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {VERSION_TABLE} ("
+        f"version VARCHAR(64) PRIMARY KEY, "
+        f"description VARCHAR(255), "
+        f"applied_at TIMESTAMP NOT NULL, "
+        f"duration_ms INTEGER NOT NULL)"
+    ))
+
+
+def applied_versions(connection: Connection) -> List[str]:
+    """
+    適用済みのバージョンを返す
+    
+    Args:
+        connection: データベース接続
+    
+    Returns:
+        適用済みのバージョンのリスト（昇順）
+    """
+    if not inspect(connection).has_table(VERSION_TABLE):
+        return []
+    rows = connection.execute(text(f"SELECT version FROM {VERSION_TABLE} ORDER BY version"))
+    return [row[0] for row in rows]
+
+
+def migration_context(connection: Connection, config: Optional[Dict[str, Any]] = None) -> MigrationContext:
+    """
+    アプリケーション設定（MIGRATION_*）からマイグレーションのコンテキストを作成する
+    
+    Args:
+        connection: 自動コミットの接続
+        config: アプリケーション設定
+    
+    Returns:
+        マイグレーションのコンテキスト
+    """
+    config = config or {}
+    return MigrationContext(
+        connection,
+        lock_timeout_ms=config.get('MIGRATION_LOCK_TIMEOUT_MS', 2000),
+        lock_retries=config.get('MIGRATION_LOCK_RETRIES', 5),
+        backfill_batch_size=config.get('MIGRATION_BACKFILL_BATCH_SIZE', 1000),
+        backfill_sleep_ms=config.get('MIGRATION_BACKFILL_SLEEP_MS', 50)
+    )
+
+
+@contextmanager
+def migration_connection(engine: Engine) -> Iterator[Connection]:
+    """
+    マイグレーション用の自動コミットの接続を返す
+    
+    PostgreSQLではアドバイザリーロックを取得し、複数のインスタンスから同時に実行された場合は
+    先に取得した方のみが実行します。
+    
+    Args:
+        engine: データベースエンジン
+    
+    Yields:
+        自動コミットの接続
+    """
+    with engine.connect() as connection:
+        connection = connection.execution_options(isolation_level='AUTOCOMMIT')
+        is_postgresql = connection.dialect.name == 'postgresql'
+        if is_postgresql:
+            connection.execute(text("SELECT pg_advisory_lock(:key)"), {'key': ADVISORY_LOCK_KEY})
+        try:
+            yield connection
+        finally:
+            if is_postgresql:
+                connection.execute(text("SELECT pg_advisory_unlock(:key)"), {'key': ADVISORY_LOCK_KEY})
+
+
+def migration_status(engine: Engine, migrations: Optional[Sequence[Migration]] = None) -> List[Dict[str, Any]]:
+    """
+    マイグレーションごとの適用状況を返す
+    
+    Args:
+        engine: データベースエンジン
+        migrations: マイグレーションのリスト（省略時はmigrations/versionsから検出）
+    
+    Returns:
+        バージョン、説明、適用済みかどうかの辞書のリスト
+    """
+    migrations = migrations if migrations is not None else discover_migrations()
+    with engine.connect() as connection:
+        applied = set(applied_versions(connection))
+    return [
+        {'version': migration.version, 'description': migration.description, 'applied': migration.version in applied}
+        for migration in migrations
+    ]
+
+
+def run_migrations(
+    engine: Engine,
+    config: Optional[Dict[str, Any]] = None,
+    target: Optional[str] = None,
+    migrations: Optional[Sequence[Migration]] = None
+) -> List[str]:
+    """
+    未適用のマイグレーションをバージョン順に適用する
+    
+    Args:
+        engine: データベースエンジン
+        config: アプリケーション設定（MIGRATION_*の設定を使用する）
+        target: このバージョンまで適用する（省略時はすべて）
+        migrations: マイグレーションのリスト（省略時はmigrations/versionsから検出）
+    
+    Returns:
+        適用したバージョンのリスト
+    
+    Raises:
+        MigrationError: マイグレーションが失敗した場合
+    """
+    migrations = migrations if migrations is not None else discover_migrations()
+    applied_now: List[str] = []
+    
+    with migration_connection(engine) as connection:
+        _ensure_version_table(connection)
+        applied = set(applied_versions(connection))
+        context = migration_context(connection, config)
+        
+        for migration in migrations:
+            if target is not None and migration.version > target:
+                break
+            if migration.version in applied:
+                continue
+            
+            logger.info(f"マイグレーションを適用します: {migration.version} {migration.description}")
+            started = time.perf_counter()
+            try:
+                migration.upgrade(context)
+            except Exception as e:
+                raise MigrationError(f"マイグレーション {migration.version} が失敗しました: {str(e)}") from e
+            duration_ms = int((time.perf_counter() - started) * 1000)
+            
+            connection.execute(
+                text(
+                    f"INSERT INTO {VERSION_TABLE} (version, description, applied_at, duration_ms) "
+                    f"VALUES (:version, :description, :applied_at, :duration_ms)"
+                ),
+                {
+                    'version': migration.version,
+                    'description': migration.description[:255],
+                    'applied_at': datetime.utcnow(),
+                    'duration_ms': duration_ms
+                }
+            )
+            applied_now.append(migration.version)
+            logger.info(f"マイグレーションを適用しました: {migration.version}（{duration_ms}ms）")
+    
+    return applied_now
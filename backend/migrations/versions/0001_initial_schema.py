@@ -0,0 +1,14 @@
+"""
+初期スキーマ（存在しないテーブルのみを作成する）
+"""
+from migrations.runner import MigrationContext
+
+version = '0001'
+description = 'initial schema'
+
+
+def upgrade(ctx: MigrationContext) -> None:
+    from services.db_service import db
+    import models.user_profile  # noqa: F401（テーブル定義の登録）
+    
+    db.metadata.create_all(bind=ctx.connection, checkfirst=True)
@@ -0,0 +1,21 @@
+"""
+エクスポートとオートコンプリートのインデックス
+
+既存のデータベースに、updated_atのインデックス（差分エクスポート用）と
+display_nameのトライグラムインデックス（PostgreSQLのみ）を書き込みをブロックせずに作成します。
+"""
+from migrations.runner import MigrationContext
+
+version = '0002'
+description = 'updated_at and display_name trigram indexes'
+
+
+def upgrade(ctx: MigrationContext) -> None:
+    ctx.create_index('ix_user_profiles_updated_at', 'user_profiles', 'updated_at')
+    
+    if ctx.is_postgresql:
+        ctx.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        ctx.create_index(
+            'ix_user_profiles_display_name_trgm', 'user_profiles',
+            'lower(display_name) gin_trgm_ops', using='GIN'
+        )
@@ -0,0 +1,59 @@
+"""
+全文検索インデックス
+
+PostgreSQLでは、生成列の追加はテーブル全体を書き換えるため、既存のテーブルには
+NULL許容のtsvector列をメタデータのみの変更で追加し、トリガーで更新を同期してから
+既存の行をバッチでバックフィルし、GINインデックスをCONCURRENTLYで作成します。
+（create_allで作成したテーブルは生成列を持つため、インデックスの作成のみを行います。）
+SQLiteではFTS5テーブルと同期用のトリガーを作成します。
+（トライグラムの検索インデックスに置き換えた0004以降のスキーマで作成したテーブルには何もしません。）
+"""
+from migrations.runner import MigrationContext
+from services.search_service import search_index_name, sqlite_search_ddl
+
+version = '0003'
+description = 'full-text search index'
+
+TABLE = 'user_profiles'
+
+
+def search_vector_expression(row: str = '') -> str:
+    """重み付きのtsvectorを計算する式（display_name: A、location: B、bio: C）"""
+    return (
+        f"setweight(to_tsvector('simple', coalesce({row}display_name, '')), 'A') || "
+        f"setweight(to_tsvector('simple', coalesce({row}location, '')), 'B') || "
+        f"setweight(to_tsvector('simple', coalesce({row}bio, '')), 'C')"
+    )
+
+
+def upgrade(ctx: MigrationContext) -> None:
+    if not ctx.is_postgresql:
+        if not ctx.table_exists(f"{TABLE}_fts"):
+            for statement in sqlite_search_ddl(TABLE):
+                ctx.execute(statement)
+        return
+    
+    # create_allで作成したテーブルの生成列はUPDATEできないため、インデックスの作成のみを行う
+    if ctx.column_is_generated(TABLE, 'search_vector'):
+        ctx.create_index(f"ix_{TABLE}_search_vector", TABLE, 'search_vector', using='GIN')
+        return
+    
+    # create_allでトライグラムの検索インデックスとともに作成したテーブル
+    if ctx.index_exists(TABLE, search_index_name(TABLE)):
+        return
+    
+    if ctx.add_column(TABLE, 'search_vector', 'tsvector'):
+        ctx.execute(
+            f"CREATE OR REPLACE FUNCTION {TABLE}_search_vector_update() RETURNS trigger AS $$ "
+            f"BEGIN NEW.search_vector := {search_vector_expression('NEW.')}; RETURN NEW; END "
+            f"$$ LANGUAGE plpgsql"
+        )
+        ctx.execute(f"DROP TRIGGER IF EXISTS {TABLE}_search_vector ON {TABLE}")
+        ctx.execute(
+            f"CREATE TRIGGER {TABLE}_search_vector "
+            f"BEFORE INSERT OR UPDATE OF display_name, bio, location ON {TABLE} "
+            f"FOR EACH ROW EXECUTE FUNCTION {TABLE}_search_vector_update()"
+        )
+    
+    ctx.backfill(TABLE, f"search_vector = {search_vector_expression()}", where='search_vector IS NULL')
+    ctx.create_index(f"ix_{TABLE}_search_vector", TABLE, 'search_vector', using='GIN')
@@ -0,0 +1,46 @@
+"""
+トライグラムによる部分一致検索
+
+日本語は空白で単語が区切られないため、0003のtsvector（simple）とFTS5（unicode61）では
+「田中太郎」の「太郎」のような部分文字列で検索できません。
+PostgreSQLではpg_trgmのGINインデックスを書き込みをブロックせずに作成してから、
+tsvector列・トリガー・インデックスを削除します。
+SQLiteではFTS5テーブルをtrigramトークナイザーで作り直します（1つのトランザクションで入れ替えます）。
+"""
+from migrations.runner import MigrationContext
+from services.search_service import search_index_name, search_text_expression, sqlite_search_ddl
+
+version = '0004'
+description = 'trigram substring search'
+
+TABLE = 'user_profiles'
+
+
+def _sqlite_fts_is_trigram(ctx: MigrationContext) -> bool:
+    sql = ctx.execute(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name", {'name': f"{TABLE}_fts"}
+    ).scalar()
+    return sql is not None and 'trigram' in sql
+
+
+def upgrade(ctx: MigrationContext) -> None:
+    if not ctx.is_postgresql:
+        if _sqlite_fts_is_trigram(ctx):
+            return
+        fts = f"{TABLE}_fts"
+        ctx.execute_atomic([
+            *(f"DROP TRIGGER IF EXISTS {fts}_{suffix}" for suffix in ('ai', 'ad', 'au')),
+            f"DROP TABLE IF EXISTS {fts}",
+            *sqlite_search_ddl(TABLE)
+        ])
+        return
+    
+    ctx.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    ctx.create_index(
+        search_index_name(TABLE), TABLE, f"({search_text_expression()}) gin_trgm_ops", using='GIN'
+    )
+    
+    ctx.drop_index(f"ix_{TABLE}_search_vector")
+    ctx.execute(f"DROP TRIGGER IF EXISTS {TABLE}_search_vector ON {TABLE}")
+    ctx.execute(f"DROP FUNCTION IF EXISTS {TABLE}_search_vector_update()")
+    ctx.execute(f"ALTER TABLE {TABLE} DROP COLUMN IF EXISTS search_vector")
@@ -0,0 +1,6 @@
+"""
+マイグレーションのバージョン
+
+各モジュールは番号順に一度だけ適用されます。操作は自動コミットで1文ずつ実行されるため、
+中断後に再実行しても問題がないように冪等に記述してください。
+"""
@@ -1,9 +1,19 @@
 """
 ユーザープロフィールモデル
 """
-from typing import Dict, Any, Optional
+import hashlib
+from typing import TYPE_CHECKING, Dict, Any, Iterable, Iterator, List, Mapping, Optional, Sequence, Tuple
 from datetime import datetime
-from services.db_service import db
+from sqlalchemy import bindparam
+from sqlalchemy.orm import load_only
+from services.db_service import db, upsert, insert_or_select
+from services.search_service import register_search_ddl
+from services.autocomplete import register_autocomplete_ddl
+from services.partitioning import register_hash_partitioning
+from services.serializers import object_serializer, row_serializer
+
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncSession
 
 
 class UserProfile(db.Model):
@@ -22,7 +32,19 @@ class UserProfile(db.Model):
     location = db.Column(db.String(100), nullable=True)
     website = db.Column(db.String(255), nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+    
+    # 更新可能なフィールド
+    UPDATABLE_FIELDS = ('display_name', 'bio', 'location', 'website')
+    
+    # 他のユーザーに公開するフィールド
+    PUBLIC_FIELDS = ('display_name', 'bio', 'location', 'website')
+    
+    # レスポンスに含めるフィールド（?fields=で選択できる）
+    FIELDS = ('id', 'firebase_uid', 'display_name', 'bio', 'location', 'website', 'created_at', 'updated_at')
+    
+    # ETagの計算に必要なフィールド
+    VERSION_FIELDS = ('id', 'updated_at')
     
     def __init__(
         self, 
@@ -48,36 +70,275 @@ class UserProfile(db.Model):
         self.location = location
         self.website = website
     
-    def to_dict(self) -> Dict[str, Any]:
+    def to_dict(self, fields: Optional[Sequence[str]] = None) -> Dict[str, Any]:
         """
         プロフィールデータを辞書形式で返す
         
+        指定されたフィールドの属性のみを参照するため、load_onlyで読み込まなかった列は取得されません。
+        フィールドの組み合わせごとに生成された専用の関数でシリアライズします。
+        
+        Args:
+            fields: 含めるフィールド（省略時はすべてのフィールド）
+        
         Returns:
             プロフィールデータの辞書
         """
-        return {
-            'id': self.id,
-            'firebase_uid': self.firebase_uid,
-            'display_name': self.display_name,
-            'bio': self.bio,
-            'location': self.location,
-            'website': self.website,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
-        }
+        return object_serializer(self.__table__, tuple(fields) if fields else self.FIELDS)(self)
     
     @classmethod
-    def get_by_firebase_uid(cls, firebase_uid: str) -> Optional['UserProfile']:
+    def serialize(cls, row: Mapping[str, Any], fields: Optional[Sequence[str]] = None) -> Dict[str, Any]:
         """
-        Firebase UIDでユーザープロフィールを取得する
+        プロフィールの行（列名と値のマッピング）をレスポンス用の辞書に変換する
+        
+        Args:
+            row: 列名と値のマッピング（RETURNINGの結果行など）
+            fields: 含めるフィールド（省略時はすべてのフィールド）
+        
+        Returns:
+            プロフィールデータの辞書（日時はISO 8601形式）
+        """
+        return row_serializer(cls.__table__, tuple(fields) if fields else cls.FIELDS)(row)
+    
+    @classmethod
+    def load_fields(cls, fields: Optional[Sequence[str]]) -> Optional[Tuple[str, ...]]:
+        """
+        指定されたフィールドとETagの計算に必要なフィールドを合わせたものを返す
+        
+        Args:
+            fields: クライアントが指定したフィールド（省略時はすべて）
+        
+        Returns:
+            データベースから取得するフィールド、すべて取得する場合はNone
+        """
+        if not fields:
+            return None
+        return tuple(dict.fromkeys(cls.VERSION_FIELDS + tuple(fields)))
+    
+    @staticmethod
+    def select_fields(profile_data: Dict[str, Any], fields: Optional[Sequence[str]]) -> Dict[str, Any]:
+        """
+        シリアライズ済みのプロフィールから指定されたフィールドのみを取り出す
+        
+        Args:
+            profile_data: プロフィールデータの辞書
+            fields: 含めるフィールド（省略時はすべて）
+        
+        Returns:
+            指定されたフィールドのみの辞書
+        """
+        if not fields:
+            return profile_data
+        return {field: profile_data.get(field) for field in fields}
+    
+    @staticmethod
+    def etag(profile_data: Mapping[str, Any], fields: Optional[Sequence[str]] = None) -> str:
+        """
+        プロフィールの強いETag（引用符なし）を返す
+        
+        idとupdated_atから計算するため、シリアライズ済みの辞書やget_versionの結果から算出できます。
+        フィールドを選択したレスポンスは表現が異なるため、選択したフィールドもETagに含めます。
+        
+        Args:
+            profile_data: idとupdated_at（ISO 8601形式）を含む辞書
+            fields: レスポンスに含めたフィールド（省略時はすべて）
+        
+        Returns:
+            ETagの値
+        """
+        version = f"{profile_data.get('id')}:{profile_data.get('updated_at')}"
+        if fields:
+            version += f":{','.join(fields)}"
+        return hashlib.sha1(version.encode('utf-8')).hexdigest()
+    
+    @classmethod
+    def get_version(cls, firebase_uid: str) -> Optional[Dict[str, Any]]:
+        """
+        ETagの計算に必要なidとupdated_atのみを取得する（ORMオブジェクトを生成しない）
         
         Args:
             firebase_uid: Firebase認証のユーザーID
+        
+        Returns:
+            idとupdated_at（ISO 8601形式）の辞書、またはNone
+        """
+        row = db.session.execute(_SELECT_VERSION_BY_UID, {'firebase_uid': firebase_uid}).first()
+        return cls._version(row)
+    
+    @classmethod
+    async def get_version_async(cls, session: 'AsyncSession', firebase_uid: str) -> Optional[Dict[str, Any]]:
+        """
+        get_versionの非同期版（ASGIモード用）
+        
+        Args:
+            session: 非同期セッション
+            firebase_uid: Firebase認証のユーザーID
+        
+        Returns:
+            idとupdated_at（ISO 8601形式）の辞書、またはNone
+        """
+        row = (await session.execute(_SELECT_VERSION_BY_UID, {'firebase_uid': firebase_uid})).first()
+        return cls._version(row)
+    
+    @staticmethod
+    def _version(row: Any) -> Optional[Dict[str, Any]]:
+        if row is None:
+            return None
+        return {'id': row.id, 'updated_at': row.updated_at.isoformat() if row.updated_at else None}
+    
+    @classmethod
+    def lookup_public(
+        cls,
+        firebase_uids: List[str],
+        fields: Optional[List[str]] = None,
+        chunk_size: int = 200
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        複数のユーザーの公開プロフィールをfirebase_uidのIN句でまとめて取得する
+        
+        ORMオブジェクトは生成せず、指定されたフィールドの列のみを取得します。
+        
+        Args:
+            firebase_uids: Firebase認証のユーザーIDのリスト（重複なし）
+            fields: 取得する公開フィールド（省略時はすべての公開フィールド）
+            chunk_size: 1回のクエリに含めるUIDの数
+        
+        Returns:
+            firebase_uidから公開プロフィールの辞書へのマッピング（存在しないUIDは含まない）
+        """
+        profiles: Dict[str, Dict[str, Any]] = {}
+        for stmt in cls._lookup_statements(firebase_uids, fields, chunk_size):
+            cls._collect_public(profiles, db.session.execute(stmt).mappings())
+        return profiles
+    
+    @classmethod
+    async def lookup_public_async(
+        cls,
+        session: 'AsyncSession',
+        firebase_uids: List[str],
+        fields: Optional[List[str]] = None,
+        chunk_size: int = 200
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        lookup_publicの非同期版（ASGIモード用）
+        
+        Args:
+            session: 非同期セッション
+            firebase_uids: Firebase認証のユーザーIDのリスト（重複なし）
+            fields: 取得する公開フィールド（省略時はすべての公開フィールド）
+            chunk_size: 1回のクエリに含めるUIDの数
+        
+        Returns:
+            firebase_uidから公開プロフィールの辞書へのマッピング（存在しないUIDは含まない）
+        """
+        profiles: Dict[str, Dict[str, Any]] = {}
+        for stmt in cls._lookup_statements(firebase_uids, fields, chunk_size):
+            cls._collect_public(profiles, (await session.execute(stmt)).mappings())
+        return profiles
+    
+    @classmethod
+    def _lookup_statements(
+        cls,
+        firebase_uids: List[str],
+        fields: Optional[List[str]],
+        chunk_size: int
+    ) -> Iterator[Any]:
+        """UIDのチャンクごとの公開フィールドのSELECT文を返す"""
+        columns = [getattr(cls, field) for field in (fields or cls.PUBLIC_FIELDS)]
+        for start in range(0, len(firebase_uids), chunk_size):
+            chunk = firebase_uids[start:start + chunk_size]
+            yield db.select(cls.firebase_uid, *columns).where(cls.firebase_uid.in_(chunk))
+    
+    @staticmethod
+    def _collect_public(profiles: Dict[str, Dict[str, Any]], rows: Iterable[Mapping[str, Any]]) -> None:
+        for row in rows:
+            profile = dict(row)
+            profiles[profile.pop('firebase_uid')] = profile
+    
+    @classmethod
+    def iter_export(
+        cls,
+        updated_since: Optional[datetime] = None,
+        after_id: int = 0,
+        batch_size: int = 1000
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        プロフィールをid順にシリアライズして順次返す（エクスポート用）
+        
+        idによるキーセットページネーションで1ページずつ取得し、各ページはサーバーサイドカーソルで
+        読み込むため、テーブルのサイズに関係なく一定のメモリで処理できます。
+        
+        Args:
+            updated_since: この日時以降に更新されたプロフィールのみを返す（オプション）
+            after_id: このidより大きいプロフィールから開始する（中断したエクスポートの再開用）
+            batch_size: 1ページあたりの行数
+        
+        Yields:
+            プロフィールデータの辞書
+        """
+        serialize = row_serializer(cls.__table__, cls.FIELDS)
+        last_id = after_id
+        while True:
+            stmt = db.select(*cls.__table__.columns).where(cls.id > last_id)
+            if updated_since is not None:
+                stmt = stmt.where(cls.updated_at >= updated_since)
+            stmt = stmt.order_by(cls.id).limit(batch_size).execution_options(yield_per=batch_size)
             
+            count = 0
+            for row in db.session.execute(stmt).mappings():
+                count += 1
+                last_id = row['id']
+                yield serialize(row)
+            
+            # ページごとにトランザクションを終了し、長時間のスナップショット保持を避ける
+            db.session.commit()
+            if count < batch_size:
+                return
+    
+    @classmethod
+    def get_by_firebase_uid(cls, firebase_uid: str, fields: Optional[Sequence[str]] = None) -> Optional['UserProfile']:
+        """
+        Firebase UIDでユーザープロフィールを取得する
+        
+        事前に組み立てた文を使用するため、呼び出しごとのクエリオブジェクトの構築と
+        SQLのコンパイルが発生しません。
+        
+        Args:
+            firebase_uid: Firebase認証のユーザーID
+            fields: 読み込むフィールド（省略時はすべて。それ以外の列は遅延読み込みになる）
+        
+        Returns:
+            ユーザープロフィールまたはNone
+        """
+        return db.session.execute(cls._select_by_uid(fields), {'firebase_uid': firebase_uid}).scalars().first()
+    
+    @classmethod
+    async def get_by_firebase_uid_async(
+        cls,
+        session: 'AsyncSession',
+        firebase_uid: str,
+        fields: Optional[Sequence[str]] = None
+    ) -> Optional['UserProfile']:
+        """
+        get_by_firebase_uidの非同期版（ASGIモード用）
+        
+        Args:
+            session: 非同期セッション
+            firebase_uid: Firebase認証のユーザーID
+            fields: 読み込むフィールド（省略時はすべて）
+        
         Returns:
             ユーザープロフィールまたはNone
         """
-        return cls.query.filter_by(firebase_uid=firebase_uid).first()
+        result = await session.execute(cls._select_by_uid(fields), {'firebase_uid': firebase_uid})
+        return result.scalars().first()
+    
+    @classmethod
+    def _select_by_uid(cls, fields: Optional[Sequence[str]]) -> Any:
+        """指定されたフィールドとETagに必要な列のみを読み込む文（省略時はすべての列）"""
+        load_fields = cls.load_fields(fields)
+        if load_fields is None:
+            return _SELECT_BY_UID
+        return _SELECT_BY_UID.options(load_only(*(getattr(cls, field) for field in load_fields)))
     
     def update(self, data: Dict[str, Any]) -> None:
         """
@@ -86,10 +347,187 @@ class UserProfile(db.Model):
         Args:
             data: 更新するデータの辞書
         """
-        # 更新可能なフィールド
-        updatable_fields = ['display_name', 'bio', 'location', 'website']
-        
         # 提供されたフィールドを更新
-        for field in updatable_fields:
+        for field in self.UPDATABLE_FIELDS:
             if field in data:
                 setattr(self, field, data[field])
+    
+    @classmethod
+    def upsert(cls, firebase_uid: str, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        プロフィールを1つの文で作成または更新する
+        
+        INSERT ... ON CONFLICT (firebase_uid) DO UPDATE ... RETURNINGを使用するため、
+        同じユーザーの初回書き込みが同時に発生しても一意制約違反になりません。
+        競合時は提供されたフィールドとupdated_atのみを更新します。
+        
+        Args:
+            firebase_uid: Firebase認証のユーザーID
+            data: 更新するデータの辞書
+        
+        Returns:
+            作成または更新されたプロフィールデータの辞書、失敗した場合はNone
+        """
+        row = upsert(cls, **cls._upsert_arguments(firebase_uid, data))
+        return cls.serialize(row) if row is not None else None
+    
+    @classmethod
+    async def upsert_async(
+        cls,
+        session: 'AsyncSession',
+        firebase_uid: str,
+        data: Dict[str, Any]
+    ) -> Optional[Dict[str, Any]]:
+        """
+        upsertの非同期版（ASGIモード用）
+        
+        Args:
+            session: 非同期セッション
+            firebase_uid: Firebase認証のユーザーID
+            data: 更新するデータの辞書
+        
+        Returns:
+            作成または更新されたプロフィールデータの辞書、失敗した場合はNone
+        """
+        from services.async_db import async_upsert
+        
+        row = await async_upsert(session, cls, **cls._upsert_arguments(firebase_uid, data))
+        return cls.serialize(row) if row is not None else None
+    
+    @classmethod
+    def _upsert_arguments(cls, firebase_uid: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        """upsertに渡す挿入・更新する値（提供されたフィールドとupdated_atのみを更新する）"""
+        now = datetime.utcnow()
+        fields = {field: data[field] for field in cls.UPDATABLE_FIELDS if field in data}
+        return {
+            'values': {'firebase_uid': firebase_uid, 'created_at': now, 'updated_at': now, **fields},
+            'conflict_columns': ['firebase_uid'],
+            'update_values': {'updated_at': now, **fields}
+        }
+    
+    @classmethod
+    def get_or_create(
+        cls,
+        firebase_uid: str,
+        fields: Optional[Sequence[str]] = None
+    ) -> Optional[Tuple[Dict[str, Any], bool]]:
+        """
+        プロフィールを取得し、存在しない場合は作成する
+        
+        INSERT ... ON CONFLICT DO NOTHING RETURNINGを使用し、競合した場合のみ既存の行を取得します。
+        複数のリクエストが同時に初回アクセスしても一意制約違反になりません。
+        INSERTは書き込みとなりシーケンスの値も消費するため、読み取りでは先にget_by_firebase_uidで取得し、
+        行が見つからない場合のみ呼び出してください。
+        
+        Args:
+            firebase_uid: Firebase認証のユーザーID
+            fields: 取得するフィールド（省略時はすべて。ETagに必要なidとupdated_atは常に含む）
+        
+        Returns:
+            プロフィールデータの辞書と作成されたかどうかのタプル、失敗した場合はNone
+        """
+        load_fields = cls.load_fields(fields)
+        now = datetime.utcnow()
+        result = insert_or_select(
+            cls,
+            values={'firebase_uid': firebase_uid, 'created_at': now, 'updated_at': now},
+            conflict_columns=['firebase_uid'],
+            columns=load_fields
+        )
+        if result is None:
+            return None
+        row, created = result
+        return cls.serialize(row, load_fields), created
+    
+    @classmethod
+    async def get_or_create_async(
+        cls,
+        session: 'AsyncSession',
+        firebase_uid: str,
+        fields: Optional[Sequence[str]] = None
+    ) -> Optional[Tuple[Dict[str, Any], bool]]:
+        """
+        get_or_createの非同期版（ASGIモード用）
+        
+        Args:
+            session: 非同期セッション
+            firebase_uid: Firebase認証のユーザーID
+            fields: 取得するフィールド（省略時はすべて）
+        
+        Returns:
+            プロフィールデータの辞書と作成されたかどうかのタプル、失敗した場合はNone
+        """
+        from services.async_db import async_insert_or_select
+        
+        load_fields = cls.load_fields(fields)
+        now = datetime.utcnow()
+        result = await async_insert_or_select(
+            session,
+            cls,
+            values={'firebase_uid': firebase_uid, 'created_at': now, 'updated_at': now},
+            conflict_columns=['firebase_uid'],
+            columns=load_fields
+        )
+        if result is None:
+            return None
+        row, created = result
+        return cls.serialize(row, load_fields), created
+    
+    @classmethod
+    def delete(cls, firebase_uid: str) -> bool:
+        """
+        プロフィールを削除する
+        
+        firebase_uidを条件に削除するため、パーティションテーブルでも1つのパーティションのみを参照します。
+        
+        Args:
+            firebase_uid: Firebase認証のユーザーID
+        
+        Returns:
+            削除されたかどうか（プロフィールが存在しない場合はFalse）
+        """
+        result = db.session.execute(
+            db.delete(cls).where(cls.firebase_uid == firebase_uid).execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        return result.rowcount > 0
+    
+    @classmethod
+    async def delete_async(cls, session: 'AsyncSession', firebase_uid: str) -> bool:
+        """
+        プロフィールを削除する（ASGIモード用）
+        
+        Args:
+            session: 非同期セッション
+            firebase_uid: Firebase認証のユーザーID
+        
+        Returns:
+            削除されたかどうか（プロフィールが存在しない場合はFalse）
+        """
+        result = await session.execute(
+            db.delete(cls).where(cls.firebase_uid == firebase_uid).execution_options(synchronize_session=False)
+        )
+        await session.commit()
+        return result.rowcount > 0
+
+
+# 頻繁に実行される検索の文（一度だけ組み立て、コンパイル結果はSQLAlchemyのコンパイルキャッシュで再利用される。
+# 同じSQL文字列が繰り返し送られるため、PostgreSQLではpsycopgのプリペアドステートメントの対象になる）
+_SELECT_BY_UID = (
+    db.select(UserProfile)
+    .where(UserProfile.firebase_uid == bindparam('firebase_uid'))
+    .limit(1)
+)
+_SELECT_VERSION_BY_UID = (
+    db.select(UserProfile.id, UserProfile.updated_at)
+    .where(UserProfile.firebase_uid == bindparam('firebase_uid'))
+)
+
+# DB_HASH_PARTITIONSが設定されている場合はfirebase_uidのハッシュでパーティショニングする（PostgreSQLのみ）
+register_hash_partitioning(UserProfile.__table__, 'firebase_uid')
+
+# 全文検索インデックス（PostgreSQLのtsvector列、SQLiteのFTS5テーブル）をテーブルと同時に作成する
+register_search_ddl(UserProfile.__table__)
+
+# 表示名のトライグラムインデックス（PostgreSQLのみ）をテーブルと同時に作成する
+register_autocomplete_ddl(UserProfile.__table__)
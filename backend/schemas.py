@@ -4,6 +4,7 @@
 from typing import Dict, Any, List, Optional, Union, Type
 from marshmallow import Schema, fields, validate, ValidationError as MarshmallowValidationError
 from errors import ValidationError
+from models.user_profile import UserProfile
 
 
 class BaseSchema(Schema):
@@ -32,6 +33,25 @@ class BaseSchema(Schema):
             )
 
 
+class CommaSeparatedList(fields.List):
+    """カンマ区切りの文字列（クエリパラメーター）またはリストを読み込むリストフィールド"""
+    
+    def _deserialize(self, value: Any, attr: Optional[str], data: Any, **kwargs: Any) -> List[Any]:
+        if isinstance(value, str):
+            value = [item.strip() for item in value.split(',') if item.strip()]
+        return super()._deserialize(value, attr, data, **kwargs)
+
+
+def _fields_param(choices: Union[List[str], tuple]) -> CommaSeparatedList:
+    """?fields=（カンマ区切り）を指定された選択肢で検証するフィールド（重複は除外される）"""
+    return CommaSeparatedList(
+        fields.String(validate=validate.OneOf(choices)),
+        required=False,
+        validate=validate.Length(min=1),
+        data_key='fields'
+    )
+
+
 class ProfileSchema(BaseSchema):
     """ユーザープロフィールスキーマ"""
     display_name = fields.String(
@@ -56,6 +76,27 @@ class ProfileSchema(BaseSchema):
     )
 
 
+class ProfileFieldsSchema(BaseSchema):
+    """プロフィールのレスポンスに含めるフィールドのクエリスキーマ"""
+    selected_fields = _fields_param(UserProfile.FIELDS)
+    
+    @classmethod
+    def parse(cls, args: Dict[str, Any]) -> Optional[List[str]]:
+        """
+        クエリパラメーターから指定されたフィールドを取得する
+        
+        Args:
+            args: クエリパラメーターの辞書
+        
+        Returns:
+            フィールドのリスト（重複を除いた指定順）、指定されていない場合はNone
+        """
+        if 'fields' not in args:
+            return None
+        selected = cls.validate_request({'fields': args['fields']}).get('selected_fields')
+        return list(dict.fromkeys(selected)) if selected else None
+
+
 class SearchQuerySchema(BaseSchema):
     """検索クエリスキーマ"""
     q = fields.String(
@@ -68,3 +109,48 @@ class SearchQuerySchema(BaseSchema):
         validate=validate.Range(min=1, max=50),
         load_default=10
     )
+    cursor = fields.String(
+        required=False,
+        validate=validate.Length(min=1, max=200)
+    )
+    selected_fields = _fields_param(UserProfile.PUBLIC_FIELDS)
+
+
+class TokenBatchSchema(BaseSchema):
+    """トークン一括検証スキーマ"""
+    tokens = fields.List(
+        fields.String(validate=validate.Length(min=1)),
+        required=True,
+        validate=validate.Length(min=1),
+        error_messages={"required": "トークンのリストは必須です"}
+    )
+
+
+class ProfileLookupSchema(BaseSchema):
+    """プロフィール一括取得スキーマ"""
+    uids = fields.List(
+        fields.String(validate=validate.Length(min=1, max=128)),
+        required=True,
+        validate=validate.Length(min=1),
+        error_messages={"required": "UIDのリストは必須です"}
+    )
+    selected_fields = fields.List(
+        fields.String(validate=validate.OneOf(UserProfile.PUBLIC_FIELDS)),
+        required=False,
+        validate=validate.Length(min=1),
+        data_key='fields'
+    )
+
+
+class AutocompleteQuerySchema(BaseSchema):
+    """表示名オートコンプリートのクエリスキーマ"""
+    q = fields.String(
+        required=True,
+        validate=validate.Length(min=1, max=100),
+        error_messages={"required": "検索クエリは必須です"}
+    )
+    limit = fields.Integer(
+        required=False,
+        validate=validate.Range(min=1, max=20),
+        load_default=8
+    )
@@ -0,0 +1,227 @@
+"""
+非同期データベースサービスモジュール
+
+ASGIモード（asgi.py）で使用する非同期のSQLAlchemyエンジンとセッションを提供します。
+PostgreSQLではpsycopgの非同期ドライバー、SQLiteではaiosqliteを使用します。
+モデルとテーブル定義はFlask-SQLAlchemy（services.db_service.db）と共有します。
+文の組み立て（services.db_service）とリードレプリカの選択（services.replica_router）は同期版と共有します。
+"""
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple, Type, TypeVar
+
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import DBAPIError, OperationalError
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+from services.db_pool import engine_options
+from services.db_service import upsert_statement, insert_or_select_statements
+from services.replica_router import replica_router
+from logger import get_logger
+
+# ロガーの取得
+logger = get_logger(__name__)
+
+T = TypeVar('T')
+
+# 非同期エンジンとセッションファクトリー（init_async_dbで設定される）
+async_engine: Optional[AsyncEngine] = None
+async_session_factory: Optional[async_sessionmaker] = None
+
+# リードレプリカの非同期エンジンとセッションファクトリー（replica_routerのレプリカ名ごと）
+async_replica_engines: Dict[str, AsyncEngine] = {}
+async_replica_factories: Dict[str, async_sessionmaker] = {}
+
+
+def async_database_url(url: str) -> str:
+    """
+    同期ドライバーのURLを非同期ドライバーのURLに変換する
+    
+    Args:
+        url: SQLALCHEMY_DATABASE_URIなどの接続先のURL
+    
+    Returns:
+        psycopg（非同期）またはaiosqliteを使用するURL
+    """
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend == 'postgresql':
+        parsed = parsed.set(drivername='postgresql+psycopg')
+    elif backend == 'sqlite':
+        parsed = parsed.set(drivername='sqlite+aiosqlite')
+    return parsed.render_as_string(hide_password=False)
+
+
+def _create_async_engine(config: Dict[str, Any], url: str, name: str) -> AsyncEngine:
+    """接続先のURLの非同期エンジンを作成する"""
+    options: Dict[str, Any] = {}
+    if url.startswith('sqlite'):
+        if ':memory:' in url or url.rstrip('/') == 'sqlite:':
+            # インメモリデータベースは接続ごとに別のデータベースになるため1つの接続を共有する
+            options = {'poolclass': StaticPool, 'connect_args': {'check_same_thread': False}}
+    else:
+        # asyncioのエンジンはQueuePoolを使用できないため、プールクラス以外の設定を適用する
+        options = {
+            key: value for key, value in engine_options(config, name=name, url=url).items() if key != 'poolclass'
+        }
+    return create_async_engine(async_database_url(url), **options)
+
+
+def init_async_db(config: Dict[str, Any]) -> AsyncEngine:
+    """
+    アプリケーション設定に基づいて非同期エンジンを初期化する
+    
+    接続プールのサイズやタイムアウトは同期エンジンと同じ設定（engine_options）を使用します。
+    DB_REPLICA_URLSが設定されている場合は、リードレプリカの非同期エンジンも作成します。
+    
+    Args:
+        config: アプリケーション設定
+    
+    Returns:
+        非同期エンジン
+    """
+    global async_engine, async_session_factory
+    
+    async_engine = _create_async_engine(config, config.get('SQLALCHEMY_DATABASE_URI') or '', 'async')
+    async_session_factory = async_sessionmaker(async_engine, expire_on_commit=False)
+    
+    async_replica_engines.clear()
+    async_replica_factories.clear()
+    for index, url in enumerate(config.get('DB_REPLICA_URLS', []), start=1):
+        name = f"replica{index}"
+        engine = _create_async_engine(config, url, f"async_{name}")
+        async_replica_engines[name] = engine
+        async_replica_factories[name] = async_sessionmaker(engine, expire_on_commit=False)
+    
+    logger.info("非同期データベース接続が初期化されました")
+    return async_engine
+
+
+async def dispose_async_db() -> None:
+    """非同期エンジンの接続をすべて閉じる"""
+    if async_engine is not None:
+        await async_engine.dispose()
+    for engine in async_replica_engines.values():
+        await engine.dispose()
+
+
+@asynccontextmanager
+async def session_scope() -> AsyncIterator[AsyncSession]:
+    """
+    リクエスト単位の非同期セッションを作成し、終了時に閉じる
+    
+    Yields:
+        非同期セッション
+    
+    Raises:
+        RuntimeError: init_async_dbが呼び出されていない場合
+    """
+    if async_session_factory is None:
+        raise RuntimeError("非同期データベースが初期化されていません")
+    async with async_session_factory() as session:
+        yield session
+
+
+async def run_read(read: Callable[[AsyncSession], Awaitable[T]]) -> T:
+    """
+    読み取り処理をリードレプリカの非同期セッションで実行する（replica_router.runの非同期版）
+    
+    レプリカの選択（書き込み直後のクライアントのプライマリへの固定、障害のあるレプリカの切り離し）は
+    replica_routerで行い、レプリカでエラーが発生した場合はプライマリで再実行します。
+    
+    Args:
+        read: セッションを受け取り、読み取り結果を返すコルーチン関数
+    
+    Returns:
+        読み取り処理の戻り値
+    """
+    replica = replica_router.choose()
+    factory = async_replica_factories.get(replica.name) if replica is not None else None
+    if factory is not None:
+        try:
+            async with factory() as session:
+                return await read(session)
+        except DBAPIError as e:
+            if isinstance(e, OperationalError) or e.connection_invalidated:
+                replica_router.mark_unhealthy(replica, e)
+    
+    async with session_scope() as session:
+        return await read(session)
+
+
+async def async_upsert(
+    session: AsyncSession,
+    model: Type[Any],
+    values: Dict[str, Any],
+    conflict_columns: List[str],
+    update_values: Dict[str, Any]
+) -> Optional[Dict[str, Any]]:
+    """
+    INSERT ... ON CONFLICT DO UPDATE ... RETURNINGを1つの文で実行し、コミットする（upsertの非同期版）
+    
+    Args:
+        session: 非同期セッション
+        model: 対象のモデルクラス
+        values: 挿入する値の辞書
+        conflict_columns: 一意制約の列名のリスト
+        update_values: 競合時に更新する値の辞書
+    
+    Returns:
+        挿入または更新された行の辞書、失敗した場合はNone
+    """
+    stmt = upsert_statement(model.__table__, values, conflict_columns, update_values, session.bind.dialect.name)
+    
+    try:
+        row = (await session.execute(stmt)).mappings().one()
+        await session.commit()
+        return dict(row)
+    except Exception as e:
+        await session.rollback()
+        logger.error(f"データベースアップサートエラー: {str(e)}")
+        return None
+
+
+async def async_insert_or_select(
+    session: AsyncSession,
+    model: Type[Any],
+    values: Dict[str, Any],
+    conflict_columns: List[str],
+    columns: Optional[Iterable[str]] = None
+) -> Optional[Tuple[Dict[str, Any], bool]]:
+    """
+    INSERT ... ON CONFLICT DO NOTHING RETURNINGで行を作成し、競合した場合は既存の行を取得する
+    （insert_or_selectの非同期版）
+    
+    Args:
+        session: 非同期セッション
+        model: 対象のモデルクラス
+        values: 挿入する値の辞書（conflict_columnsの値を含む）
+        conflict_columns: 一意制約の列名のリスト
+        columns: 返す列名（省略時はすべての列）
+    
+    Returns:
+        行の辞書と作成されたかどうかのタプル、失敗した場合はNone
+    """
+    stmt, lookup = insert_or_select_statements(
+        model.__table__, values, conflict_columns, columns, session.bind.dialect.name
+    )
+    
+    try:
+        # 競合後に既存の行が削除された場合に備えて一度だけ再試行する
+        for _ in range(2):
+            row = (await session.execute(stmt)).mappings().first()
+            if row is not None:
+                await session.commit()
+                return dict(row), True
+            
+            row = (await session.execute(lookup)).mappings().first()
+            await session.commit()
+            if row is not None:
+                return dict(row), False
+        
+        logger.error("作成した行を取得できませんでした")
+        return None
+    except Exception as e:
+        await session.rollback()
+        logger.error(f"データベース作成エラー: {str(e)}")
+        return None
@@ -2,21 +2,155 @@
 Firebase認証サービスモジュール - IDトークンの検証用
 """
 import os
-from typing import Dict, Any, Optional, Callable
-import firebase_admin
-from firebase_admin import credentials, auth
+import asyncio
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional, Callable, List, Tuple, Union
 from functools import wraps
-from flask import request, current_app, g
-from errors import UnauthorizedError, ForbiddenError, ExternalServiceError
+from flask import Flask, request, current_app, g
+from errors import APIError, UnauthorizedError, ForbiddenError, ExternalServiceError
+from services.cache import LRUTTLCache
+from services.token_verifier import (
+    FirebaseTokenVerifier, SigningKeySet, key_source_from_uri,
+    TokenVerificationError, TokenExpiredError, SigningKeysUnavailableError
+)
+from services.session_token import (
+    SessionTokenManager, SessionTokenError, SessionTokenExpiredError, is_session_token
+)
+from services.policy import Policy, any_role, compile_policy, normalize_claims
+from services.metrics import register_collector
+from services.replica_router import replica_router
+from startup import lazy_import, timed
 from logger import get_logger
 
 # ロガーの取得
 logger = get_logger(__name__)
 
-def initialize_firebase() -> bool:
+# Firebase Admin SDKは初回使用時にインポートする（起動時間の短縮のため）
+firebase_admin = lazy_import('firebase_admin')
+credentials = lazy_import('firebase_admin.credentials')
+auth = lazy_import('firebase_admin.auth')
+
+# 遅延初期化用のFirebase設定と初期化状態
+_firebase_config: Dict[str, Any] = {}
+_firebase_initialized = False
+_firebase_init_lock = threading.Lock()
+
+# 検証済みIDトークンのキャッシュ（キーはトークンのSHA-256ハッシュ）
+token_cache = LRUTTLCache()
+
+
+def init_token_cache(app: Flask) -> None:
+    """
+    アプリケーション設定に基づいて検証済みトークンキャッシュを初期化する
+    
+    Args:
+        app: Flaskアプリケーションインスタンス
+    """
+    if app.config.get('TOKEN_CACHE_ENABLED', True):
+        token_cache.max_size = app.config.get('TOKEN_CACHE_MAX_SIZE', 10000)
+    else:
+        token_cache.max_size = 0
+    token_cache.clear()
+    register_collector('token_cache', token_cache.stats)
+    logger.info(f"検証済みトークンキャッシュが初期化されました（最大サイズ: {token_cache.max_size}）")
+
+
+# オフライン検証エンジン（FIREBASE_LOCAL_VERIFICATIONが有効な場合のみ設定される）
+token_verifier: Optional[FirebaseTokenVerifier] = None
+
+
+def init_token_verifier(app: Flask) -> bool:
+    """
+    アプリケーション設定に基づいてオフライン検証エンジンを初期化する
+    
+    永続化された署名鍵セットを読み込み、以降はバックグラウンドで更新します。
+    LAZY_INITが有効な場合、署名鍵セットは初回の検証時またはウォームアップ時に読み込みます。
+    
+    Args:
+        app: Flaskアプリケーションインスタンス
+    
+    Returns:
+        bool: オフライン検証が有効になったかどうか
+    """
+    global token_verifier
+    
+    config = app.config
+    if not config.get('FIREBASE_LOCAL_VERIFICATION'):
+        token_verifier = None
+        return False
+    
+    project_id = config.get('FIREBASE_PROJECT_ID')
+    if not project_id:
+        logger.warning("FIREBASE_PROJECT_IDが未設定のため、オフライン検証を無効にします")
+        token_verifier = None
+        return False
+    
+    key_set = SigningKeySet(
+        key_source_from_uri(config.get('FIREBASE_SIGNING_KEYS_URL')),
+        cache_file=config.get('FIREBASE_SIGNING_KEYS_FILE') or None,
+        refresh_margin=config.get('FIREBASE_SIGNING_KEYS_REFRESH_MARGIN', 300)
+    )
+    if not config.get('LAZY_INIT') and not key_set.load():
+        logger.warning("署名鍵セットを読み込めませんでした。バックグラウンドで再試行します")
+    
+    token_verifier = FirebaseTokenVerifier(
+        project_id,
+        key_set,
+        leeway=config.get('FIREBASE_TOKEN_LEEWAY', 0)
+    )
+    logger.info("Firebase IDトークンのオフライン検証が有効になりました")
+    return True
+
+def init_firebase(app: Flask) -> bool:
+    """
+    アプリケーション設定に基づいてFirebase Admin SDKを初期化する
+    
+    LAZY_INITが有効な場合はインポートと初期化を行わず、初回のトークン検証時または
+    ウォームアップ時まで遅延させます。
+    
+    Args:
+        app: Flaskアプリケーションインスタンス
+    
+    Returns:
+        bool: 初期化が成功した（または遅延された）かどうか
+    """
+    global _firebase_config
+    
+    _firebase_config = app.config
+    if app.config.get('LAZY_INIT'):
+        logger.info("Firebase Admin SDKの初期化を初回使用時まで遅延します")
+        return True
+    return ensure_firebase()
+
+
+def ensure_firebase() -> bool:
+    """
+    Firebase Admin SDKが初期化されていることを保証する（初期化はプロセスごとに一度だけ行う）
+    
+    Returns:
+        bool: 初期化されているかどうか
+    """
+    global _firebase_initialized
+    
+    if _firebase_initialized:
+        return True
+    
+    with _firebase_init_lock:
+        if not _firebase_initialized:
+            with timed('init:firebase'):
+                _firebase_initialized = initialize_firebase(_firebase_config)
+    return _firebase_initialized
+
+
+def initialize_firebase(config: Optional[Dict[str, Any]] = None) -> bool:
     """
     環境変数からの認証情報を使用してFirebase Admin SDKを初期化する
     
+    Args:
+        config: Firebase設定を含む設定辞書（省略時はcurrent_app.config）
+    
     Returns:
         bool: 初期化が成功したかどうか
     """
@@ -24,7 +158,7 @@ def initialize_firebase() -> bool:
         # 既に初期化されているかチェック
         if not firebase_admin._apps:
             # 設定からFirebase認証情報を取得
-            config = current_app.config
+            config = config if config is not None else current_app.config
             
             # Firebase認証情報が設定されているかチェック
             if config.get('FIREBASE_PROJECT_ID'):
@@ -32,7 +166,7 @@ def initialize_firebase() -> bool:
                     "type": "service_account",
                     "project_id": config.get('FIREBASE_PROJECT_ID'),
                     "private_key_id": config.get('FIREBASE_PRIVATE_KEY_ID'),
-                    "private_key": config.get('FIREBASE_PRIVATE_KEY', '').replace('\\n', '\n'),
+                    "private_key": (config.get('FIREBASE_PRIVATE_KEY') or '').replace('\\n', '\n'),
                     "client_email": config.get('FIREBASE_CLIENT_EMAIL'),
                     "client_id": config.get('FIREBASE_CLIENT_ID'),
                     "auth_uri": config.get('FIREBASE_AUTH_URI'),
@@ -47,97 +181,484 @@ def initialize_firebase() -> bool:
                 # サービスアカウントが提供されていない場合はアプリケーションのデフォルト認証情報を使用
                 firebase_admin.initialize_app()
                 logger.info("Firebase Admin SDKがアプリケーションのデフォルト認証情報で初期化されました")
-            return True
+        return True
     except Exception as e:
         logger.error(f"Firebase Admin SDKの初期化エラー: {str(e)}")
         return False
 
 
-def auth_required(f: Callable) -> Callable:
+# セッショントークンマネージャー（SESSION_TOKEN_ENABLEDが有効な場合のみ設定される）
+session_tokens: Optional[SessionTokenManager] = None
+
+
+def init_session_tokens(app: Flask) -> bool:
+    """
+    アプリケーション設定に基づいてセッショントークンマネージャーを初期化する
+    
+    SESSION_TOKEN_SECRETSが設定されている場合はそのすべての鍵（古い順）を、
+    設定されていない場合はSECRET_KEYを署名鍵として使用します。
+    
+    Args:
+        app: Flaskアプリケーションインスタンス
+    
+    Returns:
+        bool: セッショントークンが有効になったかどうか
+    """
+    global session_tokens
+    
+    config = app.config
+    if not config.get('SESSION_TOKEN_ENABLED'):
+        session_tokens = None
+        return False
+    
+    secret_keys = config.get('SESSION_TOKEN_SECRETS') or [config.get('SECRET_KEY')]
+    secret_keys = [key for key in secret_keys if key]
+    if not secret_keys:
+        logger.warning("署名鍵が未設定のため、セッショントークンを無効にします")
+        session_tokens = None
+        return False
+    
+    session_tokens = SessionTokenManager(secret_keys, ttl=config.get('SESSION_TOKEN_TTL', 900))
+    logger.info(f"セッショントークンが有効になりました（鍵数: {len(secret_keys)}）")
+    return True
+
+
+def issue_session_token(decoded_token: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    検証済みのFirebase IDトークンに対してセッショントークンを発行する
+    
+    Args:
+        decoded_token: デコードされたFirebase IDトークン
+    
+    Returns:
+        セッショントークンと有効期限を含む辞書（セッショントークンが無効な場合はNone）
+    """
+    if session_tokens is None or decoded_token.get('session'):
+        return None
+    
+    token, expires_at = session_tokens.issue(decoded_token)
+    return {'token': token, 'expires_at': expires_at}
+
+
+def verify_session_token(token: str) -> Dict[str, Any]:
+    """
+    セッショントークンを検証し、クレームを返します。
+    
+    Args:
+        token: 検証するセッショントークン
+    
+    Returns:
+        クレームの辞書
+    
+    Raises:
+        UnauthorizedError: セッショントークンが無効な場合
+    """
+    if session_tokens is None:
+        logger.warning("セッショントークンが無効な環境でセッショントークンが使用されました")
+        raise UnauthorizedError("無効な認証トークンです")
+    
+    try:
+        return session_tokens.verify(token)
+    except SessionTokenExpiredError:
+        logger.warning("期限切れのセッショントークン")
+        raise UnauthorizedError("期限切れの認証トークンです")
+    except SessionTokenError as e:
+        logger.warning(f"無効なセッショントークン: {str(e)}")
+        raise UnauthorizedError("無効な認証トークンです")
+
+
+def _token_cache_key(token: str) -> str:
+    """
+    トークン文字列からキャッシュキーを生成する（生のトークンはメモリに保持しない）
+    
+    Args:
+        token: Firebase IDトークン
+    
+    Returns:
+        トークンのSHA-256ハッシュ
+    """
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+
+def _verify_id_token(token: str, check_revoked: bool = False) -> Dict[str, Any]:
+    """
+    Firebase Admin SDKでIDトークンを検証し、SDKの例外をAPIエラーに変換する
+    
+    Args:
+        token: 検証するFirebase IDトークン
+        check_revoked: トークンの取り消しを確認するかどうか
+    
+    Returns:
+        デコードされたトークン
+    
+    Raises:
+        UnauthorizedError: トークンが無効な場合
+        ExternalServiceError: 外部サービスとの通信エラーの場合
+    """
+    # 取り消し確認はFirebaseへの問い合わせが必要なため、オフライン検証は使用しない
+    if token_verifier is not None and not check_revoked:
+        return _verify_id_token_locally(token)
+    
+    ensure_firebase()
+    
+    try:
+        return auth.verify_id_token(token, check_revoked=check_revoked)
+    except auth.ExpiredIdTokenError:
+        logger.warning("期限切れの認証トークン")
+        raise UnauthorizedError("期限切れの認証トークンです")
+    except auth.RevokedIdTokenError:
+        logger.warning("取り消された認証トークン")
+        raise UnauthorizedError("取り消された認証トークンです")
+    except auth.InvalidIdTokenError:
+        logger.warning("無効な認証トークン")
+        raise UnauthorizedError("無効な認証トークンです")
+    except auth.CertificateFetchError:
+        logger.error("Firebase証明書の取得エラー")
+        raise ExternalServiceError("認証サービスとの通信中にエラーが発生しました")
+    except Exception as e:
+        logger.error(f"認証エラー: {str(e)}")
+        raise UnauthorizedError(f"認証エラー: {str(e)}")
+
+
+def _verify_id_token_locally(token: str) -> Dict[str, Any]:
+    """
+    オフライン検証エンジンでIDトークンを検証し、検証エラーをAPIエラーに変換する
+    
+    Args:
+        token: 検証するFirebase IDトークン
+    
+    Returns:
+        デコードされたトークン
+    
+    Raises:
+        UnauthorizedError: トークンが無効な場合
+        ExternalServiceError: 署名鍵セットが利用できない場合
+    """
+    try:
+        return token_verifier.verify(token)
+    except TokenExpiredError:
+        logger.warning("期限切れの認証トークン")
+        raise UnauthorizedError("期限切れの認証トークンです")
+    except TokenVerificationError as e:
+        logger.warning(f"無効な認証トークン: {str(e)}")
+        raise UnauthorizedError("無効な認証トークンです")
+    except SigningKeysUnavailableError:
+        logger.error("署名鍵セットが利用できません")
+        raise ExternalServiceError("認証サービスとの通信中にエラーが発生しました")
+
+
+def _bearer_token(auth_header: Optional[str]) -> str:
+    """
+    Authorizationヘッダーからトークンを取り出す
+    
+    Args:
+        auth_header: Authorizationヘッダーの値
+    
+    Returns:
+        トークン（'Bearer 'プレフィックスがある場合は削除したもの）
+    
+    Raises:
+        UnauthorizedError: ヘッダーがない場合
+    """
+    if not auth_header:
+        logger.warning("認証ヘッダーがありません")
+        raise UnauthorizedError("Authorizationヘッダーがありません")
+    return auth_header.replace('Bearer ', '') if auth_header.startswith('Bearer ') else auth_header
+
+
+def authenticate(auth_header: Optional[str], check_revoked: bool = False) -> Dict[str, Any]:
+    """
+    Authorizationヘッダーのトークンを検証し、デコードされたトークンを返す
+    
+    セッショントークンは対称鍵で検証し、それ以外はFirebase IDトークンとして検証します。
+    
+    Args:
+        auth_header: Authorizationヘッダーの値
+        check_revoked: トークンの取り消しを確認するかどうか（セッショントークンは受け付けない）
+    
+    Returns:
+        デコードされたトークン
+    
+    Raises:
+        UnauthorizedError: ヘッダーがない場合またはトークンが無効な場合
+        ExternalServiceError: 外部サービスとの通信エラーの場合
+    """
+    return _authenticate(auth_header, check_revoked)[0]
+
+
+def _authenticate(auth_header: Optional[str], check_revoked: bool = False) -> Tuple[Dict[str, Any], str]:
+    """
+    authenticateと同じ検証を行い、デコードされたトークンとトークンのSHA-256ハッシュを返す
+    
+    ハッシュは検証済みトークンキャッシュのキーと同じもので、require_roleの正規化クレームキャッシュの
+    キーにも使用します（リクエストごとにクレーム全体をハッシュしないため）。
+    """
+    token = _bearer_token(auth_header)
+    token_hash = _token_cache_key(token)
+    if is_session_token(token) and not check_revoked:
+        return verify_session_token(token), token_hash
+    return verify_token(token, check_revoked=check_revoked, cache_key=token_hash), token_hash
+
+
+async def authenticate_async(auth_header: Optional[str], check_revoked: bool = False) -> Dict[str, Any]:
+    """
+    authenticateの非同期版（ASGIモード用）
+    
+    セッショントークンと検証済みトークンキャッシュはイベントループ上で確認し、
+    署名鍵の取得やFirebaseとの通信を伴う検証はワーカースレッドで実行します。
+    
+    Args:
+        auth_header: Authorizationヘッダーの値
+        check_revoked: トークンの取り消しを確認するかどうか
+    
+    Returns:
+        デコードされたトークン
+    
+    Raises:
+        UnauthorizedError: ヘッダーがない場合またはトークンが無効な場合
+        ExternalServiceError: 外部サービスとの通信エラーの場合
+    """
+    token = _bearer_token(auth_header)
+    if is_session_token(token) and not check_revoked:
+        return verify_session_token(token)
+    return await verify_token_async(token, check_revoked=check_revoked)
+
+
+def auth_required(f: Optional[Callable] = None, *, check_revoked: bool = False) -> Callable:
     """
     Firebase認証を必要とするFlaskルートのためのデコレータ。
     AuthorizationヘッダーのIDトークンを検証し、デコードされたトークンをリクエストに追加します。
     
+    `@auth_required` のほか、取り消し確認が必要なエンドポイントでは
+    `@auth_required(check_revoked=True)` としてキャッシュを経由せずに検証できます。
+    
+    セッショントークンが有効な場合は、/api/auth/verifyで発行されたセッショントークンも
+    受け付けます（check_revoked=Trueの場合を除く）。
+    
     Args:
         f: デコレートする関数
-        
+        check_revoked: トークンの取り消しを確認するかどうか（キャッシュを使用しない）
+    
     Returns:
         デコレートされた関数
     """
-    @wraps(f)
-    def decorated_function(*args: Any, **kwargs: Any) -> Any:
-        # リクエストヘッダーから認証トークンを取得
-        auth_header = request.headers.get('Authorization')
-        if not auth_header:
-            logger.warning("認証ヘッダーがありません")
-            raise UnauthorizedError("Authorizationヘッダーがありません")
-        
-        # トークンを抽出（'Bearer 'プレフィックスがある場合は削除）
-        token = auth_header.replace('Bearer ', '') if auth_header.startswith('Bearer ') else auth_header
-        
-        try:
-            # トークンを検証
-            decoded_token = auth.verify_id_token(token)
+    def decorator(func: Callable) -> Callable:
+        @wraps(func)
+        def decorated_function(*args: Any, **kwargs: Any) -> Any:
+            # リクエストヘッダーから認証トークンを取得して検証
+            # トークンのハッシュはrequire_roleの正規化クレームキャッシュのキーに使用する
+            decoded_token, token_hash = _authenticate(request.headers.get('Authorization'), check_revoked=check_revoked)
             
             # デコードされたトークンをリクエストオブジェクトとFlask gオブジェクトに追加
             request.user = decoded_token
             g.user = decoded_token
             g.user_id = decoded_token.get('uid')
+            g.token_hash = token_hash
+            replica_router.identify(g.user_id)
             
             logger.info(f"ユーザー認証成功: {g.user_id}")
             
             # ルート関数を続行
-            return f(*args, **kwargs)
-        except auth.InvalidIdTokenError:
-            logger.warning("無効な認証トークン")
-            raise UnauthorizedError("無効な認証トークンです")
-        except auth.ExpiredIdTokenError:
-            logger.warning("期限切れの認証トークン")
-            raise UnauthorizedError("期限切れの認証トークンです")
-        except auth.RevokedIdTokenError:
-            logger.warning("取り消された認証トークン")
-            raise UnauthorizedError("取り消された認証トークンです")
-        except auth.CertificateFetchError:
-            logger.error("Firebase証明書の取得エラー")
-            raise ExternalServiceError("認証サービスとの通信中にエラーが発生しました")
-        except Exception as e:
-            logger.error(f"認証エラー: {str(e)}")
-            raise UnauthorizedError(f"認証エラー: {str(e)}")
-    
-    return decorated_function
-
-
-def verify_token(token: str) -> Dict[str, Any]:
+            return func(*args, **kwargs)
+        
+        return decorated_function
+    
+    if f is None:
+        return decorator
+    return decorator(f)
+
+
+def async_auth_required(f: Optional[Callable] = None, *, check_revoked: bool = False) -> Callable:
+    """
+    auth_requiredのASGIモード（Starlette）用のデコレータ。
+    デコードされたトークンをrequest.state.userに追加します。
+    
+    Args:
+        f: デコレートする非同期のエンドポイント関数
+        check_revoked: トークンの取り消しを確認するかどうか（キャッシュを使用しない）
+    
+    Returns:
+        デコレートされた関数
+    """
+    def decorator(func: Callable) -> Callable:
+        @wraps(func)
+        async def decorated_function(request: Any, *args: Any, **kwargs: Any) -> Any:
+            decoded_token = await authenticate_async(
+                request.headers.get('Authorization'), check_revoked=check_revoked
+            )
+            request.state.user = decoded_token
+            request.state.user_id = decoded_token.get('uid')
+            await replica_router.identify_async(request.state.user_id)
+            
+            logger.info(f"ユーザー認証成功: {request.state.user_id}")
+            
+            return await func(request, *args, **kwargs)
+        
+        return decorated_function
+    
+    if f is None:
+        return decorator
+    return decorator(f)
+
+
+def verify_token(token: str, check_revoked: bool = False, cache_key: Optional[str] = None) -> Dict[str, Any]:
     """
     Firebase IDトークンを検証し、有効な場合はデコードされたトークンを返します。
     
+    検証済みのトークンはその有効期限（exp）まで検証済みトークンキャッシュに保持され、
+    同じトークンによる再検証では署名検証をスキップします。
+    
     Args:
         token: 検証するFirebase IDトークン
-        
+        check_revoked: トークンの取り消しを確認するかどうか（Trueの場合はキャッシュを使用しない）
+        cache_key: 計算済みのトークンのSHA-256ハッシュ（省略時はここで計算する）
+    
     Returns:
         デコードされたトークン
-        
+    
+    Raises:
+        UnauthorizedError: トークンが無効な場合
+        ExternalServiceError: 外部サービスとの通信エラーの場合
+    """
+    cache_key = cache_key or _token_cache_key(token)
+    
+    if not check_revoked:
+        cached_token = token_cache.get(cache_key)
+        if cached_token is not None:
+            return dict(cached_token)
+    
+    decoded_token = _verify_id_token(token, check_revoked=check_revoked)
+    
+    # トークン自身の有効期限までキャッシュする
+    expires_at = decoded_token.get('exp')
+    if expires_at:
+        token_cache.set(cache_key, dict(decoded_token), float(expires_at))
+    
+    return decoded_token
+
+
+async def verify_token_async(token: str, check_revoked: bool = False) -> Dict[str, Any]:
+    """
+    verify_tokenの非同期版（ASGIモード用）
+    
+    キャッシュ済みのトークンはイベントループ上でそのまま返し、
+    キャッシュにない場合のみワーカースレッドで検証するため、イベントループをブロックしません。
+    
+    Args:
+        token: 検証するFirebase IDトークン
+        check_revoked: トークンの取り消しを確認するかどうか（Trueの場合はキャッシュを使用しない）
+    
+    Returns:
+        デコードされたトークン
+    
     Raises:
         UnauthorizedError: トークンが無効な場合
         ExternalServiceError: 外部サービスとの通信エラーの場合
     """
+    if not check_revoked:
+        cached_token = token_cache.get(_token_cache_key(token))
+        if cached_token is not None:
+            return dict(cached_token)
+    
+    return await asyncio.to_thread(verify_token, token, check_revoked)
+
+
+async def verify_tokens_async(
+    tokens: List[str],
+    max_concurrency: int = 8
+) -> Dict[str, Union[Dict[str, Any], APIError]]:
+    """
+    verify_tokensの非同期版（ASGIモード用）。重複したトークンは一度だけ検証されます。
+    
+    Args:
+        tokens: 検証するFirebase IDトークンのリスト
+        max_concurrency: 同時に検証するトークンの最大数
+    
+    Returns:
+        トークンからデコードされたトークンまたはAPIエラーへのマッピング
+    """
+    unique_tokens = list(dict.fromkeys(tokens))
+    semaphore = asyncio.Semaphore(max_concurrency)
+    
+    async def verify_or_error(token: str) -> Union[Dict[str, Any], APIError]:
+        async with semaphore:
+            try:
+                return await verify_token_async(token)
+            except APIError as e:
+                return e
+    
+    outcomes = await asyncio.gather(*(verify_or_error(token) for token in unique_tokens))
+    return dict(zip(unique_tokens, outcomes))
+
+
+# バッチ検証用のワーカープール（初回使用時に作成し、要求されたサイズが変わった場合は作り直す）
+_batch_executor: Optional[ThreadPoolExecutor] = None
+_batch_executor_size = 0
+_batch_executor_lock = threading.Lock()
+
+
+def _get_batch_executor(max_workers: int) -> ThreadPoolExecutor:
+    """
+    バッチ検証用のワーカープールを取得する
+    
+    TOKEN_BATCH_MAX_WORKERSの変更（テストでの別の設定のアプリケーションなど）を反映するため、
+    サイズが異なる場合は新しいプールを作成し、古いプールは実行中の検証が終わり次第終了させます。
+    _batch_executor_lockを保持した状態で呼び出してください（終了させたプールに投入しないため）。
+    
+    Args:
+        max_workers: ワーカースレッドの最大数
+    
+    Returns:
+        ワーカープール
+    """
+    global _batch_executor, _batch_executor_size
+    
+    if _batch_executor is None or _batch_executor_size != max_workers:
+        previous = _batch_executor
+        _batch_executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='token-batch')
+        _batch_executor_size = max_workers
+        if previous is not None:
+            previous.shutdown(wait=False)
+    return _batch_executor
+
+
+def _verify_token_or_error(token: str) -> Union[Dict[str, Any], APIError]:
+    """
+    トークンを検証し、検証エラーの場合は例外を送出せずにエラーを返す
+    
+    Args:
+        token: 検証するFirebase IDトークン
+    
+    Returns:
+        デコードされたトークン、またはAPIエラー
+    """
     try:
-        return auth.verify_id_token(token)
-    except auth.InvalidIdTokenError:
-        logger.warning("無効な認証トークン")
-        raise UnauthorizedError("無効な認証トークンです")
-    except auth.ExpiredIdTokenError:
-        logger.warning("期限切れの認証トークン")
-        raise UnauthorizedError("期限切れの認証トークンです")
-    except auth.RevokedIdTokenError:
-        logger.warning("取り消された認証トークン")
-        raise UnauthorizedError("取り消された認証トークンです")
-    except auth.CertificateFetchError:
-        logger.error("Firebase証明書の取得エラー")
-        raise ExternalServiceError("認証サービスとの通信中にエラーが発生しました")
-    except Exception as e:
-        logger.error(f"認証エラー: {str(e)}")
-        raise UnauthorizedError(f"認証エラー: {str(e)}")
+        return verify_token(token)
+    except APIError as e:
+        return e
+
+
+def verify_tokens(tokens: List[str], max_workers: int = 8) -> Dict[str, Union[Dict[str, Any], APIError]]:
+    """
+    複数のトークンを並列に検証します。重複したトークンは一度だけ検証されます。
+    
+    Args:
+        tokens: 検証するFirebase IDトークンのリスト
+        max_workers: ワーカースレッドの最大数
+    
+    Returns:
+        トークンからデコードされたトークンまたはAPIエラーへのマッピング
+    """
+    unique_tokens = list(dict.fromkeys(tokens))
+    
+    if len(unique_tokens) == 1:
+        return {unique_tokens[0]: _verify_token_or_error(unique_tokens[0])}
+    
+    # 投入はロック内で行い、検証結果はロックの外で待つ
+    with _batch_executor_lock:
+        executor = _get_batch_executor(max_workers)
+        futures = [executor.submit(_verify_token_or_error, token) for token in unique_tokens]
+    return {token: future.result() for token, future in zip(unique_tokens, futures)}
 
 
 def get_user_id_from_token() -> str:
@@ -147,7 +668,7 @@ def get_user_id_from_token() -> str:
     
     Returns:
         ユーザーID
-        
+    
     Raises:
         UnauthorizedError: ユーザーが認証されていない場合
     """
@@ -166,16 +687,22 @@ def get_user_id_from_token() -> str:
     return user_id
 
 
-def require_role(role: str) -> Callable:
+def require_role(role: Union[str, Policy]) -> Callable:
     """
     特定のロールを持つユーザーのみがアクセスできるようにするデコレータ
     
+    ロール名のほか、`any_role('admin', 'editor') & claim('email_verified', True)` のような
+    ポリシー式を指定できます。ポリシーはデコレーション時に一度だけコンパイルされます。
+    
     Args:
-        role: 必要なロール
-        
+        role: 必要なロール、またはポリシー式
+    
     Returns:
         デコレータ関数
     """
+    policy = any_role(role) if isinstance(role, str) else role
+    compiled = compile_policy(policy)
+    
     def decorator(f: Callable) -> Callable:
         @wraps(f)
         def decorated_function(*args: Any, **kwargs: Any) -> Any:
@@ -184,11 +711,16 @@ def require_role(role: str) -> Callable:
                 logger.warning("認証されていないリクエストでロールチェックが要求されました")
                 raise UnauthorizedError('認証されていません')
             
+            # 正規化されたクレームはリクエスト内で共有する（デコレータを重ねても一度だけ正規化する）
+            normalized = getattr(request, 'normalized_claims', None)
+            if normalized is None:
+                normalized = normalize_claims(request.user, g.get('token_hash'))
+                request.normalized_claims = normalized
+            
             # ユーザーのロールをチェック
-            user_roles = request.user.get('roles', [])
-            if role not in user_roles:
-                logger.warning(f"ユーザーに必要なロール '{role}' がありません")
-                raise ForbiddenError(f"このアクションには '{role}' ロールが必要です")
+            if not compiled.evaluate(normalized):
+                logger.warning(f"ユーザーに必要なロール '{compiled.description}' がありません")
+                raise ForbiddenError(f"このアクションには '{compiled.description}' ロールが必要です")
             
             return f(*args, **kwargs)
         return decorated_function
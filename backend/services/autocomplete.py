@@ -0,0 +1,377 @@
+"""
+表示名オートコンプリートモジュール
+
+PostgreSQLではpg_trgmのGINインデックスで前方一致とあいまい検索を行い、
+SQLiteや開発環境ではソート済み配列と二分探索による前方一致のインデックスを使用します。
+短い前方一致の結果はプロセス内でキャッシュし、表示名の変更時には変更前後の名前の前方一致のみを破棄します。
+"""
+import time
+import bisect
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from flask import Flask
+from sqlalchemy import DDL, Table, event, func
+
+from services.cache import LRUTTLCache
+from services.db_service import db
+from logger import get_logger
+
+# ロガーの取得
+logger = get_logger(__name__)
+
+# 候補の最大件数（AutocompleteQuerySchemaのlimitの上限。キャッシュにはこの件数を保存する）
+MAX_LIMIT = 20
+
+
+def register_autocomplete_ddl(table: Table) -> None:
+    """
+    テーブルの作成時にdisplay_nameのトライグラムインデックスを作成するイベントを登録する（PostgreSQLのみ）
+    
+    Args:
+        table: 対象のテーブル
+    """
+    for statement in (
+        "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+        f"CREATE INDEX IF NOT EXISTS ix_{table.name}_display_name_trgm "
+        f"ON {table.name} USING GIN (lower(display_name) gin_trgm_ops)"
+    ):
+        event.listen(table, 'after_create', DDL(statement).execute_if(dialect='postgresql'))
+
+
+def _escape_like(value: str) -> str:
+    """LIKEパターンの特殊文字をエスケープする"""
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+class PrefixIndex:
+    """
+    表示名のソート済み配列による前方一致インデックス（SQLite・開発環境用）
+    
+    小文字化した表示名でソートし、二分探索で前方一致の範囲を求めます。
+    """
+    
+    def __init__(self) -> None:
+        """インデックスの初期化"""
+        self._keys: List[str] = []
+        self._entries: List[Tuple[str, str]] = []
+        self._names: Dict[str, str] = {}
+    
+    def build(self, rows: List[Tuple[str, str]]) -> None:
+        """
+        インデックスを構築する
+        
+        Args:
+            rows: firebase_uidとdisplay_nameのタプルのリスト
+        """
+        entries = sorted(
+            ((display_name.lower(), firebase_uid, display_name) for firebase_uid, display_name in rows if display_name)
+        )
+        self._keys = [key for key, _, _ in entries]
+        self._entries = [(firebase_uid, display_name) for _, firebase_uid, display_name in entries]
+        self._names = dict(self._entries)
+    
+    def name_of(self, firebase_uid: str) -> Optional[str]:
+        """インデックスに登録されているユーザーの表示名を返す"""
+        return self._names.get(firebase_uid)
+    
+    def replaced(self, firebase_uid: str, display_name: Optional[str]) -> 'PrefixIndex':
+        """
+        ユーザーの表示名を置き換えたインデックスを返す
+        
+        検索中のスレッドが古いインデックスを参照し続けられるよう、自身は変更せずに新しいインデックスを作成します。
+        
+        Args:
+            firebase_uid: ユーザーID
+            display_name: 新しい表示名（削除された場合はNone）
+        
+        Returns:
+            新しいインデックス
+        """
+        keys = list(self._keys)
+        entries = list(self._entries)
+        
+        old_name = self._names.get(firebase_uid)
+        if old_name is not None:
+            index = bisect.bisect_left(keys, old_name.lower())
+            while entries[index][0] != firebase_uid:
+                index += 1
+            del keys[index], entries[index]
+        
+        if display_name:
+            key = display_name.lower()
+            index = bisect.bisect_left(keys, key)
+            while index < len(keys) and keys[index] == key and entries[index][0] < firebase_uid:
+                index += 1
+            keys.insert(index, key)
+            entries.insert(index, (firebase_uid, display_name))
+        
+        replaced = PrefixIndex()
+        replaced._keys = keys
+        replaced._entries = entries
+        replaced._names = dict(entries)
+        return replaced
+    
+    def search(self, prefix: str, limit: int) -> List[Dict[str, str]]:
+        """
+        表示名が前方一致するユーザーを返す
+        
+        Args:
+            prefix: 前方一致させる文字列
+            limit: 最大件数
+        
+        Returns:
+            firebase_uidとdisplay_nameの辞書のリスト
+        """
+        prefix = prefix.lower()
+        start = bisect.bisect_left(self._keys, prefix)
+        results = []
+        for index in range(start, min(start + limit, len(self._keys))):
+            if not self._keys[index].startswith(prefix):
+                break
+            firebase_uid, display_name = self._entries[index]
+            results.append({'firebase_uid': firebase_uid, 'display_name': display_name})
+        return results
+    
+    def __len__(self) -> int:
+        return len(self._keys)
+
+
+class ProfileAutocomplete:
+    """表示名のオートコンプリート"""
+    
+    def __init__(self) -> None:
+        """オートコンプリートの初期化（init_autocompleteで設定される）"""
+        self.cache = LRUTTLCache(max_size=10000)
+        self.cache_ttl = 30
+        self.cache_prefix_length = 3
+        self.index_ttl = 60
+        self._index = PrefixIndex()
+        self._index_built_at: Optional[float] = None
+        self._index_lock = threading.Lock()
+        # フォールバックインデックスへの変更（表示名の変更・破棄）の回数（非同期の再構築で変更を失わないため）
+        self._index_generation = 0
+    
+    def configure(
+        self,
+        cache_size: int,
+        cache_ttl: int,
+        cache_prefix_length: int,
+        index_ttl: int
+    ) -> None:
+        """
+        オートコンプリートを設定する
+        
+        Args:
+            cache_size: 前方一致キャッシュの最大エントリ数
+            cache_ttl: 前方一致キャッシュの有効期間（秒）
+            cache_prefix_length: キャッシュする前方一致の最大文字数
+            index_ttl: フォールバックインデックスを再構築する間隔（秒）
+        """
+        self.cache = LRUTTLCache(max_size=cache_size)
+        self.cache_ttl = cache_ttl
+        self.cache_prefix_length = cache_prefix_length
+        self.index_ttl = index_ttl
+        self.invalidate()
+    
+    def invalidate(self) -> None:
+        """キャッシュとフォールバックインデックスをすべて破棄する"""
+        self.cache.clear()
+        with self._index_lock:
+            self._index_built_at = None
+            self._index_generation += 1
+    
+    def update_name(self, firebase_uid: str, display_name: Optional[str]) -> None:
+        """
+        表示名の変更を反映する
+        
+        変更前と変更後の表示名の前方一致のキャッシュのみを破棄し、フォールバックインデックスの
+        該当ユーザーのエントリを置き換えます（キャッシュ全体の破棄やインデックスの再構築は行いません）。
+        変更前の表示名はフォールバックインデックスから取得するため、PostgreSQLでは変更前の名前の
+        キャッシュが最大でキャッシュの有効期間（AUTOCOMPLETE_CACHE_TTL）だけ残ります。
+        
+        Args:
+            firebase_uid: ユーザーID
+            display_name: 新しい表示名（プロフィールが削除された場合はNone）
+        """
+        with self._index_lock:
+            old_name = self._index.name_of(firebase_uid)
+            if self._index_built_at is not None:
+                self._index = self._index.replaced(firebase_uid, display_name)
+            self._index_generation += 1
+        
+        for name in (old_name, display_name):
+            if not name:
+                continue
+            name = name.strip().lower()
+            for length in range(1, self.cache_prefix_length + 1):
+                self.cache.delete(name[:length])
+    
+    def suggest(self, q: str, limit: int = 8) -> List[Dict[str, Any]]:
+        """
+        表示名の候補を返す
+        
+        Args:
+            q: 入力中の文字列
+            limit: 最大件数
+        
+        Returns:
+            firebase_uidとdisplay_nameの辞書のリスト
+        """
+        prefix = q.strip().lower()
+        if not prefix:
+            return []
+        
+        cached = self._cached(prefix, limit)
+        if cached is not None:
+            return cached
+        
+        fetch_limit = self._fetch_limit(prefix, limit)
+        if db.engine.dialect.name == 'postgresql':
+            results = self._results(db.session.execute(self._trigram_statement(prefix, fetch_limit)))
+        else:
+            if self._index_stale():
+                with self._index_lock:
+                    if self._index_stale():
+                        self._install_index(self._build_index(db.session.execute(self._index_statement())))
+            results = self._index.search(prefix, fetch_limit)
+        
+        self._store(prefix, results)
+        return results[:limit]
+    
+    async def suggest_async(self, session: Any, q: str, limit: int = 8) -> List[Dict[str, Any]]:
+        """
+        suggestの非同期版（ASGIモード用）
+        
+        Args:
+            session: 非同期セッション
+            q: 入力中の文字列
+            limit: 最大件数
+        
+        Returns:
+            firebase_uidとdisplay_nameの辞書のリスト
+        """
+        prefix = q.strip().lower()
+        if not prefix:
+            return []
+        
+        cached = self._cached(prefix, limit)
+        if cached is not None:
+            return cached
+        
+        fetch_limit = self._fetch_limit(prefix, limit)
+        if session.bind.dialect.name == 'postgresql':
+            results = self._results(await session.execute(self._trigram_statement(prefix, fetch_limit)))
+        else:
+            if self._index_stale():
+                # ロックを保持したままawaitできないため、先に問い合わせてからsuggestと同様にロック内で確認して差し替える
+                # （問い合わせ中に表示名が変更された場合は、変更を失わないよう差し替えずに次回再構築する）
+                generation = self._index_generation
+                index = self._build_index(await session.execute(self._index_statement()))
+                with self._index_lock:
+                    if self._index_stale() and self._index_generation == generation:
+                        self._install_index(index)
+            results = self._index.search(prefix, fetch_limit)
+        
+        self._store(prefix, results)
+        return results[:limit]
+    
+    def _cacheable(self, prefix: str) -> bool:
+        return len(prefix) <= self.cache_prefix_length
+    
+    def _fetch_limit(self, prefix: str, limit: int) -> int:
+        """取得する件数（キャッシュする前方一致では、limitに関係なく同じエントリを使えるよう最大件数を取得する）"""
+        return MAX_LIMIT if self._cacheable(prefix) else limit
+    
+    def _cached(self, prefix: str, limit: int) -> Optional[List[Dict[str, Any]]]:
+        """短い前方一致のキャッシュされた候補を返す"""
+        if not self._cacheable(prefix):
+            return None
+        results = self.cache.get(prefix)
+        return results[:limit] if results is not None else None
+    
+    def _store(self, prefix: str, results: List[Dict[str, Any]]) -> None:
+        """短い前方一致の候補をキャッシュする（キーは前方一致の文字列）"""
+        if self._cacheable(prefix):
+            self.cache.set(prefix, results, time.time() + self.cache_ttl)
+    
+    @staticmethod
+    def _trigram_statement(prefix: str, limit: int) -> Any:
+        """pg_trgmのインデックスで前方一致を優先し、類似度の高い順に返すSELECT文"""
+        from models.user_profile import UserProfile
+        
+        name = func.lower(UserProfile.display_name)
+        is_prefix = name.like(_escape_like(prefix) + '%', escape='\\')
+        # 短い文字列ではトライグラムの類似度が意味を持たないため前方一致のみとする
+        condition = is_prefix
+        if len(prefix) >= 3:
+            # %演算子（pg_trgm.similarity_thresholdを超える類似度）はGINインデックスを使用できる
+            condition = is_prefix | name.op('%')(prefix)
+        
+        return (
+            db.select(UserProfile.firebase_uid, UserProfile.display_name)
+            .where(condition)
+            .order_by(is_prefix.desc(), func.similarity(name, prefix).desc(), UserProfile.display_name)
+            .limit(limit)
+        )
+    
+    @staticmethod
+    def _results(rows: Any) -> List[Dict[str, Any]]:
+        return [{'firebase_uid': row.firebase_uid, 'display_name': row.display_name} for row in rows]
+    
+    def _index_stale(self) -> bool:
+        """フォールバックインデックスの再構築が必要かどうか"""
+        built_at = self._index_built_at
+        return built_at is None or time.time() - built_at > self.index_ttl
+    
+    @staticmethod
+    def _index_statement() -> Any:
+        """フォールバックインデックスを構築するためのSELECT文"""
+        from models.user_profile import UserProfile
+        
+        return (
+            db.select(UserProfile.firebase_uid, UserProfile.display_name)
+            .where(UserProfile.display_name.isnot(None))
+        )
+    
+    @staticmethod
+    def _build_index(rows: Any) -> PrefixIndex:
+        """問い合わせ結果からフォールバックインデックスを構築する"""
+        index = PrefixIndex()
+        index.build([tuple(row) for row in rows])
+        return index
+    
+    def _install_index(self, index: PrefixIndex) -> None:
+        """フォールバックインデックスを差し替える（_index_lockを保持して呼び出す）"""
+        self._index = index
+        self._index_built_at = time.time()
+        logger.debug(f"オートコンプリートのインデックスを再構築しました: {len(index)}件")
+    
+    def stats(self) -> Dict[str, Any]:
+        """
+        統計情報を返す
+        
+        Returns:
+            前方一致キャッシュの統計情報とフォールバックインデックスの件数を含む辞書
+        """
+        return {'prefix_cache': self.cache.stats(), 'fallback_index_size': len(self._index)}
+
+
+# 表示名のオートコンプリート
+autocomplete = ProfileAutocomplete()
+
+
+def init_autocomplete(app: Flask) -> None:
+    """
+    アプリケーション設定に基づいてオートコンプリートを初期化する
+    
+    Args:
+        app: Flaskアプリケーションインスタンス
+    """
+    config = app.config
+    autocomplete.configure(
+        cache_size=config.get('AUTOCOMPLETE_CACHE_SIZE', 10000),
+        cache_ttl=config.get('AUTOCOMPLETE_CACHE_TTL', 30),
+        cache_prefix_length=config.get('AUTOCOMPLETE_CACHE_PREFIX_LENGTH', 3),
+        index_ttl=config.get('AUTOCOMPLETE_INDEX_TTL', 60)
+    )
@@ -0,0 +1,411 @@
+"""
+一括インポート・エクスポートモジュール
+
+PostgreSQLではpsycopg 3のCOPY API（COPY FROM/TO STDIN/STDOUT）でCSV・バイナリ形式のファイルを
+ストリーミングし、SQLiteではCSVをチャンク単位のexecutemanyで処理します。
+"""
+import io
+import csv
+import os
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, IO, Iterator, List, Optional, Sequence
+
+from sqlalchemy import Integer, DateTime, Table
+
+from services.db_service import db, dialect_insert
+from logger import get_logger
+
+# ロガーの取得
+logger = get_logger(__name__)
+
+# 対応するファイル形式
+FORMATS = ('csv', 'binary')
+
+# 一意制約の競合時の動作（error: エラー、skip: 既存の行を残す、update: 既存の行を更新する）
+CONFLICT_ACTIONS = ('error', 'skip', 'update')
+
+# COPYでファイルを読み込む単位（バイト）
+COPY_BLOCK_SIZE = 1024 * 1024
+
+# 進捗の通知関数の型（処理済みバイト数、総バイト数（不明な場合はNone））
+ProgressCallback = Callable[[int, Optional[int]], None]
+
+
+class BulkIOError(Exception):
+    """一括インポート・エクスポートのエラー"""
+
+
+def _resolve_columns(table: Table, columns: Optional[Sequence[str]]) -> List[str]:
+    """列名を検証して返す（省略時はテーブルのすべての列）"""
+    if not columns:
+        return [column.name for column in table.columns]
+    
+    unknown = [column for column in columns if column not in table.c]
+    if unknown:
+        raise BulkIOError(f"テーブルに存在しない列です: {', '.join(unknown)}")
+    return list(columns)
+
+
+def _quote(name: str) -> str:
+    """識別子を引用符で囲む"""
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _notify(progress: Optional[ProgressCallback], processed: int, total: Optional[int]) -> None:
+    if progress is not None:
+        progress(processed, total)
+
+
+def _is_postgresql() -> bool:
+    return db.engine.dialect.name == 'postgresql'
+
+
+def import_file(
+    table: Table,
+    path: str,
+    file_format: str = 'csv',
+    conflict_columns: Sequence[str] = ('firebase_uid',),
+    on_conflict: str = 'error',
+    columns: Optional[Sequence[str]] = None,
+    batch_size: int = 5000,
+    progress: Optional[ProgressCallback] = None
+) -> Dict[str, Any]:
+    """
+    ファイルからテーブルに行を一括で読み込む
+    
+    CSVファイルは1行目のヘッダーで列を指定します。バイナリ形式（PostgreSQLのみ）は
+    columns（省略時はテーブルのすべての列）の順序で読み込みます。
+    
+    Args:
+        table: 読み込み先のテーブル
+        path: 読み込むファイルのパス
+        file_format: ファイル形式（csvまたはbinary）
+        conflict_columns: 一意制約の列名
+        on_conflict: 一意制約の競合時の動作（error、skip、update）
+        columns: バイナリ形式の列の順序
+        batch_size: SQLiteで1回のexecutemanyに含める行数
+        progress: 進捗の通知関数
+    
+    Returns:
+        読み込んだ行数（rows）と処理時間（seconds）の辞書
+    
+    Raises:
+        BulkIOError: 形式・列・競合時の動作の指定が不正な場合
+    """
+    if file_format not in FORMATS:
+        raise BulkIOError(f"対応していないファイル形式です: {file_format}")
+    if on_conflict not in CONFLICT_ACTIONS:
+        raise BulkIOError(f"対応していない競合時の動作です: {on_conflict}")
+    
+    started = time.perf_counter()
+    total = os.path.getsize(path)
+    
+    with open(path, 'rb') as f:
+        if _is_postgresql():
+            rows = _copy_from(table, f, total, file_format, conflict_columns, on_conflict, columns, progress)
+        elif file_format == 'csv':
+            rows = _executemany_from(table, f, total, conflict_columns, on_conflict, batch_size, progress)
+        else:
+            raise BulkIOError("バイナリ形式はPostgreSQLでのみ使用できます")
+    
+    seconds = time.perf_counter() - started
+    logger.info(f"{table.name}に{rows}行をインポートしました（{seconds:.1f}秒）")
+    return {'rows': rows, 'seconds': seconds}
+
+
+def export_file(
+    table: Table,
+    path: str,
+    file_format: str = 'csv',
+    columns: Optional[Sequence[str]] = None,
+    batch_size: int = 5000,
+    progress: Optional[ProgressCallback] = None
+) -> Dict[str, Any]:
+    """
+    テーブルの行をid順にファイルへ一括で書き出す
+    
+    Args:
+        table: 書き出すテーブル
+        path: 書き出し先のファイルのパス
+        file_format: ファイル形式（csvまたはbinary）
+        columns: 書き出す列（省略時はテーブルのすべての列）
+        batch_size: SQLiteで一度に読み込む行数
+        progress: 進捗の通知関数
+    
+    Returns:
+        書き出した行数（rows）と処理時間（seconds）の辞書
+    
+    Raises:
+        BulkIOError: 形式・列の指定が不正な場合
+    """
+    if file_format not in FORMATS:
+        raise BulkIOError(f"対応していないファイル形式です: {file_format}")
+    
+    column_names = _resolve_columns(table, columns)
+    started = time.perf_counter()
+    
+    if not _is_postgresql() and file_format != 'csv':
+        raise BulkIOError("バイナリ形式はPostgreSQLでのみ使用できます")
+    
+    with open(path, 'wb') as f:
+        if _is_postgresql():
+            rows = _copy_to(table, f, file_format, column_names, progress)
+        else:
+            rows = _select_to_csv(table, f, column_names, batch_size, progress)
+    
+    seconds = time.perf_counter() - started
+    logger.info(f"{table.name}から{rows}行をエクスポートしました（{seconds:.1f}秒）")
+    return {'rows': rows, 'seconds': seconds}
+
+
+def _copy_options(file_format: str) -> str:
+    return 'FORMAT binary' if file_format == 'binary' else 'FORMAT csv'
+
+
+def _read_csv_header(f: IO[bytes], table: Table) -> List[str]:
+    """CSVファイルのヘッダー行を読み込み、列名を返す"""
+    header = f.readline().decode('utf-8-sig')
+    columns = next(csv.reader([header]), [])
+    if not columns:
+        raise BulkIOError("CSVファイルにヘッダー行がありません")
+    return _resolve_columns(table, [column.strip() for column in columns])
+
+
+def _python_defaults(table: Table, column_names: Sequence[str]) -> Dict[str, Any]:
+    """
+    ファイルに含まれない列のうち、Python側のデフォルト値（datetime.utcnowなど）を持つ列の値を返す
+    
+    COPYではPython側のデフォルト値が適用されないため、これらの値をINSERT ... SELECTで補います。
+    """
+    defaults: Dict[str, Any] = {}
+    for column in table.columns:
+        if column.name in column_names or column.default is None:
+            continue
+        if column.default.is_callable:
+            defaults[column.name] = column.default.arg(None)
+        elif column.default.is_scalar:
+            defaults[column.name] = column.default.arg
+    return defaults
+
+
+def _copy_from(
+    table: Table,
+    f: IO[bytes],
+    total: int,
+    file_format: str,
+    conflict_columns: Sequence[str],
+    on_conflict: str,
+    columns: Optional[Sequence[str]],
+    progress: Optional[ProgressCallback]
+) -> int:
+    """PostgreSQLのCOPY FROM STDINでファイルを読み込む"""
+    if file_format == 'csv':
+        column_names = _read_csv_header(f, table)
+    else:
+        column_names = _resolve_columns(table, columns)
+    
+    column_list = ', '.join(_quote(column) for column in column_names)
+    target = _quote(table.name)
+    defaults = _python_defaults(table, column_names)
+    
+    raw_connection = db.engine.raw_connection()
+    try:
+        connection = raw_connection.driver_connection
+        with connection.cursor() as cursor:
+            staged = on_conflict != 'error' or bool(defaults)
+            if staged:
+                # COPYはON CONFLICTとPython側のデフォルト値に対応していないため、一時テーブルに読み込んでからINSERTする
+                staging = _quote(f"{table.name}_import")
+                cursor.execute(
+                    f"CREATE TEMP TABLE {staging} (LIKE {target} INCLUDING DEFAULTS) ON COMMIT DROP"
+                )
+                copy_target = staging
+            else:
+                copy_target = target
+            
+            with cursor.copy(f"COPY {copy_target} ({column_list}) FROM STDIN WITH ({_copy_options(file_format)})") as copy:
+                while True:
+                    block = f.read(COPY_BLOCK_SIZE)
+                    if not block:
+                        break
+                    copy.write(block)
+                    _notify(progress, f.tell(), total)
+            rows = cursor.rowcount
+            
+            if staged:
+                conflict = ''
+                if on_conflict != 'error':
+                    conflict_list = ', '.join(_quote(column) for column in conflict_columns)
+                    if on_conflict == 'skip':
+                        action = 'DO NOTHING'
+                    else:
+                        updates = [
+                            column for column in column_names
+                            if column not in conflict_columns and column != 'id'
+                        ]
+                        action = 'DO UPDATE SET ' + ', '.join(
+                            f"{_quote(column)} = EXCLUDED.{_quote(column)}" for column in updates
+                        ) if updates else 'DO NOTHING'
+                    conflict = f" ON CONFLICT ({conflict_list}) {action}"
+                # ファイルに含まれないcreated_at・updated_atなどはexecutemanyと同じくPython側のデフォルト値で補う
+                insert_list = ', '.join(_quote(column) for column in [*column_names, *defaults])
+                select_list = ', '.join([column_list, *('%s' for _ in defaults)])
+                cursor.execute(
+                    f"INSERT INTO {target} ({insert_list}) SELECT {select_list} FROM {copy_target}{conflict}",
+                    list(defaults.values())
+                )
+                rows = cursor.rowcount
+            
+            if 'id' in column_names:
+                # 明示的なidを読み込んだ場合は、以降のINSERTと衝突しないようにシーケンスを進める
+                cursor.execute(
+                    f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), "
+                    f"COALESCE((SELECT MAX(id) FROM {target}), 1))"
+                )
+        connection.commit()
+    except Exception:
+        raw_connection.rollback()
+        raise
+    finally:
+        raw_connection.close()
+    
+    return rows
+
+
+def _copy_to(
+    table: Table,
+    f: IO[bytes],
+    file_format: str,
+    column_names: List[str],
+    progress: Optional[ProgressCallback]
+) -> int:
+    """PostgreSQLのCOPY TO STDOUTでファイルに書き出す"""
+    column_list = ', '.join(_quote(column) for column in column_names)
+    options = _copy_options(file_format)
+    if file_format == 'csv':
+        options += ', HEADER true'
+    
+    raw_connection = db.engine.raw_connection()
+    try:
+        with raw_connection.driver_connection.cursor() as cursor:
+            query = f"COPY (SELECT {column_list} FROM {_quote(table.name)} ORDER BY id) TO STDOUT WITH ({options})"
+            with cursor.copy(query) as copy:
+                written = 0
+                for block in copy:
+                    f.write(block)
+                    written += len(block)
+                    _notify(progress, written, None)
+            rows = cursor.rowcount
+        raw_connection.rollback()
+    finally:
+        raw_connection.close()
+    
+    return rows
+
+
+def _converters(table: Table, column_names: List[str]) -> List[Callable[[str], Any]]:
+    """CSVの文字列を列の型に変換する関数のリストを返す（空文字列はNULLとして扱う）"""
+    def convert(column_type: Any) -> Callable[[str], Any]:
+        if isinstance(column_type, Integer):
+            return lambda value: int(value) if value != '' else None
+        if isinstance(column_type, DateTime):
+            return lambda value: datetime.fromisoformat(value) if value != '' else None
+        return lambda value: value if value != '' else None
+    
+    return [convert(table.c[column].type) for column in column_names]
+
+
+def _read_csv_chunks(
+    table: Table,
+    f: IO[bytes],
+    batch_size: int
+) -> Iterator[List[Dict[str, Any]]]:
+    """CSVファイルを読み込み、列の型に変換した行をチャンク単位で返す"""
+    text = io.TextIOWrapper(f, encoding='utf-8-sig', newline='')
+    reader = csv.reader(text)
+    header = next(reader, [])
+    if not header:
+        raise BulkIOError("CSVファイルにヘッダー行がありません")
+    column_names = _resolve_columns(table, [column.strip() for column in header])
+    converters = _converters(table, column_names)
+    
+    chunk: List[Dict[str, Any]] = []
+    for record in reader:
+        chunk.append({
+            column: converter(value)
+            for column, converter, value in zip(column_names, converters, record)
+        })
+        if len(chunk) >= batch_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+    text.detach()
+
+
+def _executemany_from(
+    table: Table,
+    f: IO[bytes],
+    total: int,
+    conflict_columns: Sequence[str],
+    on_conflict: str,
+    batch_size: int,
+    progress: Optional[ProgressCallback]
+) -> int:
+    """SQLiteでCSVファイルをチャンク単位のexecutemanyで読み込む"""
+    rows = 0
+    for chunk in _read_csv_chunks(table, f, batch_size):
+        stmt = dialect_insert(table)
+        if on_conflict == 'skip':
+            stmt = stmt.on_conflict_do_nothing(index_elements=list(conflict_columns))
+        elif on_conflict == 'update':
+            updates = [column for column in chunk[0] if column not in conflict_columns and column != 'id']
+            if updates:
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=list(conflict_columns),
+                    set_={column: stmt.excluded[column] for column in updates}
+                )
+            else:
+                stmt = stmt.on_conflict_do_nothing(index_elements=list(conflict_columns))
+        
+        try:
+            db.session.execute(stmt, chunk)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        
+        rows += len(chunk)
+        _notify(progress, f.tell(), total)
+    
+    return rows
+
+
+def _select_to_csv(
+    table: Table,
+    f: IO[bytes],
+    column_names: List[str],
+    batch_size: int,
+    progress: Optional[ProgressCallback]
+) -> int:
+    """SQLiteでテーブルをid順に読み込み、CSVに書き出す"""
+    text = io.TextIOWrapper(f, encoding='utf-8', newline='')
+    writer = csv.writer(text)
+    writer.writerow(column_names)
+    
+    stmt = db.select(*(table.c[column] for column in column_names)).order_by(table.c.id)
+    rows = 0
+    result = db.session.execute(stmt.execution_options(yield_per=batch_size))
+    for partition in result.partitions():
+        writer.writerows(
+            [value.isoformat(sep=' ') if isinstance(value, datetime) else value for value in row]
+            for row in partition
+        )
+        rows += len(partition)
+        text.flush()
+        _notify(progress, f.tell(), None)
+    
+    text.detach()
+    db.session.rollback()
+    return rows
@@ -0,0 +1,144 @@
+"""
+インプロセスキャッシュモジュール
+"""
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+class LRUTTLCache:
+    """
+    エントリごとの有効期限とLRU退避を備えたスレッドセーフなキャッシュ
+
+    各エントリは登録時に指定された有効期限（UNIXエポック秒）まで有効です。
+    サイズ上限を超えた場合は最も長く参照されていないエントリから退避します。
+    """
+
+    def __init__(self, max_size: int = 1024, clock: Callable[[], float] = time.time) -> None:
+        """
+        キャッシュの初期化
+
+        Args:
+            max_size: 保持するエントリの最大数（0以下の場合はキャッシュ無効）
+            clock: 現在時刻を返す関数（テスト用に差し替え可能）
+        """
+        self.max_size = max_size
+        self._clock = clock
+        self._entries: 'OrderedDict[Hashable, tuple[float, Any]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """
+        キーに対応する値を取得する
+
+        Args:
+            key: キャッシュキー
+
+        Returns:
+            有効な値、または存在しない・期限切れの場合はNone
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, value = entry
+            if expires_at <= self._clock():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(
+        self,
+        key: Hashable,
+        value: Any,
+        expires_at: float,
+        replace: Optional[Callable[[Any], bool]] = None
+    ) -> None:
+        """
+        値をキャッシュに登録する
+
+        Args:
+            key: キャッシュキー
+            value: 登録する値
+            expires_at: 有効期限（UNIXエポック秒）
+            replace: 有効な既存の値を受け取り、置き換えてよいかどうかを返す関数（省略時は常に置き換える）。
+                     判定と登録はロック内で行うため、並行する登録と競合しません。
+        """
+        if self.max_size <= 0 or expires_at <= self._clock():
+            return
+
+        with self._lock:
+            if replace is not None:
+                entry = self._entries.get(key)
+                if entry is not None and entry[0] > self._clock() and not replace(entry[1]):
+                    return
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: Hashable) -> None:
+        """
+        キーに対応するエントリを削除する
+
+        Args:
+            key: キャッシュキー
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        """すべてのエントリと統計情報をクリアする"""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+            self.expirations = 0
+
+    def _purge_expired(self) -> None:
+        """期限切れのエントリを削除する（self._lockを保持して呼び出す）"""
+        now = self._clock()
+        expired = [key for key, (expires_at, _) in self._entries.items() if expires_at <= now]
+        for key in expired:
+            del self._entries[key]
+        self.expirations += len(expired)
+
+    def __len__(self) -> int:
+        """有効なエントリの数を返す（期限切れで未削除のエントリは削除してから数える）"""
+        with self._lock:
+            self._purge_expired()
+            return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        キャッシュの統計情報を返す
+
+        Returns:
+            ヒット数、ミス数、ヒット率などを含む辞書（sizeは期限切れのエントリを除いた数）
+        """
+        with self._lock:
+            self._purge_expired()
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits / lookups) if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations
+            }
@@ -0,0 +1,385 @@
+"""
+レスポンス圧縮モジュール
+
+Accept-Encodingに基づいてレスポンスをgzip（brotli・zstandardがインストールされている場合はbrやzstdも）で圧縮します。
+圧縮レベルはContent-Typeごとに設定でき、設定されていないContent-Typeは圧縮しません。
+COMPRESSION_MIN_SIZE未満の本文は圧縮せず、ジェネレーターによるストリーミングレスポンス（NDJSONなど）は
+本文をバッファリングせずにチャンクごとに圧縮して送信します。
+"""
+import time
+import zlib
+import threading
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from flask import Flask, Response, request
+from werkzeug.http import parse_accept_header
+
+from logger import get_logger
+
+# ロガーの取得
+logger = get_logger(__name__)
+
+
+class _GzipEncoder:
+    """gzipのストリーミングエンコーダー"""
+    
+    def __init__(self, level: int) -> None:
+        self._compressor = zlib.compressobj(min(max(level, 1), 9), zlib.DEFLATED, 31)
+    
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+    
+    def flush(self) -> bytes:
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+    
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+class _BrotliEncoder:
+    """brotliのストリーミングエンコーダー"""
+    
+    def __init__(self, level: int) -> None:
+        import brotli
+        self._compressor = brotli.Compressor(quality=min(max(level, 0), 11))
+    
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+    
+    def flush(self) -> bytes:
+        return self._compressor.flush()
+    
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+
+class _ZstdEncoder:
+    """zstandardのストリーミングエンコーダー"""
+    
+    def __init__(self, level: int) -> None:
+        import zstandard
+        self._flush_block = zstandard.COMPRESSOBJ_FLUSH_BLOCK
+        self._compressor = zstandard.ZstdCompressor(level=min(max(level, 1), 22)).compressobj()
+    
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+    
+    def flush(self) -> bytes:
+        return self._compressor.flush(self._flush_block)
+    
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+# Content-Encodingからエンコーダーと必要なモジュールへのマッピング
+ENCODERS: Dict[str, Tuple[Callable[[int], Any], Optional[str]]] = {
+    'gzip': (_GzipEncoder, None),
+    'br': (_BrotliEncoder, 'brotli'),
+    'zstd': (_ZstdEncoder, 'zstandard'),
+}
+
+
+def available_encodings(preferred: Iterable[str]) -> List[str]:
+    """
+    使用できるContent-Encodingを優先順に返す
+    
+    Args:
+        preferred: サーバーが優先するContent-Encodingのリスト
+    
+    Returns:
+        モジュールがインストールされているContent-Encodingのリスト
+    """
+    encodings = []
+    for encoding in preferred:
+        if encoding not in ENCODERS:
+            logger.warning(f"不明な圧縮方式です: {encoding}")
+            continue
+        module = ENCODERS[encoding][1]
+        if module is not None:
+            try:
+                __import__(module)
+            except ImportError:
+                logger.info(f"{module}がインストールされていないため{encoding}は使用しません")
+                continue
+        encodings.append(encoding)
+    return encodings
+
+
+def parse_levels(value: str) -> Dict[str, int]:
+    """
+    Content-Typeごとの圧縮レベルの設定を解析する
+    
+    Args:
+        value: カンマ区切りの「Content-Type=レベル」（例: application/json=6,text/*=6）
+    
+    Returns:
+        Content-Typeから圧縮レベルへのマッピング
+    
+    Raises:
+        ValueError: 形式が不正な場合
+    """
+    levels = {}
+    for item in value.split(','):
+        if not item.strip():
+            continue
+        mimetype, separator, level = item.partition('=')
+        if not separator:
+            raise ValueError(f"圧縮レベルの設定が不正です: {item}")
+        levels[mimetype.strip().lower()] = int(level)
+    return levels
+
+
+class _EncodingStats:
+    """Content-Encodingごとの統計情報"""
+    
+    def __init__(self) -> None:
+        self.responses = 0
+        self.streamed = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.cpu_seconds = 0.0
+
+
+class Compressor:
+    """レスポンスの圧縮方式の選択と圧縮を行う"""
+    
+    def __init__(self) -> None:
+        """圧縮の初期化（init_compressionで有効化されるまでは圧縮しない）"""
+        self.enabled = False
+        self.min_size = 1024
+        self.flush_size = 16384
+        self.encodings: List[str] = []
+        self.levels: Dict[str, int] = {}
+        self._stats: Dict[str, _EncodingStats] = {}
+        self._lock = threading.Lock()
+        self.skipped_small = 0
+        self.not_accepted = 0
+    
+    def configure(
+        self,
+        enabled: bool,
+        encodings: List[str],
+        levels: Dict[str, int],
+        min_size: int,
+        flush_size: int
+    ) -> None:
+        """
+        圧縮を設定する
+        
+        Args:
+            enabled: 圧縮を有効にするかどうか
+            encodings: 使用するContent-Encoding（サーバーの優先順）
+            levels: Content-Typeから圧縮レベルへのマッピング（type/*も指定可能）
+            min_size: 圧縮する本文の最小バイト数
+            flush_size: ストリーミング時にクライアントへ送信する間隔（圧縮前のバイト数）
+        """
+        self.enabled = enabled
+        self.encodings = list(encodings)
+        self.levels = dict(levels)
+        self.min_size = max(min_size, 0)
+        self.flush_size = max(flush_size, 1)
+        with self._lock:
+            self._stats = {encoding: _EncodingStats() for encoding in self.encodings}
+            self.skipped_small = 0
+            self.not_accepted = 0
+    
+    def level_for(self, mimetype: Optional[str]) -> Optional[int]:
+        """
+        Content-Typeの圧縮レベルを返す
+        
+        Args:
+            mimetype: レスポンスのContent-Type（パラメーターを除く）
+        
+        Returns:
+            圧縮レベル、圧縮しないContent-Typeの場合はNone
+        """
+        if not mimetype:
+            return None
+        mimetype = mimetype.lower()
+        if mimetype in self.levels:
+            return self.levels[mimetype]
+        return self.levels.get(mimetype.split('/', 1)[0] + '/*')
+    
+    def negotiate(self, accept_encoding: Optional[str]) -> Optional[str]:
+        """
+        Accept-Encodingから使用するContent-Encodingを選択する
+        
+        クライアントの品質値が最も高いものを選び、同じ品質値の場合はサーバーの優先順で選びます。
+        
+        Args:
+            accept_encoding: Accept-Encodingヘッダーの値
+        
+        Returns:
+            Content-Encoding、使用できるものがない場合はNone
+        """
+        if not accept_encoding:
+            return None
+        accept = parse_accept_header(accept_encoding)
+        best = None
+        best_quality = 0.0
+        for encoding in self.encodings:
+            quality = accept.quality(encoding)
+            if quality > best_quality:
+                best, best_quality = encoding, quality
+        return best
+    
+    def compress_response(self, response: Response, accept_encoding: Optional[str]) -> Response:
+        """
+        レスポンスを圧縮する（圧縮しない場合はそのまま返す）
+        
+        Args:
+            response: レスポンス
+            accept_encoding: リクエストのAccept-Encodingヘッダーの値
+        
+        Returns:
+            レスポンス
+        """
+        if not self.enabled or response.status_code < 200 or response.status_code in (204, 304):
+            return response
+        if response.direct_passthrough or 'Content-Encoding' in response.headers:
+            return response
+        level = self.level_for(response.mimetype)
+        if level is None:
+            return response
+        
+        # 同じURLでもAccept-Encodingによって本文が異なるため、キャッシュに伝える
+        response.vary.add('Accept-Encoding')
+        if response.cache_control.no_transform:
+            return response
+        
+        encoding = self.negotiate(accept_encoding)
+        if encoding is None:
+            with self._lock:
+                self.not_accepted += 1
+            return response
+        
+        if response.is_streamed:
+            response.response = self._stream(response.response, encoding, level)
+            response.headers.pop('Content-Length', None)
+        else:
+            data = response.get_data()
+            if len(data) < self.min_size:
+                with self._lock:
+                    self.skipped_small += 1
+                return response
+            response.set_data(self._compress(data, encoding, level))
+        
+        response.headers['Content-Encoding'] = encoding
+        # 圧縮した表現は元の表現とバイト単位で異なるため、強いETagは弱いETagにする
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
+    
+    def _compress(self, data: bytes, encoding: str, level: int) -> bytes:
+        """本文全体を圧縮する"""
+        started = time.thread_time()
+        encoder = ENCODERS[encoding][0](level)
+        compressed = encoder.compress(data) + encoder.finish()
+        self._record(encoding, len(data), len(compressed), time.thread_time() - started, streamed=False)
+        return compressed
+    
+    def _stream(self, chunks: Iterable[Any], encoding: str, level: int) -> Iterator[bytes]:
+        """
+        チャンクを順に圧縮して返す
+        
+        圧縮前のバイト数がflush_sizeに達するごとにフラッシュし、受信側が途中までの本文を展開できるようにします。
+        """
+        encoder = ENCODERS[encoding][0](level)
+        bytes_in = bytes_out = pending = 0
+        cpu_seconds = 0.0
+        try:
+            for chunk in chunks:
+                if isinstance(chunk, str):
+                    chunk = chunk.encode('utf-8')
+                started = time.thread_time()
+                output = encoder.compress(chunk)
+                pending += len(chunk)
+                if pending >= self.flush_size:
+                    output += encoder.flush()
+                    pending = 0
+                cpu_seconds += time.thread_time() - started
+                bytes_in += len(chunk)
+                if output:
+                    bytes_out += len(output)
+                    yield output
+            
+            started = time.thread_time()
+            output = encoder.finish()
+            cpu_seconds += time.thread_time() - started
+            bytes_out += len(output)
+            yield output
+        finally:
+            # ジェネレーターの終了時に元のイテラブルを閉じる（stream_with_contextのコンテキストの解放など）
+            close = getattr(chunks, 'close', None)
+            if close is not None:
+                close()
+            self._record(encoding, bytes_in, bytes_out, cpu_seconds, streamed=True)
+    
+    def _record(self, encoding: str, bytes_in: int, bytes_out: int, cpu_seconds: float, streamed: bool) -> None:
+        """圧縮の統計情報を記録する"""
+        with self._lock:
+            stats = self._stats.setdefault(encoding, _EncodingStats())
+            stats.responses += 1
+            stats.streamed += int(streamed)
+            stats.bytes_in += bytes_in
+            stats.bytes_out += bytes_out
+            stats.cpu_seconds += cpu_seconds
+    
+    def stats(self) -> Dict[str, Any]:
+        """
+        統計情報を返す
+        
+        Returns:
+            Content-Encodingごとの圧縮数、圧縮率（圧縮後/圧縮前）、CPU時間などを含む辞書
+        """
+        with self._lock:
+            encodings = {
+                encoding: {
+                    'responses': stats.responses,
+                    'streamed': stats.streamed,
+                    'bytes_in': stats.bytes_in,
+                    'bytes_out': stats.bytes_out,
+                    'ratio': round(stats.bytes_out / stats.bytes_in, 4) if stats.bytes_in else None,
+                    'cpu_ms': round(stats.cpu_seconds * 1000, 3),
+                }
+                for encoding, stats in self._stats.items()
+            }
+            return {
+                'enabled': self.enabled,
+                'min_size': self.min_size,
+                'encodings': encodings,
+                'skipped_small': self.skipped_small,
+                'not_accepted': self.not_accepted,
+            }
+
+
+def _compress_after_request(response: Response) -> Response:
+    """after_requestでレスポンスを圧縮する"""
+    return compressor.compress_response(response, request.headers.get('Accept-Encoding'))
+
+
+def init_compression(app: Flask) -> None:
+    """
+    アプリケーション設定に基づいてレスポンスの圧縮を初期化する
+    
+    Args:
+        app: Flaskアプリケーションインスタンス
+    
+    Raises:
+        ValueError: COMPRESSION_LEVELSの形式が不正な場合
+    """
+    compressor.configure(
+        enabled=app.config.get('COMPRESSION_ENABLED', True),
+        encodings=available_encodings(app.config.get('COMPRESSION_ALGORITHMS', ['zstd', 'br', 'gzip'])),
+        levels=parse_levels(app.config.get('COMPRESSION_LEVELS', '')),
+        min_size=app.config.get('COMPRESSION_MIN_SIZE', 1024),
+        flush_size=app.config.get('COMPRESSION_STREAM_FLUSH_BYTES', 16384)
+    )
+    if compressor.enabled:
+        app.after_request(_compress_after_request)
+        logger.info(f"レスポンスの圧縮が有効になりました（{', '.join(compressor.encodings)}）")
+
+
+# レスポンスの圧縮
+compressor = Compressor()
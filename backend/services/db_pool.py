@@ -0,0 +1,234 @@
+"""
+データベース接続プールモジュール
+
+ワーカー数・スレッド数から接続プールのサイズを算出し、SQLAlchemyのエンジンオプションを組み立てます。
+接続の取得待ち時間とプールの飽和度を計測するQueuePoolのサブクラスを提供します。
+"""
+import time
+import threading
+import weakref
+from typing import Any, Dict, Optional, Type
+
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+
+from logger import get_logger
+
+# ロガーの取得
+logger = get_logger(__name__)
+
+# 遅い接続取得とみなす待ち時間（ミリ秒）
+SLOW_CHECKOUT_MS = 10.0
+
+
+class PoolMetrics:
+    """接続プールの取得待ち時間と飽和度の計測値"""
+    
+    def __init__(self, name: str) -> None:
+        """
+        計測値の初期化
+        
+        Args:
+            name: プールの名前（primary、replicaなど）
+        """
+        self.name = name
+        self.checkouts = 0
+        self.wait_ms_total = 0.0
+        self.wait_ms_max = 0.0
+        self.slow_checkouts = 0
+        self.timeouts = 0
+        self.max_checked_out = 0
+        self._pool: Optional[weakref.ReferenceType] = None
+        self._lock = threading.Lock()
+    
+    def attach(self, pool: QueuePool) -> None:
+        """現在のプールを関連付ける（プールの再作成時にも呼ばれる）"""
+        self._pool = weakref.ref(pool)
+    
+    def record_checkout(self, wait_ms: float, checked_out: int) -> None:
+        """接続の取得を記録する"""
+        with self._lock:
+            self.checkouts += 1
+            self.wait_ms_total += wait_ms
+            if wait_ms > self.wait_ms_max:
+                self.wait_ms_max = wait_ms
+            if wait_ms >= SLOW_CHECKOUT_MS:
+                self.slow_checkouts += 1
+            if checked_out > self.max_checked_out:
+                self.max_checked_out = checked_out
+    
+    def record_timeout(self) -> None:
+        """接続の取得のタイムアウトを記録する"""
+        with self._lock:
+            self.timeouts += 1
+    
+    def stats(self) -> Dict[str, Any]:
+        """
+        統計情報を返す
+        
+        Returns:
+            プールの現在の状態と取得待ち時間の統計を含む辞書
+        """
+        stats: Dict[str, Any] = {
+            'checkouts': self.checkouts,
+            'wait_ms_avg': (self.wait_ms_total / self.checkouts) if self.checkouts else 0.0,
+            'wait_ms_max': self.wait_ms_max,
+            'slow_checkouts': self.slow_checkouts,
+            'timeouts': self.timeouts,
+            'max_checked_out': self.max_checked_out
+        }
+        
+        pool = self._pool() if self._pool is not None else None
+        if pool is not None:
+            capacity = pool.size() + max(pool._max_overflow, 0)
+            checked_out = pool.checkedout()
+            stats.update({
+                'pool_size': pool.size(),
+                'max_overflow': pool._max_overflow,
+                'checked_out': checked_out,
+                'overflow': max(pool.overflow(), 0),
+                'saturation': (checked_out / capacity) if capacity > 0 else 0.0
+            })
+        return stats
+
+
+class InstrumentedQueuePool(QueuePool):
+    """接続の取得待ち時間を計測するQueuePool"""
+    
+    metrics: PoolMetrics
+    
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.metrics.attach(self)
+    
+    def _do_get(self) -> Any:
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            self.metrics.record_timeout()
+            raise
+        self.metrics.record_checkout((time.perf_counter() - started) * 1000, self.checkedout())
+        return connection
+
+
+# プール名ごとの計測値
+_pool_metrics: Dict[str, PoolMetrics] = {}
+
+
+def instrumented_pool_class(name: str) -> Type[InstrumentedQueuePool]:
+    """
+    計測値を名前で共有するInstrumentedQueuePoolのサブクラスを返す
+    
+    プールの再作成（dispose、フェイルオーバー後など）でも同じ計測値に記録されます。
+    
+    Args:
+        name: プールの名前
+    
+    Returns:
+        プールクラス
+    """
+    metrics = _pool_metrics.setdefault(name, PoolMetrics(name))
+    return type(f"InstrumentedQueuePool_{name}", (InstrumentedQueuePool,), {'metrics': metrics})
+
+
+def pool_stats() -> Dict[str, Any]:
+    """
+    すべての接続プールの統計情報を返す
+    
+    Returns:
+        プール名から統計情報へのマッピング
+    """
+    return {name: metrics.stats() for name, metrics in _pool_metrics.items()}
+
+
+def pool_sizing(config: Dict[str, Any]) -> Dict[str, int]:
+    """
+    ワーカーあたりの接続プールのサイズを算出する
+    
+    DB_POOL_SIZE・DB_MAX_OVERFLOWが未指定（負の値）の場合はスレッド数から算出します。
+    DB_MAX_CONNECTIONSを指定した場合は、全ワーカーの合計がその値を超えないように制限します。
+    
+    Args:
+        config: アプリケーション設定
+    
+    Returns:
+        pool_sizeとmax_overflowの辞書
+    """
+    threads = max(int(config.get('WORKER_THREADS', 4)), 1)
+    workers = max(int(config.get('WEB_CONCURRENCY', 1)), 1)
+    
+    pool_size = int(config.get('DB_POOL_SIZE', -1))
+    max_overflow = int(config.get('DB_MAX_OVERFLOW', -1))
+    if pool_size < 0:
+        pool_size = threads
+    if max_overflow < 0:
+        max_overflow = max(threads // 2, 1)
+    
+    max_connections = int(config.get('DB_MAX_CONNECTIONS', 0))
+    if max_connections > 0:
+        per_worker = max(max_connections // workers, 1)
+        pool_size = min(pool_size, per_worker)
+        max_overflow = min(max_overflow, per_worker - pool_size)
+    
+    return {'pool_size': pool_size, 'max_overflow': max_overflow}
+
+
+def prepare_threshold(config: Dict[str, Any]) -> Optional[int]:
+    """
+    psycopgのサーバーサイドプリペアドステートメントの閾値を返す
+    
+    同じ文がこの回数実行されると、psycopgは接続ごとに文をPREPAREして以降は実行計画を再利用します。
+    PgBouncerのトランザクションモードでは接続がトランザクションごとに入れ替わり、
+    PREPAREした文が別の接続で見つからなくなるため、DB_PGBOUNCERが有効な場合は無効（None）にします。
+    
+    Args:
+        config: アプリケーション設定
+    
+    Returns:
+        閾値（無効の場合はNone）
+    """
+    if config.get('DB_PGBOUNCER', False):
+        return None
+    threshold = int(config.get('DB_PREPARE_THRESHOLD', 5))
+    return threshold if threshold >= 0 else None
+
+
+def engine_options(
+    config: Dict[str, Any],
+    name: str = 'primary',
+    url: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    PostgreSQL用のSQLAlchemyエンジンオプションを組み立てる
+    
+    Args:
+        config: アプリケーション設定
+        name: プールの名前（メトリクスのキー）
+        url: 接続先のURL（省略時はSQLALCHEMY_DATABASE_URI）
+    
+    Returns:
+        create_engineに渡すオプションの辞書
+    """
+    connect_args: Dict[str, Any] = {}
+    url = url or config.get('SQLALCHEMY_DATABASE_URI')
+    if url and make_url(url).get_driver_name() == 'psycopg':
+        connect_args['prepare_threshold'] = prepare_threshold(config)
+    
+    application_name = config.get('DB_APPLICATION_NAME')
+    if application_name:
+        connect_args['application_name'] = application_name
+    
+    statement_timeout = int(config.get('DB_STATEMENT_TIMEOUT_MS', 0))
+    if statement_timeout > 0:
+        connect_args['options'] = f"-c statement_timeout={statement_timeout}"
+    
+    return {
+        'poolclass': instrumented_pool_class(name),
+        **pool_sizing(config),
+        'pool_timeout': float(config.get('DB_POOL_TIMEOUT', 10)),
+        'pool_recycle': int(config.get('DB_POOL_RECYCLE', 1800)),
+        'pool_pre_ping': bool(config.get('DB_POOL_PRE_PING', True)),
+        'connect_args': connect_args
+    }
@@ -1,16 +1,58 @@
 """
 データベースサービスモジュール
 """
-from typing import Any, Optional, List, Dict, Type
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Iterable, Iterator, Optional, List, Dict, Tuple, Type
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
+from sqlalchemy import select
+from sqlalchemy.engine import Engine
 from flask import Flask
+from services.db_pool import engine_options, pool_stats
+from services.metrics import register_collector
 from logger import get_logger
 
 # ロガーの取得
 logger = get_logger(__name__)
 
+# 読み取り専用の文を送るエンジン（bind_readsの範囲内でのみ設定される）
+_read_engine: ContextVar[Optional[Engine]] = ContextVar('read_engine', default=None)
+
+
+class RoutingSession(Session):
+    """bind_readsの範囲内で実行される読み取りの文を指定されたエンジン（リードレプリカ）に送るセッション"""
+    
+    def get_bind(self, mapper: Any = None, clause: Any = None, bind: Any = None, **kwargs: Any) -> Any:
+        engine = _read_engine.get()
+        if (
+            engine is not None
+            and bind is None
+            and clause is not None
+            and not getattr(clause, 'is_dml', False)
+            and not self._flushing
+        ):
+            return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@contextmanager
+def bind_reads(engine: Engine) -> Iterator[None]:
+    """
+    範囲内の読み取りの文を指定されたエンジンで実行する（書き込みとフラッシュはプライマリのまま）
+    
+    Args:
+        engine: 読み取りに使用するエンジン
+    """
+    token = _read_engine.set(engine)
+    try:
+        yield
+    finally:
+        _read_engine.reset(token)
+
+
 # SQLAlchemyインスタンスを作成
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 def init_db(app: Flask) -> None:
     """
@@ -19,9 +61,18 @@ def init_db(app: Flask) -> None:
     Args:
         app: Flaskアプリケーションインスタンス
     """
-    # 設定はすでにapp.configに適用されているため、
-    # ここではSQLAlchemyの初期化のみを行う
+    # SQLite以外では接続プールの設定を適用する（明示的なSQLALCHEMY_ENGINE_OPTIONSを優先）
+    uri = app.config.get('SQLALCHEMY_DATABASE_URI') or ''
+    if not uri.startswith('sqlite'):
+        options = engine_options(app.config)
+        options.update(app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+        logger.info(
+            f"接続プール: pool_size={options['pool_size']}、max_overflow={options['max_overflow']}"
+        )
+    
     db.init_app(app)
+    register_collector('db_pool', pool_stats)
     logger.info("データベース接続が初期化されました")
 
 def commit_changes() -> bool:
@@ -45,7 +96,7 @@ def add_to_db(model_instance: Any) -> bool:
     
     Args:
         model_instance: 追加するモデルインスタンス
-        
+    
     Returns:
         bool: 追加が成功したかどうか
     """
@@ -62,7 +113,7 @@ def delete_from_db(model_instance: Any) -> bool:
     
     Args:
         model_instance: 削除するモデルインスタンス
-        
+    
     Returns:
         bool: 削除が成功したかどうか
     """
@@ -72,3 +123,153 @@ def delete_from_db(model_instance: Any) -> bool:
     except Exception as e:
         logger.error(f"データベース削除エラー: {str(e)}")
         return False
+
+def dialect_insert(table: Any, dialect_name: Optional[str] = None) -> Any:
+    """
+    接続先のデータベースに対応したINSERT文（ON CONFLICT句をサポートするもの）を作成する
+    
+    Args:
+        table: 挿入先のテーブル
+        dialect_name: データベースの方言名（省略時はFlask-SQLAlchemyのエンジンの方言）
+    
+    Returns:
+        PostgreSQLまたはSQLite方言のInsertオブジェクト
+    
+    Raises:
+        NotImplementedError: ON CONFLICT句に対応していないデータベースの場合
+    """
+    dialect_name = dialect_name or db.engine.dialect.name
+    if dialect_name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect_name == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise NotImplementedError(f"ON CONFLICT句に対応していないデータベースです: {dialect_name}")
+    return insert(table)
+
+def upsert_statement(
+    table: Any,
+    values: Dict[str, Any],
+    conflict_columns: List[str],
+    update_values: Dict[str, Any],
+    dialect_name: Optional[str] = None
+) -> Any:
+    """
+    INSERT ... ON CONFLICT DO UPDATE ... RETURNINGの文を作成する（upsertと非同期版で共有する）
+    
+    Args:
+        table: 挿入先のテーブル
+        values: 挿入する値の辞書
+        conflict_columns: 一意制約の列名のリスト
+        update_values: 競合時に更新する値の辞書
+        dialect_name: データベースの方言名（省略時はFlask-SQLAlchemyのエンジンの方言）
+    
+    Returns:
+        挿入または更新された行のすべての列を返す文
+    """
+    stmt = dialect_insert(table, dialect_name).values(**values)
+    return stmt.on_conflict_do_update(
+        index_elements=conflict_columns,
+        set_=update_values
+    ).returning(*table.columns)
+
+def insert_or_select_statements(
+    table: Any,
+    values: Dict[str, Any],
+    conflict_columns: List[str],
+    columns: Optional[Iterable[str]] = None,
+    dialect_name: Optional[str] = None
+) -> Tuple[Any, Any]:
+    """
+    INSERT ... ON CONFLICT DO NOTHING RETURNINGの文と、競合した場合に既存の行を取得する文を作成する
+    （insert_or_selectと非同期版で共有する）
+    
+    Args:
+        table: 挿入先のテーブル
+        values: 挿入する値の辞書（conflict_columnsの値を含む）
+        conflict_columns: 一意制約の列名のリスト
+        columns: 返す列名（省略時はすべての列）
+        dialect_name: データベースの方言名（省略時はFlask-SQLAlchemyのエンジンの方言）
+    
+    Returns:
+        INSERT文とSELECT文のタプル
+    """
+    returning = [table.c[column] for column in columns] if columns else list(table.columns)
+    stmt = dialect_insert(table, dialect_name).values(**values)
+    stmt = stmt.on_conflict_do_nothing(index_elements=conflict_columns).returning(*returning)
+    lookup = select(*returning).where(
+        *(table.c[column] == values[column] for column in conflict_columns)
+    )
+    return stmt, lookup
+
+def upsert(
+    model: Type[Any],
+    values: Dict[str, Any],
+    conflict_columns: List[str],
+    update_values: Dict[str, Any]
+) -> Optional[Dict[str, Any]]:
+    """
+    INSERT ... ON CONFLICT DO UPDATE ... RETURNINGを1つの文で実行し、コミットする
+    
+    Args:
+        model: 対象のモデルクラス
+        values: 挿入する値の辞書
+        conflict_columns: 一意制約の列名のリスト
+        update_values: 競合時に更新する値の辞書
+    
+    Returns:
+        挿入または更新された行の辞書、失敗した場合はNone
+    """
+    stmt = upsert_statement(model.__table__, values, conflict_columns, update_values)
+    
+    try:
+        row = db.session.execute(stmt).mappings().one()
+        db.session.commit()
+        return dict(row)
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"データベースアップサートエラー: {str(e)}")
+        return None
+
+def insert_or_select(
+    model: Type[Any],
+    values: Dict[str, Any],
+    conflict_columns: List[str],
+    columns: Optional[Iterable[str]] = None
+) -> Optional[Tuple[Dict[str, Any], bool]]:
+    """
+    INSERT ... ON CONFLICT DO NOTHING RETURNINGで行を作成し、競合した場合は既存の行を取得する
+    
+    行が存在しない一般的なケースでは1つの文・1つのトランザクションで完了し、
+    同時に作成された場合も一意制約違反にはなりません。
+    
+    Args:
+        model: 対象のモデルクラス
+        values: 挿入する値の辞書（conflict_columnsの値を含む）
+        conflict_columns: 一意制約の列名のリスト
+        columns: 返す列名（省略時はすべての列）
+    
+    Returns:
+        行の辞書と作成されたかどうかのタプル、失敗した場合はNone
+    """
+    stmt, lookup = insert_or_select_statements(model.__table__, values, conflict_columns, columns)
+    
+    try:
+        # 競合後に既存の行が削除された場合に備えて一度だけ再試行する
+        for _ in range(2):
+            row = db.session.execute(stmt).mappings().first()
+            if row is not None:
+                db.session.commit()
+                return dict(row), True
+            
+            row = db.session.execute(lookup).mappings().first()
+            db.session.commit()
+            if row is not None:
+                return dict(row), False
+        
+        logger.error("作成した行を取得できませんでした")
+        return None
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"データベース作成エラー: {str(e)}")
+        return None
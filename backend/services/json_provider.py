@@ -0,0 +1,151 @@
+"""
+JSONエンコーダーモジュール
+
+orjsonがインストールされている場合はorjsonでエンコード・デコードし、ない場合は標準ライブラリのjsonを使用します。
+APIのレスポンス（FastJSONProvider）、JSON形式のログ、共有キャッシュのシリアライズで共通して使用します。
+
+このモジュールはloggerから読み込まれるため、loggerをインポートしないでください。
+"""
+import json
+import uuid
+import decimal
+import dataclasses
+from datetime import date
+from typing import Any, Optional
+
+from flask import Flask, Response
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.http import http_date
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# orjsonのオプション（datetimeは標準ライブラリと同じ形式にするため_defaultに渡し、dictの整数キーを許可する）
+if orjson is not None:
+    ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+    ORJSON_SORTED_OPTIONS = ORJSON_OPTIONS | orjson.OPT_SORT_KEYS
+
+
+def _default(value: Any) -> Any:
+    """JSONで表現できない値を変換する（FlaskのDefaultJSONProviderと同じ変換）"""
+    if isinstance(value, date):
+        return http_date(value)
+    if isinstance(value, (decimal.Decimal, uuid.UUID)):
+        return str(value)
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        return dataclasses.asdict(value)
+    if hasattr(value, '__html__'):
+        return str(value.__html__())
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def is_fast() -> bool:
+    """
+    orjsonを使用しているかどうか
+    
+    Returns:
+        orjsonがインストールされている場合はTrue
+    """
+    return orjson is not None
+
+
+def dumps_bytes(value: Any, sort_keys: bool = False) -> bytes:
+    """
+    値をコンパクトなUTF-8のJSONにエンコードする
+    
+    Args:
+        value: エンコードする値
+        sort_keys: キーをソートするかどうか
+    
+    Returns:
+        JSONのバイト列
+    """
+    if orjson is not None:
+        return orjson.dumps(value, default=_default, option=ORJSON_SORTED_OPTIONS if sort_keys else ORJSON_OPTIONS)
+    return json.dumps(
+        value, default=_default, ensure_ascii=False, separators=(',', ':'), sort_keys=sort_keys
+    ).encode('utf-8')
+
+
+def dumps(value: Any, sort_keys: bool = False) -> str:
+    """
+    値をコンパクトなJSON文字列にエンコードする
+    
+    Args:
+        value: エンコードする値
+        sort_keys: キーをソートするかどうか
+    
+    Returns:
+        JSON文字列
+    """
+    if orjson is not None:
+        return dumps_bytes(value, sort_keys).decode('utf-8')
+    return json.dumps(value, default=_default, ensure_ascii=False, separators=(',', ':'), sort_keys=sort_keys)
+
+
+def loads(data: Any) -> Any:
+    """
+    JSONをデコードする
+    
+    Args:
+        data: JSONの文字列またはバイト列
+    
+    Returns:
+        デコードした値
+    
+    Raises:
+        ValueError: JSONとして不正な場合
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    orjsonでエンコード・デコードするFlaskのJSONプロバイダー
+    
+    jsonifyやrequest.get_jsonから使用されます。orjsonがない場合はDefaultJSONProviderと同じ動作になります。
+    エンコード結果はバイト列のままレスポンスに設定し、文字列への変換を行いません。
+    """
+    
+    # キーのソートはレスポンスごとのコストになるため行わない
+    sort_keys = False
+    
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        if orjson is None or kwargs:
+            kwargs.setdefault('sort_keys', self.sort_keys)
+            return super().dumps(obj, **kwargs)
+        return dumps(obj, self.sort_keys)
+    
+    def loads(self, s: Any, **kwargs: Any) -> Any:
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+    
+    def response(self, *args: Any, **kwargs: Any) -> Response:
+        if orjson is None or self._app.debug:
+            # デバッグ時は読みやすいようにインデントする
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps_bytes(obj, self.sort_keys) + b'\n', mimetype=self.mimetype)
+
+
+def init_json(app: Flask) -> None:
+    """
+    アプリケーション設定に基づいてJSONプロバイダーを設定する
+    
+    JSON_PROVIDERが'fast'（デフォルト）の場合はFastJSONProvider、'default'の場合はFlaskの標準のプロバイダーを使用します。
+    
+    Args:
+        app: Flaskアプリケーションインスタンス
+    """
+    provider: Optional[str] = app.config.get('JSON_PROVIDER', 'fast')
+    if provider == 'fast':
+        app.json = FastJSONProvider(app)
+    elif provider == 'default':
+        app.json = DefaultJSONProvider(app)
+    else:
+        raise ValueError(f"不明なJSON_PROVIDERです: {provider}")
@@ -0,0 +1,46 @@
+"""
+メトリクス収集モジュール
+"""
+import threading
+from typing import Any, Callable, Dict
+
+from logger import get_logger
+
+# ロガーの取得
+logger = get_logger(__name__)
+
+# メトリクス名から収集関数へのマッピング
+_collectors: Dict[str, Callable[[], Any]] = {}
+_collectors_lock = threading.Lock()
+
+
+def register_collector(name: str, collector: Callable[[], Any]) -> None:
+    """
+    メトリクスの収集関数を登録する（同じ名前で登録した場合は置き換える）
+    
+    Args:
+        name: メトリクス名
+        collector: 現在の値を返す関数
+    """
+    with _collectors_lock:
+        _collectors[name] = collector
+
+
+def collect_metrics() -> Dict[str, Any]:
+    """
+    登録されたすべてのメトリクスを収集する
+    
+    Returns:
+        メトリクス名から値へのマッピング
+    """
+    with _collectors_lock:
+        collectors = dict(_collectors)
+    
+    metrics = {}
+    for name, collector in collectors.items():
+        try:
+            metrics[name] = collector()
+        except Exception as e:
+            logger.error(f"メトリクスの収集エラー（{name}）: {str(e)}")
+            metrics[name] = None
+    return metrics
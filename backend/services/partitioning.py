@@ -0,0 +1,159 @@
+"""
+テーブルのハッシュパーティショニングモジュール（PostgreSQLのみ）
+
+DB_HASH_PARTITIONSが1以上の場合、登録されたテーブルをパーティションキーのハッシュで
+分割したパーティションテーブルとして作成します（CREATE TABLE ... PARTITION BY HASH）。
+パーティションキーによる検索は1つのパーティションのみを参照するため、
+テーブルとインデックスが小さく保たれ、VACUUMやキャッシュの効率が向上します。
+
+PostgreSQLでは主キーと一意インデックスにパーティションキーを含める必要があるため、
+パーティションテーブルの主キーは(id, パーティションキー)として作成します。
+ORMのマッピング（主キーはid）は変わらず、idはシーケンスで採番されるため一意のままです。
+"""
+from typing import Any, List, Optional
+
+from flask import Flask
+from sqlalchemy import PrimaryKeyConstraint, Table, event, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.schema import CreateTable
+
+from logger import get_logger
+
+# ロガーの取得
+logger = get_logger(__name__)
+
+# パーティションキーを記録するTable.infoのキー
+PARTITION_KEY_INFO = 'hash_partition_key'
+
+# パーティション数（0の場合はパーティショニングしない。init_partitioningで設定される）
+_partitions = 0
+
+
+def hash_partitions() -> int:
+    """
+    設定されたパーティション数を返す
+    
+    Returns:
+        パーティション数（パーティショニングしない場合は0）
+    """
+    return _partitions
+
+
+def partition_key(table: Table) -> Optional[str]:
+    """
+    テーブルをパーティショニングする場合はパーティションキーを返す
+    
+    Args:
+        table: テーブル
+    
+    Returns:
+        パーティションキーの列名、パーティショニングしない場合はNone
+    """
+    if _partitions <= 0:
+        return None
+    return table.info.get(PARTITION_KEY_INFO)
+
+
+def partition_name(table: str, remainder: int) -> str:
+    """パーティションのテーブル名を返す"""
+    return f"{table}_p{remainder}"
+
+
+def partition_ddl(table: str, partitions: int) -> List[str]:
+    """
+    ハッシュパーティションを作成するDDLを返す
+    
+    Args:
+        table: パーティションテーブル名
+        partitions: パーティション数
+    
+    Returns:
+        DDLのリスト
+    """
+    return [
+        f"CREATE TABLE IF NOT EXISTS {partition_name(table, remainder)} PARTITION OF {table} "
+        f"FOR VALUES WITH (MODULUS {partitions}, REMAINDER {remainder})"
+        for remainder in range(partitions)
+    ]
+
+
+def is_partitioned(connection: Connection, table: str) -> bool:
+    """
+    テーブルがパーティションテーブルかどうか
+    
+    Args:
+        connection: データベース接続
+        table: テーブル名
+    
+    Returns:
+        パーティションテーブルの場合はTrue（PostgreSQL以外では常にFalse）
+    """
+    if connection.dialect.name != 'postgresql':
+        return False
+    row = connection.execute(
+        text(
+            "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+            "WHERE c.relname = :table AND pg_table_is_visible(c.oid)"
+        ),
+        {'table': table}
+    ).first()
+    return row is not None
+
+
+@compiles(CreateTable, 'postgresql')
+def _compile_create_table(create: CreateTable, compiler: Any, **kw: Any) -> str:
+    """パーティショニングするテーブルのCREATE TABLEにPARTITION BY HASHを付与する"""
+    sql = compiler.visit_create_table(create, **kw)
+    key = partition_key(create.element)
+    if key is None:
+        return sql
+    return f"{sql.rstrip()} PARTITION BY HASH ({compiler.preparer.quote(key)})\n\n"
+
+
+@compiles(PrimaryKeyConstraint, 'postgresql')
+def _compile_primary_key(constraint: PrimaryKeyConstraint, compiler: Any, **kw: Any) -> str:
+    """パーティショニングするテーブルの主キーにパーティションキーを含める"""
+    key = partition_key(constraint.table) if constraint.table is not None else None
+    if key is None or key in constraint.columns:
+        return compiler.visit_primary_key_constraint(constraint, **kw)
+    
+    columns = [column.name for column in constraint.columns] + [key]
+    name = f"CONSTRAINT {compiler.preparer.quote(constraint.name)} " if constraint.name else ''
+    return f"{name}PRIMARY KEY ({', '.join(compiler.preparer.quote(column) for column in columns)})"
+
+
+def _create_partitions(table: Table, connection: Connection, **kw: Any) -> None:
+    """パーティションテーブルの作成後にパーティションを作成する"""
+    if connection.dialect.name != 'postgresql' or partition_key(table) is None:
+        return
+    for statement in partition_ddl(table.name, _partitions):
+        connection.execute(text(statement))
+    logger.info(f"{table.name}を{_partitions}個のハッシュパーティションで作成しました")
+
+
+def register_hash_partitioning(table: Table, key: str) -> None:
+    """
+    テーブルをパーティションキーのハッシュでパーティショニングできるようにする
+    
+    DB_HASH_PARTITIONSが1以上の場合のみ、PostgreSQLでのテーブル作成時にパーティションテーブルとして作成されます。
+    
+    Args:
+        table: 対象のテーブル
+        key: パーティションキーの列名（一意インデックスはこの列を含む必要がある）
+    """
+    table.info[PARTITION_KEY_INFO] = key
+    event.listen(table, 'after_create', _create_partitions)
+
+
+def init_partitioning(app: Flask) -> None:
+    """
+    アプリケーション設定に基づいてパーティション数を設定する
+    
+    Args:
+        app: Flaskアプリケーションインスタンス
+    """
+    global _partitions
+    _partitions = max(app.config.get('DB_HASH_PARTITIONS', 0), 0)
+    if _partitions:
+        logger.info(f"ハッシュパーティショニングが有効になりました（パーティション数: {_partitions}）")
@@ -0,0 +1,355 @@
+"""
+ロール・クレームのポリシーエンジンモジュール
+
+ロール式（any/all/not）とクレームの条件をデコレーション時に一度だけコンパイルし、
+リクエストごとの評価をビットマスクの演算と辞書参照だけで行います。
+"""
+import json
+import time
+import hashlib
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+
+from flask import Flask
+
+from services.cache import LRUTTLCache
+from logger import get_logger
+
+# ロガーの取得
+logger = get_logger(__name__)
+
+# ロール名からビットへのマッピング（ポリシーのコンパイル時に割り当てる）
+_role_bits: Dict[str, int] = {}
+_role_bits_lock = threading.Lock()
+
+# 正規化されたクレームのキャッシュ（キーはトークンのSHA-256、トークンの有効期限まで保持）
+claims_cache = LRUTTLCache(max_size=10000)
+
+# トークンにexpが無い場合の正規化クレームの保持期間（秒）
+_DEFAULT_CLAIMS_TTL = 300
+
+# 評価関数の型（ユーザーのロールビットマスク、クレーム）-> 許可するかどうか
+Evaluator = Callable[[int, Dict[str, Any]], bool]
+
+_MISSING = object()
+
+
+def _role_bit(role: str) -> int:
+    """ロールに対応するビットを返す（未割り当ての場合は割り当てる）"""
+    bit = _role_bits.get(role)
+    if bit is None:
+        with _role_bits_lock:
+            bit = _role_bits.get(role)
+            if bit is None:
+                bit = 1 << len(_role_bits)
+                _role_bits[role] = bit
+    return bit
+
+
+def _roles_mask(roles: Iterable[str]) -> int:
+    """ロールのリストをビットマスクに変換する（ポリシーで参照されないロールは無視する）"""
+    mask = 0
+    for role in roles:
+        bit = _role_bits.get(role)
+        if bit is not None:
+            mask |= bit
+    return mask
+
+
+class Policy:
+    """
+    ポリシー式の基底クラス
+    
+    `&`（かつ）、`|`（または）、`~`（否定）で組み合わせることができます。
+    """
+    
+    def __and__(self, other: 'Policy') -> 'Policy':
+        return _AllOf([self, other])
+    
+    def __or__(self, other: 'Policy') -> 'Policy':
+        return _AnyOf([self, other])
+    
+    def __invert__(self) -> 'Policy':
+        return _Not(self)
+    
+    def compile(self) -> Evaluator:
+        """
+        ポリシー式を評価関数にコンパイルする
+        
+        Returns:
+            ロールビットマスクとクレームを受け取り、許可するかどうかを返す関数
+        """
+        raise NotImplementedError
+
+
+class _Roles(Policy):
+    """ロールの集合に対する条件"""
+    
+    def __init__(self, roles: Iterable[str], require_all: bool) -> None:
+        self.roles = list(dict.fromkeys(roles))
+        self.require_all = require_all
+        if not self.roles:
+            raise ValueError("ロールが指定されていません")
+    
+    def compile(self) -> Evaluator:
+        mask = 0
+        for role in self.roles:
+            mask |= _role_bit(role)
+        
+        if self.require_all:
+            return lambda user_mask, claims: user_mask & mask == mask
+        return lambda user_mask, claims: user_mask & mask != 0
+    
+    def __str__(self) -> str:
+        if len(self.roles) == 1:
+            return self.roles[0]
+        return f"{'all' if self.require_all else 'any'}({', '.join(self.roles)})"
+
+
+class _Claim(Policy):
+    """クレームの値に対する条件"""
+    
+    def __init__(self, name: str, expected: Any = _MISSING, predicate: Optional[Callable[[Any], bool]] = None) -> None:
+        self.name = name
+        self.expected = expected
+        self.predicate = predicate
+    
+    def compile(self) -> Evaluator:
+        name = self.name
+        if self.predicate is not None:
+            predicate = self.predicate
+            return lambda user_mask, claims: bool(predicate(claims.get(name)))
+        if self.expected is _MISSING:
+            return lambda user_mask, claims: bool(claims.get(name))
+        expected = self.expected
+        return lambda user_mask, claims: claims.get(name) == expected
+    
+    def __str__(self) -> str:
+        if self.predicate is not None or self.expected is _MISSING:
+            return f"claim({self.name})"
+        return f"claim({self.name}={self.expected!r})"
+
+
+class _Not(Policy):
+    """否定"""
+    
+    def __init__(self, policy: Policy) -> None:
+        self.policy = policy
+    
+    def compile(self) -> Evaluator:
+        inner = self.policy.compile()
+        return lambda user_mask, claims: not inner(user_mask, claims)
+    
+    def __str__(self) -> str:
+        return f"not({self.policy})"
+
+
+class _AllOf(Policy):
+    """論理積"""
+    
+    def __init__(self, policies: List[Policy]) -> None:
+        self.policies = policies
+    
+    def compile(self) -> Evaluator:
+        evaluators = tuple(policy.compile() for policy in self.policies)
+        return lambda user_mask, claims: all(evaluate(user_mask, claims) for evaluate in evaluators)
+    
+    def __str__(self) -> str:
+        return ' & '.join(f"({policy})" for policy in self.policies)
+
+
+class _AnyOf(Policy):
+    """論理和"""
+    
+    def __init__(self, policies: List[Policy]) -> None:
+        self.policies = policies
+    
+    def compile(self) -> Evaluator:
+        evaluators = tuple(policy.compile() for policy in self.policies)
+        return lambda user_mask, claims: any(evaluate(user_mask, claims) for evaluate in evaluators)
+    
+    def __str__(self) -> str:
+        return ' | '.join(f"({policy})" for policy in self.policies)
+
+
+def any_role(*roles: str) -> Policy:
+    """いずれかのロールを持つことを要求するポリシー"""
+    return _Roles(roles, require_all=False)
+
+
+def all_roles(*roles: str) -> Policy:
+    """すべてのロールを持つことを要求するポリシー"""
+    return _Roles(roles, require_all=True)
+
+
+def no_role(*roles: str) -> Policy:
+    """いずれのロールも持たないことを要求するポリシー"""
+    return _Not(_Roles(roles, require_all=False))
+
+
+def claim(name: str, expected: Any = _MISSING, predicate: Optional[Callable[[Any], bool]] = None) -> Policy:
+    """
+    クレームの条件を表すポリシー
+    
+    Args:
+        name: クレーム名
+        expected: 期待する値（省略時はクレームが真であることを要求する）
+        predicate: クレームの値を受け取り真偽を返す関数
+    
+    Returns:
+        ポリシー
+    """
+    return _Claim(name, expected, predicate)
+
+
+class CompiledPolicy:
+    """コンパイル済みのポリシーと評価回数のカウンター"""
+    
+    def __init__(self, policy: Policy) -> None:
+        """
+        ポリシーのコンパイル
+        
+        Args:
+            policy: コンパイルするポリシー
+        """
+        self.description = str(policy)
+        self._evaluate = policy.compile()
+        self.evaluations = 0
+        self.allowed = 0
+        self.denied = 0
+        self._lock = threading.Lock()
+    
+    def evaluate(self, normalized: 'NormalizedClaims') -> bool:
+        """
+        正規化されたクレームに対してポリシーを評価する
+        
+        Args:
+            normalized: 正規化されたクレーム
+        
+        Returns:
+            bool: 許可するかどうか
+        """
+        allowed = self._evaluate(normalized.role_mask, normalized.claims)
+        with self._lock:
+            self.evaluations += 1
+            if allowed:
+                self.allowed += 1
+            else:
+                self.denied += 1
+        return allowed
+    
+    def stats(self) -> Dict[str, Any]:
+        """評価回数の統計情報を返す"""
+        with self._lock:
+            return {'evaluations': self.evaluations, 'allowed': self.allowed, 'denied': self.denied}
+
+
+class NormalizedClaims:
+    """ロールをビットマスクに変換したクレーム"""
+    
+    __slots__ = ('role_mask', 'claims', 'roles_version')
+    
+    def __init__(self, role_mask: int, claims: Dict[str, Any], roles_version: int) -> None:
+        self.role_mask = role_mask
+        self.claims = claims
+        self.roles_version = roles_version
+
+
+def _token_roles(decoded_token: Dict[str, Any]) -> Set[str]:
+    """トークンのrolesクレーム（リストまたは文字列）をロールの集合に変換する"""
+    roles = decoded_token.get('roles') or []
+    if isinstance(roles, str):
+        return {roles}
+    return set(roles)
+
+
+def _claims_cache_key(decoded_token: Dict[str, Any]) -> str:
+    """
+    クレーム全体からキャッシュキーを生成する（トークンのハッシュがない場合のみ使用する）
+    
+    同じuid・iatでもロールやカスタムクレームが異なるトークンは別のキーになります。
+    
+    Args:
+        decoded_token: デコードされたトークン
+    
+    Returns:
+        キーでソートしたクレームのJSONのSHA-256ハッシュ
+    """
+    payload = json.dumps(decoded_token, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def normalize_claims(decoded_token: Dict[str, Any], token_hash: Optional[str] = None) -> NormalizedClaims:
+    """
+    デコードされたトークンのクレームを正規化する
+    
+    結果はトークンのSHA-256ハッシュ（検証済みトークンキャッシュのキー）をキーとして
+    トークンの有効期限までキャッシュされます。ハッシュがない場合はクレーム全体をハッシュしてキーにします。
+    
+    Args:
+        decoded_token: デコードされたトークン
+        token_hash: トークンのSHA-256ハッシュ（auth_requiredがg.token_hashに設定する）
+    
+    Returns:
+        正規化されたクレーム
+    """
+    cache_key = token_hash or _claims_cache_key(decoded_token)
+    roles_version = len(_role_bits)
+    
+    normalized = claims_cache.get(cache_key)
+    if normalized is not None and normalized.roles_version == roles_version:
+        return normalized
+    
+    normalized = NormalizedClaims(
+        _roles_mask(_token_roles(decoded_token)),
+        decoded_token,
+        roles_version
+    )
+    expires_at = decoded_token.get('exp') or (time.time() + _DEFAULT_CLAIMS_TTL)
+    claims_cache.set(cache_key, normalized, float(expires_at))
+    return normalized
+
+
+# コンパイル済みのポリシー（メトリクス用）
+_compiled_policies: List[CompiledPolicy] = []
+
+
+def compile_policy(policy: Policy) -> CompiledPolicy:
+    """
+    ポリシーをコンパイルし、メトリクスの対象として登録する
+    
+    Args:
+        policy: コンパイルするポリシー
+    
+    Returns:
+        コンパイル済みのポリシー
+    """
+    compiled = CompiledPolicy(policy)
+    _compiled_policies.append(compiled)
+    return compiled
+
+
+def policy_stats() -> Dict[str, Any]:
+    """
+    ポリシーごとの評価回数と正規化クレームキャッシュの統計情報を返す
+    
+    Returns:
+        統計情報の辞書
+    """
+    policies: Dict[str, Dict[str, int]] = {}
+    for compiled in _compiled_policies:
+        totals = policies.setdefault(compiled.description, {'evaluations': 0, 'allowed': 0, 'denied': 0})
+        for key, value in compiled.stats().items():
+            totals[key] += value
+    return {'policies': policies, 'claims_cache': claims_cache.stats()}
+
+
+def init_policies(app: Flask) -> None:
+    """
+    アプリケーション設定に基づいて正規化クレームキャッシュを初期化する
+    
+    Args:
+        app: Flaskアプリケーションインスタンス
+    """
+    claims_cache.max_size = app.config.get('POLICY_CLAIMS_CACHE_SIZE', 10000)
+    claims_cache.clear()
@@ -0,0 +1,405 @@
+"""
+プロフィールキャッシュモジュール
+
+シリアライズ済みのプロフィール辞書をfirebase_uidごとにキャッシュします。
+インプロセスのLRUキャッシュの後ろに、ワーカー間で共有するバックエンド（Redisなど）を
+オプションで配置できます。ASGIモードの非同期版のメソッドは、共有バックエンドへのアクセスを
+ワーカースレッドで実行し、イベントループを止めません。
+"""
+import time
+import asyncio
+import threading
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from flask import Flask
+
+from services.cache import LRUTTLCache
+from services.json_provider import dumps_bytes, loads
+from logger import get_logger
+
+# ロガーの取得
+logger = get_logger(__name__)
+
+
+def is_newer_or_same(current: Dict[str, Any], profile: Dict[str, Any]) -> bool:
+    """
+    プロフィールがキャッシュされている値と同じか新しいかどうか（updated_atで比較する）
+    
+    Args:
+        current: キャッシュされているプロフィール辞書
+        profile: 登録しようとしているプロフィール辞書
+    
+    Returns:
+        置き換えてよい場合はTrue（どちらかにupdated_atがない場合もTrue）
+    """
+    current_version = current.get('updated_at')
+    version = profile.get('updated_at')
+    if not current_version or not version:
+        return True
+    return datetime.fromisoformat(version) >= datetime.fromisoformat(current_version)
+
+
+# 削除されたプロフィールの墓標（削除直後に、削除前の行を読み取ったGETがキャッシュに登録しないようにする）
+TOMBSTONE_FIELD = '__deleted__'
+TOMBSTONE = {TOMBSTONE_FIELD: True}
+
+
+def is_tombstone(value: Dict[str, Any]) -> bool:
+    """キャッシュされている値が削除の墓標かどうか"""
+    return bool(value.get(TOMBSTONE_FIELD))
+
+
+# 既存の値が墓標の場合、またはupdated_atが新しい場合は登録しないRedisのスクリプト
+# （updated_atはISO 8601の文字列として比較する）
+_SET_IF_NEWER_SCRIPT = """
+local current = redis.call('GET', KEYS[1])
+if current then
+    local ok, value = pcall(cjson.decode, current)
+    if ok and type(value) == 'table' then
+        if value['__deleted__'] then
+            return 0
+        end
+        if ARGV[2] ~= '' and type(value['updated_at']) == 'string' and value['updated_at'] > ARGV[2] then
+            return 0
+        end
+    end
+end
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[3])
+return 1
+"""
+
+
+class SharedCacheBackend(ABC):
+    """
+    ワーカー間で共有するキャッシュバックエンドのインターフェース
+    
+    実装は例外を送出せず、障害時はキャッシュミスとして振る舞う必要があります。
+    メソッドが不足している実装はインスタンスの作成時にTypeErrorになります。
+    """
+    
+    @abstractmethod
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """キーに対応する値を取得する（存在しない場合はNone）"""
+    
+    @abstractmethod
+    def set(self, key: str, value: Dict[str, Any], ttl: int) -> None:
+        """値をTTL付きで登録する"""
+    
+    @abstractmethod
+    def set_if_newer(self, key: str, value: Dict[str, Any], ttl: int) -> None:
+        """
+        既存の値が墓標（TOMBSTONE）の場合、またはupdated_atが新しい場合を除き、値をTTL付きで登録する
+        （判定と登録はアトミックに行う）
+        """
+    
+    @abstractmethod
+    def delete(self, key: str, tombstone_ttl: int = 0) -> None:
+        """キーに対応する値を削除する（tombstone_ttlが正の場合は、その秒数の間は墓標（TOMBSTONE）に置き換える）"""
+
+
+class RedisCacheBackend(SharedCacheBackend):
+    """Redisを使用した共有キャッシュバックエンド（redisパッケージが必要）"""
+    
+    def __init__(self, url: str, prefix: str = 'profile:') -> None:
+        """
+        バックエンドの初期化
+        
+        Args:
+            url: RedisのURL（例: redis://localhost:6379/0）
+            prefix: キーの接頭辞
+        """
+        import redis
+        
+        self._client = redis.Redis.from_url(url, socket_timeout=0.2, socket_connect_timeout=0.2)
+        self.prefix = prefix
+        self._set_if_newer = self._client.register_script(_SET_IF_NEWER_SCRIPT)
+    
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            raw = self._client.get(self.prefix + key)
+        except Exception as e:
+            logger.warning(f"共有キャッシュの取得エラー: {str(e)}")
+            return None
+        return loads(raw) if raw else None
+    
+    def set(self, key: str, value: Dict[str, Any], ttl: int) -> None:
+        try:
+            self._client.setex(self.prefix + key, ttl, dumps_bytes(value))
+        except Exception as e:
+            logger.warning(f"共有キャッシュの登録エラー: {str(e)}")
+    
+    def set_if_newer(self, key: str, value: Dict[str, Any], ttl: int) -> None:
+        try:
+            self._set_if_newer(keys=[self.prefix + key], args=[dumps_bytes(value), value.get('updated_at') or '', ttl])
+        except Exception as e:
+            logger.warning(f"共有キャッシュの登録エラー: {str(e)}")
+    
+    def delete(self, key: str, tombstone_ttl: int = 0) -> None:
+        try:
+            if tombstone_ttl > 0:
+                self._client.setex(self.prefix + key, tombstone_ttl, dumps_bytes(TOMBSTONE))
+            else:
+                self._client.delete(self.prefix + key)
+        except Exception as e:
+            logger.warning(f"共有キャッシュの削除エラー: {str(e)}")
+
+
+class ProfileCache:
+    """
+    プロフィールのリードスルーキャッシュ
+    
+    インプロセスのLRUキャッシュを優先し、ミスした場合は共有バックエンドを参照します。
+    削除したプロフィールは、tombstone_ttl秒の間は墓標に置き換えてキャッシュへの登録を拒否します。
+    """
+    
+    def __init__(self) -> None:
+        """キャッシュの初期化（init_profile_cacheで設定されるまでは無効）"""
+        self.enabled = False
+        self.ttl = 300
+        self.local_ttl = 300
+        self.tombstone_ttl = 10
+        self._local = LRUTTLCache(max_size=0)
+        self._shared: Optional[SharedCacheBackend] = None
+        self._lock = threading.Lock()
+        self.shared_hits = 0
+        self.shared_misses = 0
+    
+    def configure(
+        self,
+        enabled: bool,
+        max_size: int,
+        ttl: int,
+        shared: Optional[SharedCacheBackend] = None,
+        local_ttl: Optional[int] = None,
+        tombstone_ttl: int = 10
+    ) -> None:
+        """
+        キャッシュを設定する
+        
+        Args:
+            enabled: キャッシュを有効にするかどうか
+            max_size: インプロセスキャッシュの最大エントリ数
+            ttl: エントリの有効期間（秒）
+            shared: 共有バックエンド（Noneの場合はインプロセスのみ）
+            local_ttl: インプロセスキャッシュの有効期間（秒、他のワーカーでの更新・削除が反映されるまでの最大時間）
+            tombstone_ttl: 削除後にキャッシュへの登録を拒否する期間（秒、削除前の行を読み取ったGETの登録を防ぐ）
+        """
+        self.enabled = enabled
+        self.ttl = ttl
+        self.local_ttl = min(ttl, local_ttl) if local_ttl else ttl
+        self.tombstone_ttl = tombstone_ttl
+        self._local = LRUTTLCache(max_size=max_size if enabled else 0)
+        self._shared = shared if enabled else None
+        self.shared_hits = 0
+        self.shared_misses = 0
+    
+    def get(self, firebase_uid: str) -> Optional[Dict[str, Any]]:
+        """
+        プロフィール辞書を取得する
+        
+        Args:
+            firebase_uid: Firebase認証のユーザーID
+        
+        Returns:
+            キャッシュされたプロフィール辞書、またはNone
+        """
+        if not self.enabled:
+            return None
+        
+        profile = self._local.get(firebase_uid)
+        if profile is not None:
+            return None if is_tombstone(profile) else profile
+        if self._shared is None:
+            return None
+        return self._get_shared(firebase_uid)
+    
+    async def get_async(self, firebase_uid: str) -> Optional[Dict[str, Any]]:
+        """
+        getの非同期版（ASGIモード用）
+        
+        Args:
+            firebase_uid: Firebase認証のユーザーID
+        
+        Returns:
+            キャッシュされたプロフィール辞書、またはNone
+        """
+        if not self.enabled:
+            return None
+        
+        profile = self._local.get(firebase_uid)
+        if profile is not None:
+            return None if is_tombstone(profile) else profile
+        if self._shared is None:
+            return None
+        return await asyncio.to_thread(self._get_shared, firebase_uid)
+    
+    def _get_shared(self, firebase_uid: str) -> Optional[Dict[str, Any]]:
+        """共有バックエンドから取得し、インプロセスキャッシュに登録する"""
+        profile = self._shared.get(firebase_uid)
+        if profile is not None and is_tombstone(profile):
+            profile = None
+        with self._lock:
+            if profile is None:
+                self.shared_misses += 1
+            else:
+                self.shared_hits += 1
+        if profile is not None:
+            self._set_local(firebase_uid, profile)
+        return profile
+    
+    def set(self, firebase_uid: str, profile: Dict[str, Any]) -> None:
+        """
+        プロフィール辞書を登録（更新）する
+        
+        キャッシュされている値のupdated_atの方が新しい場合は置き換えません。古い行を読み取ったGETや、
+        逆順に完了した更新が、並行する更新で登録された新しいプロフィールを上書きしないようにするためです。
+        削除の墓標がある場合も登録しません。
+        
+        Args:
+            firebase_uid: Firebase認証のユーザーID
+            profile: シリアライズ済みのプロフィール辞書
+        """
+        if not self.enabled:
+            return
+        
+        self._set_local(firebase_uid, profile)
+        if self._shared is not None:
+            self._shared.set_if_newer(firebase_uid, profile, self.ttl)
+    
+    async def set_async(self, firebase_uid: str, profile: Dict[str, Any]) -> None:
+        """
+        setの非同期版（ASGIモード用）
+        
+        Args:
+            firebase_uid: Firebase認証のユーザーID
+            profile: シリアライズ済みのプロフィール辞書
+        """
+        if not self.enabled:
+            return
+        
+        self._set_local(firebase_uid, profile)
+        if self._shared is not None:
+            await asyncio.to_thread(self._shared.set_if_newer, firebase_uid, profile, self.ttl)
+    
+    def _set_local(self, firebase_uid: str, profile: Dict[str, Any]) -> None:
+        """インプロセスキャッシュに登録する（墓標がある場合、キャッシュされている値の方が新しい場合は置き換えない）"""
+        self._local.set(
+            firebase_uid, profile, time.time() + self.local_ttl,
+            replace=lambda current: not is_tombstone(current) and is_newer_or_same(current, profile)
+        )
+    
+    def invalidate(self, firebase_uid: str) -> None:
+        """
+        プロフィール辞書をキャッシュから削除する
+        
+        Args:
+            firebase_uid: Firebase認証のユーザーID
+        """
+        if not self.enabled:
+            return
+        
+        self._local.delete(firebase_uid)
+        if self._shared is not None:
+            self._shared.delete(firebase_uid)
+    
+    async def invalidate_async(self, firebase_uid: str) -> None:
+        """
+        invalidateの非同期版（ASGIモード用）
+        
+        Args:
+            firebase_uid: Firebase認証のユーザーID
+        """
+        if not self.enabled:
+            return
+        
+        self._local.delete(firebase_uid)
+        if self._shared is not None:
+            await asyncio.to_thread(self._shared.delete, firebase_uid)
+    
+    def mark_deleted(self, firebase_uid: str) -> None:
+        """
+        削除したプロフィールをキャッシュから取り除き、tombstone_ttl秒の間は墓標に置き換える
+        
+        削除のコミット前に行を読み取ったGETが、コミット後にプロフィールを登録して
+        削除されたプロフィールを返し続けないようにするため、削除のコミット後に呼び出します。
+        
+        Args:
+            firebase_uid: Firebase認証のユーザーID
+        """
+        if not self.enabled:
+            return
+        
+        self._local.set(firebase_uid, TOMBSTONE, time.time() + self.tombstone_ttl)
+        if self._shared is not None:
+            self._shared.delete(firebase_uid, self.tombstone_ttl)
+    
+    async def mark_deleted_async(self, firebase_uid: str) -> None:
+        """
+        mark_deletedの非同期版（ASGIモード用）
+        
+        Args:
+            firebase_uid: Firebase認証のユーザーID
+        """
+        if not self.enabled:
+            return
+        
+        self._local.set(firebase_uid, TOMBSTONE, time.time() + self.tombstone_ttl)
+        if self._shared is not None:
+            await asyncio.to_thread(self._shared.delete, firebase_uid, self.tombstone_ttl)
+    
+    def stats(self) -> Dict[str, Any]:
+        """
+        キャッシュの統計情報を返す
+        
+        Returns:
+            インプロセスキャッシュと共有バックエンドのヒット数・ミス数を含む辞書
+        """
+        stats = {'enabled': self.enabled, 'ttl': self.ttl, 'local': self._local.stats()}
+        if self._shared is not None:
+            lookups = self.shared_hits + self.shared_misses
+            stats['shared'] = {
+                'backend': type(self._shared).__name__,
+                'hits': self.shared_hits,
+                'misses': self.shared_misses,
+                'hit_rate': (self.shared_hits / lookups) if lookups else 0.0
+            }
+        return stats
+
+
+# プロフィールキャッシュ
+profile_cache = ProfileCache()
+
+
+def init_profile_cache(app: Flask) -> None:
+    """
+    アプリケーション設定に基づいてプロフィールキャッシュを初期化する
+    
+    Args:
+        app: Flaskアプリケーションインスタンス
+    """
+    config = app.config
+    enabled = config.get('PROFILE_CACHE_ENABLED', True)
+    
+    shared = None
+    redis_url = config.get('PROFILE_CACHE_REDIS_URL')
+    if enabled and redis_url:
+        try:
+            shared = RedisCacheBackend(redis_url)
+        except ImportError:
+            logger.warning("redisパッケージがインストールされていないため、共有キャッシュを無効にします")
+    
+    profile_cache.configure(
+        enabled=enabled,
+        max_size=config.get('PROFILE_CACHE_MAX_SIZE', 10000),
+        ttl=config.get('PROFILE_CACHE_TTL', 300),
+        shared=shared,
+        # インプロセスキャッシュは他のワーカーの書き込みで無効化されないため、共有バックエンドの有無に関係なく
+        # PROFILE_CACHE_LOCAL_TTL秒で失効させる（複数ワーカーで古いプロフィールやETagを返し続けないため）
+        local_ttl=config.get('PROFILE_CACHE_LOCAL_TTL', 5),
+        tombstone_ttl=config.get('PROFILE_CACHE_TOMBSTONE_TTL', 10)
+    )
+    logger.info(
+        f"プロフィールキャッシュが初期化されました（有効: {enabled}、共有バックエンド: {'あり' if shared else 'なし'}）"
+    )
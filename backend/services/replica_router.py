@@ -0,0 +1,405 @@
+"""
+リードレプリカのルーティングモジュール
+
+読み取り専用の処理をリードレプリカに振り分け、書き込みはプライマリで実行します。
+書き込みを行ったクライアントの読み取りは一定時間プライマリに固定し（read-your-writes）、
+接続エラーが発生したレプリカは一定時間切り離してプライマリにフェイルオーバーします。
+
+固定はワーカープロセスではなく、認証されたユーザー（firebase_uid）ごとの最終書き込み時刻として
+共有ストア（PROFILE_CACHE_REDIS_URLのRedis、未設定の場合はワーカー内のみ）に保持します。
+認証時にそのユーザーの最終書き込み時刻を読み込み、一定時間内であれば、どのワーカーでもプライマリで読み取ります。
+あわせて書き込みを行ったレスポンスで最終書き込み時刻をCookie（last_write）とヘッダー（X-Last-Write）で返し、
+クライアントが送り返した場合はその時刻も使用します。
+（時刻を改ざんしても、そのクライアント自身の読み取りがプライマリになるだけです。）
+"""
+import time
+import asyncio
+import itertools
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional, TypeVar
+
+from flask import Flask, Response, request
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import DBAPIError, OperationalError
+
+from services.cache import LRUTTLCache
+from services.db_pool import engine_options
+from services.db_service import db, bind_reads
+from services.metrics import register_collector
+from services.profile_cache import SharedCacheBackend, RedisCacheBackend
+from logger import get_logger
+
+# ロガーの取得
+logger = get_logger(__name__)
+
+T = TypeVar('T')
+
+# 最終書き込み時刻をクライアントに保持させるCookieとヘッダー
+PIN_COOKIE = 'last_write'
+PIN_HEADER = 'X-Last-Write'
+
+
+class PinState:
+    """リクエストごとのクライアント・ユーザーの最終書き込み時刻"""
+    
+    __slots__ = ('last_write', 'written', 'user_id')
+    
+    def __init__(self, last_write: Optional[float]) -> None:
+        self.last_write = last_write
+        self.written = False
+        self.user_id: Optional[str] = None
+
+
+# 処理中のリクエストの固定の状態（Flaskのbefore_requestまたはASGIのミドルウェアで設定される）
+_pin_state: ContextVar[Optional[PinState]] = ContextVar('replica_pin_state', default=None)
+
+
+def _parse_last_write(value: Optional[str]) -> Optional[float]:
+    """クライアントから送られた最終書き込み時刻を解析する（不正な値と未来の時刻は無視する）"""
+    if not value:
+        return None
+    try:
+        last_write = float(value)
+    except ValueError:
+        return None
+    return min(last_write, time.time())
+
+
+class Replica:
+    """リードレプリカの接続先と状態"""
+    
+    def __init__(self, name: str, engine: Engine) -> None:
+        self.name = name
+        self.engine = engine
+        self.unhealthy_until = 0.0
+        self.reads = 0
+        self.errors = 0
+    
+    @property
+    def healthy(self) -> bool:
+        return time.time() >= self.unhealthy_until
+
+
+class ReplicaRouter:
+    """読み取りをリードレプリカに振り分けるルーター"""
+    
+    def __init__(self) -> None:
+        """ルーターの初期化（レプリカが設定されるまではすべてプライマリで実行する）"""
+        self.replicas: List[Replica] = []
+        self.pin_seconds = 5.0
+        self.retry_interval = 30.0
+        self.pinned_reads = 0
+        self.failovers = 0
+        self._cycle: Iterator[Replica] = iter(())
+        self._lock = threading.Lock()
+        self._pins = LRUTTLCache(max_size=0)
+        self._shared_pins: Optional[SharedCacheBackend] = None
+    
+    @property
+    def enabled(self) -> bool:
+        """レプリカが設定されているかどうか"""
+        return bool(self.replicas)
+    
+    def configure(
+        self,
+        replicas: List[Replica],
+        pin_seconds: float,
+        retry_interval: float,
+        shared_pins: Optional[SharedCacheBackend] = None,
+        max_pins: int = 10000
+    ) -> None:
+        """
+        ルーターを設定する
+        
+        Args:
+            replicas: リードレプリカのリスト
+            pin_seconds: 書き込み後にユーザーの読み取りをプライマリに固定する時間（秒）
+            retry_interval: 接続エラーが発生したレプリカを切り離す時間（秒）
+            shared_pins: ユーザーごとの最終書き込み時刻をワーカー間で共有するバックエンド（Noneの場合はワーカー内のみ）
+            max_pins: ワーカー内で保持する最終書き込み時刻の最大件数
+        """
+        for replica in self.replicas:
+            replica.engine.dispose()
+        self.replicas = replicas
+        self.pin_seconds = pin_seconds
+        self.retry_interval = retry_interval
+        self.pinned_reads = 0
+        self.failovers = 0
+        self._cycle = itertools.cycle(replicas) if replicas else iter(())
+        self._pins = LRUTTLCache(max_size=max_pins if replicas else 0)
+        self._shared_pins = shared_pins if replicas else None
+    
+    @property
+    def _pinning(self) -> bool:
+        return bool(self.replicas) and self.pin_seconds > 0
+    
+    def begin_request(self, value: Optional[str]) -> PinState:
+        """
+        リクエストの開始時に、クライアントから送られた最終書き込み時刻を設定する
+        
+        Args:
+            value: Cookieまたはヘッダーの値
+        
+        Returns:
+            リクエストの固定の状態
+        """
+        state = PinState(_parse_last_write(value))
+        _pin_state.set(state)
+        return state
+    
+    def identify(self, user_id: Optional[str]) -> None:
+        """
+        認証されたユーザーを処理中のリクエストに設定し、そのユーザーの最終書き込み時刻を読み込む
+        
+        別のワーカーやクライアントで行った書き込みの直後でも、読み取りをプライマリに固定するために使用します。
+        
+        Args:
+            user_id: Firebase認証のユーザーID
+        """
+        state = self._identified_state(user_id)
+        if state is not None:
+            self._merge_pin(state, self._load_pin(user_id))
+    
+    async def identify_async(self, user_id: Optional[str]) -> None:
+        """
+        identifyの非同期版（ASGIモード用、共有ストアへのアクセスはワーカースレッドで実行する）
+        
+        Args:
+            user_id: Firebase認証のユーザーID
+        """
+        state = self._identified_state(user_id)
+        if state is None:
+            return
+        if self._shared_pins is None:
+            self._merge_pin(state, self._load_pin(user_id))
+        else:
+            self._merge_pin(state, await asyncio.to_thread(self._load_pin, user_id))
+    
+    def _identified_state(self, user_id: Optional[str]) -> Optional[PinState]:
+        """処理中のリクエストの状態にユーザーを設定する（固定しない場合はNone）"""
+        state = _pin_state.get()
+        if state is None or not user_id or not self._pinning:
+            return None
+        state.user_id = user_id
+        return state
+    
+    @staticmethod
+    def _merge_pin(state: PinState, last_write: Optional[float]) -> None:
+        if last_write is not None and (state.last_write is None or last_write > state.last_write):
+            state.last_write = last_write
+    
+    def _load_pin(self, user_id: str) -> Optional[float]:
+        """ユーザーの最終書き込み時刻をワーカー内、共有ストアの順に取得する"""
+        last_write = self._pins.get(user_id)
+        if last_write is None and self._shared_pins is not None:
+            stored = self._shared_pins.get(user_id)
+            last_write = stored.get('last_write') if stored else None
+        return last_write
+    
+    def pin(self) -> None:
+        """
+        書き込みを行ったユーザーの読み取りを一定時間プライマリに固定する
+        
+        最終書き込み時刻を更新し、レスポンスの送信前にsave_pinで保存します（リクエストの外では何もしません）。
+        """
+        state = _pin_state.get()
+        if state is not None and self._pinning:
+            state.last_write = time.time()
+            state.written = True
+    
+    def save_pin(self, state: Optional[PinState] = None) -> None:
+        """
+        書き込みを行ったユーザーの最終書き込み時刻をワーカー内と共有ストアに保存する
+        
+        Args:
+            state: リクエストの固定の状態（省略時は処理中のリクエスト）
+        """
+        state = state or _pin_state.get()
+        if state is None or not state.written or state.user_id is None:
+            return
+        self._pins.set(state.user_id, state.last_write, state.last_write + self.pin_seconds)
+        if self._shared_pins is not None:
+            self._shared_pins.set(
+                state.user_id, {'last_write': state.last_write}, max(int(self.pin_seconds + 0.999), 1)
+            )
+    
+    def is_pinned(self) -> bool:
+        """処理中のリクエストのクライアントが最近書き込みを行ったかどうか"""
+        state = _pin_state.get()
+        return (
+            state is not None and state.last_write is not None
+            and time.time() - state.last_write < self.pin_seconds
+        )
+    
+    def pin_value(self, state: Optional[PinState] = None) -> Optional[str]:
+        """
+        レスポンスで返す最終書き込み時刻を返す
+        
+        Args:
+            state: リクエストの固定の状態（省略時は処理中のリクエスト）
+        
+        Returns:
+            Cookieとヘッダーの値、このリクエストで書き込みを行っていない場合はNone
+        """
+        state = state or _pin_state.get()
+        if state is None or not state.written:
+            return None
+        return f"{state.last_write:.3f}"
+    
+    def cookie_options(self) -> Dict[str, Any]:
+        """最終書き込み時刻のCookieの属性（固定する時間が過ぎると削除される）"""
+        return {'max_age': max(int(self.pin_seconds + 0.999), 1), 'path': '/', 'httponly': True, 'samesite': 'Lax'}
+    
+    def choose(self) -> Optional[Replica]:
+        """
+        読み取りに使用するレプリカを選択する
+        
+        Returns:
+            レプリカ、プライマリで読み取る場合はNone
+        """
+        if not self.replicas:
+            return None
+        
+        if self.is_pinned():
+            with self._lock:
+                self.pinned_reads += 1
+            return None
+        
+        with self._lock:
+            for _ in range(len(self.replicas)):
+                replica = next(self._cycle)
+                if replica.healthy:
+                    replica.reads += 1
+                    return replica
+            self.failovers += 1
+        return None
+    
+    def mark_unhealthy(self, replica: Replica, error: Exception) -> None:
+        """レプリカを一定時間切り離す"""
+        with self._lock:
+            replica.errors += 1
+            replica.unhealthy_until = time.time() + self.retry_interval
+            self.failovers += 1
+        logger.warning(f"リードレプリカ {replica.name} を切り離します（{self.retry_interval}秒）: {str(error)}")
+    
+    @contextmanager
+    def read(self) -> Iterator[Optional[Replica]]:
+        """
+        範囲内の読み取りをレプリカで実行する
+        
+        接続エラーが発生した場合はレプリカを切り離して例外を再送出します。
+        
+        Yields:
+            使用するレプリカ、プライマリで読み取る場合はNone
+        """
+        replica = self.choose()
+        if replica is None:
+            yield None
+            return
+        
+        try:
+            with bind_reads(replica.engine):
+                yield replica
+        except OperationalError as e:
+            self.mark_unhealthy(replica, e)
+            raise
+        except DBAPIError as e:
+            if e.connection_invalidated:
+                self.mark_unhealthy(replica, e)
+            raise
+    
+    def run(self, read: Callable[[], T]) -> T:
+        """
+        読み取り処理をレプリカで実行し、接続エラーの場合はプライマリで再実行する
+        
+        Args:
+            read: 読み取り処理
+        
+        Returns:
+            読み取り処理の戻り値
+        """
+        on_replica = False
+        try:
+            with self.read() as replica:
+                on_replica = replica is not None
+                return read()
+        except DBAPIError:
+            if not on_replica:
+                raise
+            db.session.rollback()
+        return read()
+    
+    def stats(self) -> Dict[str, Any]:
+        """
+        統計情報を返す
+        
+        Returns:
+            レプリカごとの状態と読み取り回数、固定・フェイルオーバーの回数を含む辞書
+        """
+        return {
+            'replicas': {
+                replica.name: {
+                    'healthy': replica.healthy,
+                    'reads': replica.reads,
+                    'errors': replica.errors
+                }
+                for replica in self.replicas
+            },
+            'pinned_reads': self.pinned_reads,
+            'failovers': self.failovers
+        }
+
+
+# リードレプリカのルーター
+replica_router = ReplicaRouter()
+
+
+def init_replicas(app: Flask) -> None:
+    """
+    アプリケーション設定に基づいてリードレプリカを初期化する
+    
+    Args:
+        app: Flaskアプリケーションインスタンス
+    """
+    config = app.config
+    replicas = []
+    for index, url in enumerate(config.get('DB_REPLICA_URLS', []), start=1):
+        name = f"replica{index}"
+        options = {} if url.startswith('sqlite') else engine_options(config, name=name, url=url)
+        replicas.append(Replica(name, create_engine(url, **options)))
+    
+    # ユーザーごとの最終書き込み時刻はプロフィールキャッシュと同じRedisでワーカー間で共有する
+    shared_pins = None
+    redis_url = config.get('PROFILE_CACHE_REDIS_URL')
+    if replicas and redis_url:
+        try:
+            shared_pins = RedisCacheBackend(redis_url, prefix='replica_pin:')
+        except ImportError:
+            logger.warning("redisパッケージがインストールされていないため、書き込み後の固定はワーカー内のみになります")
+    
+    replica_router.configure(
+        replicas,
+        pin_seconds=config.get('DB_REPLICA_PIN_SECONDS', 5),
+        retry_interval=config.get('DB_REPLICA_RETRY_INTERVAL', 30),
+        shared_pins=shared_pins
+    )
+    register_collector('replicas', replica_router.stats)
+    
+    @app.before_request
+    def read_replica_pin() -> None:
+        replica_router.begin_request(request.headers.get(PIN_HEADER) or request.cookies.get(PIN_COOKIE))
+    
+    @app.after_request
+    def write_replica_pin(response: Response) -> Response:
+        replica_router.save_pin()
+        value = replica_router.pin_value()
+        if value is not None:
+            response.set_cookie(PIN_COOKIE, value, secure=request.is_secure, **replica_router.cookie_options())
+            response.headers[PIN_HEADER] = value
+        return response
+    
+    if replicas:
+        logger.info(f"リードレプリカが初期化されました: {len(replicas)}台")
@@ -0,0 +1,319 @@
+"""
+プロフィール検索サービスモジュール
+
+display_name、bio、locationを部分一致で検索します。
+日本語は空白で単語が区切られないため、単語単位のtsvectorやunicode61トークナイザーではなく
+トライグラム（3文字単位）のインデックスを使用します。
+PostgreSQLではpg_trgmのGINインデックス、SQLiteではトリガーで同期するFTS5テーブル（trigramトークナイザー）を使用し、
+LIKE '%q%'による全件走査は行いません（3文字未満の検索語を除く）。
+"""
+import json
+import base64
+import binascii
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import DDL, Table, event, text
+
+from services.db_service import db
+from errors import BadRequestError
+from logger import get_logger
+
+# ロガーの取得
+logger = get_logger(__name__)
+
+# 検索対象の列
+SEARCH_COLUMNS = ('display_name', 'bio', 'location')
+
+# 検索結果に含める列
+RESULT_COLUMNS = ('firebase_uid', 'display_name', 'bio', 'location', 'website')
+
+# 検索対象の列の重み（display_name、location、bioの順に高い）
+SEARCH_WEIGHTS = {'display_name': 10.0, 'location': 5.0, 'bio': 1.0}
+
+# トライグラムのインデックスで絞り込める検索語の最小の長さ
+TRIGRAM_MIN_LENGTH = 3
+
+
+def search_text_expression() -> str:
+    """
+    検索対象の列を連結した式を返す（PostgreSQLのトライグラムインデックスと検索条件で同じ式を使用する）
+    
+    Returns:
+        SQLの式
+    """
+    return " || ' ' || ".join(f"coalesce({column}, '')" for column in ('display_name', 'location', 'bio'))
+
+
+def search_index_name(table: str) -> str:
+    """PostgreSQLのトライグラムインデックスの名前"""
+    return f"ix_{table}_search_trgm"
+
+
+def _postgresql_ddl(table: str) -> List[str]:
+    """pg_trgmの拡張とトライグラムのGINインデックスを作成するDDL"""
+    return [
+        "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+        f"CREATE INDEX IF NOT EXISTS {search_index_name(table)} "
+        f"ON {table} USING GIN (({search_text_expression()}) gin_trgm_ops)"
+    ]
+
+
+def sqlite_search_ddl(table: str) -> List[str]:
+    """外部コンテンツのFTS5テーブル（trigramトークナイザー）と同期用のトリガーを作成するDDL"""
+    fts = f"{table}_fts"
+    columns = ', '.join(SEARCH_COLUMNS)
+    new_values = ', '.join(f"new.{column}" for column in SEARCH_COLUMNS)
+    old_values = ', '.join(f"old.{column}" for column in SEARCH_COLUMNS)
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({columns}, content='{table}', content_rowid='id', tokenize='trigram')",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN "
+        f"INSERT INTO {fts}(rowid, {columns}) VALUES (new.id, {new_values}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {columns}) VALUES ('delete', old.id, {old_values}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {columns}) VALUES ('delete', old.id, {old_values}); "
+        f"INSERT INTO {fts}(rowid, {columns}) VALUES (new.id, {new_values}); END",
+        f"INSERT INTO {fts}({fts}) VALUES ('rebuild')"
+    ]
+
+
+def register_search_ddl(table: Table) -> None:
+    """
+    テーブルの作成・削除時に全文検索インデックスを作成・削除するイベントを登録する
+    
+    Args:
+        table: 検索対象のテーブル
+    """
+    for statement in _postgresql_ddl(table.name):
+        event.listen(table, 'after_create', DDL(statement).execute_if(dialect='postgresql'))
+    for statement in sqlite_search_ddl(table.name):
+        event.listen(table, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+    event.listen(
+        table, 'before_drop',
+        DDL(f"DROP TABLE IF EXISTS {table.name}_fts").execute_if(dialect='sqlite')
+    )
+
+
+def encode_cursor(score: float, profile_id: int) -> str:
+    """
+    検索結果の位置（スコアとid）をカーソル文字列に変換する
+    
+    Args:
+        score: 最後の結果のスコア
+        profile_id: 最後の結果のid
+    
+    Returns:
+        URLセーフなカーソル文字列
+    """
+    raw = json.dumps([score, profile_id], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[float, int]:
+    """
+    カーソル文字列をスコアとidに変換する
+    
+    Args:
+        cursor: カーソル文字列
+    
+    Returns:
+        スコアとidのタプル
+    
+    Raises:
+        BadRequestError: カーソルが不正な場合
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        score, profile_id = json.loads(raw)
+        return float(score), int(profile_id)
+    except (binascii.Error, ValueError, TypeError):
+        raise BadRequestError("カーソルが不正です")
+
+
+def _split_terms(q: str) -> Tuple[List[str], List[str]]:
+    """検索語を空白で分割し、トライグラムで絞り込める語句と短い語句に分ける"""
+    terms = list(dict.fromkeys(q.split()))
+    return (
+        [term for term in terms if len(term) >= TRIGRAM_MIN_LENGTH],
+        [term for term in terms if len(term) < TRIGRAM_MIN_LENGTH]
+    )
+
+
+def _fts5_query(terms: Sequence[str]) -> Optional[str]:
+    """検索語をFTS5のクエリ構文（各語句の部分一致のAND）に変換する（演算子は文字列として扱う）"""
+    return ' '.join('"{}"'.format(term.replace('"', '""')) for term in terms) or None
+
+
+def _like_pattern(term: str) -> str:
+    """検索語を部分一致のLIKEパターンに変換する（ワイルドカードはエスケープする）"""
+    escaped = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f"%{escaped}%"
+
+
+def _result_columns(fields: Optional[Sequence[str]]) -> Tuple[str, ...]:
+    """検索結果に含める列（firebase_uidは常に含める）"""
+    if not fields:
+        return RESULT_COLUMNS
+    return tuple(dict.fromkeys(('firebase_uid', *fields)))
+
+
+def _like_score(patterns: Sequence[str]) -> str:
+    """検索語を含む列の重みの合計（LIKEの結果は0または1）"""
+    return ' + '.join(
+        f"{SEARCH_WEIGHTS[column]} * (coalesce(p.{column}, '') LIKE :{pattern} ESCAPE '\\')"
+        for pattern in patterns
+        for column in SEARCH_WEIGHTS
+    )
+
+
+def _postgresql_search(table: str, columns: Sequence[str], patterns: Sequence[str]) -> str:
+    # ILIKEはトライグラムのインデックスで絞り込まれる（3文字未満の語句のみの場合はインデックス全体を走査する）
+    search_text = search_text_expression()
+    conditions = ' AND '.join(f"({search_text}) ILIKE :{pattern} ESCAPE '\\'" for pattern in patterns)
+    score = ' + '.join(
+        f"{weight} * word_similarity(:q, coalesce({column}, ''))"
+        for column, weight in SEARCH_WEIGHTS.items()
+    )
+    return (
+        f"SELECT * FROM ("
+        f"SELECT id, {', '.join(columns)}, ({score})::float8 AS score "
+        f"FROM {table} "
+        f"WHERE {conditions}"
+        f") AS ranked "
+    )
+
+
+def _sqlite_search(table: str, columns: Sequence[str], matched: bool, patterns: Sequence[str]) -> str:
+    column_list = ', '.join(f"p.{column}" for column in columns)
+    short_conditions = [
+        '(' + ' OR '.join(f"p.{column} LIKE :{pattern} ESCAPE '\\'" for column in SEARCH_WEIGHTS) + ')'
+        for pattern in patterns
+    ]
+    if not matched:
+        # 3文字未満の語句のみの場合はトライグラムで絞り込めないため、語句を含む列の重みでスコアを付ける
+        return (
+            f"SELECT * FROM ("
+            f"SELECT p.id, {column_list}, {_like_score(patterns)} AS score "
+            f"FROM {table} AS p "
+            f"WHERE {' AND '.join(short_conditions)}"
+            f") AS ranked "
+        )
+    
+    fts = f"{table}_fts"
+    weights = ', '.join(str(SEARCH_WEIGHTS[column]) for column in SEARCH_COLUMNS)
+    return (
+        f"SELECT * FROM ("
+        f"SELECT p.id, {column_list}, -bm25({fts}, {weights}) AS score "
+        f"FROM {fts} JOIN {table} AS p ON p.id = {fts}.rowid "
+        f"WHERE {' AND '.join([f'{fts} MATCH :q', *short_conditions])}"
+        f") AS ranked "
+    )
+
+
+def _search_query(
+    q: str,
+    limit: int,
+    cursor: Optional[str],
+    dialect_name: str,
+    table: str,
+    columns: Sequence[str]
+) -> Optional[Tuple[str, Dict[str, Any]]]:
+    """検索のSQLとパラメーターを組み立てる（検索語が空の場合はNone）"""
+    long_terms, short_terms = _split_terms(q)
+    if not long_terms and not short_terms:
+        return None
+    
+    if dialect_name == 'postgresql':
+        terms = long_terms + short_terms
+        patterns = [f"term{index}" for index in range(len(terms))]
+        sql = _postgresql_search(table, columns, patterns)
+        params: Dict[str, Any] = {'q': ' '.join(terms)}
+    elif dialect_name == 'sqlite':
+        terms = short_terms
+        patterns = [f"term{index}" for index in range(len(terms))]
+        fts_query = _fts5_query(long_terms)
+        sql = _sqlite_search(table, columns, fts_query is not None, patterns)
+        params = {'q': fts_query} if fts_query is not None else {}
+    else:
+        raise NotImplementedError(f"全文検索に対応していないデータベースです: {dialect_name}")
+    params.update((pattern, _like_pattern(term)) for pattern, term in zip(patterns, terms))
+    
+    if cursor:
+        params['cursor_score'], params['cursor_id'] = decode_cursor(cursor)
+        sql += "WHERE score < :cursor_score OR (score = :cursor_score AND id > :cursor_id) "
+    sql += "ORDER BY score DESC, id ASC LIMIT :limit"
+    params['limit'] = limit + 1
+    return sql, params
+
+
+def _page(rows: List[Any], limit: int, columns: Sequence[str]) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """limit + 1件の取得結果からページと次のページのカーソルを作成する"""
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]['score'], rows[-1]['id'])
+    
+    results = [{column: row[column] for column in columns} for row in rows]
+    return results, next_cursor
+
+
+def search_profiles(
+    q: str,
+    limit: int = 10,
+    cursor: Optional[str] = None,
+    table: str = 'user_profiles',
+    fields: Optional[Sequence[str]] = None
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    プロフィールを全文検索し、スコアの高い順に返す
+    
+    スコアとidによるキーセットページネーションのため、ページが進んでもOFFSETのように遅くなりません。
+    
+    Args:
+        q: 検索語
+        limit: 1ページあたりの件数
+        cursor: 前のページのnext_cursor（オプション）
+        table: 検索対象のテーブル名
+        fields: 結果に含めるフィールド（省略時はすべて。firebase_uidは常に含む）
+    
+    Returns:
+        検索結果のリストと次のページのカーソル（最後のページの場合はNone）のタプル
+    """
+    columns = _result_columns(fields)
+    query = _search_query(q, limit, cursor, db.engine.dialect.name, table, columns)
+    if query is None:
+        return [], None
+    
+    rows = db.session.execute(text(query[0]), query[1]).mappings().all()
+    return _page(rows, limit, columns)
+
+
+async def search_profiles_async(
+    session: Any,
+    q: str,
+    limit: int = 10,
+    cursor: Optional[str] = None,
+    table: str = 'user_profiles',
+    fields: Optional[Sequence[str]] = None
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    search_profilesの非同期版（ASGIモード用）
+    
+    Args:
+        session: 非同期セッション
+        q: 検索語
+        limit: 1ページあたりの件数
+        cursor: 前のページのnext_cursor（オプション）
+        table: 検索対象のテーブル名
+        fields: 結果に含めるフィールド（省略時はすべて）
+    
+    Returns:
+        検索結果のリストと次のページのカーソル（最後のページの場合はNone）のタプル
+    """
+    columns = _result_columns(fields)
+    query = _search_query(q, limit, cursor, session.bind.dialect.name, table, columns)
+    if query is None:
+        return [], None
+    
+    rows = (await session.execute(text(query[0]), query[1])).mappings().all()
+    return _page(rows, limit, columns)
@@ -0,0 +1,86 @@
+"""
+モデルのシリアライザーモジュール
+
+モデルの列の型からフィールドごとの変換を決めた専用のシリアライズ関数を生成し、
+フィールドの組み合わせごとにキャッシュします。生成された関数は辞書リテラルを1つ返すだけで、
+呼び出しごとのフィールドのループや型の判定を行いません（日時の列のみISO 8601形式に変換します）。
+"""
+import keyword
+from datetime import date, datetime, time
+from functools import lru_cache
+from typing import Any, Callable, Dict, Tuple
+
+from sqlalchemy import Table
+
+# 生成した関数のキャッシュの最大数（フィールドの組み合わせごと）
+MAX_COMPILED = 256
+
+# ISO 8601形式に変換する型
+_ISO_TYPES = (datetime, date, time)
+
+
+def _is_temporal(table: Table, field: str) -> bool:
+    """列の型が日時かどうか"""
+    try:
+        return issubclass(table.c[field].type.python_type, _ISO_TYPES)
+    except NotImplementedError:
+        return False
+
+
+def _compile(table: Table, fields: Tuple[str, ...], source: str) -> Callable[[Any], Dict[str, Any]]:
+    """フィールドごとの式を並べた関数を生成する"""
+    for field in fields:
+        if field not in table.c or not field.isidentifier() or keyword.iskeyword(field):
+            raise ValueError(f"シリアライズできないフィールドです: {field}")
+    
+    lines = ['def serialize(source):']
+    if source == 'mapping':
+        lines.append('    get = source.get')
+        read = "get('{field}')"
+    else:
+        read = 'source.{field}'
+    
+    items = []
+    for index, field in enumerate(fields):
+        if _is_temporal(table, field):
+            lines.append(f"    v{index} = {read.format(field=field)}")
+            items.append(f"'{field}': v{index}.isoformat() if v{index} is not None else None")
+        else:
+            items.append(f"'{field}': {read.format(field=field)}")
+    lines.append('    return {' + ', '.join(items) + '}')
+    
+    namespace: Dict[str, Any] = {}
+    exec(compile('\n'.join(lines), f"<serializer {table.name}:{source}>", 'exec'), namespace)
+    return namespace['serialize']
+
+
+@lru_cache(maxsize=MAX_COMPILED)
+def row_serializer(table: Table, fields: Tuple[str, ...]) -> Callable[[Any], Dict[str, Any]]:
+    """
+    行（列名と値のマッピング）をシリアライズする関数を返す
+    
+    Args:
+        table: モデルのテーブル
+        fields: 含めるフィールド（この順に出力される）
+    
+    Returns:
+        マッピングを受け取り辞書を返す関数（存在しないキーはNoneになる）
+    """
+    return _compile(table, fields, 'mapping')
+
+
+@lru_cache(maxsize=MAX_COMPILED)
+def object_serializer(table: Table, fields: Tuple[str, ...]) -> Callable[[Any], Dict[str, Any]]:
+    """
+    モデルのインスタンスをシリアライズする関数を返す
+    
+    指定されたフィールドの属性のみを参照するため、読み込まれていない列は取得されません。
+    
+    Args:
+        table: モデルのテーブル
+        fields: 含めるフィールド（この順に出力される）
+    
+    Returns:
+        インスタンスを受け取り辞書を返す関数
+    """
+    return _compile(table, fields, 'object')
@@ -0,0 +1,120 @@
+"""
+セッショントークンモジュール
+
+Firebase IDトークンの検証後に発行する短命なHMAC署名付きトークンを扱います。
+セッショントークンは対称鍵で検証できるため、RS256の署名検証や鍵の取得が不要です。
+"""
+import time
+import hashlib
+from typing import Any, Dict, List, Tuple
+
+from itsdangerous import URLSafeSerializer, BadSignature
+
+from logger import get_logger
+
+# ロガーの取得
+logger = get_logger(__name__)
+
+# セッショントークンの接頭辞（Firebase IDトークンと区別するため）
+SESSION_TOKEN_PREFIX = 'st.'
+
+
+class SessionTokenError(Exception):
+    """セッショントークンが無効な場合の例外"""
+
+
+class SessionTokenExpiredError(SessionTokenError):
+    """セッショントークンの有効期限が切れている場合の例外"""
+
+
+def is_session_token(token: str) -> bool:
+    """
+    トークンがセッショントークンかどうかを判定する
+    
+    Args:
+        token: 判定するトークン
+    
+    Returns:
+        bool: セッショントークンかどうか
+    """
+    return token.startswith(SESSION_TOKEN_PREFIX)
+
+
+class SessionTokenManager:
+    """
+    セッショントークンの発行と検証を行うクラス
+    
+    複数の秘密鍵を受け付け、最後の鍵で署名し、すべての鍵で検証します。
+    新しい鍵をリストの末尾に追加し、古い鍵の発行済みトークンが失効した後に
+    先頭から取り除くことで鍵をローテーションできます。
+    """
+    
+    def __init__(self, secret_keys: List[str], ttl: int = 900) -> None:
+        """
+        マネージャーの初期化
+        
+        Args:
+            secret_keys: 署名用の秘密鍵のリスト（古い順、最後の鍵で署名する）
+            ttl: セッショントークンの最大有効期間（秒）
+        """
+        if not secret_keys:
+            raise ValueError("セッショントークンの秘密鍵が設定されていません")
+        self.ttl = ttl
+        self._serializer = URLSafeSerializer(
+            secret_keys,
+            salt='session-token',
+            signer_kwargs={'digest_method': hashlib.sha256}
+        )
+    
+    def issue(self, decoded_token: Dict[str, Any]) -> Tuple[str, int]:
+        """
+        検証済みのFirebase IDトークンからセッショントークンを発行する
+        
+        有効期限はFirebase IDトークンの有効期限（exp）を超えません。
+        カスタムクレームを含むすべてのクレームを引き継ぐため、claim()によるポリシーは
+        IDトークンと同じ判定になります。
+        
+        Args:
+            decoded_token: デコードされたFirebase IDトークン
+        
+        Returns:
+            セッショントークンと有効期限（UNIXエポック秒）のタプル
+        """
+        expires_at = int(time.time()) + self.ttl
+        if decoded_token.get('exp'):
+            expires_at = min(expires_at, int(decoded_token['exp']))
+        
+        payload = {key: value for key, value in decoded_token.items() if key != 'session'}
+        payload.setdefault('email_verified', False)
+        payload['exp'] = expires_at
+        return SESSION_TOKEN_PREFIX + self._serializer.dumps(payload), expires_at
+    
+    def verify(self, token: str) -> Dict[str, Any]:
+        """
+        セッショントークンを検証し、クレームを返す
+        
+        Args:
+            token: セッショントークン
+        
+        Returns:
+            クレームの辞書（uid、email、expなど）
+        
+        Raises:
+            SessionTokenExpiredError: 有効期限が切れている場合
+            SessionTokenError: 署名が不正な場合
+        """
+        if not is_session_token(token):
+            raise SessionTokenError("セッショントークンではありません")
+        
+        try:
+            claims = self._serializer.loads(token[len(SESSION_TOKEN_PREFIX):])
+        except BadSignature as e:
+            raise SessionTokenError(f"セッショントークンの署名が不正です: {str(e)}")
+        
+        if not isinstance(claims, dict) or not claims.get('uid'):
+            raise SessionTokenError("セッショントークンのクレームが不正です")
+        if claims.get('exp', 0) <= time.time():
+            raise SessionTokenExpiredError("セッショントークンの有効期限が切れています")
+        
+        claims['session'] = True
+        return claims
@@ -0,0 +1,436 @@
+"""
+Firebase IDトークンのオフライン検証モジュール
+
+Googleの署名鍵セットをプロセス内で保持し、リクエスト処理中にネットワークへ
+アクセスすることなくFirebase IDトークン（RS256 JWT）を検証します。
+鍵セットはローカルファイルに永続化され、バックグラウンドスレッドで有効期限前に更新されます。
+"""
+import os
+import re
+import json
+import stat
+import time
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from startup import lazy_import
+from logger import get_logger
+
+# 暗号化ライブラリとHTTPクライアントは初回使用時にインポートする
+jwt = lazy_import('jwt')
+requests = lazy_import('requests')
+x509 = lazy_import('cryptography.x509')
+
+# ロガーの取得
+logger = get_logger(__name__)
+
+# Firebase IDトークンの署名鍵（x509証明書）の取得元
+FIREBASE_SIGNING_KEYS_URL = (
+    'https://www.googleapis.com/robot/v1/metadata/x509/'
+    'securetoken@system.gserviceaccount.com'
+)
+
+# Firebase IDトークンの発行者プレフィックス
+FIREBASE_ISSUER_PREFIX = 'https://securetoken.google.com/'
+
+# Cache-Controlヘッダーが無い場合の鍵セットの有効期間（秒）
+DEFAULT_KEYS_TTL = 3600
+
+_MAX_AGE_PATTERN = re.compile(r'max-age=(\d+)')
+
+
+class TokenVerificationError(Exception):
+    """トークンが無効な場合の例外"""
+
+
+class TokenExpiredError(TokenVerificationError):
+    """トークンの有効期限が切れている場合の例外"""
+
+
+class SigningKeysUnavailableError(Exception):
+    """有効な署名鍵セットを取得できない場合の例外"""
+
+
+class KeySource(ABC):
+    """
+    署名鍵セットの取得元の基底クラス
+
+    テストやベンチマークではファイルやスタブサーバーを取得元として差し替えられます。
+    fetchを実装していない取得元はインスタンスの作成時にTypeErrorになります。
+    """
+
+    @abstractmethod
+    def fetch(self) -> Tuple[Dict[str, str], float]:
+        """
+        署名鍵セットを取得する
+
+        Returns:
+            鍵ID（kid）からPEM形式の証明書へのマッピングと、有効期限（UNIXエポック秒）のタプル
+        """
+
+
+class HttpKeySource(KeySource):
+    """HTTP(S)で公開されている署名鍵セットの取得元"""
+
+    def __init__(self, url: str = FIREBASE_SIGNING_KEYS_URL, timeout: float = 5.0) -> None:
+        """
+        取得元の初期化
+
+        Args:
+            url: 証明書JSONのURL
+            timeout: HTTPタイムアウト（秒）
+        """
+        self.url = url
+        self.timeout = timeout
+
+    def fetch(self) -> Tuple[Dict[str, str], float]:
+        response = requests.get(self.url, timeout=self.timeout)
+        response.raise_for_status()
+
+        max_age = DEFAULT_KEYS_TTL
+        match = _MAX_AGE_PATTERN.search(response.headers.get('Cache-Control', ''))
+        if match:
+            max_age = int(match.group(1))
+
+        return response.json(), time.time() + max_age
+
+
+class FileKeySource(KeySource):
+    """ローカルファイルに保存された署名鍵セットの取得元"""
+
+    def __init__(self, path: str, ttl: int = DEFAULT_KEYS_TTL) -> None:
+        """
+        取得元の初期化
+
+        Args:
+            path: 証明書JSON（kidからPEMへのマッピング）のファイルパス
+            ttl: 読み込んだ鍵セットの有効期間（秒）
+        """
+        self.path = path
+        self.ttl = ttl
+
+    def fetch(self) -> Tuple[Dict[str, str], float]:
+        with open(self.path, 'r', encoding='utf-8') as f:
+            return json.load(f), time.time() + self.ttl
+
+
+def key_source_from_uri(uri: str) -> KeySource:
+    """
+    URIから署名鍵セットの取得元を作成する
+
+    Args:
+        uri: http(s)://で始まるURL、file://で始まるURI、またはファイルパス
+
+    Returns:
+        署名鍵セットの取得元
+    """
+    if uri.startswith('http://') or uri.startswith('https://'):
+        return HttpKeySource(uri)
+    if uri.startswith('file://'):
+        uri = uri[len('file://'):]
+    return FileKeySource(uri)
+
+
+class SigningKeySet:
+    """
+    署名鍵セットを保持・永続化・更新するクラス
+
+    起動時にローカルファイルから鍵セットを読み込み、有効期限の前にバックグラウンドで更新します。
+    取得元が利用できない間は最後に取得できた鍵セットを使い続けます。
+    """
+
+    def __init__(
+        self,
+        source: KeySource,
+        cache_file: Optional[str] = None,
+        refresh_margin: int = 300,
+        retry_interval: int = 30,
+        unknown_kid_refresh_interval: int = 60,
+        clock: Callable[[], float] = time.time
+    ) -> None:
+        """
+        鍵セットの初期化
+
+        Args:
+            source: 署名鍵セットの取得元
+            cache_file: 鍵セットを永続化するファイルパス（Noneの場合は永続化しない）
+            refresh_margin: 有効期限の何秒前に更新するか
+            retry_interval: 更新に失敗した場合の再試行間隔（秒）
+            unknown_kid_refresh_interval: 不明な鍵IDによる臨時の更新の最小間隔（秒）
+            clock: 現在時刻を返す関数（テスト用に差し替え可能）
+        """
+        self.source = source
+        self.cache_file = cache_file
+        self.refresh_margin = refresh_margin
+        self.retry_interval = retry_interval
+        self.unknown_kid_refresh_interval = unknown_kid_refresh_interval
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._unknown_kid_lock = threading.Lock()
+        self._last_unknown_kid_refresh: Optional[float] = None
+        self._certs: Dict[str, str] = {}
+        self._public_keys: Dict[str, Any] = {}
+        self._load_attempted = False
+        self.expires_at = 0.0
+        self.refresh_count = 0
+        self.refresh_failures = 0
+        self._thread: Optional[threading.Thread] = None
+        self._thread_pid: Optional[int] = None
+        self._stop_event = threading.Event()
+
+    def _install(self, certs: Dict[str, str], expires_at: float) -> None:
+        """取得した鍵セットを公開鍵に変換して差し替える"""
+        public_keys = {
+            kid: x509.load_pem_x509_certificate(pem.encode('utf-8')).public_key()
+            for kid, pem in certs.items()
+        }
+        with self._lock:
+            self._certs = dict(certs)
+            self._public_keys = public_keys
+            self.expires_at = expires_at
+
+    def _persist(self) -> None:
+        """現在の鍵セットをファイルにアトミックに書き込む（プロセスのユーザーのみが読み書きできる権限で作成する）"""
+        if not self.cache_file:
+            return
+        tmp_path = f"{self.cache_file}.{os.getpid()}.tmp"
+        try:
+            if os.path.lexists(tmp_path):
+                os.unlink(tmp_path)
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({'keys': self._certs, 'expires_at': self.expires_at}, f)
+            os.replace(tmp_path, self.cache_file)
+        except OSError as e:
+            logger.warning(f"署名鍵セットの保存に失敗しました: {str(e)}")
+
+    @staticmethod
+    def _is_trusted_file(status: os.stat_result) -> bool:
+        """
+        鍵セットファイルを信頼できるかどうか
+
+        読み込んだ証明書はトークンの検証に使用されるため、他のユーザーが所有するファイルや
+        グループ・他のユーザーが書き込めるファイルは、偽造したトークンを受け付けないよう読み込みません。
+        """
+        if hasattr(os, 'geteuid') and status.st_uid != os.geteuid():
+            return False
+        return not status.st_mode & (stat.S_IWGRP | stat.S_IWOTH)
+
+    def load(self) -> bool:
+        """
+        永続化された鍵セットを読み込み、無い場合や期限切れの場合は取得元から取得する
+
+        Returns:
+            bool: 使用可能な鍵セットが読み込まれたかどうか
+        """
+        self._load_attempted = True
+        if self.cache_file and os.path.exists(self.cache_file):
+            try:
+                with open(self.cache_file, 'r', encoding='utf-8') as f:
+                    if self._is_trusted_file(os.fstat(f.fileno())):
+                        data = json.load(f)
+                    else:
+                        data = None
+                        logger.warning(
+                            f"他のユーザーが所有または書き込み可能な署名鍵セットファイルは読み込みません: {self.cache_file}"
+                        )
+                if data is not None:
+                    self._install(data['keys'], float(data['expires_at']))
+                    logger.info(f"署名鍵セットをファイルから読み込みました: {self.cache_file}")
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"署名鍵セットファイルの読み込みに失敗しました: {str(e)}")
+
+        if self.expires_at - self.refresh_margin <= self._clock():
+            self.refresh()
+
+        return bool(self._public_keys)
+
+    def refresh(self) -> bool:
+        """
+        取得元から鍵セットを取得して差し替える（失敗時は既存の鍵セットを維持する）
+
+        Returns:
+            bool: 更新が成功したかどうか
+        """
+        try:
+            certs, expires_at = self.source.fetch()
+            self._install(certs, expires_at)
+        except Exception as e:
+            self.refresh_failures += 1
+            logger.error(f"署名鍵セットの更新に失敗しました（既存の鍵セットを継続使用します）: {str(e)}")
+            return False
+
+        self.refresh_count += 1
+        self._persist()
+        logger.info(f"署名鍵セットを更新しました（鍵数: {len(certs)}）")
+        return True
+
+    def _next_refresh_delay(self) -> float:
+        """次の更新までの待機時間を計算する"""
+        delay = self.expires_at - self.refresh_margin - self._clock()
+        return max(delay, float(self.retry_interval))
+
+    def _run(self) -> None:
+        """バックグラウンド更新ループ"""
+        while not self._stop_event.wait(self._next_refresh_delay()):
+            self.refresh()
+
+    def ensure_started(self) -> None:
+        """
+        バックグラウンド更新スレッドを開始する
+
+        フォーク後のワーカープロセスではスレッドが引き継がれないため、プロセスごとに開始します。
+        """
+        if self._thread_pid == os.getpid() and self._thread and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread_pid == os.getpid() and self._thread and self._thread.is_alive():
+                return
+            self._stop_event.clear()
+            self._thread = threading.Thread(
+                target=self._run, name='firebase-signing-key-refresh', daemon=True
+            )
+            self._thread_pid = os.getpid()
+            self._thread.start()
+
+    def stop(self) -> None:
+        """バックグラウンド更新スレッドを停止する"""
+        self._stop_event.set()
+
+    def get_key(self, kid: str) -> Any:
+        """
+        鍵IDに対応する公開鍵を取得する
+
+        Googleが鍵を入れ替えてから次のバックグラウンド更新までの間も新しい鍵で署名されたトークンを
+        受け付けるため、鍵IDが見つからない場合は鍵セットを臨時に更新してから探し直します。
+
+        Args:
+            kid: JWTヘッダーの鍵ID
+
+        Returns:
+            公開鍵
+
+        Raises:
+            SigningKeysUnavailableError: 鍵セットが読み込まれていない場合
+            TokenVerificationError: 鍵IDが鍵セットに存在しない場合
+        """
+        if not self._public_keys and not self._load_attempted:
+            # 起動時に読み込まれていない場合（遅延初期化）は初回使用時に一度だけ読み込む
+            with self._lock:
+                should_load = not self._load_attempted
+                self._load_attempted = True
+            if should_load:
+                self.load()
+
+        public_keys = self._public_keys
+        if not public_keys:
+            raise SigningKeysUnavailableError("署名鍵セットが読み込まれていません")
+        key = public_keys.get(kid)
+        if key is None:
+            self._refresh_for_unknown_kid()
+            key = self._public_keys.get(kid)
+        if key is None:
+            raise TokenVerificationError(f"不明な鍵IDです: {kid}")
+        return key
+
+    def _refresh_for_unknown_kid(self) -> None:
+        """
+        不明な鍵IDのために鍵セットを更新する
+
+        同時に不明な鍵IDを受け取ったスレッドは1回の更新の完了を待ち（シングルフライト）、
+        偽の鍵IDで取得元に負荷をかけられないよう、更新はunknown_kid_refresh_interval秒に1回までに制限します。
+        """
+        with self._unknown_kid_lock:
+            now = self._clock()
+            last = self._last_unknown_kid_refresh
+            if last is not None and now - last < self.unknown_kid_refresh_interval:
+                return
+            self._last_unknown_kid_refresh = now
+            logger.info("不明な鍵IDのため署名鍵セットを更新します")
+            self.refresh()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        鍵セットの状態を返す
+
+        Returns:
+            鍵数、有効期限、更新回数などを含む辞書
+        """
+        return {
+            'keys': len(self._public_keys),
+            'expires_at': self.expires_at,
+            'refresh_count': self.refresh_count,
+            'refresh_failures': self.refresh_failures
+        }
+
+
+class FirebaseTokenVerifier:
+    """ネットワークにアクセスせずにFirebase IDトークンを検証するエンジン"""
+
+    def __init__(self, project_id: str, key_set: SigningKeySet, leeway: int = 0) -> None:
+        """
+        検証エンジンの初期化
+
+        Args:
+            project_id: FirebaseプロジェクトID（audクレームと照合）
+            key_set: 署名鍵セット
+            leeway: 時刻クレームの検証で許容する時計のずれ（秒）
+        """
+        self.project_id = project_id
+        self.issuer = f"{FIREBASE_ISSUER_PREFIX}{project_id}"
+        self.key_set = key_set
+        self.leeway = leeway
+
+    def verify(self, token: str) -> Dict[str, Any]:
+        """
+        Firebase IDトークンを検証し、デコードされたクレームを返す
+
+        Args:
+            token: Firebase IDトークン
+
+        Returns:
+            デコードされたトークン（uidクレームを含む）
+
+        Raises:
+            TokenExpiredError: トークンの有効期限が切れている場合
+            TokenVerificationError: トークンが無効な場合
+            SigningKeysUnavailableError: 署名鍵セットが利用できない場合
+        """
+        self.key_set.ensure_started()
+
+        try:
+            header = jwt.get_unverified_header(token)
+        except jwt.PyJWTError as e:
+            raise TokenVerificationError(f"トークンの形式が不正です: {str(e)}")
+
+        if header.get('alg') != 'RS256':
+            raise TokenVerificationError("トークンの署名アルゴリズムが不正です")
+        kid = header.get('kid')
+        if not kid:
+            raise TokenVerificationError("トークンに鍵IDがありません")
+
+        try:
+            claims = jwt.decode(
+                token,
+                self.key_set.get_key(kid),
+                algorithms=['RS256'],
+                audience=self.project_id,
+                issuer=self.issuer,
+                leeway=self.leeway,
+                options={'require': ['exp', 'iat', 'sub']}
+            )
+        except jwt.ExpiredSignatureError as e:
+            raise TokenExpiredError(f"トークンの有効期限が切れています: {str(e)}")
+        except jwt.PyJWTError as e:
+            raise TokenVerificationError(f"トークンの検証に失敗しました: {str(e)}")
+
+        subject = claims['sub']
+        if not isinstance(subject, str) or not subject or len(subject) > 128:
+            raise TokenVerificationError("トークンのsubクレームが不正です")
+        auth_time = claims.get('auth_time')
+        if auth_time is not None and auth_time > time.time() + self.leeway:
+            raise TokenVerificationError("トークンのauth_timeクレームが未来の時刻です")
+
+        claims['uid'] = subject
+        return claims
@@ -0,0 +1,272 @@
+"""
+書き込みの集約モジュール
+
+同じユーザーの短時間に連続するプロフィール更新（エディターの自動保存など）を、
+集約ウィンドウの間まとめて1回のアップサートとコミットで書き込みます。
+最初のリクエスト（リーダー）がウィンドウの終了後に集約した更新を書き込み、
+ウィンドウ内に到着した後続のリクエスト（フォロワー）はその結果を待って同じプロフィールを返します。
+ASGIモードではsubmit_asyncで同じ集約をイベントループ上で行います。
+"""
+import time
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from flask import Flask
+
+from logger import get_logger
+
+# ロガーの取得
+logger = get_logger(__name__)
+
+
+class _Batch:
+    """集約中の更新と書き込みの結果"""
+    
+    def __init__(self) -> None:
+        self.data: Dict[str, Any] = {}
+        self.size = 0
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.done = threading.Event()
+
+
+class _AsyncBatch(_Batch):
+    """イベントループ上で集約中の更新と書き込みの結果"""
+    
+    def __init__(self) -> None:
+        super().__init__()
+        self.done_async = asyncio.Event()
+
+
+class WriteCoalescer:
+    """キーごとの書き込みを集約ウィンドウの間まとめて実行する"""
+    
+    def __init__(self) -> None:
+        """集約の初期化（init_write_coalescerで有効化されるまでは集約しない）"""
+        self.enabled = False
+        self.window = 0.05
+        self._pending: Dict[str, _Batch] = {}
+        self._writing: Dict[str, _Batch] = {}
+        self._async_pending: Dict[str, _AsyncBatch] = {}
+        self._async_writing: Dict[str, _AsyncBatch] = {}
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.batches = 0
+        self.absorbed = 0
+        self.max_batch_size = 0
+        self.errors = 0
+    
+    def configure(self, enabled: bool, window_ms: int) -> None:
+        """
+        集約を設定する
+        
+        Args:
+            enabled: 集約を有効にするかどうか
+            window_ms: 集約ウィンドウ（ミリ秒）
+        """
+        self.enabled = enabled
+        self.window = max(window_ms, 0) / 1000
+        with self._lock:
+            self.submitted = 0
+            self.batches = 0
+            self.absorbed = 0
+            self.max_batch_size = 0
+            self.errors = 0
+    
+    def submit(self, key: str, data: Dict[str, Any], write: Callable[[Dict[str, Any]], Any]) -> Any:
+        """
+        更新を集約して書き込み、書き込み結果を返す
+        
+        同じキーの更新はウィンドウ内の到着順にマージされ（同じフィールドは後の値で上書き）、
+        writeは集約した更新で1回だけ呼び出されます。集約された全員に同じ結果（または例外）が返されます。
+        
+        Args:
+            key: 集約するキー（firebase_uid）
+            data: 更新するデータの辞書
+            write: 集約した更新を書き込み、結果を返す関数
+        
+        Returns:
+            writeの戻り値
+        """
+        if not self.enabled:
+            return write(data)
+        
+        batch, leader = self._join(self._pending, key, data, _Batch)
+        if leader:
+            self._flush(key, batch, write)
+        else:
+            batch.done.wait()
+        
+        if batch.error is not None:
+            raise batch.error
+        return batch.result
+    
+    async def submit_async(
+        self,
+        key: str,
+        data: Dict[str, Any],
+        write: Callable[[Dict[str, Any]], Awaitable[Any]]
+    ) -> Any:
+        """
+        submitの非同期版（ASGIモード用）
+        
+        ウィンドウの待機と後続のリクエストの待機はイベントループ上で行い、スレッドを占有しません。
+        
+        Args:
+            key: 集約するキー（firebase_uid）
+            data: 更新するデータの辞書
+            write: 集約した更新を書き込み、結果を返すコルーチン関数
+        
+        Returns:
+            writeの戻り値
+        """
+        if not self.enabled:
+            return await write(data)
+        
+        batch, leader = self._join(self._async_pending, key, data, _AsyncBatch)
+        if leader:
+            await self._flush_async(key, batch, write)
+        else:
+            await batch.done_async.wait()
+        
+        if batch.error is not None:
+            raise batch.error
+        return batch.result
+    
+    def _join(self, pending: Dict[str, Any], key: str, data: Dict[str, Any], factory: Callable[[], Any]) -> Any:
+        """集約中のバッチに更新を追加する（バッチがない場合は作成してリーダーになる）"""
+        with self._lock:
+            self.submitted += 1
+            batch = pending.get(key)
+            leader = batch is None
+            if leader:
+                batch = factory()
+                pending[key] = batch
+            batch.data.update(data)
+            batch.size += 1
+        return batch, leader
+    
+    def _start_write(self, pending: Dict[str, Any], writing: Dict[str, Any], key: str, batch: _Batch) -> Any:
+        """ウィンドウを閉じて書き込み中のバッチにし、前の集約のバッチを返す"""
+        # 以降に到着した更新は次の集約に含める
+        with self._lock:
+            if pending.get(key) is batch:
+                del pending[key]
+            previous = writing.get(key)
+            writing[key] = batch
+            self.batches += 1
+            self.absorbed += batch.size - 1
+            if batch.size > self.max_batch_size:
+                self.max_batch_size = batch.size
+        return previous
+    
+    def _finish_write(
+        self,
+        pending: Dict[str, Any],
+        writing: Dict[str, Any],
+        key: str,
+        batch: _Batch,
+        error: Optional[BaseException]
+    ) -> None:
+        """書き込みの結果を記録し、集約中・書き込み中のバッチから取り除く"""
+        with self._lock:
+            if error is not None:
+                batch.error = error
+                self.errors += 1
+            # ウィンドウを閉じる前に中断された場合は集約中のまま残っている
+            if pending.get(key) is batch:
+                del pending[key]
+            if writing.get(key) is batch:
+                del writing[key]
+        
+        if batch.size > 1:
+            logger.debug(f"{batch.size}件の書き込みを1回に集約しました: {key}")
+    
+    def _flush(self, key: str, batch: _Batch, write: Callable[[Dict[str, Any]], Any]) -> None:
+        """ウィンドウの終了を待ってから集約した更新を書き込む（リーダーのみ）"""
+        if self.window > 0:
+            time.sleep(self.window)
+        
+        previous = self._start_write(self._pending, self._writing, key, batch)
+        
+        # 前の集約の書き込みが終わるまで待ち、古い更新で新しい更新を上書きしないようにする
+        if previous is not None:
+            previous.done.wait()
+        
+        error = None
+        try:
+            batch.result = write(dict(batch.data))
+        except BaseException as e:
+            error = e
+        finally:
+            self._finish_write(self._pending, self._writing, key, batch, error)
+            batch.done.set()
+    
+    async def _flush_async(
+        self,
+        key: str,
+        batch: _AsyncBatch,
+        write: Callable[[Dict[str, Any]], Awaitable[Any]]
+    ) -> None:
+        """
+        _flushの非同期版
+        
+        リーダーのタスクがキャンセルされた場合（クライアントの切断、lifespanの終了など）も、
+        バッチを取り除いてフォロワーにエラーを返し、以降の更新が終わらないバッチを待ち続けないようにします。
+        """
+        error = None
+        try:
+            if self.window > 0:
+                await asyncio.sleep(self.window)
+            
+            previous = self._start_write(self._async_pending, self._async_writing, key, batch)
+            if previous is not None:
+                await previous.done_async.wait()
+            
+            batch.result = await write(dict(batch.data))
+        except asyncio.CancelledError:
+            # フォロワーのタスクはキャンセルされていないため、キャンセルではなくエラーとして返す
+            error = RuntimeError(f"集約した書き込みがキャンセルされました: {key}")
+            raise
+        except BaseException as e:
+            error = e
+        finally:
+            self._finish_write(self._async_pending, self._async_writing, key, batch, error)
+            batch.done_async.set()
+    
+    def stats(self) -> Dict[str, Any]:
+        """
+        統計情報を返す
+        
+        Returns:
+            受け付けた書き込み数、実際の書き込み数、集約された書き込み数などを含む辞書
+        """
+        return {
+            'enabled': self.enabled,
+            'window_ms': self.window * 1000,
+            'submitted': self.submitted,
+            'writes': self.batches,
+            'absorbed': self.absorbed,
+            'max_batch_size': self.max_batch_size,
+            'errors': self.errors
+        }
+
+
+# プロフィール更新の集約
+write_coalescer = WriteCoalescer()
+
+
+def init_write_coalescer(app: Flask) -> None:
+    """
+    アプリケーション設定に基づいて書き込みの集約を初期化する
+    
+    Args:
+        app: Flaskアプリケーションインスタンス
+    """
+    write_coalescer.configure(
+        enabled=app.config.get('WRITE_COALESCING_ENABLED', False),
+        window_ms=app.config.get('WRITE_COALESCING_WINDOW_MS', 50)
+    )
+    if write_coalescer.enabled:
+        logger.info(f"プロフィール更新の集約が有効になりました（ウィンドウ: {write_coalescer.window * 1000:.0f}ms）")
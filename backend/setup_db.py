@@ -1,21 +1,24 @@
 """
 データベースセットアップスクリプト
 
-このスクリプトはデータベースの作成とマイグレーションを行います。
+このスクリプトはデータベースの作成とマイグレーション（migrateサブコマンド）、
+ユーザープロフィールの一括インポート・エクスポートを行います。
 アプリケーション起動とは別に実行することで、データベースの初期化と
 マイグレーションを分離します。
 """
 import os
 import sys
+import time
 import argparse
+from typing import Optional
 from flask import Flask
-from dotenv import load_dotenv
 
-# 設定のインポート
+# 設定のインポート（環境変数の読み込みはconfigモジュールで行う）
 from config import get_config
 
 # サービスのインポート
 from services.db_service import init_db, db
+from services.partitioning import init_partitioning
 
 # ロギングのインポート
 from logger import setup_logger, get_logger
@@ -30,9 +33,6 @@ def create_app_for_db():
     Returns:
         設定済みのFlaskアプリケーションインスタンス
     """
-    # 環境変数の読み込み
-    load_dotenv()
-    
     # Flaskアプリケーションの作成
     app = Flask(__name__)
     
@@ -45,6 +45,7 @@ def create_app_for_db():
     
     # データベースの初期化
     init_db(app)
+    init_partitioning(app)
     
     return app
 
@@ -66,6 +67,131 @@ def create_tables(app, drop_all=False):
         db.create_all()
         logger.info("データベーステーブルが作成されました")
 
+class ProgressPrinter:
+    """一括インポート・エクスポートの進捗を標準エラー出力に表示する"""
+    
+    def __init__(self, interval: float = 1.0) -> None:
+        self.interval = interval
+        self.started = time.perf_counter()
+        self._last_printed = 0.0
+    
+    def __call__(self, processed: int, total: Optional[int]) -> None:
+        now = time.perf_counter()
+        if now - self._last_printed < self.interval and processed != total:
+            return
+        self._last_printed = now
+        
+        elapsed = now - self.started
+        rate = processed / elapsed / (1024 * 1024) if elapsed else 0.0
+        if total:
+            message = f"{processed * 100 / total:5.1f}% ({processed:,} / {total:,} バイト, {rate:.1f} MB/s)"
+        else:
+            message = f"{processed:,} バイト ({rate:.1f} MB/s)"
+        print(f"\r{message}", end='', file=sys.stderr, flush=True)
+    
+    def finish(self) -> None:
+        print(file=sys.stderr)
+
+def import_profiles(app, path, file_format='csv', on_conflict='error', columns=None, batch_size=5000):
+    """
+    ファイルからユーザープロフィールを一括で読み込む
+    
+    Args:
+        app: Flaskアプリケーションインスタンス
+        path: 読み込むファイルのパス
+        file_format: ファイル形式（csvまたはbinary）
+        on_conflict: firebase_uidの競合時の動作（error、skip、update）
+        columns: バイナリ形式の列の順序
+        batch_size: SQLiteで1回のexecutemanyに含める行数
+    
+    Returns:
+        読み込んだ行数と処理時間の辞書
+    """
+    from models.user_profile import UserProfile
+    from services.bulk_io import import_file
+    
+    progress = ProgressPrinter()
+    with app.app_context():
+        result = import_file(
+            UserProfile.__table__, path,
+            file_format=file_format,
+            on_conflict=on_conflict,
+            columns=columns,
+            batch_size=batch_size,
+            progress=progress
+        )
+    progress.finish()
+    return result
+
+def export_profiles(app, path, file_format='csv', columns=None, batch_size=5000):
+    """
+    ユーザープロフィールをファイルに一括で書き出す
+    
+    Args:
+        app: Flaskアプリケーションインスタンス
+        path: 書き出し先のファイルのパス
+        file_format: ファイル形式（csvまたはbinary）
+        columns: 書き出す列
+        batch_size: SQLiteで一度に読み込む行数
+    
+    Returns:
+        書き出した行数と処理時間の辞書
+    """
+    from models.user_profile import UserProfile
+    from services.bulk_io import export_file
+    
+    progress = ProgressPrinter()
+    with app.app_context():
+        result = export_file(
+            UserProfile.__table__, path,
+            file_format=file_format,
+            columns=columns,
+            batch_size=batch_size,
+            progress=progress
+        )
+    progress.finish()
+    return result
+
+def migrate(app, target=None, show_status=False):
+    """
+    未適用のマイグレーションを適用する
+    
+    Args:
+        app: Flaskアプリケーションインスタンス
+        target: このバージョンまで適用する（省略時はすべて）
+        show_status: 適用せずにマイグレーションごとの適用状況を表示する
+    
+    Returns:
+        適用したバージョンのリスト（show_statusの場合は適用状況のリスト）
+    """
+    from migrations import run_migrations, migration_status
+    
+    with app.app_context():
+        if show_status:
+            return migration_status(db.engine)
+        return run_migrations(db.engine, app.config, target=target)
+
+def partition(app, partitions=None, drop_old=False):
+    """
+    既存のuser_profilesをハッシュパーティションテーブルにオンラインで移行する（PostgreSQLのみ）
+    
+    Args:
+        app: Flaskアプリケーションインスタンス
+        partitions: パーティション数（省略時はDB_HASH_PARTITIONS）
+        drop_old: 移行後に元のテーブルを削除するかどうか
+    
+    Returns:
+        移行したかどうか
+    """
+    from migrations.partition import partition_profiles
+    
+    with app.app_context():
+        return partition_profiles(db.engine, app.config, partitions=partitions, drop_old=drop_old)
+
+def _split_columns(value):
+    """カンマ区切りの列名を分割する"""
+    return [column.strip() for column in value.split(',') if column.strip()] if value else None
+
 def main():
     """メイン関数"""
     parser = argparse.ArgumentParser(description='データベースセットアップツール')
@@ -73,6 +199,36 @@ def main():
     parser.add_argument('--env', type=str, default='development', 
                         help='環境設定 (development, testing, production)')
     
+    subparsers = parser.add_subparsers(dest='command')
+    
+    import_parser = subparsers.add_parser('import', help='ファイルからユーザープロフィールを一括で読み込む')
+    import_parser.add_argument('file', help='読み込むファイル')
+    import_parser.add_argument('--format', choices=['csv', 'binary'], default='csv',
+                               help='ファイル形式（binaryはPostgreSQLのみ）')
+    import_parser.add_argument('--on-conflict', choices=['error', 'skip', 'update'], default='error',
+                               help='firebase_uidが既に存在する場合の動作')
+    import_parser.add_argument('--columns', help='バイナリ形式の列の順序（カンマ区切り）')
+    import_parser.add_argument('--batch-size', type=int, default=5000,
+                               help='SQLiteで1回に書き込む行数')
+    
+    export_parser = subparsers.add_parser('export', help='ユーザープロフィールをファイルに一括で書き出す')
+    export_parser.add_argument('file', help='書き出し先のファイル')
+    export_parser.add_argument('--format', choices=['csv', 'binary'], default='csv',
+                               help='ファイル形式（binaryはPostgreSQLのみ）')
+    export_parser.add_argument('--columns', help='書き出す列（カンマ区切り）')
+    export_parser.add_argument('--batch-size', type=int, default=5000,
+                               help='SQLiteで一度に読み込む行数')
+    
+    migrate_parser = subparsers.add_parser('migrate', help='未適用のマイグレーションを適用する')
+    migrate_parser.add_argument('--target', help='このバージョンまで適用する')
+    migrate_parser.add_argument('--status', action='store_true', help='適用せずに適用状況を表示する')
+    
+    partition_parser = subparsers.add_parser(
+        'partition', help='既存のuser_profilesをハッシュパーティションテーブルにオンラインで移行する'
+    )
+    partition_parser.add_argument('--partitions', type=int, help='パーティション数（省略時はDB_HASH_PARTITIONS）')
+    partition_parser.add_argument('--drop-old', action='store_true', help='移行後に元のテーブルを削除する')
+    
     args = parser.parse_args()
     
     # 環境変数の設定
@@ -81,6 +237,36 @@ def main():
     # アプリケーションの作成
     app = create_app_for_db()
     
+    if args.command == 'import':
+        result = import_profiles(
+            app, args.file, args.format, args.on_conflict,
+            _split_columns(args.columns), args.batch_size
+        )
+        logger.info(f"{result['rows']}行をインポートしました（{result['seconds']:.1f}秒）")
+        return 0
+    
+    if args.command == 'export':
+        result = export_profiles(
+            app, args.file, args.format,
+            _split_columns(args.columns), args.batch_size
+        )
+        logger.info(f"{result['rows']}行をエクスポートしました（{result['seconds']:.1f}秒）")
+        return 0
+    
+    if args.command == 'migrate':
+        if args.status:
+            for entry in migrate(app, show_status=True):
+                mark = 'x' if entry['applied'] else ' '
+                print(f"[{mark}] {entry['version']} {entry['description']}")
+            return 0
+        applied = migrate(app, target=args.target)
+        logger.info(f"{len(applied)}件のマイグレーションを適用しました" + (f": {', '.join(applied)}" if applied else ''))
+        return 0
+    
+    if args.command == 'partition':
+        partition(app, partitions=args.partitions, drop_old=args.drop_old)
+        return 0
+    
     # データベーステーブルの作成
     create_tables(app, args.drop)
     
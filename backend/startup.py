@@ -0,0 +1,122 @@
+"""
+起動処理の計測と遅延インポートのモジュール
+"""
+import time
+import importlib
+import threading
+from contextlib import contextmanager
+from types import ModuleType
+from typing import Dict, Iterator, Optional
+
+from logger import get_logger
+
+# ロガーの取得
+logger = get_logger(__name__)
+
+# フェーズ名から所要時間（ミリ秒）へのマッピング
+_timings: Dict[str, float] = {}
+_timings_lock = threading.Lock()
+
+
+def record_timing(phase: str, elapsed_ms: float) -> None:
+    """
+    起動フェーズの所要時間を記録する
+    
+    Args:
+        phase: フェーズ名（例: 'import:firebase_admin', 'init:firebase'）
+        elapsed_ms: 所要時間（ミリ秒）
+    """
+    with _timings_lock:
+        _timings[phase] = round(elapsed_ms, 3)
+
+
+@contextmanager
+def timed(phase: str) -> Iterator[None]:
+    """
+    ブロックの所要時間を起動フェーズとして記録するコンテキストマネージャー
+    
+    Args:
+        phase: フェーズ名
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_timing(phase, (time.perf_counter() - started) * 1000)
+
+
+def get_timings() -> Dict[str, float]:
+    """
+    記録された起動フェーズの所要時間を返す
+    
+    Returns:
+        フェーズ名から所要時間（ミリ秒）へのマッピング
+    """
+    with _timings_lock:
+        return dict(_timings)
+
+
+def check_startup_budget(total_ms: float, budget_ms: float, strict: bool = False) -> bool:
+    """
+    起動時間が予算内に収まっているかを確認する
+    
+    Args:
+        total_ms: 起動にかかった時間（ミリ秒）
+        budget_ms: 起動時間の予算（ミリ秒、0以下の場合は確認しない）
+        strict: 予算を超えた場合に例外を送出するかどうか
+    
+    Returns:
+        bool: 予算内に収まっているかどうか
+    
+    Raises:
+        RuntimeError: strictが有効で予算を超えた場合
+    """
+    if budget_ms <= 0 or total_ms <= budget_ms:
+        return True
+    
+    message = f"起動時間が予算を超えました: {total_ms:.1f}ms（予算: {budget_ms:.1f}ms）"
+    if strict:
+        raise RuntimeError(message)
+    logger.warning(message, extra={'context': {'startup_timings': get_timings()}})
+    return False
+
+
+class LazyModule:
+    """
+    属性への最初のアクセス時にインポートされるモジュールのプロキシ
+    
+    インポートにかかった時間は 'import:<モジュール名>' として記録されます。
+    """
+    
+    def __init__(self, name: str) -> None:
+        """
+        プロキシの初期化
+        
+        Args:
+            name: インポートするモジュール名
+        """
+        self._name = name
+        self._module: Optional[ModuleType] = None
+    
+    def _load(self) -> ModuleType:
+        """モジュールをインポートして返す"""
+        if self._module is None:
+            with timed(f"import:{self._name}"):
+                self._module = importlib.import_module(self._name)
+        return self._module
+    
+    def __getattr__(self, attr: str):
+        return getattr(self._load(), attr)
+
+
+def lazy_import(name: str) -> LazyModule:
+    """
+    モジュールを遅延インポートするプロキシを返す
+    
+    Args:
+        name: インポートするモジュール名
+    
+    Returns:
+        遅延インポートのプロキシ
+    """
+    return LazyModule(name)
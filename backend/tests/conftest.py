@@ -65,3 +65,17 @@ def create_test_profile(app):
         return profile
     
     return _create_profile
+
+
+@pytest.fixture
+def mock_auth():
+    """トークン検証をモックして認証済みの状態にするフィクスチャ"""
+    from unittest.mock import patch
+    import time
+    with patch('services.auth_service.verify_token') as mock_verify_token:
+        mock_verify_token.return_value = {
+            'uid': 'test-user-id',
+            'email': 'test@example.com',
+            'exp': int(time.time()) + 3600
+        }
+        yield mock_verify_token
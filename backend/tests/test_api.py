@@ -2,6 +2,7 @@
 APIエンドポイントのpytestによるテスト
 """
 import json
+import time
 from unittest.mock import patch, MagicMock
 
 import pytest
@@ -20,6 +21,17 @@ def test_index_route(client):
     assert 'endpoints' in data
 
 
+def test_metrics_route(app, client):
+    """メトリクスルートのテスト"""
+    app.config['METRICS_ENABLED'] = True
+    response = client.get('/metrics')
+    data = json.loads(response.data)
+    
+    assert response.status_code == 200
+    assert 'token_cache' in data
+    assert 'create_app' in data['startup']
+
+
 class TestAuthRoutes:
     """認証ルートのテスト"""
     
@@ -47,6 +59,44 @@ class TestAuthRoutes:
         assert data['user']['uid'] == 'test-user-id'
         assert data['user']['email'] == 'test@example.com'
     
+    @patch('services.auth_service.verify_token')
+    def test_verify_auth_issues_session_token(self, mock_verify_token, client, app):
+        """セッショントークンの発行と、セッショントークンによる認証のテスト"""
+        from services.auth_service import init_session_tokens
+        
+        # セッショントークンを有効化
+        app.config['SESSION_TOKEN_ENABLED'] = True
+        init_session_tokens(app)
+        
+        # モックの設定
+        mock_verify_token.return_value = {
+            'uid': 'test-user-id',
+            'email': 'test@example.com',
+            'exp': int(time.time()) + 3600
+        }
+        
+        # テスト
+        response = client.post('/api/auth/verify', headers={'Authorization': 'Bearer test-token'})
+        data = json.loads(response.data)
+        
+        assert response.status_code == 200
+        assert data['session_token'].startswith('st.')
+        
+        # セッショントークンではFirebaseの検証を行わない
+        response = client.post(
+            '/api/auth/verify',
+            headers={'Authorization': f"Bearer {data['session_token']}"}
+        )
+        session_data = json.loads(response.data)
+        
+        assert response.status_code == 200
+        assert session_data['user']['uid'] == 'test-user-id'
+        assert 'session_token' not in session_data
+        assert mock_verify_token.call_count == 1
+        
+        app.config['SESSION_TOKEN_ENABLED'] = False
+        init_session_tokens(app)
+    
     def test_verify_auth_no_token(self, client):
         """認証トークンなしのテスト"""
         response = client.post('/api/auth/verify')
@@ -85,6 +135,45 @@ class TestAuthRoutes:
         
         assert response.status_code == 401
         assert data['error'] == 'unauthorized'
+    
+    @patch('services.auth_service.verify_token')
+    def test_check_tokens_batch(self, mock_verify_token, client):
+        """トークン一括検証のテスト（重複トークンは一度だけ検証される）"""
+        from errors import UnauthorizedError
+        
+        # モックの設定
+        def fake_verify(token):
+            if token == 'bad-token':
+                raise UnauthorizedError("無効な認証トークンです")
+            return {'uid': f'uid-{token}', 'email': None, 'auth_time': 1600000000}
+        mock_verify_token.side_effect = fake_verify
+        
+        # テスト
+        response = client.post(
+            '/api/auth/token/batch',
+            json={'tokens': ['a', 'bad-token', 'a', 'b']}
+        )
+        data = json.loads(response.data)
+        
+        assert response.status_code == 200
+        assert data['count'] == 4
+        assert data['valid_count'] == 3
+        assert data['results'][0] == data['results'][2]
+        assert data['results'][0]['user']['uid'] == 'uid-a'
+        assert data['results'][1]['valid'] is False
+        assert data['results'][1]['error'] == 'unauthorized'
+        assert data['results'][3]['user']['uid'] == 'uid-b'
+        assert mock_verify_token.call_count == 3
+    
+    def test_check_tokens_batch_too_many(self, client, app):
+        """一括検証の上限超過のテスト"""
+        app.config['TOKEN_BATCH_MAX_SIZE'] = 2
+        
+        response = client.post('/api/auth/token/batch', json={'tokens': ['a', 'b', 'c']})
+        data = json.loads(response.data)
+        
+        assert response.status_code == 400
+        assert data['error'] == 'bad_request'
 
 
 class TestProfileRoutes:
@@ -211,3 +300,304 @@ class TestProfileRoutes:
         
         assert response.status_code == 404
         assert data['error'] == 'not_found'
+
+
+class TestProfileCache:
+    """プロフィールキャッシュのテスト"""
+    
+    def test_get_profile_served_from_cache(self, client, auth_headers, mock_auth, create_test_profile):
+        """2回目のプロフィール取得がキャッシュから返されることのテスト"""
+        create_test_profile()
+        
+        with patch.object(UserProfile, 'get_by_firebase_uid', wraps=UserProfile.get_by_firebase_uid) as mock_get:
+            first = client.get('/api/profile', headers=auth_headers)
+            second = client.get('/api/profile', headers=auth_headers)
+        
+        assert first.status_code == second.status_code == 200
+        assert json.loads(first.data)['profile'] == json.loads(second.data)['profile']
+        assert mock_get.call_count == 1
+    
+    def test_existing_profile_is_read_without_insert(self, client, auth_headers, mock_auth, create_test_profile):
+        """既存のプロフィールの取得でINSERTが実行されないことのテスト（キャッシュされない?fields=も含む）"""
+        create_test_profile()
+        
+        with patch.object(UserProfile, 'get_or_create', wraps=UserProfile.get_or_create) as mock_create:
+            client.get('/api/profile', headers=auth_headers)
+            client.get('/api/profile', headers=auth_headers, query_string={'fields': 'display_name'})
+            client.get('/api/profile', headers=auth_headers, query_string={'fields': 'display_name'})
+        
+        assert mock_create.call_count == 0
+    
+    def test_write_updates_and_invalidates_cache(self, client, auth_headers, mock_auth, create_test_profile):
+        """更新・削除後にキャッシュが古いプロフィールを返さないことのテスト"""
+        create_test_profile()
+        client.get('/api/profile', headers=auth_headers)
+        
+        client.put('/api/profile', headers=auth_headers, json={'display_name': 'Updated User'})
+        response = client.get('/api/profile', headers=auth_headers)
+        assert json.loads(response.data)['profile']['display_name'] == 'Updated User'
+        
+        client.delete('/api/profile', headers=auth_headers)
+        response = client.get('/api/profile', headers=auth_headers)
+        data = json.loads(response.data)
+        assert data['profile']['display_name'] is None
+        assert data['message'] == 'プロフィールが作成されました'
+
+
+class TestProfileUpsert:
+    """プロフィールのアップサートのテスト"""
+    
+    def test_upsert_creates_then_updates(self, app):
+        """初回は作成し、2回目は提供されたフィールドのみを更新することのテスト"""
+        created = UserProfile.upsert('upsert-user', {'display_name': 'First', 'bio': 'Bio'})
+        updated = UserProfile.upsert('upsert-user', {'display_name': 'Second'})
+        
+        assert created['id'] == updated['id']
+        assert updated['display_name'] == 'Second'
+        assert updated['bio'] == 'Bio'
+        assert updated['created_at'] == created['created_at']
+        assert updated['updated_at'] >= created['updated_at']
+        assert UserProfile.query.filter_by(firebase_uid='upsert-user').count() == 1
+    
+    def test_get_or_create_is_idempotent(self, app, create_test_profile):
+        """既存のプロフィールでは作成されず、新規の場合のみ作成されることのテスト"""
+        create_test_profile()
+        
+        existing, created = UserProfile.get_or_create('test-user-id')
+        assert created is False
+        assert existing['display_name'] == 'Test User'
+        
+        new, created = UserProfile.get_or_create('new-user-id')
+        again, created_again = UserProfile.get_or_create('new-user-id')
+        assert created is True and created_again is False
+        assert new['id'] == again['id']
+
+
+class TestProfileETag:
+    """プロフィールの条件付きレスポンスのテスト"""
+    
+    def test_if_none_match_returns_304(self, client, auth_headers, mock_auth, create_test_profile):
+        """ETagが一致する場合に304、更新後は200が返されることのテスト"""
+        create_test_profile()
+        
+        response = client.get('/api/profile', headers=auth_headers)
+        etag = response.headers['ETag']
+        assert response.status_code == 200
+        
+        conditional_headers = dict(auth_headers, **{'If-None-Match': etag})
+        response = client.get('/api/profile', headers=conditional_headers)
+        assert response.status_code == 304
+        assert response.data == b''
+        
+        client.put('/api/profile', headers=auth_headers, json={'bio': 'Changed'})
+        response = client.get('/api/profile', headers=conditional_headers)
+        assert response.status_code == 200
+        assert response.headers['ETag'] != etag
+    
+    def test_etag_from_version_query(self, app, create_test_profile):
+        """軽量なクエリから計算したETagがシリアライズ結果と一致することのテスト"""
+        profile = create_test_profile()
+        
+        assert UserProfile.etag(UserProfile.get_version('test-user-id')) == UserProfile.etag(profile.to_dict())
+        assert UserProfile.get_version('missing-user') is None
+
+
+class TestProfileLookup:
+    """プロフィール一括取得のテスト"""
+    
+    def test_lookup_profiles(self, client, auth_headers, mock_auth, create_test_profile, app):
+        """重複を除外し、指定したフィールドのみを返すことのテスト"""
+        create_test_profile(firebase_uid='user-a', display_name='User A')
+        create_test_profile(firebase_uid='user-b', display_name='User B')
+        app.config['PROFILE_LOOKUP_CHUNK_SIZE'] = 1
+        
+        response = client.post('/api/profiles/lookup', headers=auth_headers, json={
+            'uids': ['user-a', 'user-b', 'user-a', 'unknown'],
+            'fields': ['display_name']
+        })
+        data = json.loads(response.data)
+        
+        assert response.status_code == 200
+        assert data['profiles'] == {
+            'user-a': {'display_name': 'User A'},
+            'user-b': {'display_name': 'User B'}
+        }
+        assert data['missing'] == ['unknown']
+    
+    def test_lookup_profiles_validation(self, client, auth_headers, mock_auth, app):
+        """上限超過と非公開フィールドの指定が拒否されることのテスト"""
+        app.config['PROFILE_LOOKUP_MAX_UIDS'] = 2
+        
+        response = client.post('/api/profiles/lookup', headers=auth_headers, json={'uids': ['a', 'b', 'c']})
+        assert response.status_code == 400
+        
+        response = client.post('/api/profiles/lookup', headers=auth_headers, json={
+            'uids': ['a'],
+            'fields': ['firebase_uid']
+        })
+        assert response.status_code == 422
+
+
+class TestAdminExport:
+    """管理者用エクスポートのテスト"""
+    
+    def test_export_requires_admin(self, client, auth_headers, mock_auth):
+        """adminロールが無いユーザーが拒否されることのテスト"""
+        response = client.get('/api/admin/profiles/export', headers=auth_headers)
+        assert response.status_code == 403
+    
+    def test_export_streams_ndjson(self, client, auth_headers, mock_auth, create_test_profile, app):
+        """複数ページにわたるNDJSON出力とupdated_sinceによる絞り込みのテスト"""
+        mock_auth.return_value = dict(mock_auth.return_value, roles=['admin'])
+        app.config['ADMIN_EXPORT_BATCH_SIZE'] = 2
+        for i in range(5):
+            create_test_profile(firebase_uid=f'user-{i}', display_name=f'User {i}')
+        
+        response = client.get('/api/admin/profiles/export', headers=auth_headers)
+        lines = [json.loads(line) for line in response.data.decode('utf-8').splitlines()]
+        
+        assert response.status_code == 200
+        assert response.mimetype == 'application/x-ndjson'
+        assert [line['firebase_uid'] for line in lines] == [f'user-{i}' for i in range(5)]
+        
+        response = client.get(
+            '/api/admin/profiles/export',
+            headers=auth_headers,
+            query_string={'updated_since': lines[3]['updated_at']}
+        )
+        assert [json.loads(line)['firebase_uid'] for line in response.data.decode('utf-8').splitlines()] == ['user-3', 'user-4']
+        
+        response = client.get('/api/admin/profiles/export', headers=auth_headers, query_string={'updated_since': 'invalid'})
+        assert response.status_code == 400
+
+
+class TestProfileSearch:
+    """プロフィール検索のテスト"""
+    
+    def test_search_ranked_and_paginated(self, client, auth_headers, mock_auth, create_test_profile):
+        """全文検索の結果がスコア順にカーソルでページングされることのテスト"""
+        create_test_profile(firebase_uid='user-a', display_name='Tokyo Runner', bio='Marathon')
+        create_test_profile(firebase_uid='user-b', display_name='Osaka Cook', bio='I love Tokyo food')
+        create_test_profile(firebase_uid='user-c', display_name='Kyoto', bio='Temples')
+        
+        response = client.get('/api/profiles/search', headers=auth_headers, query_string={'q': 'tokyo', 'max_results': 1})
+        data = json.loads(response.data)
+        assert response.status_code == 200
+        assert [result['firebase_uid'] for result in data['results']] == ['user-a']
+        
+        response = client.get('/api/profiles/search', headers=auth_headers, query_string={
+            'q': 'tokyo', 'max_results': 1, 'cursor': data['next_cursor']
+        })
+        data = json.loads(response.data)
+        assert [result['firebase_uid'] for result in data['results']] == ['user-b']
+        assert data['next_cursor'] is None
+    
+    def test_search_index_follows_updates(self, client, auth_headers, mock_auth, create_test_profile):
+        """プロフィールの更新が検索インデックスに反映されることのテスト"""
+        create_test_profile(display_name='Before')
+        client.put('/api/profile', headers=auth_headers, json={'display_name': 'After'})
+        
+        before = client.get('/api/profiles/search', headers=auth_headers, query_string={'q': 'Before'})
+        after = client.get('/api/profiles/search', headers=auth_headers, query_string={'q': 'After'})
+        assert json.loads(before.data)['results'] == []
+        assert len(json.loads(after.data)['results']) == 1
+        
+        response = client.get('/api/profiles/search', headers=auth_headers, query_string={'q': 'x', 'cursor': '!!'})
+        assert response.status_code == 400
+    
+    def test_search_japanese_substring(self, client, auth_headers, mock_auth, create_test_profile):
+        """空白で区切られない日本語の部分文字列（3文字未満を含む）で検索できることのテスト"""
+        create_test_profile(firebase_uid='user-a', display_name='田中太郎', bio='東京都渋谷区在住のエンジニア')
+        create_test_profile(firebase_uid='user-b', display_name='山田花子', bio='大阪府のデザイナー 100%')
+        
+        def search(q):
+            response = client.get('/api/profiles/search', headers=auth_headers, query_string={'q': q})
+            return [result['firebase_uid'] for result in json.loads(response.data)['results']]
+        
+        assert search('渋谷区') == ['user-a']
+        assert search('太郎') == ['user-a']
+        assert search('デザイナー 山田') == ['user-b']
+        assert search('0%') == ['user-b']
+        assert search('%') == ['user-b']
+        assert search('京都') == ['user-a']
+
+
+class TestProfileAutocomplete:
+    """表示名オートコンプリートのテスト"""
+    
+    def test_prefix_suggestions(self, client, auth_headers, mock_auth, create_test_profile):
+        """前方一致の候補がfirebase_uidとdisplay_nameのみで返されることのテスト"""
+        create_test_profile(firebase_uid='user-a', display_name='Alice')
+        create_test_profile(firebase_uid='user-b', display_name='alfred')
+        create_test_profile(firebase_uid='user-c', display_name='Bob')
+        
+        response = client.get('/api/profiles/autocomplete', headers=auth_headers, query_string={'q': 'AL'})
+        data = json.loads(response.data)
+        
+        assert response.status_code == 200
+        assert data['results'] == [
+            {'firebase_uid': 'user-b', 'display_name': 'alfred'},
+            {'firebase_uid': 'user-a', 'display_name': 'Alice'}
+        ]
+    
+    def test_rename_invalidates_prefix_cache(self, client, auth_headers, mock_auth, create_test_profile):
+        """表示名の変更後にキャッシュされた候補が返されないことのテスト"""
+        create_test_profile(display_name='Carol')
+        first = client.get('/api/profiles/autocomplete', headers=auth_headers, query_string={'q': 'ca'})
+        assert len(json.loads(first.data)['results']) == 1
+        
+        client.put('/api/profile', headers=auth_headers, json={'display_name': 'Dave'})
+        
+        response = client.get('/api/profiles/autocomplete', headers=auth_headers, query_string={'q': 'ca'})
+        assert json.loads(response.data)['results'] == []
+        response = client.get('/api/profiles/autocomplete', headers=auth_headers, query_string={'q': 'da'})
+        assert json.loads(response.data)['results'][0]['display_name'] == 'Dave'
+    
+    def test_async_rebuild_keeps_concurrent_rename(self):
+        """非同期の再構築中に表示名が変更された場合、変更前の行でインデックスを上書きしないことのテスト"""
+        import asyncio
+        from types import SimpleNamespace
+        from services.autocomplete import ProfileAutocomplete
+        
+        suggester = ProfileAutocomplete()
+        suggester.configure(cache_size=0, cache_ttl=60, cache_prefix_length=3, index_ttl=60)
+        
+        class FakeSession:
+            bind = SimpleNamespace(dialect=SimpleNamespace(name='sqlite'))
+            rename = True
+            
+            async def execute(self, statement):
+                # 問い合わせ中に別のワーカースレッドで表示名が変更される
+                if self.rename:
+                    suggester.update_name('user-a', 'Dave')
+                return [('user-a', 'Dave' if not self.rename else 'Carol')]
+        
+        session = FakeSession()
+        asyncio.run(suggester.suggest_async(session, 'ca'))
+        assert suggester._index_stale()
+        
+        session.rename = False
+        results = asyncio.run(suggester.suggest_async(session, 'da'))
+        assert results == [{'firebase_uid': 'user-a', 'display_name': 'Dave'}]
+        assert not suggester._index_stale()
+    
+    def test_rename_keeps_unrelated_prefixes(self, client, auth_headers, mock_auth, create_test_profile):
+        """表示名の変更で変更前後の名前の前方一致のみが破棄されることのテスト"""
+        from services.autocomplete import autocomplete
+        
+        create_test_profile(firebase_uid='user-a', display_name='Alice')
+        create_test_profile(firebase_uid='user-b', display_name='Alfred')
+        create_test_profile(display_name='Carol')
+        for q in ('al', 'ca', 'd'):
+            client.get('/api/profiles/autocomplete', headers=auth_headers, query_string={'q': q})
+        
+        client.put('/api/profile', headers=auth_headers, json={'display_name': 'Dave'})
+        
+        assert autocomplete.cache.get('al') is not None
+        assert autocomplete.cache.get('ca') is None
+        assert autocomplete.cache.get('d') is None
+        
+        response = client.get('/api/profiles/autocomplete', headers=auth_headers, query_string={'q': 'al', 'limit': 1})
+        assert json.loads(response.data)['results'] == [{'firebase_uid': 'user-b', 'display_name': 'Alfred'}]
+        response = client.get('/api/profiles/autocomplete', headers=auth_headers, query_string={'q': 'dav'})
+        assert json.loads(response.data)['results'] == [{'firebase_uid': 'test-user-id', 'display_name': 'Dave'}]
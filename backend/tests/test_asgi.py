@@ -0,0 +1,159 @@
+"""
+ASGIモードのpytestによるテスト
+
+starlette、httpx、aiosqlite、greenletがインストールされていない環境ではスキップされます。
+"""
+import pytest
+
+pytest.importorskip('starlette')
+pytest.importorskip('httpx')
+pytest.importorskip('aiosqlite')
+pytest.importorskip('greenlet')
+
+from sqlalchemy import create_engine, text
+from starlette.testclient import TestClient
+
+from services.db_service import db
+
+
+def _create_database(url):
+    """テーブルを作成したSQLiteのデータベースを用意する"""
+    engine = create_engine(url)
+    db.metadata.create_all(engine)
+    return engine
+
+
+@pytest.fixture
+def asgi_client(app, tmp_path):
+    """非同期ルートとFlaskのルートを提供するASGIアプリケーションのテストクライアント"""
+    from asgi import create_asgi_app
+    
+    url = f"sqlite:///{tmp_path / 'asgi.db'}"
+    _create_database(url).dispose()
+    
+    app.config['SQLALCHEMY_DATABASE_URI'] = url
+    with TestClient(create_asgi_app(app)) as client:
+        yield client
+
+
+@pytest.fixture
+def asgi_replica_client(app, tmp_path):
+    """プライマリとは別のデータを持つリードレプリカを設定したASGIアプリケーションのテストクライアント"""
+    from asgi import create_asgi_app
+    from services.replica_router import replica_router, Replica
+    
+    url = f"sqlite:///{tmp_path / 'asgi.db'}"
+    _create_database(url).dispose()
+    replica_url = f"sqlite:///{tmp_path / 'replica.db'}"
+    replica_engine = _create_database(replica_url)
+    with replica_engine.begin() as connection:
+        connection.execute(text(
+            "INSERT INTO user_profiles (firebase_uid, display_name) VALUES ('test-user-id', 'From Replica')"
+        ))
+    
+    app.config['SQLALCHEMY_DATABASE_URI'] = url
+    app.config['DB_REPLICA_URLS'] = [replica_url]
+    replica_router.configure([Replica('replica1', replica_engine)], pin_seconds=60, retry_interval=60)
+    try:
+        with TestClient(create_asgi_app(app)) as client:
+            yield client, replica_router.replicas[0]
+    finally:
+        replica_router.configure([], pin_seconds=5, retry_interval=30)
+
+
+class TestASGIProfile:
+    """ASGIモードのプロフィールAPIのテスト"""
+    
+    def test_requires_authorization(self, asgi_client):
+        """Flaskと同じ形式のエラーレスポンスが返されることのテスト"""
+        response = asgi_client.get('/api/profile')
+        
+        assert response.status_code == 401
+        assert response.json() == {
+            'error': 'unauthorized',
+            'message': 'Authorizationヘッダーがありません',
+            'status_code': 401
+        }
+    
+    def test_get_update_and_not_modified(self, asgi_client, auth_headers, mock_auth):
+        """プロフィールの作成・更新とETagによる304のテスト"""
+        response = asgi_client.get('/api/profile', headers=auth_headers)
+        assert response.status_code == 200
+        assert response.json()['message'] == 'プロフィールが作成されました'
+        
+        response = asgi_client.put('/api/profile', headers=auth_headers, json={'display_name': 'Async User'})
+        assert response.status_code == 200
+        etag = response.headers['ETag']
+        
+        response = asgi_client.get('/api/profile', headers={**auth_headers, 'If-None-Match': etag})
+        assert response.status_code == 304
+        
+        response = asgi_client.post('/api/profiles/lookup', headers=auth_headers, json={'uids': ['test-user-id']})
+        assert response.json()['profiles']['test-user-id']['display_name'] == 'Async User'
+    
+    def test_validation_error(self, asgi_client, auth_headers, mock_auth):
+        """入力検証エラーが422で返されることのテスト"""
+        response = asgi_client.put('/api/profile', headers=auth_headers, json={'display_name': ''})
+        
+        assert response.status_code == 422
+        assert response.json()['error'] == 'validation_error'
+        assert 'display_name' in response.json()['details']['errors']
+    
+    def test_delete_not_found(self, asgi_client, auth_headers, mock_auth):
+        """存在しないプロフィールの削除が404になることのテスト"""
+        response = asgi_client.delete('/api/profile', headers=auth_headers)
+        
+        assert response.status_code == 404
+        assert response.json()['error'] == 'not_found'
+    
+    def test_other_routes_served_by_flask(self, asgi_client):
+        """非同期ルート以外はFlaskアプリケーションで処理されることのテスト"""
+        response = asgi_client.get('/')
+        
+        assert response.status_code == 200
+        assert response.json()['status'] == 'running'
+    
+    def test_write_returns_replica_pin(self, asgi_client, auth_headers, mock_auth, tmp_path):
+        """書き込みのレスポンスで最終書き込み時刻のCookieとヘッダーが返されることのテスト"""
+        from services.replica_router import replica_router, Replica, PIN_COOKIE, PIN_HEADER
+        
+        replica_router.configure(
+            [Replica('replica1', create_engine(f"sqlite:///{tmp_path / 'replica.db'}"))], pin_seconds=60, retry_interval=60
+        )
+        try:
+            response = asgi_client.get('/', headers=auth_headers)
+            assert PIN_HEADER not in response.headers
+            
+            response = asgi_client.put('/api/profile', headers=auth_headers, json={'display_name': 'Async User'})
+            assert response.cookies[PIN_COOKIE] == response.headers[PIN_HEADER]
+        finally:
+            replica_router.configure([], pin_seconds=5, retry_interval=30)
+    
+    def test_reads_go_to_replica_until_write(self, asgi_replica_client, auth_headers, mock_auth):
+        """非同期ルートの読み取りがレプリカで実行され、書き込み後はプライマリになることのテスト"""
+        client, replica = asgi_replica_client
+        
+        response = client.get('/api/profile', headers=auth_headers)
+        assert response.json()['profile']['display_name'] == 'From Replica'
+        assert replica.reads == 1
+        
+        client.put('/api/profile', headers=auth_headers, json={'bio': 'Updated'})
+        # Cookieを送らなくても、ユーザーごとの最終書き込み時刻によりプライマリで読み取られる
+        client.cookies.clear()
+        response = client.get('/api/profiles/search', headers=auth_headers, params={'q': 'From'})
+        
+        assert response.json()['results'] == []
+        assert replica.reads == 1
+    
+    def test_updates_are_coalesced(self, asgi_client, auth_headers, mock_auth):
+        """WRITE_COALESCING_ENABLEDが非同期ルートの更新にも適用されることのテスト"""
+        from services.write_coalescer import write_coalescer
+        
+        write_coalescer.configure(enabled=True, window_ms=0)
+        try:
+            response = asgi_client.put('/api/profile', headers=auth_headers, json={'display_name': 'Async User'})
+            
+            assert response.json()['profile']['display_name'] == 'Async User'
+            assert write_coalescer.stats()['writes'] == 1
+        finally:
+            write_coalescer.configure(enabled=False, window_ms=0)
@@ -0,0 +1,229 @@
+"""
+認証サービスのpytestによるテスト
+"""
+import time
+from unittest.mock import patch
+
+import pytest
+
+from errors import UnauthorizedError, ForbiddenError
+from services import auth_service
+from services.cache import LRUTTLCache
+from services.policy import any_role, all_roles, no_role, claim, compile_policy, normalize_claims
+from services.session_token import SessionTokenManager, SessionTokenError, SessionTokenExpiredError
+
+
+def _decoded_token(uid='test-user-id', ttl=3600):
+    """テスト用のデコード済みトークンを作成する"""
+    return {'uid': uid, 'email': 'test@example.com', 'exp': int(time.time()) + ttl}
+
+
+class TestLRUTTLCache:
+    """LRU/TTLキャッシュのテスト"""
+
+    def test_expired_entry_is_miss(self):
+        """有効期限切れのエントリがミスになることのテスト"""
+        now = [1000.0]
+        cache = LRUTTLCache(max_size=10, clock=lambda: now[0])
+        cache.set('key', 'value', expires_at=1010.0)
+
+        assert cache.get('key') == 'value'
+        now[0] = 1011.0
+        assert cache.get('key') is None
+        assert cache.stats()['expirations'] == 1
+
+    def test_size_excludes_expired_entries(self):
+        """件数とstatsのsizeに期限切れのエントリが含まれないことのテスト"""
+        now = [1000.0]
+        cache = LRUTTLCache(max_size=10, clock=lambda: now[0])
+        cache.set('short', 'value', expires_at=1010.0)
+        cache.set('long', 'value', expires_at=2000.0)
+
+        assert len(cache) == 2
+        now[0] = 1011.0
+        assert len(cache) == 1
+        assert cache.stats()['size'] == 1
+        assert cache.stats()['expirations'] == 1
+
+    def test_lru_eviction(self):
+        """サイズ上限を超えた場合にLRUで退避されることのテスト"""
+        cache = LRUTTLCache(max_size=2)
+        expires_at = time.time() + 60
+        cache.set('a', 1, expires_at)
+        cache.set('b', 2, expires_at)
+        cache.get('a')
+        cache.set('c', 3, expires_at)
+
+        assert cache.get('b') is None
+        assert cache.get('a') == 1
+        assert cache.get('c') == 3
+        assert cache.stats()['evictions'] == 1
+
+
+class TestVerifiedTokenCache:
+    """検証済みトークンキャッシュのテスト"""
+
+    @patch('services.auth_service.auth.verify_id_token')
+    def test_repeat_verification_hits_cache(self, mock_verify_id_token, app):
+        """同じトークンの再検証で署名検証がスキップされることのテスト"""
+        mock_verify_id_token.return_value = _decoded_token()
+
+        first = auth_service.verify_token('test-token')
+        second = auth_service.verify_token('test-token')
+
+        assert first['uid'] == second['uid'] == 'test-user-id'
+        assert mock_verify_id_token.call_count == 1
+        assert auth_service.token_cache.stats()['hits'] == 1
+
+    @patch('services.auth_service.auth.verify_id_token')
+    def test_check_revoked_bypasses_cache(self, mock_verify_id_token, app):
+        """取り消し確認ではキャッシュが使用されないことのテスト"""
+        mock_verify_id_token.return_value = _decoded_token()
+
+        auth_service.verify_token('test-token')
+        auth_service.verify_token('test-token', check_revoked=True)
+
+        assert mock_verify_id_token.call_count == 2
+        mock_verify_id_token.assert_called_with('test-token', check_revoked=True)
+
+    @patch('services.auth_service.auth.verify_id_token')
+    def test_invalid_token_is_not_cached(self, mock_verify_id_token, app):
+        """無効なトークンがキャッシュされないことのテスト"""
+        mock_verify_id_token.side_effect = auth_service.auth.InvalidIdTokenError('invalid')
+
+        for _ in range(2):
+            with pytest.raises(UnauthorizedError):
+                auth_service.verify_token('bad-token')
+
+        assert mock_verify_id_token.call_count == 2
+        assert len(auth_service.token_cache) == 0
+
+
+
+class TestSessionTokenManager:
+    """セッショントークンのテスト"""
+
+    def test_issue_and_verify(self):
+        """発行したセッショントークンの検証と有効期限の上限のテスト"""
+        manager = SessionTokenManager(['secret'], ttl=900)
+        decoded = _decoded_token(ttl=60)
+
+        token, expires_at = manager.issue(decoded)
+        claims = manager.verify(token)
+
+        assert claims['uid'] == 'test-user-id'
+        assert claims['session'] is True
+        assert expires_at == decoded['exp']
+
+    def test_custom_claims_are_preserved(self):
+        """カスタムクレームが引き継がれ、claim()のポリシーがIDトークンと同じ判定になることのテスト"""
+        manager = SessionTokenManager(['secret'])
+        decoded = {**_decoded_token(), 'iat': 1, 'tenant': 'acme', 'plan': {'tier': 'pro'}}
+        policy = compile_policy(claim('tenant', 'acme'))
+
+        claims = manager.verify(manager.issue(decoded)[0])
+
+        assert claims['tenant'] == 'acme'
+        assert claims['plan'] == {'tier': 'pro'}
+        assert policy.evaluate(normalize_claims(claims)) is policy.evaluate(normalize_claims(decoded)) is True
+
+    def test_key_rotation(self):
+        """鍵のローテーション中に古い鍵で署名したトークンが検証できることのテスト"""
+        token, _ = SessionTokenManager(['old-secret']).issue(_decoded_token())
+
+        assert SessionTokenManager(['old-secret', 'new-secret']).verify(token)['uid'] == 'test-user-id'
+        with pytest.raises(SessionTokenError):
+            SessionTokenManager(['new-secret']).verify(token)
+
+    def test_expired_and_tampered(self):
+        """期限切れ・改ざんされたトークンが拒否されることのテスト"""
+        manager = SessionTokenManager(['secret'])
+        expired_token, _ = manager.issue(_decoded_token(ttl=-1))
+        token, _ = manager.issue(_decoded_token())
+
+        with pytest.raises(SessionTokenExpiredError):
+            manager.verify(expired_token)
+        with pytest.raises(SessionTokenError):
+            manager.verify(token[:-2] + 'xx')
+
+
+
+class TestPolicy:
+    """ロールポリシーのテスト"""
+
+    def test_compiled_expressions(self):
+        """ロール式とクレーム条件の評価のテスト"""
+        policy = compile_policy(
+            (any_role('admin', 'editor') & claim('email_verified', True)) | all_roles('owner', 'billing')
+        )
+        deny_banned = compile_policy(no_role('banned'))
+
+        editor = normalize_claims({'uid': 'u1', 'iat': 1, 'roles': ['editor'], 'email_verified': True})
+        unverified = normalize_claims({'uid': 'u2', 'iat': 1, 'roles': ['admin']})
+        owner = normalize_claims({'uid': 'u3', 'iat': 1, 'roles': ['owner', 'billing', 'banned']})
+
+        assert policy.evaluate(editor) is True
+        assert policy.evaluate(unverified) is False
+        assert policy.evaluate(owner) is True
+        assert deny_banned.evaluate(editor) is True
+        assert deny_banned.evaluate(owner) is False
+        assert policy.stats() == {'evaluations': 3, 'allowed': 2, 'denied': 1}
+
+    def test_claims_cache_keyed_by_token_hash(self, app):
+        """正規化クレームのキャッシュがトークンのハッシュをキーにし、クレームをハッシュしないことのテスト"""
+        policy = compile_policy(any_role('admin'))
+        
+        with patch('services.policy._claims_cache_key') as claims_cache_key:
+            admin = normalize_claims({'uid': 'u4', 'roles': ['admin']}, 'token-hash-1')
+            viewer = normalize_claims({'uid': 'u4', 'roles': ['viewer']}, 'token-hash-2')
+            assert normalize_claims({'uid': 'u4', 'roles': ['admin']}, 'token-hash-1') is admin
+        
+        claims_cache_key.assert_not_called()
+        assert policy.evaluate(admin) is True
+        assert policy.evaluate(viewer) is False
+        
+        # auth_requiredは検証済みトークンキャッシュと同じハッシュをg.token_hashに設定する
+        @auth_service.auth_required
+        def protected():
+            from flask import g
+            return g.token_hash
+        
+        with patch.object(auth_service, 'verify_token', return_value=_decoded_token()):
+            with app.test_request_context('/', headers={'Authorization': 'Bearer test-token'}):
+                assert protected() == auth_service._token_cache_key('test-token')
+    
+    def test_require_role_decorator(self, app):
+        """require_roleデコレータのテスト"""
+        @auth_service.require_role('admin')
+        def admin_only():
+            return 'ok'
+
+        with app.test_request_context('/'):
+            from flask import request
+            request.user = _decoded_token() | {'roles': ['admin']}
+            assert admin_only() == 'ok'
+
+        with app.test_request_context('/'):
+            from flask import request
+            request.user = _decoded_token() | {'roles': 'viewer'}
+            with pytest.raises(ForbiddenError):
+                admin_only()
+
+
+class TestTokenBatch:
+    """トークン一括検証のワーカープールのテスト"""
+
+    def test_executor_follows_max_workers(self):
+        """TOKEN_BATCH_MAX_WORKERSの変更でワーカープールが作り直されることのテスト"""
+        with patch.object(auth_service, 'verify_token', side_effect=lambda token: {'uid': token}):
+            auth_service.verify_tokens(['a', 'b'], max_workers=2)
+            first = auth_service._batch_executor
+            assert first._max_workers == 2
+
+            auth_service.verify_tokens(['a', 'b'], max_workers=2)
+            assert auth_service._batch_executor is first
+
+            results = auth_service.verify_tokens(['a', 'b', 'c'], max_workers=4)
+            assert auth_service._batch_executor._max_workers == 4
+
+        assert results == {'a': {'uid': 'a'}, 'b': {'uid': 'b'}, 'c': {'uid': 'c'}}
@@ -0,0 +1,71 @@
+"""
+一括インポート・エクスポートのpytestによるテスト
+"""
+import csv
+from datetime import datetime
+
+import pytest
+
+from models.user_profile import UserProfile
+from services.bulk_io import import_file, export_file, BulkIOError, _python_defaults
+
+
+def _write_csv(path, rows):
+    """テスト用のCSVファイルを作成する"""
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['firebase_uid', 'display_name', 'bio'])
+        writer.writerows(rows)
+
+
+class TestBulkIO:
+    """一括インポート・エクスポートのテスト（SQLite）"""
+    
+    def test_import_in_chunks_with_conflict_actions(self, app, tmp_path, create_test_profile):
+        """チャンク単位の読み込みと競合時の動作のテスト"""
+        create_test_profile(firebase_uid='user-0', display_name='Existing')
+        path = tmp_path / 'profiles.csv'
+        _write_csv(path, [(f'user-{i}', f'User {i}', '') for i in range(5)])
+        progress = []
+        
+        result = import_file(
+            UserProfile.__table__, str(path),
+            on_conflict='skip', batch_size=2,
+            progress=lambda processed, total: progress.append((processed, total))
+        )
+        
+        assert result['rows'] == 5
+        assert UserProfile.query.count() == 5
+        assert UserProfile.get_by_firebase_uid('user-0').display_name == 'Existing'
+        assert UserProfile.get_by_firebase_uid('user-3').bio is None
+        assert len(progress) == 3
+        
+        import_file(UserProfile.__table__, str(path), on_conflict='update')
+        assert UserProfile.get_by_firebase_uid('user-0').display_name == 'User 0'
+    
+    def test_export_round_trip(self, app, tmp_path, create_test_profile):
+        """エクスポートしたCSVを別のデータベースに読み込めることのテスト"""
+        for i in range(3):
+            create_test_profile(firebase_uid=f'user-{i}', display_name=f'User {i}')
+        path = tmp_path / 'export.csv'
+        
+        assert export_file(UserProfile.__table__, str(path), batch_size=2)['rows'] == 3
+        
+        UserProfile.query.delete()
+        assert import_file(UserProfile.__table__, str(path))['rows'] == 3
+        exported = [profile.to_dict() for profile in UserProfile.query.order_by(UserProfile.id)]
+        assert [profile['firebase_uid'] for profile in exported] == ['user-0', 'user-1', 'user-2']
+        assert all(profile['created_at'] for profile in exported)
+    
+    def test_binary_requires_postgresql(self, app, tmp_path):
+        """SQLiteでバイナリ形式が拒否されることのテスト"""
+        with pytest.raises(BulkIOError):
+            export_file(UserProfile.__table__, str(tmp_path / 'export.bin'), file_format='binary')
+    
+    def test_copy_fills_python_defaults(self):
+        """ファイルに含まれない日時の列がPython側のデフォルト値で補われることのテスト（PostgreSQLのCOPY用）"""
+        defaults = _python_defaults(UserProfile.__table__, ['firebase_uid', 'display_name', 'created_at'])
+        
+        assert set(defaults) == {'updated_at'}
+        assert isinstance(defaults['updated_at'], datetime)
+        assert _python_defaults(UserProfile.__table__, [column.name for column in UserProfile.__table__.columns]) == {}
@@ -0,0 +1,123 @@
+"""
+レスポンス圧縮のpytestによるテスト
+"""
+import gzip
+import json
+import zlib
+
+import pytest
+from flask import Response, jsonify
+
+from services.compression import compressor, parse_levels
+
+
+@pytest.fixture
+def compress_app(app):
+    """圧縮を確認するためのルートを追加したアプリケーション"""
+    rows = [{'id': index, 'display_name': f"ユーザー {index}"} for index in range(200)]
+    
+    @app.route('/test/large')
+    def large():
+        response = jsonify({'profiles': rows})
+        response.set_etag('large')
+        return response
+    
+    @app.route('/test/small')
+    def small():
+        return jsonify({'ok': True})
+    
+    @app.route('/test/stream')
+    def stream():
+        def generate():
+            for row in rows:
+                yield json.dumps(row, ensure_ascii=False) + '\n'
+        return Response(generate(), mimetype='application/x-ndjson')
+    
+    @app.route('/test/binary')
+    def binary():
+        return Response(b'\0' * 4096, mimetype='image/png')
+    
+    return app
+
+
+class TestCompression:
+    """レスポンス圧縮のテスト"""
+    
+    def test_gzip_response(self, compress_app):
+        """gzipで圧縮され、展開すると元の本文になることのテスト"""
+        response = compress_app.test_client().get('/test/large', headers={'Accept-Encoding': 'gzip'})
+        
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert 'Accept-Encoding' in response.headers['Vary']
+        assert response.headers['ETag'] == 'W/"large"'
+        assert int(response.headers['Content-Length']) == len(response.data)
+        assert len(json.loads(gzip.decompress(response.data))['profiles']) == 200
+        
+        stats = compressor.stats()['encodings']['gzip']
+        assert stats['responses'] == 1
+        assert stats['bytes_out'] == len(response.data)
+        assert 0 < stats['ratio'] < 1
+    
+    def test_not_compressed(self, compress_app):
+        """小さい本文、対象外のContent-Type、Accept-Encodingのないリクエストは圧縮されないことのテスト"""
+        client = compress_app.test_client()
+        
+        small = client.get('/test/small', headers={'Accept-Encoding': 'gzip'})
+        assert 'Content-Encoding' not in small.headers
+        assert small.get_json() == {'ok': True}
+        
+        binary = client.get('/test/binary', headers={'Accept-Encoding': 'gzip'})
+        assert 'Content-Encoding' not in binary.headers
+        
+        identity = client.get('/test/large')
+        assert 'Content-Encoding' not in identity.headers
+        assert identity.headers['ETag'] == '"large"'
+        
+        refused = client.get('/test/large', headers={'Accept-Encoding': 'gzip;q=0, identity'})
+        assert 'Content-Encoding' not in refused.headers
+        
+        stats = compressor.stats()
+        assert stats['skipped_small'] == 1
+        assert stats['not_accepted'] == 2
+    
+    def test_streamed_response(self, compress_app, monkeypatch):
+        """ストリーミングレスポンスがチャンクごとに圧縮されることのテスト"""
+        monkeypatch.setattr(compressor, 'flush_size', 1024)
+        response = compress_app.test_client().get('/test/stream', headers={'Accept-Encoding': 'gzip'})
+        
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert 'Content-Length' not in response.headers
+        lines = zlib.decompress(response.data, 31).decode('utf-8').splitlines()
+        assert len(lines) == 200
+        assert json.loads(lines[0]) == {'id': 0, 'display_name': 'ユーザー 0'}
+        assert compressor.stats()['encodings']['gzip']['streamed'] == 1
+    
+    def test_negotiate(self, monkeypatch):
+        """品質値が最も高く、同じ品質値ではサーバーの優先順で選択されることのテスト"""
+        monkeypatch.setattr(compressor, 'encodings', ['zstd', 'br', 'gzip'])
+        
+        assert compressor.negotiate('gzip, br') == 'br'
+        assert compressor.negotiate('gzip, br;q=0.5') == 'gzip'
+        assert compressor.negotiate('*') == 'zstd'
+        assert compressor.negotiate('deflate') is None
+        assert compressor.negotiate(None) is None
+    
+    def test_levels(self, monkeypatch):
+        """Content-Typeごとの圧縮レベルの設定のテスト"""
+        levels = parse_levels('application/json=6, application/x-ndjson=3, text/*=9')
+        monkeypatch.setattr(compressor, 'levels', levels)
+        
+        assert compressor.level_for('application/x-ndjson') == 3
+        assert compressor.level_for('text/csv') == 9
+        assert compressor.level_for('image/png') is None
+        with pytest.raises(ValueError):
+            parse_levels('application/json')
+    
+    def test_conditional_request_with_weak_etag(self, client, auth_headers, mock_auth, create_test_profile):
+        """圧縮時の弱いETagでも条件付きリクエストが304になることのテスト"""
+        create_test_profile()
+        etag = client.get('/api/profile', headers=auth_headers).headers['ETag']
+        
+        response = client.get('/api/profile', headers={**auth_headers, 'If-None-Match': f"W/{etag}"})
+        
+        assert response.status_code == 304
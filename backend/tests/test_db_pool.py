@@ -0,0 +1,68 @@
+"""
+接続プールのpytestによるテスト
+"""
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+
+from services.db_pool import pool_sizing, instrumented_pool_class, engine_options
+
+
+class TestPoolSizing:
+    """接続プールのサイズ算出のテスト"""
+    
+    def test_sized_from_threads(self):
+        """スレッド数からサイズが算出されることのテスト"""
+        assert pool_sizing({'WORKER_THREADS': 8}) == {'pool_size': 8, 'max_overflow': 4}
+        assert pool_sizing({'WORKER_THREADS': 8, 'DB_POOL_SIZE': 2, 'DB_MAX_OVERFLOW': 0}) == {
+            'pool_size': 2, 'max_overflow': 0
+        }
+    
+    def test_capped_by_connection_budget(self):
+        """全ワーカーの合計が接続数の上限を超えないことのテスト"""
+        sizing = pool_sizing({'WORKER_THREADS': 8, 'WEB_CONCURRENCY': 4, 'DB_MAX_CONNECTIONS': 20})
+        assert sizing == {'pool_size': 5, 'max_overflow': 0}
+    
+    def test_engine_options(self):
+        """statement_timeoutとapplication_nameが接続引数に設定されることのテスト"""
+        options = engine_options({'DB_STATEMENT_TIMEOUT_MS': 5000, 'DB_APPLICATION_NAME': 'api'}, name='options-test')
+        assert options['connect_args'] == {'application_name': 'api', 'options': '-c statement_timeout=5000'}
+        assert options['pool_pre_ping'] is True
+    
+    def test_prepare_threshold(self):
+        """psycopgの場合のみプリペアドステートメントの閾値が設定され、PgBouncerでは無効になることのテスト"""
+        url = 'postgresql+psycopg://postgres@localhost/app'
+        options = engine_options({'DB_PREPARE_THRESHOLD': 3}, name='prepare-test', url=url)
+        assert options['connect_args']['prepare_threshold'] == 3
+        
+        options = engine_options({'DB_PREPARE_THRESHOLD': 3, 'DB_PGBOUNCER': True}, name='prepare-test', url=url)
+        assert options['connect_args']['prepare_threshold'] is None
+        
+        options = engine_options({}, name='prepare-test', url='postgresql+psycopg2://postgres@localhost/app')
+        assert 'prepare_threshold' not in options['connect_args']
+
+
+class TestInstrumentedPool:
+    """計測付き接続プールのテスト"""
+    
+    def test_checkout_and_timeout_metrics(self, tmp_path):
+        """取得回数・飽和度・タイムアウトが記録されることのテスト"""
+        pool_class = instrumented_pool_class('pool-test')
+        engine = create_engine(
+            f"sqlite:///{tmp_path / 'pool.db'}",
+            poolclass=pool_class, pool_size=1, max_overflow=0, pool_timeout=0.05
+        )
+        
+        with engine.connect() as connection:
+            connection.execute(text('SELECT 1'))
+            stats = pool_class.metrics.stats()
+            assert stats['checked_out'] == 1
+            assert stats['saturation'] == 1.0
+            with pytest.raises(PoolTimeoutError):
+                engine.connect()
+        
+        stats = pool_class.metrics.stats()
+        assert stats['checkouts'] == 1
+        assert stats['timeouts'] == 1
+        assert stats['checked_out'] == 0
+        engine.dispose()
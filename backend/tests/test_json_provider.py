@@ -0,0 +1,93 @@
+"""
+JSONプロバイダーとシリアライザーのpytestによるテスト
+"""
+import json
+import logging
+from datetime import datetime
+
+import pytest
+from flask import Flask, jsonify
+from flask.json.provider import DefaultJSONProvider
+
+from logger import CustomJSONFormatter
+from models.user_profile import UserProfile
+from services.json_provider import FastJSONProvider, init_json
+from services.serializers import object_serializer, row_serializer
+
+
+class TestJSONProvider:
+    """JSONプロバイダーのテスト"""
+    
+    def test_provider_installed(self, app):
+        """デフォルトでFastJSONProviderが設定されることのテスト"""
+        assert isinstance(app.json, FastJSONProvider)
+    
+    def test_jsonify_matches_default_provider(self, app):
+        """日本語がUTF-8で出力され、日時がFlaskと同じ形式になることのテスト"""
+        payload = {'message': 'プロフィール', 'updated_at': datetime(2024, 1, 2, 3, 4, 5), 'ids': [1, 2]}
+        
+        # デバッグモードでは標準のプロバイダーの出力になるため無効にする
+        app.debug = False
+        with app.app_context():
+            response = jsonify(payload)
+        
+        assert response.mimetype == 'application/json'
+        assert 'プロフィール'.encode('utf-8') in response.data
+        assert json.loads(response.data) == json.loads(DefaultJSONProvider(app).dumps(payload))
+        assert json.loads(response.data)['updated_at'] == 'Tue, 02 Jan 2024 03:04:05 GMT'
+    
+    def test_api_response(self, client):
+        """エンドポイントのレスポンスがJSONとして読み込めることのテスト"""
+        response = client.get('/')
+        
+        assert response.status_code == 200
+        assert response.get_json() == json.loads(response.data)
+    
+    def test_init_json(self):
+        """JSON_PROVIDERの設定でプロバイダーを切り替えられることのテスト"""
+        app = Flask(__name__)
+        app.config['JSON_PROVIDER'] = 'default'
+        init_json(app)
+        assert type(app.json) is DefaultJSONProvider
+        
+        app.config['JSON_PROVIDER'] = 'unknown'
+        with pytest.raises(ValueError):
+            init_json(app)
+    
+    def test_log_formatter(self, app):
+        """JSON形式のログが非ASCII文字をエスケープせず正しいJSONとして出力されることのテスト"""
+        record = logging.LogRecord('test', logging.INFO, __file__, 1, 'ログメッセージ', None, None)
+        
+        with app.app_context():
+            line = CustomJSONFormatter().format(record)
+        
+        assert json.loads(line)['message'] == 'ログメッセージ'
+        assert '"message":"ログメッセージ"' in line
+
+
+class TestSerializers:
+    """生成されたシリアライザーのテスト"""
+    
+    def test_row_serializer(self):
+        """日時がISO 8601形式になり、存在しないキーがNoneになることのテスト"""
+        now = datetime(2024, 1, 2, 3, 4, 5)
+        serialize = row_serializer(UserProfile.__table__, ('display_name', 'bio', 'updated_at'))
+        
+        assert serialize({'display_name': 'Test', 'updated_at': now}) == {
+            'display_name': 'Test', 'bio': None, 'updated_at': '2024-01-02T03:04:05'
+        }
+        assert row_serializer(UserProfile.__table__, ('display_name', 'bio', 'updated_at')) is serialize
+    
+    def test_object_serializer(self):
+        """インスタンスのシリアライズが行のシリアライズと一致することのテスト"""
+        profile = UserProfile('serializer-user', display_name='Test', bio='Bio')
+        profile.id, profile.created_at, profile.updated_at = 1, None, datetime(2024, 1, 2)
+        row = {field: getattr(profile, field) for field in UserProfile.FIELDS}
+        
+        assert object_serializer(UserProfile.__table__, UserProfile.FIELDS)(profile) == UserProfile.serialize(row)
+        assert profile.to_dict(['display_name']) == {'display_name': 'Test'}
+    
+    def test_invalid_field(self):
+        """テーブルに存在しないフィールドが拒否されることのテスト"""
+        with pytest.raises(ValueError):
+            row_serializer(UserProfile.__table__, ('display_name', '__class__'))
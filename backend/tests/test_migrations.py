@@ -0,0 +1,227 @@
+"""
+マイグレーションのpytestによるテスト
+"""
+import pytest
+from sqlalchemy import create_engine, inspect, text
+
+from migrations import Migration, MigrationError, discover_migrations, migration_status, run_migrations
+from migrations.runner import MigrationContext
+
+
+@pytest.fixture
+def engine(tmp_path):
+    """空のSQLiteデータベースのエンジン"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'migrations.db'}")
+    yield engine
+    engine.dispose()
+
+
+class TestMigrations:
+    """マイグレーションのテスト"""
+    
+    def test_apply_all_and_rerun(self, engine):
+        """すべてのマイグレーションが一度だけ適用されることのテスト"""
+        versions = [migration.version for migration in discover_migrations()]
+        
+        assert run_migrations(engine) == versions
+        assert run_migrations(engine) == []
+        
+        tables = inspect(engine).get_table_names()
+        assert 'user_profiles' in tables
+        assert 'user_profiles_fts' in tables
+        assert all(entry['applied'] for entry in migration_status(engine))
+    
+    def test_target_version(self, engine):
+        """指定したバージョンまでのみ適用されることのテスト"""
+        assert run_migrations(engine, target='0001') == ['0001']
+        assert [entry['applied'] for entry in migration_status(engine)][:2] == [True, False]
+    
+    def test_add_column_and_backfill(self, engine):
+        """列の追加とバッチでのバックフィルのテスト"""
+        def create(ctx):
+            ctx.execute("CREATE TABLE items (id INTEGER PRIMARY KEY, name VARCHAR(20))")
+            for index in range(25):
+                ctx.execute("INSERT INTO items (name) VALUES (:name)", {'name': f"item{index}"})
+        
+        def add_status(ctx):
+            assert ctx.add_column('items', 'status', 'VARCHAR(10)') is True
+            assert ctx.add_column('items', 'status', 'VARCHAR(10)') is False
+            assert ctx.backfill('items', "status = 'active'", where='status IS NULL', batch_size=10, sleep_ms=0) == 25
+            ctx.create_index('ix_items_status', 'items', 'status')
+        
+        migrations = [Migration('0001', 'items', create), Migration('0002', 'status', add_status)]
+        assert run_migrations(engine, migrations=migrations) == ['0001', '0002']
+        
+        with engine.connect() as connection:
+            assert connection.execute(text("SELECT count(*) FROM items WHERE status = 'active'")).scalar() == 25
+        assert 'ix_items_status' in [index['name'] for index in inspect(engine).get_indexes('items')]
+    
+    def test_failed_migration_is_not_recorded(self, engine):
+        """失敗したマイグレーションは記録されず、再実行できることのテスト"""
+        def fail(ctx):
+            raise RuntimeError('boom')
+        
+        with pytest.raises(MigrationError):
+            run_migrations(engine, migrations=[Migration('0001', 'fail', fail)])
+        assert migration_status(engine, migrations=[Migration('0001', 'fail', fail)])[0]['applied'] is False
+    
+    def test_rejects_rewriting_column(self, engine):
+        """デフォルト値のないNOT NULL列の追加が拒否されることのテスト"""
+        def add_required(ctx):
+            ctx.execute("CREATE TABLE items (id INTEGER PRIMARY KEY)")
+            ctx.add_column('items', 'code', 'VARCHAR(10) NOT NULL')
+        
+        with pytest.raises(MigrationError):
+            run_migrations(engine, migrations=[Migration('0001', 'required', add_required)])
+    
+    def test_search_index_on_generated_column(self):
+        """PostgreSQLの生成列にはバックフィルせず、インデックスのみを作成することのテスト"""
+        search_index = next(migration for migration in discover_migrations() if migration.version == '0003')
+        calls = []
+        
+        class GeneratedColumnContext(MigrationContext):
+            dialect = 'postgresql'
+            
+            def __init__(self):
+                pass
+            
+            def column_is_generated(self, table, column):
+                return column == 'search_vector'
+            
+            def execute(self, sql, params=None):
+                calls.append(('execute', sql))
+            
+            def add_column(self, table, column, definition):
+                calls.append(('add_column', column))
+                return True
+            
+            def backfill(self, table, assignments, **kwargs):
+                calls.append(('backfill', table))
+                return 0
+            
+            def create_index(self, name, table, expression, **kwargs):
+                calls.append(('create_index', name))
+        
+        search_index.upgrade(GeneratedColumnContext())
+        
+        assert calls == [('create_index', 'ix_user_profiles_search_vector')]
+    
+    def test_index_on_partitioned_table(self):
+        """パーティションテーブルでは親にON ONLYで作成し、パーティションのインデックスを接続することのテスト"""
+        statements = []
+        # 中断された前回の実行でp0のインデックスが無効なまま残っている
+        indexes = {
+            'ix_user_profiles_updated_at': ('I', False),
+            'ix_user_profiles_updated_at_p0': ('i', False)
+        }
+        
+        class PartitionedContext(MigrationContext):
+            dialect = 'postgresql'
+            
+            def __init__(self):
+                self.lock_retries = 0
+            
+            def partitions(self, table):
+                return ['user_profiles_p0', 'user_profiles_p1'] if table == 'user_profiles' else None
+            
+            def _index_state(self, name):
+                return indexes.get(name)
+            
+            def _execute_once(self, sql, params=None):
+                statements.append(sql)
+                words = sql.split()
+                if words[0] == 'DROP':
+                    indexes.pop(words[-1], None)
+                elif 'CONCURRENTLY' in words:
+                    indexes.setdefault(words[words.index('EXISTS') + 1], ('i', True))
+        
+        ctx = PartitionedContext()
+        ctx.create_index('ix_user_profiles_updated_at', 'user_profiles', 'updated_at')
+        
+        assert statements == [
+            "CREATE INDEX IF NOT EXISTS ix_user_profiles_updated_at ON ONLY user_profiles (updated_at)",
+            "DROP INDEX CONCURRENTLY IF EXISTS ix_user_profiles_updated_at_p0",
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_user_profiles_updated_at_p0 ON user_profiles_p0 (updated_at)",
+            "ALTER INDEX ix_user_profiles_updated_at ATTACH PARTITION ix_user_profiles_updated_at_p0",
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_user_profiles_updated_at_p1 ON user_profiles_p1 (updated_at)",
+            "ALTER INDEX ix_user_profiles_updated_at ATTACH PARTITION ix_user_profiles_updated_at_p1"
+        ]
+        
+        statements.clear()
+        ctx.drop_index('ix_user_profiles_updated_at')
+        ctx.create_index('ix_other_name', 'other', 'name')
+        
+        assert statements == [
+            "DROP INDEX IF EXISTS ix_user_profiles_updated_at",
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_other_name ON other (name)"
+        ]
+    
+    def test_concurrent_index_retried_after_lock_timeout(self, monkeypatch):
+        """lock_timeoutで無効なインデックスが残った場合、削除して作成し直すことのテスト"""
+        from sqlalchemy.exc import OperationalError
+        from migrations import runner
+        
+        class LockNotAvailable(Exception):
+            sqlstate = runner.LOCK_NOT_AVAILABLE
+        
+        monkeypatch.setattr(runner.time, 'sleep', lambda seconds: None)
+        statements = []
+        indexes = {}
+        
+        class LockTimeoutContext(MigrationContext):
+            dialect = 'postgresql'
+            
+            def __init__(self, failures, valid=True):
+                self.lock_retries = 2
+                self.failures = failures
+                self.valid = valid
+            
+            def partitions(self, table):
+                return None
+            
+            def _index_state(self, name):
+                return indexes.get(name)
+            
+            def _execute_once(self, sql, params=None):
+                statements.append(sql)
+                words = sql.split()
+                name = words[words.index('EXISTS') + 1]
+                if sql.startswith('DROP'):
+                    indexes.pop(name, None)
+                    return
+                if name in indexes:
+                    return
+                # カタログへの登録後、CONCURRENTLYの待機中にタイムアウトすると無効なインデックスが残る
+                indexes[name] = ('i', self.valid and self.failures == 0)
+                if self.failures > 0:
+                    self.failures -= 1
+                    raise OperationalError(sql, {}, LockNotAvailable())
+        
+        create = "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_items_name ON items (name)"
+        LockTimeoutContext(failures=1).create_index('ix_items_name', 'items', 'name')
+        
+        assert statements == [create, "DROP INDEX CONCURRENTLY IF EXISTS ix_items_name", create]
+        assert indexes['ix_items_name'] == ('i', True)
+        
+        indexes.clear()
+        with pytest.raises(MigrationError):
+            LockTimeoutContext(failures=0, valid=False).create_index('ix_items_name', 'items', 'name')
+    
+    def test_search_index_rebuilt_with_trigram(self, engine):
+        """unicode61のFTS5テーブルがtrigramトークナイザーで作り直されることのテスト"""
+        run_migrations(engine, target='0003')
+        with engine.begin() as connection:
+            connection.execute(text("DROP TABLE user_profiles_fts"))
+            connection.execute(text(
+                "CREATE VIRTUAL TABLE user_profiles_fts USING fts5("
+                "display_name, bio, location, content='user_profiles', content_rowid='id')"
+            ))
+            connection.execute(text(
+                "INSERT INTO user_profiles (firebase_uid, display_name) VALUES ('user-a', '田中太郎')"
+            ))
+        
+        assert run_migrations(engine) == ['0004']
+        
+        with engine.connect() as connection:
+            rows = connection.execute(text("SELECT rowid FROM user_profiles_fts WHERE user_profiles_fts MATCH '\"中太郎\"'")).all()
+        assert len(rows) == 1
@@ -0,0 +1,52 @@
+"""
+ハッシュパーティショニングのpytestによるテスト
+"""
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.schema import CreateTable
+
+from models.user_profile import UserProfile
+from migrations import MigrationContext, MigrationError
+from migrations.partition import partition_table
+from services import partitioning
+
+
+class TestPartitioning:
+    """ハッシュパーティショニングのテスト"""
+    
+    def test_disabled_by_default(self, monkeypatch):
+        """パーティション数が0の場合は通常のテーブルとして作成されることのテスト"""
+        monkeypatch.setattr(partitioning, '_partitions', 0)
+        sql = str(CreateTable(UserProfile.__table__).compile(dialect=postgresql.dialect()))
+        
+        assert 'PARTITION BY' not in sql
+        assert 'PRIMARY KEY (id)' in sql
+    
+    def test_postgresql_partitioned_table(self, monkeypatch):
+        """PostgreSQLではfirebase_uidのハッシュでパーティショニングされることのテスト"""
+        monkeypatch.setattr(partitioning, '_partitions', 4)
+        sql = str(CreateTable(UserProfile.__table__).compile(dialect=postgresql.dialect()))
+        
+        assert 'PARTITION BY HASH (firebase_uid)' in sql
+        assert 'PRIMARY KEY (id, firebase_uid)' in sql
+        assert partitioning.partition_ddl('user_profiles', 4)[3] == (
+            "CREATE TABLE IF NOT EXISTS user_profiles_p3 PARTITION OF user_profiles "
+            "FOR VALUES WITH (MODULUS 4, REMAINDER 3)"
+        )
+    
+    def test_sqlite_unaffected(self, monkeypatch):
+        """SQLiteではパーティション数に関係なく通常のテーブルとして作成されることのテスト"""
+        monkeypatch.setattr(partitioning, '_partitions', 4)
+        sql = str(CreateTable(UserProfile.__table__).compile(dialect=sqlite.dialect()))
+        
+        assert 'PARTITION BY' not in sql
+        assert 'PRIMARY KEY (id)' in sql
+    
+    def test_online_migration_requires_postgresql(self, tmp_path):
+        """既存のテーブルの移行はPostgreSQL以外では実行できないことのテスト"""
+        engine = create_engine(f"sqlite:///{tmp_path / 'partition.db'}")
+        with engine.connect() as connection:
+            with pytest.raises(MigrationError):
+                partition_table(MigrationContext(connection), 'user_profiles', 'firebase_uid', 4)
+        engine.dispose()
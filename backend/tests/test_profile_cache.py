@@ -0,0 +1,95 @@
+"""
+プロフィールキャッシュのpytestによるテスト
+"""
+import time
+from unittest.mock import patch
+
+import pytest
+
+from models.user_profile import UserProfile
+from services.profile_cache import SharedCacheBackend, init_profile_cache, profile_cache
+
+
+class TestProfileCache:
+    """プロフィールキャッシュのテスト"""
+    
+    def test_local_ttl_without_shared_backend(self, app):
+        """共有バックエンドがない場合もインプロセスキャッシュはPROFILE_CACHE_LOCAL_TTL秒で失効することのテスト"""
+        app.config.update(PROFILE_CACHE_ENABLED=True, PROFILE_CACHE_TTL=300, PROFILE_CACHE_LOCAL_TTL=5)
+        
+        init_profile_cache(app)
+        
+        assert profile_cache.enabled is True
+        assert profile_cache.local_ttl == 5
+    
+    def test_delete_removes_entry_cached_during_delete(
+        self, app, client, auth_headers, mock_auth, create_test_profile
+    ):
+        """削除中に並行するGETがキャッシュしたプロフィールが削除後に残らないことのテスト"""
+        create_test_profile()
+        delete = UserProfile.delete
+        
+        def delete_with_concurrent_read(firebase_uid):
+            # 削除前の無効化とコミットの間に並行するGETがキャッシュした状態を再現する
+            profile_cache.set(firebase_uid, {'firebase_uid': firebase_uid, 'display_name': 'Stale'})
+            return delete(firebase_uid)
+        
+        with patch.object(UserProfile, 'delete', side_effect=delete_with_concurrent_read):
+            response = client.delete('/api/profile', headers=auth_headers)
+        
+        assert response.status_code == 200
+        assert profile_cache.get('test-user-id') is None
+    
+    def test_read_before_delete_is_not_cached_after_delete(
+        self, app, client, auth_headers, mock_auth, create_test_profile
+    ):
+        """削除のコミット前に行を読み取ったGETが、削除後にプロフィールを登録できないことのテスト"""
+        create_test_profile()
+        stale = client.get('/api/profile', headers=auth_headers).get_json()['profile']
+        
+        assert client.delete('/api/profile', headers=auth_headers).status_code == 200
+        
+        # 削除前の行を読み取ったGETの登録が、削除後の無効化より後に届く
+        profile_cache.set('test-user-id', stale)
+        assert profile_cache.get('test-user-id') is None
+        
+        # 墓標の期限が切れた後は再び登録できる
+        later = time.time() + profile_cache.tombstone_ttl + 1
+        with patch('services.profile_cache.time.time', return_value=later), \
+                patch.object(profile_cache._local, '_clock', return_value=later):
+            profile_cache.set('test-user-id', stale)
+            assert profile_cache.get('test-user-id') == stale
+    
+    def test_set_does_not_replace_newer_profile(self, app):
+        """古いプロフィールの登録が、並行する更新で登録された新しいプロフィールを上書きしないことのテスト"""
+        profile_cache.configure(enabled=True, max_size=10, ttl=300)
+        newer = {'id': 1, 'display_name': 'New', 'updated_at': '2024-01-01T00:00:01.500000'}
+        older = {'id': 1, 'display_name': 'Old', 'updated_at': '2024-01-01T00:00:01'}
+        
+        # 更新がキャッシュした後に、更新前の行を読み取ったGETの登録が届く
+        profile_cache.set('test-user-id', newer)
+        profile_cache.set('test-user-id', older)
+        assert profile_cache.get('test-user-id')['display_name'] == 'New'
+        
+        profile_cache.set('test-user-id', {**newer, 'display_name': 'Newest', 'updated_at': '2024-01-01T00:00:02'})
+        assert profile_cache.get('test-user-id')['display_name'] == 'Newest'
+    
+    def test_get_profile_looks_up_cache_once(self, client, auth_headers, mock_auth, create_test_profile):
+        """ETagの判定とレスポンスでキャッシュの参照が1回のみ行われることのテスト"""
+        create_test_profile()
+        etag = client.get('/api/profile', headers=auth_headers).headers['ETag']
+        
+        with patch.object(profile_cache, 'get', wraps=profile_cache.get) as mock_get:
+            client.get('/api/profile', headers={**auth_headers, 'If-None-Match': etag})
+            client.get('/api/profile', headers=auth_headers)
+        
+        assert mock_get.call_count == 2
+    
+    def test_incomplete_backend_fails_on_construction(self):
+        """メソッドが不足している共有バックエンドがインスタンスの作成時にエラーになることのテスト"""
+        class IncompleteBackend(SharedCacheBackend):
+            def get(self, key):
+                return None
+        
+        with pytest.raises(TypeError):
+            IncompleteBackend()
@@ -0,0 +1,115 @@
+"""
+リードレプリカのルーティングのpytestによるテスト
+"""
+import json
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from services.db_service import db
+from services.profile_cache import SharedCacheBackend
+from services.replica_router import replica_router, Replica, PIN_COOKIE, PIN_HEADER
+
+
+@pytest.fixture
+def replica(app, tmp_path):
+    """プライマリとは別のデータを持つSQLiteのレプリカを設定するフィクスチャ"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'replica.db'}")
+    db.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(text(
+            "INSERT INTO user_profiles (firebase_uid, display_name) VALUES ('test-user-id', 'From Replica')"
+        ))
+    
+    replica_router.configure([Replica('replica1', engine)], pin_seconds=60, retry_interval=60)
+    yield replica_router.replicas[0]
+    replica_router.configure([], pin_seconds=5, retry_interval=30)
+
+
+class TestReplicaRouter:
+    """リードレプリカのルーティングのテスト"""
+    
+    def test_reads_go_to_replica_until_write(self, client, auth_headers, mock_auth, create_test_profile, replica):
+        """読み取りはレプリカ、書き込み後はそのユーザーの読み取りがプライマリになることのテスト"""
+        create_test_profile(display_name='From Primary')
+        
+        response = client.get('/api/profile', headers=auth_headers)
+        assert json.loads(response.data)['profile']['display_name'] == 'From Replica'
+        assert replica.reads == 1
+        
+        client.put('/api/profile', headers=auth_headers, json={'bio': 'Updated'})
+        response = client.get('/api/profile', headers=auth_headers)
+        
+        profile = json.loads(response.data)['profile']
+        assert profile['display_name'] == 'From Primary'
+        assert profile['bio'] == 'Updated'
+        assert replica.reads == 1
+    
+    def test_pin_follows_user_across_workers(self, app, auth_headers, mock_auth, create_test_profile, replica):
+        """固定がクライアントではなくユーザーごとに共有ストアで保持され、別のワーカーでも有効になることのテスト"""
+        class DictBackend(SharedCacheBackend):
+            def __init__(self):
+                self.values = {}
+            
+            def get(self, key):
+                return self.values.get(key)
+            
+            def set(self, key, value, ttl):
+                self.values[key] = value
+            
+            def set_if_newer(self, key, value, ttl):
+                self.values[key] = value
+            
+            def delete(self, key):
+                self.values.pop(key, None)
+        
+        shared = DictBackend()
+        replica_router.configure([replica], pin_seconds=60, retry_interval=60, shared_pins=shared)
+        create_test_profile(display_name='From Primary')
+        
+        response = app.test_client().put('/api/profile', headers=auth_headers, json={'bio': 'Updated'})
+        last_write = response.headers[PIN_HEADER]
+        assert f"{PIN_COOKIE}={last_write}" in response.headers['Set-Cookie']
+        assert shared.values['test-user-id']['last_write'] == pytest.approx(float(last_write), abs=0.001)
+        
+        # 別のワーカー（ワーカー内の記録なし）で、Cookieもヘッダーも送らないクライアントの読み取りもプライマリで実行される
+        replica_router._pins.clear()
+        app.test_client().get('/api/profiles/search', headers=auth_headers, query_string={'q': 'From'})
+        assert replica.reads == 0
+        
+        # 書き込みを行っていない別のユーザーの読み取りはレプリカで実行される
+        mock_auth.return_value = {**mock_auth.return_value, 'uid': 'other-user-id'}
+        app.test_client().get('/api/profiles/search', headers=auth_headers, query_string={'q': 'From'})
+        assert replica.reads == 1
+        
+        # クライアントがヘッダーで最終書き込み時刻を送った場合もプライマリで実行される
+        app.test_client().get(
+            '/api/profiles/search', headers={**auth_headers, PIN_HEADER: last_write}, query_string={'q': 'From'}
+        )
+        assert replica.reads == 1
+        assert replica_router.pinned_reads == 2
+    
+    def test_replica_reads_are_not_cached(self, client, auth_headers, mock_auth, create_test_profile, replica):
+        """レプリカから読み取ったプロフィールがキャッシュされないことのテスト"""
+        from services.profile_cache import profile_cache
+        
+        create_test_profile(display_name='From Primary')
+        client.get('/api/profile', headers=auth_headers)
+        
+        assert replica.reads == 1
+        assert profile_cache.get('test-user-id') is None
+    
+    def test_unhealthy_replica_fails_over(self, app, create_test_profile):
+        """接続できないレプリカが切り離され、プライマリで読み取られることのテスト"""
+        create_test_profile(display_name='From Primary')
+        broken = create_engine('sqlite:////nonexistent-dir/replica.db')
+        replica_router.configure([Replica('broken', broken)], pin_seconds=60, retry_interval=60)
+        try:
+            from models.user_profile import UserProfile
+            profile = replica_router.run(lambda: UserProfile.get_by_firebase_uid('test-user-id'))
+            
+            assert profile.display_name == 'From Primary'
+            assert replica_router.replicas[0].healthy is False
+            assert replica_router.choose() is None
+        finally:
+            replica_router.configure([], pin_seconds=5, retry_interval=30)
@@ -0,0 +1,70 @@
+"""
+プロフィールのフィールド選択（?fields=）のpytestによるテスト
+"""
+import json
+
+from sqlalchemy import inspect
+
+from models.user_profile import UserProfile
+from services.db_service import db
+
+
+class TestSparseFields:
+    """フィールド選択のテスト"""
+    
+    def test_get_profile_with_fields(self, client, auth_headers, mock_auth, create_test_profile):
+        """指定したフィールドのみが返され、ETagが表現ごとに異なることのテスト"""
+        create_test_profile(display_name='Sparse User')
+        
+        response = client.get('/api/profile?fields=display_name', headers=auth_headers)
+        assert response.status_code == 200
+        assert json.loads(response.data)['profile'] == {'display_name': 'Sparse User'}
+        
+        full = client.get('/api/profile', headers=auth_headers)
+        assert 'bio' in json.loads(full.data)['profile']
+        assert full.headers['ETag'] != response.headers['ETag']
+        
+        cached = client.get('/api/profile?fields=display_name', headers=auth_headers)
+        assert cached.headers['ETag'] == response.headers['ETag']
+        
+        not_modified = client.get(
+            '/api/profile?fields=display_name',
+            headers={**auth_headers, 'If-None-Match': response.headers['ETag']}
+        )
+        assert not_modified.status_code == 304
+    
+    def test_invalid_field(self, client, auth_headers, mock_auth):
+        """モデルに存在しないフィールドが拒否されることのテスト"""
+        response = client.get('/api/profile?fields=display_name,password', headers=auth_headers)
+        
+        assert response.status_code == 422
+    
+    def test_unrequested_columns_are_deferred(self, app, create_test_profile):
+        """指定しなかった列がデータベースから読み込まれないことのテスト"""
+        create_test_profile()
+        db.session.expunge_all()
+        
+        profile = UserProfile.get_by_firebase_uid('test-user-id', fields=['display_name'])
+        unloaded = inspect(profile).unloaded
+        
+        assert {'bio', 'location', 'website', 'created_at'} <= unloaded
+        assert 'display_name' not in unloaded
+        assert profile.to_dict(['display_name']) == {'display_name': 'Test User'}
+        assert 'bio' in inspect(profile).unloaded
+    
+    def test_get_or_create_returns_requested_columns(self, app):
+        """作成時もETagに必要な列と指定した列のみが返されることのテスト"""
+        profile_data, created = UserProfile.get_or_create('new-user', fields=['display_name'])
+        
+        assert created is True
+        assert set(profile_data) == {'id', 'updated_at', 'display_name'}
+    
+    def test_search_with_fields(self, client, auth_headers, mock_auth, create_test_profile):
+        """検索結果にfirebase_uidと指定したフィールドのみが含まれることのテスト"""
+        create_test_profile(display_name='Searchable Name')
+        
+        response = client.get('/api/profiles/search?q=Searchable&fields=display_name', headers=auth_headers)
+        
+        assert json.loads(response.data)['results'] == [
+            {'firebase_uid': 'test-user-id', 'display_name': 'Searchable Name'}
+        ]
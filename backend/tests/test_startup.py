@@ -0,0 +1,87 @@
+"""
+起動計測と遅延インポートのpytestによるテスト
+"""
+import os
+import sys
+import subprocess
+
+import pytest
+
+from startup import LazyModule, check_startup_budget, get_timings
+
+
+def test_lazy_module_imports_on_first_access():
+    """遅延インポートが初回アクセス時に行われ、時間が記録されることのテスト"""
+    lazy_json = LazyModule('json')
+    assert lazy_json._module is None
+    
+    assert lazy_json.dumps({'a': 1}) == '{"a": 1}'
+    assert lazy_json._module is not None
+    assert 'import:json' in get_timings()
+
+
+def test_check_startup_budget():
+    """起動時間の予算チェックのテスト"""
+    assert check_startup_budget(50.0, 100.0) is True
+    assert check_startup_budget(150.0, 0) is True
+    assert check_startup_budget(150.0, 100.0) is False
+    
+    with pytest.raises(RuntimeError):
+        check_startup_budget(150.0, 100.0, strict=True)
+
+
+def test_app_module_import_is_lazy():
+    """app.pyのインポートではアプリケーションが作成されず、appの参照時に作成されることのテスト"""
+    script = (
+        "import app; "
+        "assert 'app' not in vars(app); "
+        "from flask import Flask; "
+        "assert isinstance(app.app, Flask) and app.app is app.app"
+    )
+    backend = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run(
+        [sys.executable, '-c', script], cwd=backend, env={**os.environ, 'FLASK_ENV': 'testing'},
+        capture_output=True, text=True, timeout=120
+    )
+    
+    assert result.returncode == 0, result.stderr
+
+
+def test_warm_up_starts_once_per_worker_process(monkeypatch):
+    """ウォームアップがアプリケーションの作成時ではなく、ワーカープロセスごとに1回開始されることのテスト"""
+    import app as app_module
+    
+    started = []
+    monkeypatch.setattr(app_module, 'schedule_warm_up', lambda app: started.append(app) or 'timer')
+    flask_app = app_module.create_app()
+    flask_app.config.update(LAZY_INIT=True, WARM_UP_ON_START=True)
+    
+    assert app_module.start_warm_up(flask_app) == 'timer'
+    assert app_module.start_warm_up(flask_app) is None
+    assert len(started) == 1
+    
+    # gunicorn --preloadでフォークしたワーカー（別のプロセスID）では改めて開始する
+    monkeypatch.setattr(app_module.os, 'getpid', lambda: -1)
+    assert app_module.start_warm_up(flask_app) == 'timer'
+    assert len(started) == 2
+
+
+def test_warm_up_hook_does_not_replace_response(monkeypatch):
+    """ウォームアップを開始する最初のリクエストが通常どおり処理されることのテスト"""
+    import threading
+    import app as app_module
+    from config import Config
+    
+    started = []
+    monkeypatch.setattr(Config, 'LAZY_INIT', True)
+    monkeypatch.setattr(Config, 'WARM_UP_ON_START', True)
+    monkeypatch.setattr(
+        app_module, 'schedule_warm_up',
+        lambda app: started.append(app) or threading.Timer(0, lambda: None)
+    )
+    flask_app = app_module.create_app()
+    client = flask_app.test_client()
+    
+    assert client.get('/').status_code == 200
+    assert client.get('/').status_code == 200
+    assert len(started) == 1
@@ -0,0 +1,171 @@
+"""
+オフライン検証エンジンのpytestによるテスト
+"""
+import json
+import time
+import datetime
+
+import jwt
+import pytest
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+
+from services.token_verifier import (
+    FirebaseTokenVerifier, SigningKeySet, FileKeySource, KeySource,
+    TokenExpiredError, TokenVerificationError, SigningKeysUnavailableError
+)
+
+PROJECT_ID = 'test-project'
+KID = 'test-kid'
+
+
+@pytest.fixture(scope='module')
+def signing_key():
+    """テスト用のRSA秘密鍵と自己署名証明書を作成するフィクスチャ"""
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, 'test')])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(private_key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now)
+        .not_valid_after(now + datetime.timedelta(days=1))
+        .sign(private_key, hashes.SHA256())
+    )
+    cert_pem = cert.public_bytes(serialization.Encoding.PEM).decode('utf-8')
+    return private_key, cert_pem
+
+
+@pytest.fixture
+def keys_file(tmp_path, signing_key):
+    """Googleの証明書JSONと同じ形式の鍵ファイルを作成するフィクスチャ"""
+    path = tmp_path / 'certs.json'
+    path.write_text(json.dumps({KID: signing_key[1]}))
+    return str(path)
+
+
+def make_token(private_key, ttl=3600, **overrides):
+    """テスト用のFirebase IDトークンを作成する"""
+    now = int(time.time())
+    claims = {
+        'iss': f'https://securetoken.google.com/{PROJECT_ID}',
+        'aud': PROJECT_ID,
+        'sub': 'test-user-id',
+        'iat': now,
+        'auth_time': now,
+        'exp': now + ttl,
+        'email': 'test@example.com'
+    }
+    claims.update(overrides)
+    return jwt.encode(claims, private_key, algorithm='RS256', headers={'kid': KID})
+
+
+class FailingKeySource(KeySource):
+    """常に取得に失敗する取得元"""
+
+    def fetch(self):
+        raise ConnectionError('network unavailable')
+
+
+class TestFirebaseTokenVerifier:
+    """オフライン検証エンジンのテスト"""
+
+    def test_verify_valid_token(self, signing_key, keys_file):
+        """有効なトークンがオフラインで検証されることのテスト"""
+        key_set = SigningKeySet(FileKeySource(keys_file))
+        assert key_set.load()
+        verifier = FirebaseTokenVerifier(PROJECT_ID, key_set)
+
+        claims = verifier.verify(make_token(signing_key[0]))
+
+        assert claims['uid'] == 'test-user-id'
+        assert claims['email'] == 'test@example.com'
+        key_set.stop()
+
+    def test_verify_expired_and_wrong_audience(self, signing_key, keys_file):
+        """期限切れ・audienceの不一致が拒否されることのテスト"""
+        key_set = SigningKeySet(FileKeySource(keys_file))
+        key_set.load()
+        verifier = FirebaseTokenVerifier(PROJECT_ID, key_set)
+
+        with pytest.raises(TokenExpiredError):
+            verifier.verify(make_token(signing_key[0], ttl=-10, iat=int(time.time()) - 100))
+        with pytest.raises(TokenVerificationError):
+            verifier.verify(make_token(signing_key[0], aud='other-project'))
+        key_set.stop()
+
+    def test_persisted_keys_survive_source_outage(self, signing_key, keys_file, tmp_path):
+        """取得元の障害時にも永続化された鍵セットで検証できることのテスト"""
+        cache_file = str(tmp_path / 'persisted.json')
+        SigningKeySet(FileKeySource(keys_file), cache_file=cache_file).load()
+
+        key_set = SigningKeySet(FailingKeySource(), cache_file=cache_file)
+        assert key_set.load()
+        assert key_set.refresh() is False
+
+        verifier = FirebaseTokenVerifier(PROJECT_ID, key_set)
+        assert verifier.verify(make_token(signing_key[0]))['uid'] == 'test-user-id'
+        assert key_set.stats()['refresh_failures'] == 1
+        key_set.stop()
+
+    def test_writable_keys_file_is_not_trusted(self, signing_key, keys_file, tmp_path):
+        """グループ・他のユーザーが書き込める鍵セットファイルが読み込まれないことのテスト"""
+        cache_file = tmp_path / 'persisted.json'
+        SigningKeySet(FileKeySource(keys_file), cache_file=str(cache_file)).load()
+        assert cache_file.stat().st_mode & 0o777 == 0o600
+
+        cache_file.chmod(0o666)
+        key_set = SigningKeySet(FailingKeySource(), cache_file=str(cache_file))
+
+        assert key_set.load() is False
+        key_set.stop()
+
+    def test_unknown_kid_triggers_rate_limited_refresh(self, signing_key, tmp_path):
+        """鍵の入れ替え後、不明な鍵IDで臨時に1回だけ更新して検証できることのテスト"""
+        path = tmp_path / 'rotating.json'
+        path.write_text(json.dumps({'old-kid': signing_key[1]}))
+
+        class CountingKeySource(FileKeySource):
+            fetches = 0
+
+            def fetch(self):
+                CountingKeySource.fetches += 1
+                return super().fetch()
+
+        key_set = SigningKeySet(CountingKeySource(str(path)))
+        assert key_set.load()
+        verifier = FirebaseTokenVerifier(PROJECT_ID, key_set)
+
+        # 取得元が新しい鍵に入れ替わった
+        path.write_text(json.dumps({KID: signing_key[1]}))
+        assert verifier.verify(make_token(signing_key[0]))['uid'] == 'test-user-id'
+        assert CountingKeySource.fetches == 2
+
+        # 間隔内の不明な鍵IDでは取得元にアクセスしない
+        with pytest.raises(TokenVerificationError):
+            key_set.get_key('forged-kid')
+        assert CountingKeySource.fetches == 2
+        key_set.stop()
+
+    def test_no_keys_available(self, signing_key):
+        """鍵セットが一度も取得できない場合のテスト"""
+        key_set = SigningKeySet(FailingKeySource())
+        assert key_set.load() is False
+        verifier = FirebaseTokenVerifier(PROJECT_ID, key_set)
+
+        with pytest.raises(SigningKeysUnavailableError):
+            verifier.verify(make_token(signing_key[0]))
+        key_set.stop()
+
+    def test_incomplete_key_source_fails_on_construction(self):
+        """fetchを実装していない取得元がインスタンスの作成時にエラーになることのテスト"""
+        class IncompleteKeySource(KeySource):
+            pass
+
+        with pytest.raises(TypeError):
+            IncompleteKeySource()
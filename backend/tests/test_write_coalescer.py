@@ -0,0 +1,142 @@
+"""
+書き込みの集約のpytestによるテスト
+"""
+import asyncio
+import threading
+
+import pytest
+
+from services.write_coalescer import WriteCoalescer
+
+
+def _submit_concurrently(coalescer, updates, write):
+    """複数のスレッドから同時に更新を送信し、それぞれの結果を返す"""
+    results = [None] * len(updates)
+    barrier = threading.Barrier(len(updates))
+    
+    def worker(index):
+        barrier.wait()
+        try:
+            results[index] = coalescer.submit('user-1', updates[index], write)
+        except Exception as e:
+            results[index] = e
+    
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(len(updates))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+class TestWriteCoalescer:
+    """書き込みの集約のテスト"""
+    
+    def test_disabled_writes_directly(self):
+        """無効な場合はそのまま書き込まれることのテスト"""
+        coalescer = WriteCoalescer()
+        
+        assert coalescer.submit('user-1', {'bio': 'a'}, lambda data: data) == {'bio': 'a'}
+        assert coalescer.stats()['submitted'] == 0
+    
+    def test_concurrent_updates_are_merged(self):
+        """同時の更新が1回の書き込みにまとめられ、全員が同じ結果を受け取ることのテスト"""
+        coalescer = WriteCoalescer()
+        coalescer.configure(enabled=True, window_ms=200)
+        writes = []
+        
+        def write(data):
+            writes.append(data)
+            return {'firebase_uid': 'user-1', **data}
+        
+        updates = [{'bio': 'bio'}, {'display_name': 'Name'}, {'location': 'Tokyo'}, {'website': 'https://example.com'}]
+        results = _submit_concurrently(coalescer, updates, write)
+        
+        assert len(writes) == 1
+        assert writes[0] == {'bio': 'bio', 'display_name': 'Name', 'location': 'Tokyo', 'website': 'https://example.com'}
+        assert all(result == results[0] for result in results)
+        
+        stats = coalescer.stats()
+        assert stats['submitted'] == 4
+        assert stats['writes'] == 1
+        assert stats['absorbed'] == 3
+        assert stats['max_batch_size'] == 4
+    
+    def test_error_is_raised_to_every_caller(self):
+        """書き込みの失敗が集約された全員に伝わることのテスト"""
+        coalescer = WriteCoalescer()
+        coalescer.configure(enabled=True, window_ms=200)
+        
+        def write(data):
+            raise RuntimeError('write failed')
+        
+        results = _submit_concurrently(coalescer, [{'bio': 'a'}, {'bio': 'b'}], write)
+        
+        assert all(isinstance(result, RuntimeError) for result in results)
+        assert coalescer.stats()['errors'] == 1
+    
+    def test_async_updates_are_merged(self):
+        """イベントループ上の同時の更新が1回の書き込みにまとめられることのテスト"""
+        coalescer = WriteCoalescer()
+        coalescer.configure(enabled=True, window_ms=50)
+        writes = []
+        
+        async def write(data):
+            writes.append(data)
+            return {'firebase_uid': 'user-1', **data}
+        
+        async def submit_all():
+            return await asyncio.gather(
+                coalescer.submit_async('user-1', {'bio': 'bio'}, write),
+                coalescer.submit_async('user-1', {'display_name': 'Name'}, write)
+            )
+        
+        results = asyncio.run(submit_all())
+        
+        assert writes == [{'bio': 'bio', 'display_name': 'Name'}]
+        assert results[0] == results[1]
+        assert coalescer.stats()['absorbed'] == 1
+    
+    def test_cancelled_async_leader_releases_batch(self):
+        """リーダーのタスクがキャンセルされても、フォロワーと以降の更新が待ち続けないことのテスト"""
+        coalescer = WriteCoalescer()
+        coalescer.configure(enabled=True, window_ms=200)
+        writes = []
+        
+        async def write(data):
+            writes.append(data)
+            return {'firebase_uid': 'user-1', **data}
+        
+        async def cancel_leader():
+            leader = asyncio.create_task(coalescer.submit_async('user-1', {'bio': 'a'}, write))
+            await asyncio.sleep(0)
+            follower = asyncio.create_task(coalescer.submit_async('user-1', {'bio': 'b'}, write))
+            await asyncio.sleep(0)
+            
+            # ウィンドウの待機中にクライアントが切断する
+            leader.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await leader
+            with pytest.raises(RuntimeError):
+                await asyncio.wait_for(follower, timeout=1)
+            
+            return await asyncio.wait_for(coalescer.submit_async('user-1', {'bio': 'c'}, write), timeout=1)
+        
+        result = asyncio.run(cancel_leader())
+        
+        assert result == {'firebase_uid': 'user-1', 'bio': 'c'}
+        assert writes == [{'bio': 'c'}]
+        assert coalescer.stats()['errors'] == 1
+    
+    def test_update_through_api(self, client, auth_headers, mock_auth):
+        """集約を有効にしてもPUT /api/profileが更新後のプロフィールを返すことのテスト"""
+        from services.write_coalescer import write_coalescer
+        
+        write_coalescer.configure(enabled=True, window_ms=1)
+        try:
+            response = client.put('/api/profile', headers=auth_headers, json={'bio': 'Coalesced'})
+        finally:
+            write_coalescer.configure(enabled=False, window_ms=50)
+        
+        assert response.status_code == 200
+        assert response.get_json()['profile']['bio'] == 'Coalesced'